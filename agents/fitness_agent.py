@@ -1,9 +1,12 @@
 """健身记录分析Agent - 使用LangGraph构建"""
-from typing import Dict, Any, TypedDict, Annotated
+from typing import Dict, Any, List, Optional, TypedDict, Annotated
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage
 import config
+from utils.profiling import request_profiler
+from utils.date_range import DateRange
+from utils.deadline import Deadline
 from agents.nodes import (
     query_router_node,
     database_query_node,
@@ -17,10 +20,15 @@ class AgentState(TypedDict):
     """Agent状态定义"""
     messages: Annotated[list[BaseMessage], add_messages]
     query: str
+    user_id: int
     intent: str
+    date_range: Optional[DateRange]
+    prefetched_data: Optional[str]
     data: str
     analysis: str
     response: str
+    deadline: Optional[Deadline]
+    degraded: List[str]
 
 
 class FitnessAgent:
@@ -66,57 +74,107 @@ class FitnessAgent:
         
         return app
     
-    def invoke(self, query: str, user_id: int = 1) -> str:
+    def _initial_state(self, query: str, user_id: int, deadline_seconds: Optional[float]) -> AgentState:
+        """初始化状态（截止时间从此刻开始计算）"""
+        return {
+            "messages": [],
+            "query": query,
+            "user_id": user_id,
+            "intent": "",
+            "date_range": None,
+            "prefetched_data": None,
+            "data": "",
+            "analysis": "",
+            "response": "",
+            "deadline": Deadline.from_config(deadline_seconds),
+            "degraded": []
+        }
+    
+    def run(
+        self,
+        query: str,
+        user_id: int = 1,
+        profile: Optional[bool] = None,
+        deadline_seconds: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
-        执行Agent推理
+        执行Agent推理并返回回复及降级信息
         
         Args:
             query: 用户查询
             user_id: 用户ID
+            profile: True强制剖析本次请求，None按PROFILING_CONFIG采样
+            deadline_seconds: 端到端时间预算（秒），None使用DEADLINE_CONFIG，0表示不限
         
         Returns:
-            Agent生成的回复
+            {"response": 回复, "degraded": 因预算不足降级的节点列表}
         """
-        # 初始化状态
-        initial_state: AgentState = {
-            "messages": [],
-            "query": query,
-            "intent": "",
-            "data": "",
-            "analysis": "",
-            "response": ""
-        }
+        initial_state = self._initial_state(query, user_id, deadline_seconds)
         
         # 运行Agent
         try:
-            result = self.graph.invoke(initial_state)
-            return result.get("response", "抱歉，无法生成回复")
+            with request_profiler.session(force=profile, user_id=user_id, query=query) as session:
+                result = self.graph.invoke(initial_state)
+                session.tag(intent=result.get("intent", ""), degraded=result.get("degraded", []))
+            return {
+                "response": result.get("response", "抱歉，无法生成回复"),
+                "degraded": result.get("degraded", [])
+            }
         except Exception as e:
-            return f"Agent执行出错: {str(e)}"
+            return {"response": f"Agent执行出错: {str(e)}", "degraded": []}
     
-    def stream(self, query: str, user_id: int = 1):
+    def invoke(
+        self,
+        query: str,
+        user_id: int = 1,
+        profile: Optional[bool] = None,
+        deadline_seconds: Optional[float] = None
+    ) -> str:
+        """
+        执行Agent推理
+        
+        Args:
+            query: 用户查询
+            user_id: 用户ID
+            profile: True强制剖析本次请求，None按PROFILING_CONFIG采样
+            deadline_seconds: 端到端时间预算（秒），None使用DEADLINE_CONFIG，0表示不限
+        
+        Returns:
+            Agent生成的回复（预算不足时为降级的简要回复）
+        """
+        return self.run(query, user_id, profile, deadline_seconds)["response"]
+    
+    def stream(
+        self,
+        query: str,
+        user_id: int = 1,
+        profile: Optional[bool] = None,
+        deadline_seconds: Optional[float] = None
+    ):
         """
         流式执行Agent推理（用于实时显示过程）
         
         Args:
             query: 用户查询
             user_id: 用户ID
+            profile: True强制剖析本次请求，None按PROFILING_CONFIG采样
+            deadline_seconds: 端到端时间预算（秒），None使用DEADLINE_CONFIG，0表示不限
         
         Yields:
             每个节点的执行结果
         """
-        initial_state: AgentState = {
-            "messages": [],
-            "query": query,
-            "intent": "",
-            "data": "",
-            "analysis": "",
-            "response": ""
-        }
+        initial_state = self._initial_state(query, user_id, deadline_seconds)
         
         try:
-            for event in self.graph.stream(initial_state):
-                yield event
+            with request_profiler.session(force=profile, user_id=user_id, query=query) as session:
+                for event in self.graph.stream(initial_state):
+                    for update in event.values():
+                        if isinstance(update, dict) and update.get("intent"):
+                            session.tag(intent=update["intent"])
+                    # 调用方处理事件的时间不计入剖析
+                    session.pause()
+                    yield event
+                    session.resume()
         except Exception as e:
             yield {"error": str(e)}
 
@@ -124,3 +182,18 @@ class FitnessAgent:
 # 创建全局Agent实例
 fitness_agent = FitnessAgent()
 
+
+def get_agent(mode: str = config.AGENT_CONFIG["mode"]):
+    """
+    按模式获取Agent实例
+    
+    Args:
+        mode: pipeline（固定流程）或tool_calling（模型自行并行调用工具）
+    
+    Returns:
+        提供invoke(query, user_id)的Agent
+    """
+    if mode == "tool_calling":
+        from agents.tool_agent import tool_agent
+        return tool_agent
+    return fitness_agent
@@ -1,20 +1,143 @@
 """Agent节点定义 - 定义LangGraph中的各个节点"""
-from typing import Dict, Any
+import hashlib
+import math
+from datetime import date
+from typing import Dict, Any, List, Optional
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage
 import config
 from utils.prompts import QUERY_ROUTER_PROMPT, ANALYSIS_PROMPT, RESPONSE_PROMPT
 from tools.database_tool import DATABASE_TOOLS
 from tools.analysis_tool import ANALYSIS_TOOLS
+from database.feature_store import feature_store
+from database.anomalies import anomaly_detector
+from database.heart_rate import heart_rate_summary_for_date
+from agents.prefetch import SpeculativePrefetcher, keyword_intent, DEFAULT_INTENT
+from utils.date_range import DateRange, parse_date_range
+from database.events import subscribe_workout_written, unsubscribe_workout_written
+from utils.response_cache import ResponseCache, data_cache_key
+from utils.llm_limiter import Hedger, LLMLimiter, RateLimitedLLM, RateLimitExceeded, UsageTracker
+from utils.deadline import DeadlineExceeded, degraded_response, is_timeout, run_with_timeout
 
 
-# 初始化LLM
-llm = ChatOpenAI(
-    model=config.OPENAI_MODEL,
-    temperature=config.AGENT_CONFIG["temperature"],
-    api_key=config.OPENAI_API_KEY,
-    base_url=config.OPENAI_BASE_URL
-)
+# 所有节点共享的限流器
+llm_limiter = LLMLimiter(**config.LLM_LIMITER_CONFIG)
+
+# 按节点（模型层级）统计的延迟、token和费用
+llm_usage = UsageTracker(config.MODEL_PRICES)
+
+
+def create_hedger(node: str) -> Optional[Hedger]:
+    """按HEDGE_CONFIG为节点创建对冲策略（每个层级单独统计延迟），未启用时返回None"""
+    settings = config.HEDGE_CONFIG
+    if not settings["enabled"] or node not in settings["nodes"]:
+        return None
+    return Hedger(
+        percentile=settings["percentile"],
+        min_delay=settings["min_delay"],
+        max_extra_ratio=settings["max_extra_ratio"],
+        burst=settings["burst"],
+        window=settings["window"],
+        min_samples=settings["min_samples"]
+    )
+
+
+def create_node_llm(node: str) -> RateLimitedLLM:
+    """
+    按NODE_MODEL_CONFIG创建节点使用的模型（重试交由限流器统一处理）
+    
+    Args:
+        node: 节点名（router / analysis / response / report）
+    
+    Returns:
+        带限流、分层用量统计和可选对冲的模型
+    """
+    settings = config.NODE_MODEL_CONFIG[node]
+    return RateLimitedLLM(
+        ChatOpenAI(
+            model=settings["model"],
+            temperature=settings["temperature"],
+            max_tokens=settings["max_tokens"],
+            timeout=settings["timeout"],
+            api_key=config.OPENAI_API_KEY,
+            base_url=config.OPENAI_BASE_URL,
+            max_retries=0
+        ),
+        llm_limiter,
+        max_output_tokens=settings["max_tokens"],
+        tier=node,
+        model=settings["model"],
+        usage=llm_usage,
+        hedger=create_hedger(node)
+    )
+
+
+# 路由和分析使用小模型，只有最终回复使用大模型
+router_llm = create_node_llm("router")
+analysis_llm = create_node_llm("analysis")
+response_llm = create_node_llm("response")
+# 批量周报点评（jobs.batch_reports）
+report_llm = create_node_llm("report")
+# 未区分节点的调用方（如工具调用模式）使用回复模型
+llm = response_llm
+
+
+def hedge_snapshot() -> Dict[str, Dict[str, Any]]:
+    """各层级的对冲指标（未启用对冲的层级不列出）"""
+    tiers = {"router": router_llm, "analysis": analysis_llm, "response": response_llm, "report": report_llm}
+    return {tier: model.hedger.snapshot() for tier, model in tiers.items() if model.hedger is not None}
+
+
+# 工具结果和分析结果的响应缓存（新记录写入时按用户失效）
+response_cache = ResponseCache(**config.RESPONSE_CACHE_CONFIG)
+subscribe_workout_written(response_cache.on_workout_written)
+
+
+def use_response_cache(cache: Any):
+    """
+    替换响应缓存（预分叉服务在fork之前换成共享内存缓存，所有工作进程共用）
+    
+    Args:
+        cache: 与ResponseCache接口一致的缓存
+    """
+    global response_cache
+    unsubscribe_workout_written(response_cache.on_workout_written)
+    response_cache = cache
+    subscribe_workout_written(cache.on_workout_written)
+
+
+def node_budget(state: Dict[str, Any], node: str) -> float:
+    """节点可用的时间（秒）：状态中没有截止时间时为inf"""
+    deadline = state.get("deadline")
+    return deadline.node_timeout(node) if deadline is not None else math.inf
+
+
+def _optional(budget: float) -> Optional[float]:
+    return None if math.isinf(budget) else budget
+
+
+def llm_timeout(node: str, budget: float) -> Optional[float]:
+    """
+    节点模型调用的超时：取节点可用时间与模型配置超时的较小值
+    
+    Raises:
+        DeadlineExceeded: 可用时间不足以完成一次模型调用
+    """
+    if math.isinf(budget):
+        return None
+    if budget < config.DEADLINE_CONFIG["min_llm_seconds"]:
+        raise DeadlineExceeded(f"{node}节点剩余{budget:.2f}秒，不调用模型")
+    return min(budget, config.NODE_MODEL_CONFIG[node]["timeout"])
+
+
+def should_degrade(error: Exception) -> bool:
+    """超时、预算用完或在限流器中排队超时时降级，其他错误照常报告"""
+    return is_timeout(error) or isinstance(error, RateLimitExceeded)
+
+
+def mark_degraded(state: Dict[str, Any], node: str) -> List[str]:
+    """在已降级的节点列表后追加node"""
+    return [*state.get("degraded", []), node]
 
 
 def query_router_node(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -28,31 +151,131 @@ def query_router_node(state: Dict[str, Any]) -> Dict[str, Any]:
         更新后的状态，包含intent字段
     """
     query = state.get("query", "")
+    user_id = state.get("user_id", 1)
     
-    # 使用LLM识别意图
-    prompt = QUERY_ROUTER_PROMPT.format_messages(query=query)
-    response = llm.invoke(prompt)
-    
-    intent = response.content.strip().lower()
-    
-    # 简单的意图映射
-    if "今天" in query or "今日" in query:
-        intent = "today_performance"
-    elif "历史" in query or "过去" in query or "最近" in query:
-        intent = "historical_analysis"
-    elif "对比" in query or "比较" in query:
-        intent = "comparison"
-    elif "趋势" in query:
-        intent = "trend_analysis"
-    else:
-        intent = "general_query"
+    # 本地规则解析时间范围（微秒级，不占用LLM调用）
+    date_range = parse_date_range(query)
+    
+    # 在LLM识别意图的同时预取最可能需要的数据
+    speculation = prefetcher.start(query, user_id, date_range=date_range, query=query)
+    intent = None
+    degraded = state.get("degraded", [])
+    try:
+        try:
+            # 使用LLM识别意图
+            prompt = QUERY_ROUTER_PROMPT.format_messages(query=query)
+            response = router_llm.invoke(prompt, timeout=llm_timeout("router", node_budget(state, "router")))
+            
+            intent = response.content.strip().lower()
+        except Exception as e:
+            if not should_degrade(e):
+                raise
+            # 预算不足：只用关键词规则识别意图
+            degraded = mark_degraded(state, "router")
+        
+        # 简单的意图映射
+        intent = keyword_intent(query) or DEFAULT_INTENT
+    finally:
+        # 预取最多等到数据库查询节点的预算用完
+        prefetched = prefetcher.resolve(speculation, intent, timeout=_optional(node_budget(state, "database")))
     
     return {
         **state,
-        "intent": intent
+        "intent": intent,
+        "date_range": date_range,
+        "prefetched_data": prefetched,
+        "degraded": degraded
     }
 
 
+def fetch_data(
+    intent: str,
+    user_id: int,
+    date_range: Optional[DateRange] = None,
+    query: str = ""
+) -> str:
+    """
+    按意图查询数据（数据库查询节点和推测式预取共用）
+    
+    Args:
+        intent: 查询意图
+        user_id: 用户ID
+        date_range: 查询中解析出的时间范围，None时使用各意图的默认窗口
+        query: 用户查询原文（备注检索使用）
+    
+    Returns:
+        工具返回的数据
+    """
+    window = date_range.as_params() if date_range else {}
+    
+    if intent == "today_performance":
+        # 使用工具获取今天的汇总
+        return DATABASE_TOOLS[1].invoke({"user_id": user_id})  # get_today_workout_summary
+    
+    elif intent == "historical_analysis":
+        # 长范围历史按预计算的日/周/月汇总读取（行数有界，不截断）
+        return DATABASE_TOOLS[3].invoke({
+            "user_id": user_id,
+            "days": config.ROLLUP_CONFIG["history_days"],
+            **window
+        })  # get_workout_rollups
+    
+    elif intent == "trend_analysis":
+        # 获取统计数据
+        return DATABASE_TOOLS[2].invoke({
+            "user_id": user_id,
+            "days": 7,
+            **window
+        })  # get_workout_statistics
+    
+    elif intent == "notes_search":
+        # 按备注内容检索，只返回最相关的记录
+        return DATABASE_TOOLS[4].invoke({
+            "user_id": user_id,
+            "query": query,
+            "limit": 10,
+            **window
+        })  # search_workout_notes
+    
+    else:
+        # 默认查询最近的记录（指定了时间范围时查询该范围内的记录）
+        return DATABASE_TOOLS[0].invoke({
+            "user_id": user_id,
+            "limit": 100 if window else 20,
+            **window
+        })  # query_workout_records
+
+
+def cached_fetch_data(
+    intent: str,
+    user_id: int,
+    prewarmed: bool = False,
+    date_range: Optional[DateRange] = None,
+    query: str = ""
+) -> str:
+    """
+    带响应缓存的fetch_data（按天缓存，新记录写入时失效）
+    
+    Args:
+        intent: 查询意图
+        user_id: 用户ID
+        prewarmed: 是否为预热调用
+        date_range: 查询中解析出的时间范围
+        query: 用户查询原文（仅备注检索的结果依赖查询原文）
+    
+    Returns:
+        工具返回的数据（不使用时间范围的意图按无范围缓存，与预热条目共用）
+    """
+    key = data_cache_key(intent, date_range, query)
+    return response_cache.get_or_compute(
+        user_id, key, lambda: fetch_data(intent, user_id, date_range, query), prewarmed
+    )
+
+
+# 推测式预取器
+prefetcher = SpeculativePrefetcher(cached_fetch_data, **config.PREFETCH_CONFIG)
+
+
 def database_query_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     数据库查询节点 - 根据意图查询数据库
@@ -65,48 +288,98 @@ def database_query_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     intent = state.get("intent", "")
     query = state.get("query", "")
+    user_id = state.get("user_id", 1)
+    
+    # 路由节点已按命中的预测预取到数据
+    prefetched = state.get("prefetched_data")
+    if prefetched is not None:
+        return {
+            **state,
+            "data": prefetched
+        }
     
     data = ""
+    degraded = state.get("degraded", [])
     
     try:
-        if intent == "today_performance":
-            # 使用工具获取今天的汇总
-            result = DATABASE_TOOLS[1].invoke({"user_id": 1})  # get_today_workout_summary
-            data = result
-        
-        elif intent == "historical_analysis":
-            # 查询历史记录
-            result = DATABASE_TOOLS[0].invoke({
-                "user_id": 1,
-                "limit": 50
-            })  # query_workout_records
-            data = result
-        
-        elif intent == "trend_analysis":
-            # 获取统计数据
-            result = DATABASE_TOOLS[2].invoke({
-                "user_id": 1,
-                "days": 7
-            })  # get_workout_statistics
-            data = result
-        
-        else:
-            # 默认查询最近的记录
-            result = DATABASE_TOOLS[0].invoke({
-                "user_id": 1,
-                "limit": 20
-            })
-            data = result
+        # 查询不支持超时参数，超出节点预算时不再等待（查询在后台完成并写入缓存）
+        data = run_with_timeout(
+            lambda: cached_fetch_data(intent, user_id, date_range=state.get("date_range"), query=query),
+            node_budget(state, "database")
+        )
+    
+    except DeadlineExceeded:
+        degraded = mark_degraded(state, "database")
     
     except Exception as e:
         data = f"查询数据时出错: {str(e)}"
     
     return {
         **state,
-        "data": data
+        "data": data,
+        "degraded": degraded
     }
 
 
+def analyze(intent: str, data: str, user_id: int, budget: float = math.inf) -> str:
+    """
+    按意图分析数据（分析节点和缓存预热共用）
+    
+    Args:
+        intent: 查询意图
+        data: 查询到的数据
+        user_id: 用户ID
+        budget: 可用时间（秒），只限制模型调用；不足时抛出DeadlineExceeded
+    
+    Returns:
+        分析结果
+    """
+    # 写入时已标记的异常（不必重新扫描历史记录）
+    anomalies = anomaly_detector.summary(user_id)
+    
+    if intent == "trend_analysis" or intent == "historical_analysis":
+        # 使用分析工具
+        if data and data != "未找到匹配的运动记录":
+            analysis = ANALYSIS_TOOLS[0].invoke({"data": data})  # analyze_workout_trends
+            return f"{analysis}\n\n近期异常记录：\n{anomalies}" if anomalies else analysis
+        return "数据不足，无法进行趋势分析"
+    
+    elif intent == "comparison":
+        # 对比分析需要特殊处理
+        return "对比分析功能（需要两个时间段的数据）"
+    
+    # 使用LLM进行一般性分析
+    if not data:
+        return "暂无数据可分析"
+    if intent == "today_performance":
+        # 逐秒心率先压缩为有界长度的概况（区间分布 + 降采样曲线）
+        heart_rate = heart_rate_summary_for_date(user_id)
+        if heart_rate:
+            data = f"{data}\n\n心率概况：\n{heart_rate}"
+    if anomalies:
+        data = f"{data}\n\n近期异常记录：\n{anomalies}"
+    # 用增量维护的画像特征代替原始历史记录做“与平时对比”
+    prompt = ANALYSIS_PROMPT.format_messages(
+        data=data,
+        profile=feature_store.summary(user_id)
+    )
+    response = analysis_llm.invoke(prompt, timeout=llm_timeout("analysis", budget))
+    return response.content
+
+
+def cached_analyze(
+    intent: str,
+    data: str,
+    user_id: int,
+    prewarmed: bool = False,
+    budget: float = math.inf
+) -> str:
+    """带响应缓存的analyze（键包含数据摘要，数据不同不会误命中；命中时不受预算限制）"""
+    digest = hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+    key = ("analysis", intent, date.today().isoformat(), digest)
+    return response_cache.get_or_compute(user_id, key, lambda: analyze(intent, data, user_id, budget), prewarmed)
+
+
 def analysis_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     数据分析节点 - 对查询到的数据进行分析
@@ -119,37 +392,25 @@ def analysis_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     data = state.get("data", "")
     intent = state.get("intent", "")
+    user_id = state.get("user_id", 1)
     
     analysis = ""
+    degraded = state.get("degraded", [])
     
     try:
-        if intent == "trend_analysis" or intent == "historical_analysis":
-            # 使用分析工具
-            if data and data != "未找到匹配的运动记录":
-                result = ANALYSIS_TOOLS[0].invoke({"data": data})  # analyze_workout_trends
-                analysis = result
-            else:
-                analysis = "数据不足，无法进行趋势分析"
-        
-        elif intent == "comparison":
-            # 对比分析需要特殊处理
-            analysis = "对比分析功能（需要两个时间段的数据）"
-        
-        else:
-            # 使用LLM进行一般性分析
-            if data:
-                prompt = ANALYSIS_PROMPT.format_messages(data=data)
-                response = llm.invoke(prompt)
-                analysis = response.content
-            else:
-                analysis = "暂无数据可分析"
+        analysis = cached_analyze(intent, data, user_id, budget=node_budget(state, "analysis"))
     
     except Exception as e:
-        analysis = f"分析过程中出错: {str(e)}"
+        if should_degrade(e):
+            # 预算不足：跳过分析，直接根据数据回复
+            degraded = mark_degraded(state, "analysis")
+        else:
+            analysis = f"分析过程中出错: {str(e)}"
     
     return {
         **state,
-        "analysis": analysis
+        "analysis": analysis,
+        "degraded": degraded
     }
 
 
@@ -164,8 +425,14 @@ def response_node(state: Dict[str, Any]) -> Dict[str, Any]:
         更新后的状态，包含response字段
     """
     query = state.get("query", "")
+    user_id = state.get("user_id", 1)
     data = state.get("data", "")
     analysis = state.get("analysis", "")
+    degraded = state.get("degraded", [])
+    
+    # 同一查询和数据生成过的回复，预算不足时作为降级回答
+    digest = hashlib.blake2b(f"{query}\n{data}".encode("utf-8"), digest_size=16).hexdigest()
+    answer_key = ("response", date.today().isoformat(), digest)
     
     # 构建消息历史
     messages = [
@@ -181,15 +448,24 @@ def response_node(state: Dict[str, Any]) -> Dict[str, Any]:
     try:
         # 使用LLM生成回复
         prompt = RESPONSE_PROMPT.format_messages(messages=messages)
-        response = llm.invoke(prompt)
+        response = response_llm.invoke(prompt, timeout=llm_timeout("response", node_budget(state, "response")))
         
         final_response = response.content
+        response_cache.put(user_id, answer_key, final_response)
     
     except Exception as e:
-        final_response = f"生成回复时出错: {str(e)}"
+        if should_degrade(e):
+            # 预算不足：优先使用缓存的回答，否则按查询结果生成模板化简要回复
+            degraded = mark_degraded(state, "response")
+            final_response = response_cache.get(user_id, answer_key, record=False) or degraded_response(
+                data, analysis, config.DEADLINE_CONFIG["summary_lines"]
+            )
+        else:
+            final_response = f"生成回复时出错: {str(e)}"
     
     return {
         **state,
-        "response": final_response
+        "response": final_response,
+        "degraded": degraded
     }
 
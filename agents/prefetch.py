@@ -0,0 +1,178 @@
+"""推测式预取 - 在路由节点调用LLM识别意图的同时，提前查询最可能需要的数据
+
+预测与路由节点确认意图用同一套关键词规则，不调用LLM；无关键词命中时不预取
+（此时确认的意图为DEFAULT_INTENT，不需要查询数据）。意图确认后：
+预测命中则直接采用预取结果，未命中则取消（尚未开始时）或丢弃。
+"""
+import concurrent.futures
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from database.notes_index import extract_quantities
+from utils.profiling import profile_worker
+
+
+# 关键词 -> 意图（按顺序匹配，与路由节点一致）
+INTENT_KEYWORDS = [
+    (("今天", "今日"), "today_performance"),
+    (("历史", "过去", "最近"), "historical_analysis"),
+    (("对比", "比较"), "comparison"),
+    (("趋势",), "trend_analysis"),
+    (("备注", "笔记"), "notes_search"),
+]
+
+DEFAULT_INTENT = "general_query"
+
+# 查询中出现这些数值时按备注检索
+ROUTING_QUANTITIES = {"distance_m", "laps"}
+
+
+def keyword_intent(query: str) -> Optional[str]:
+    """
+    按关键词识别意图
+
+    Args:
+        query: 用户查询
+
+    Returns:
+        命中的意图，无关键词时返回None
+    """
+    for keywords, intent in INTENT_KEYWORDS:
+        if any(keyword in query for keyword in keywords):
+            return intent
+    # 带具体距离或圈数（“5公里”“20圈”）的查询按备注检索；
+    # 只有次数、组数、时长（“10次”“1个小时以上”）时多为普通筛选，不据此路由
+    if ROUTING_QUANTITIES & extract_quantities(query, skip_ambiguous=True).keys():
+        return "notes_search"
+    return None
+
+
+class Speculation:
+    """一次推测式预取"""
+
+    __slots__ = ("intent", "future", "started")
+
+    def __init__(self, intent: str, future: Future):
+        self.intent = intent
+        self.future = future
+        self.started = time.monotonic()
+
+
+class SpeculativePrefetcher:
+    """推测式数据预取器"""
+
+    def __init__(
+        self,
+        fetch: Callable[..., str],
+        enabled: bool = True,
+        max_workers: int = 4
+    ):
+        """
+        Args:
+            fetch: 按(意图, 用户ID)查询数据的函数
+            enabled: 是否启用预取
+            max_workers: 预取线程数
+        """
+        self.fetch = fetch
+        self.enabled = enabled
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "hits": 0, "misses": 0, "cancelled": 0, "errors": 0, "timeouts": 0, "skipped": 0
+        }
+        self.overlap_seconds = 0.0
+
+    def predict(self, text: str) -> Optional[str]:
+        """
+        预测意图（与路由节点相同的关键词规则）
+
+        Returns:
+            预测的意图；无关键词时返回None（不做预取）
+        """
+        return keyword_intent(text)
+
+    def start(self, text: str, user_id: int, **fetch_kwargs) -> Optional[Speculation]:
+        """
+        开始预取（在调用路由LLM之前调用）
+
+        Args:
+            text: 用户查询（用于预测意图）
+            user_id: 用户ID
+            **fetch_kwargs: 透传给查询函数的参数（如解析出的时间范围、备注检索用的query）
+
+        Returns:
+            预取句柄，不预取时返回None
+        """
+        if not self.enabled:
+            return None
+        intent = self.predict(text)
+        if intent is None:
+            self._incr("skipped")
+            return None
+        future = self.executor.submit(profile_worker(self._run), intent, user_id, fetch_kwargs)
+        return Speculation(intent, future)
+
+    def resolve(
+        self,
+        speculation: Optional[Speculation],
+        intent: Optional[str],
+        timeout: Optional[float] = None
+    ) -> Optional[str]:
+        """
+        意图确认后处理预取结果
+
+        Args:
+            speculation: start返回的句柄
+            intent: 确认的意图；路由失败时传None，仅丢弃预取
+            timeout: 等待预取完成的最长秒数，None表示一直等待
+
+        Returns:
+            预测命中时返回预取到的数据，否则返回None
+        """
+        if speculation is None:
+            return None
+
+        if intent != speculation.intent:
+            self._incr("cancelled" if speculation.future.cancel() else "misses")
+            return None
+
+        resolved_at = time.monotonic()
+        try:
+            data, finished_at = speculation.future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # 预取仍在进行（完成后写入响应缓存），交由数据库查询节点按剩余预算处理
+            self._incr("timeouts")
+            return None
+        except Exception:
+            # 交由数据库查询节点重新查询并按原方式报告错误
+            self._incr("errors")
+            return None
+        with self.lock:
+            self.counters["hits"] += 1
+            # 与路由LLM调用重叠的查询耗时，即节省的端到端延迟
+            self.overlap_seconds += min(finished_at, resolved_at) - speculation.started
+        return data
+
+    def _run(self, intent: str, user_id: int, fetch_kwargs: Dict[str, Any]):
+        return self.fetch(intent, user_id, **fetch_kwargs), time.monotonic()
+
+    def _incr(self, name: str):
+        with self.lock:
+            self.counters[name] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """预取指标（命中率按实际发起的预取计算）"""
+        with self.lock:
+            counters = dict(self.counters)
+            overlap = self.overlap_seconds
+        issued = sum(counters[name] for name in ("hits", "misses", "cancelled", "errors", "timeouts"))
+        return {
+            **counters,
+            "issued": issued,
+            "hit_rate": counters["hits"] / issued if issued else 0.0,
+            "overlap_seconds": round(overlap, 3),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
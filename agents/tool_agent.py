@@ -0,0 +1,156 @@
+"""工具调用模式Agent - 模型绑定全部工具并自行选择，同一轮的多个工具调用并发执行
+
+与固定流程（FitnessAgent：路由 -> 查询 -> 分析 -> 回复）并列的另一种图：
+    model --有工具调用--> tools --> model --> ... --无工具调用--> END
+每轮工具结果全部返回后再进入下一轮模型调用；模型调用轮数不超过AGENT_CONFIG["max_iterations"]，
+最后一轮不再提供工具，强制模型基于已有结果作答。
+
+启用方式：AGENT_MODE=tool_calling（main.py），或 python load_test.py --mode compare 对比两种模式的延迟。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Dict, Optional, TypedDict, Annotated
+from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
+from langchain_core.messages import BaseMessage, ToolMessage
+import config
+from agents.nodes import response_llm
+from agents.tool_executor import run_tool_calls
+from tools.database_tool import DATABASE_TOOLS
+from tools.analysis_tool import ANALYSIS_TOOLS
+from utils.prompts import TOOL_AGENT_PROMPT
+from utils.profiling import request_profiler
+
+
+ALL_TOOLS = DATABASE_TOOLS + ANALYSIS_TOOLS
+TOOLS_BY_NAME = {tool.name: tool for tool in ALL_TOOLS}
+
+# 所有请求共享的工具执行线程池
+tool_executor = ThreadPoolExecutor(
+    max_workers=config.AGENT_CONFIG["tool_workers"],
+    thread_name_prefix="tool-call"
+)
+
+
+class ToolAgentState(TypedDict):
+    """工具调用模式的状态"""
+    messages: Annotated[list[BaseMessage], add_messages]
+    query: str
+    user_id: int
+    iterations: int
+    tool_calls: int
+    tool_seconds: float
+    response: str
+
+
+class ToolCallingAgent:
+    """模型自行调用工具的健身记录分析Agent"""
+
+    def __init__(
+        self,
+        max_iterations: int = config.AGENT_CONFIG["max_iterations"],
+        tool_timeout: Optional[float] = config.AGENT_CONFIG["tool_timeout"]
+    ):
+        """
+        Args:
+            max_iterations: 模型调用轮数上限
+            tool_timeout: 单轮工具调用的超时（秒）
+        """
+        self.max_iterations = max_iterations
+        self.tool_timeout = tool_timeout
+        self.model = response_llm.bind_tools(ALL_TOOLS)
+        self.graph = self._build_graph()
+
+    def _build_graph(self):
+        workflow = StateGraph(ToolAgentState)
+        workflow.add_node("model", self._model_node)
+        workflow.add_node("tools", self._tools_node)
+        workflow.set_entry_point("model")
+        workflow.add_conditional_edges("model", self._route, {"tools": "tools", END: END})
+        workflow.add_edge("tools", "model")
+        return workflow.compile()
+
+    def _model_node(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """模型节点 - 决定调用哪些工具，或给出最终回复"""
+        iterations = state["iterations"] + 1
+        # 最后一轮不绑定工具，保证在上限内结束
+        model = self.model if iterations < self.max_iterations else response_llm
+        message = model.invoke(state["messages"])
+        return {
+            "messages": [message],
+            "iterations": iterations,
+            "response": "" if getattr(message, "tool_calls", None) else message.content
+        }
+
+    def _tools_node(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """工具节点 - 并发执行上一轮的全部工具调用，按调用顺序返回结果"""
+        started = time.perf_counter()
+        results = run_tool_calls(
+            state["messages"][-1].tool_calls,
+            TOOLS_BY_NAME,
+            user_id=state["user_id"],
+            executor=tool_executor,
+            timeout=self.tool_timeout
+        )
+        return {
+            "messages": [
+                ToolMessage(content=result.content, tool_call_id=result.call_id, name=result.name)
+                for result in results
+            ],
+            "tool_calls": state["tool_calls"] + len(results),
+            "tool_seconds": state["tool_seconds"] + time.perf_counter() - started
+        }
+
+    @staticmethod
+    def _route(state: Dict[str, Any]) -> str:
+        return "tools" if getattr(state["messages"][-1], "tool_calls", None) else END
+
+    def run(self, query: str, user_id: int = 1) -> Dict[str, Any]:
+        """
+        执行一次查询并返回最终状态（包含轮数和工具调用统计）
+
+        Args:
+            query: 用户查询
+            user_id: 用户ID
+
+        Returns:
+            最终状态
+        """
+        initial_state: ToolAgentState = {
+            "messages": TOOL_AGENT_PROMPT.format_messages(
+                user_id=user_id, today=date.today().isoformat(), query=query
+            ),
+            "query": query,
+            "user_id": user_id,
+            "iterations": 0,
+            "tool_calls": 0,
+            "tool_seconds": 0.0,
+            "response": ""
+        }
+        # 每轮两步（model + tools），另加最后一轮model
+        return self.graph.invoke(initial_state, {"recursion_limit": 2 * self.max_iterations + 1})
+
+    def invoke(self, query: str, user_id: int = 1, profile: Optional[bool] = None) -> str:
+        """
+        执行Agent推理（与FitnessAgent.invoke接口一致）
+
+        Args:
+            query: 用户查询
+            user_id: 用户ID
+            profile: True强制剖析本次请求，None按PROFILING_CONFIG采样
+
+        Returns:
+            Agent生成的回复
+        """
+        try:
+            with request_profiler.session(force=profile, user_id=user_id, query=query, mode="tool_calling") as session:
+                result = self.run(query, user_id)
+                session.tag(iterations=result["iterations"], tool_calls=result["tool_calls"])
+            return result.get("response") or "抱歉，无法生成回复"
+        except Exception as e:
+            return f"Agent执行出错: {str(e)}"
+
+
+# 创建全局Agent实例
+tool_agent = ToolCallingAgent()
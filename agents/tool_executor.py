@@ -0,0 +1,89 @@
+"""并行工具执行 - 模型同一轮发出的多个工具调用并发执行，结果按调用顺序合并
+
+工具调用格式与LangChain的AIMessage.tool_calls一致：{"name", "args", "id"}。
+单个工具失败或超时只影响它自己的结果，不影响同一轮的其他调用。
+"""
+import time
+from concurrent.futures import Executor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Mapping, Optional
+from utils.profiling import profile_worker
+
+
+class ToolResult:
+    """一次工具调用的结果"""
+
+    __slots__ = ("call_id", "name", "content", "seconds", "error")
+
+    def __init__(self, call_id: str, name: str, content: str, seconds: float, error: bool = False):
+        self.call_id = call_id
+        self.name = name
+        self.content = content
+        self.seconds = seconds
+        self.error = error
+
+
+def _tool_args(tool: Any, args: Optional[Dict[str, Any]], user_id: Optional[int]) -> Dict[str, Any]:
+    """补全参数；user_id始终以当前请求的用户为准，模型无法查询其他用户"""
+    args = dict(args or {})
+    if user_id is not None and "user_id" in (getattr(tool, "args", None) or {}):
+        args["user_id"] = user_id
+    return args
+
+
+def _invoke(tool: Any, call: Dict[str, Any], user_id: Optional[int]) -> ToolResult:
+    started = time.perf_counter()
+    try:
+        content = tool.invoke(_tool_args(tool, call.get("args"), user_id))
+        error = False
+    except Exception as e:
+        content, error = f"工具执行出错: {str(e)}", True
+    return ToolResult(call.get("id", ""), call["name"], str(content), time.perf_counter() - started, error)
+
+
+def run_tool_calls(
+    tool_calls: List[Dict[str, Any]],
+    tools: Mapping[str, Any],
+    user_id: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    timeout: Optional[float] = None
+) -> List[ToolResult]:
+    """
+    执行一轮工具调用
+
+    Args:
+        tool_calls: 模型发出的工具调用
+        tools: 工具名 -> 工具
+        user_id: 当前请求的用户ID（覆盖模型给出的user_id参数）
+        executor: 并发执行使用的线程池；为None或只有一个调用时在当前线程执行
+        timeout: 整轮调用的超时（秒），超时的调用返回错误结果
+
+    Returns:
+        与tool_calls顺序一致的结果列表
+    """
+    results: List[Optional[ToolResult]] = [None] * len(tool_calls)
+    pending = []
+    for index, call in enumerate(tool_calls):
+        tool = tools.get(call["name"])
+        if tool is None:
+            results[index] = ToolResult(call.get("id", ""), call["name"], f"未知工具: {call['name']}", 0.0, True)
+        else:
+            pending.append((index, tool, call))
+
+    if executor is None or len(pending) <= 1:
+        for index, tool, call in pending:
+            results[index] = _invoke(tool, call, user_id)
+        return results
+
+    started = time.perf_counter()
+    futures = [(index, call, executor.submit(profile_worker(_invoke), tool, call, user_id)) for index, tool, call in pending]
+    for index, call, future in futures:
+        remaining = None if timeout is None else max(0.0, timeout - (time.perf_counter() - started))
+        try:
+            results[index] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            future.cancel()
+            results[index] = ToolResult(
+                call.get("id", ""), call["name"], f"工具执行超时（{timeout}秒）",
+                time.perf_counter() - started, True
+            )
+    return results
@@ -0,0 +1,119 @@
+"""WorkoutRecord内存与吞吐基准测试
+
+用法：
+    python bench_workout_record.py --count 1000000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from database.models import (
+    WORKOUT_FIELDS,
+    WorkoutRecord,
+    records_to_columns,
+    records_from_columns,
+    rows_to_dicts,
+)
+
+
+class LegacyWorkoutRecord:
+    """改造前的运动记录模型（每个实例带__dict__），作为对照组"""
+
+    def __init__(self, id=None, user_id=1, date=None, exercise_type="", duration=0,
+                 calories_burned=0, heart_rate_avg=0, notes="", created_at=None):
+        self.id = id
+        self.user_id = user_id
+        self.date = date
+        self.exercise_type = exercise_type
+        self.duration = duration
+        self.calories_burned = calories_burned
+        self.heart_rate_avg = heart_rate_avg
+        self.notes = notes
+        self.created_at = created_at
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "date": self.date.isoformat() if isinstance(self.date, date) else str(self.date),
+            "exercise_type": self.exercise_type,
+            "duration": self.duration,
+            "calories_burned": self.calories_burned,
+            "heart_rate_avg": self.heart_rate_avg,
+            "notes": self.notes,
+            "created_at": self.created_at.isoformat() if isinstance(self.created_at, datetime) else str(self.created_at)
+        }
+
+
+def make_rows(count: int):
+    """生成模拟游标行（约3年的日期，与真实数据的日期重复度相近）"""
+    exercise_types = ["跑步", "游泳", "力量训练", "瑜伽"]
+    notes = ["晨跑5公里", "自由泳1000米", "胸肌训练", "拉伸放松"]
+    start = datetime(2022, 1, 1, 7, 0, 0)
+    rows = []
+    for i in range(count):
+        created_at = start + timedelta(minutes=i)
+        rows.append((
+            i + 1, i % 1000 + 1, created_at.date(), exercise_types[i % 4],
+            30 + i % 40, 200 + i % 300, 110 + i % 50, notes[i % 4], created_at
+        ))
+    return rows
+
+
+def measure(name: str, fn, repeat: int = 3):
+    """测量耗时（取repeat次最好值）与新增内存峰值（tracemalloc会拖慢分配，耗时在不跟踪内存时单独测量）"""
+    elapsed = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = min(elapsed, time.perf_counter() - start)
+        del result
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return name, elapsed, current, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WorkoutRecord内存与吞吐基准测试")
+    parser.add_argument("--count", type=int, default=1_000_000, help="记录数")
+    args = parser.parse_args()
+
+    print(f"生成{args.count:,}行模拟数据...")
+    rows = make_rows(args.count)
+    columns = list(WORKOUT_FIELDS)
+
+    results = []
+
+    # 行 -> 对象/字典
+    results.append(measure("dict(zip(...)) 每行一个字典", lambda: [dict(zip(columns, row)) for row in rows]))
+    results.append(measure("LegacyWorkoutRecord(*row)", lambda: [LegacyWorkoutRecord(*row) for row in rows]))
+    name, elapsed, current, peak, slotted = measure("WorkoutRecord.from_rows", lambda: WorkoutRecord.from_rows(rows, columns))
+    results.append((name, elapsed, current, peak, None))
+
+    # 对象 -> 字典
+    legacy = [LegacyWorkoutRecord(*row) for row in rows]
+    results.append(measure("Legacy to_dict 逐条", lambda: [r.to_dict() for r in legacy]))
+    del legacy
+    results.append(measure("WorkoutRecord.to_dict 逐条", lambda: [r.to_dict() for r in slotted]))
+    results.append(measure("from_rows + to_dict", lambda: [r.to_dict() for r in WorkoutRecord.from_rows(rows, columns)]))
+    results.append(measure("rows_to_dicts（跳过对象）", lambda: rows_to_dicts(rows, columns)))
+
+    # 列式互转
+    name, elapsed, current, peak, cols = measure("records_to_columns", lambda: records_to_columns(slotted))
+    results.append((name, elapsed, current, peak, None))
+    results.append(measure("records_from_columns", lambda: records_from_columns(cols)))
+
+    print(f"\n{'操作':<32}{'耗时(s)':>10}{'吞吐(万条/s)':>14}{'保留内存(MB)':>14}{'峰值(MB)':>12}")
+    print("-" * 82)
+    for name, elapsed, current, peak, _ in results:
+        throughput = args.count / elapsed / 10000 if elapsed > 0 else 0
+        print(f"{name:<32}{elapsed:>10.3f}{throughput:>14.1f}{current / 1e6:>14.1f}{peak / 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
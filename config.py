@@ -1,4 +1,5 @@
 """配置文件 - 管理API密钥和数据库连接配置"""
+import json
 import os
 from dotenv import load_dotenv
 
@@ -9,6 +10,7 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")  # 或使用Claude模型
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", None) 
+OPENAI_SMALL_MODEL = os.getenv("OPENAI_SMALL_MODEL", OPENAI_MODEL)  # 路由、分析等简单任务使用的小模型（未配置时与主模型相同）
 
 # 数据库配置（伪代码 - 实际使用时需要配置真实连接信息）
 DATABASE_CONFIG = {
@@ -19,11 +21,192 @@ DATABASE_CONFIG = {
     "password": os.getenv("DATABASE_PASSWORD", ""),
     "database": os.getenv("DATABASE_NAME", "fitness_db"),
     "charset": os.getenv("DATABASE_CHARSET", "utf8mb4"),
+    "statement_cache_size": int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "64")),  # 每个PostgreSQL连接缓存的预编译语句数
 }
 
 # Agent配置
 AGENT_CONFIG = {
     "max_iterations": 10,
     "temperature": 0.7,
+    "mode": os.getenv("AGENT_MODE", "pipeline"),  # pipeline：固定流程；tool_calling：模型自行并行调用工具
+    "tool_workers": int(os.getenv("AGENT_TOOL_WORKERS", "8")),  # 工具调用模式下并发执行工具的线程数
+    "tool_timeout": float(os.getenv("AGENT_TOOL_TIMEOUT", "30")),  # 单轮工具调用的超时（秒）
 }
 
+
+def _node_model(node: str, model: str, temperature: float, max_tokens: int, timeout: float) -> dict:
+    """读取单个节点的模型配置（环境变量前缀为节点名大写，如ROUTER_MODEL）"""
+    prefix = node.upper()
+    return {
+        "model": os.getenv(f"{prefix}_MODEL", model),
+        "temperature": float(os.getenv(f"{prefix}_TEMPERATURE", str(temperature))),
+        "max_tokens": int(os.getenv(f"{prefix}_MAX_TOKENS", str(max_tokens))),
+        "timeout": float(os.getenv(f"{prefix}_TIMEOUT", str(timeout))),  # 秒
+    }
+
+
+# 各节点的模型分层配置：路由和分析用小模型、温度0，只有最终回复使用大模型
+NODE_MODEL_CONFIG = {
+    "router": _node_model("router", OPENAI_SMALL_MODEL, 0.0, 20, 10),
+    "analysis": _node_model("analysis", OPENAI_SMALL_MODEL, 0.0, 800, 30),
+    "response": _node_model("response", OPENAI_MODEL, AGENT_CONFIG["temperature"], 1000, 60),
+    "report": _node_model("report", OPENAI_SMALL_MODEL, 0.3, 400, 30),  # 批量周报点评
+}
+
+# 模型价格（每千token的输入、输出价格，美元），用于分层费用统计；可用MODEL_PRICES（JSON）覆盖或补充
+MODEL_PRICES = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    **{model: tuple(price) for model, price in json.loads(os.getenv("MODEL_PRICES", "{}")).items()},
+}
+
+# LLM调用限流配置（令牌桶限速 + AIMD自适应并发 + 抖动重试）
+LLM_LIMITER_CONFIG = {
+    "requests_per_minute": float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")),  # 0 表示不限
+    "tokens_per_minute": float(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),  # 0 表示不限
+    "initial_concurrency": int(os.getenv("LLM_INITIAL_CONCURRENCY", "4")),
+    "min_concurrency": int(os.getenv("LLM_MIN_CONCURRENCY", "1")),
+    "max_concurrency": int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+    "latency_threshold": float(os.getenv("LLM_LATENCY_THRESHOLD", "20")),  # 秒
+    "max_retries": int(os.getenv("LLM_MAX_RETRIES", "3")),
+    "backoff_base": float(os.getenv("LLM_BACKOFF_BASE", "0.5")),  # 秒
+    "backoff_max": float(os.getenv("LLM_BACKOFF_MAX", "20")),  # 秒
+}
+
+# LLM对冲请求配置：调用超过近期延迟分位数仍未返回时再发一个相同请求，先返回者胜出
+HEDGE_CONFIG = {
+    "enabled": os.getenv("HEDGE_ENABLED", "false").lower() == "true",
+    "nodes": os.getenv("HEDGE_NODES", "router,analysis,response").split(","),  # 启用对冲的节点（模型层级）
+    "percentile": float(os.getenv("HEDGE_PERCENTILE", "95")),  # 以该分位数的近期延迟作为对冲等待时间
+    "min_delay": float(os.getenv("HEDGE_MIN_DELAY", "0.05")),  # 等待时间下限（秒）
+    "max_extra_ratio": float(os.getenv("HEDGE_MAX_EXTRA_RATIO", "0.1")),  # 对冲请求占调用数的上限
+    "burst": float(os.getenv("HEDGE_BURST", "5")),  # 允许短时集中对冲的次数
+    "window": int(os.getenv("HEDGE_WINDOW", "500")),  # 每个层级保留的最近延迟样本数
+    "min_samples": int(os.getenv("HEDGE_MIN_SAMPLES", "20")),  # 样本不足时不对冲
+}
+
+# 请求级时间预算配置（utils.deadline）：端到端预算按节点切分，不足时降级为简要回复
+DEADLINE_CONFIG = {
+    "budget_seconds": float(os.getenv("DEADLINE_SECONDS", "30")),  # 单次请求的端到端预算，0表示不限
+    # 各节点（按执行顺序）占总预算的比例，用于为后续节点预留时间；可用DEADLINE_SHARES（JSON）覆盖
+    "shares": {
+        "router": 0.15,
+        "database": 0.15,
+        "analysis": 0.3,
+        "response": 0.4,
+        **json.loads(os.getenv("DEADLINE_SHARES", "{}")),
+    },
+    "min_llm_seconds": float(os.getenv("DEADLINE_MIN_LLM_SECONDS", "2")),  # 节点可用时间低于该值时不再调用模型
+    "summary_lines": int(os.getenv("DEADLINE_SUMMARY_LINES", "12")),  # 简要回复最多引用的数据行数
+}
+
+# workout_records按月分区配置
+PARTITION_CONFIG = {
+    "months_ahead": int(os.getenv("PARTITION_MONTHS_AHEAD", "3")),  # 提前创建的月份数
+    "retain_months": int(os.getenv("PARTITION_RETAIN_MONTHS", "24")),  # 在线保留的月份数，更早的分区归档
+}
+
+# 历史数据列式归档配置
+ARCHIVE_CONFIG = {
+    "root": os.getenv("ARCHIVE_DIR", "data/archive"),
+    "compact_threshold": int(os.getenv("ARCHIVE_COMPACT_THRESHOLD", "8")),  # 单用户同一层级的段数达到该值时合并该层
+}
+
+# 心率采样处理配置
+HEART_RATE_CONFIG = {
+    "max_points": int(os.getenv("HEART_RATE_MAX_POINTS", "48")),  # 发送给LLM的心率曲线点数上限
+    "max_heart_rate": int(os.getenv("HEART_RATE_MAX", "190")),  # 计算心率区间使用的最大心率
+    "ingest_batch_size": int(os.getenv("HEART_RATE_INGEST_BATCH_SIZE", "1000")),
+    "cache_series": int(os.getenv("HEART_RATE_CACHE_SERIES", "512")),  # 内存中缓存的心率序列数上限（LRU淘汰）
+}
+
+# 多粒度汇总配置（历史查询按范围自动选择日/周/月粒度）
+ROLLUP_CONFIG = {
+    "max_rows": int(os.getenv("ROLLUP_MAX_ROWS", "60")),  # 单次汇总返回的行数上限
+    "history_days": int(os.getenv("ROLLUP_HISTORY_DAYS", "365")),  # 历史分析默认覆盖的天数
+}
+
+# 写入时异常检测配置（按用户/运动类型）
+ANOMALY_CONFIG = {
+    "alpha": float(os.getenv("ANOMALY_EWMA_ALPHA", "0.1")),  # EWMA平滑系数
+    "robust_threshold": float(os.getenv("ANOMALY_ROBUST_THRESHOLD", "3.5")),  # 稳健z分数阈值
+    "z_threshold": float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0")),  # EWMA z分数阈值
+    "min_samples": int(os.getenv("ANOMALY_MIN_SAMPLES", "10")),  # 每个运动类型开始评分前的样本数
+    "max_flags": int(os.getenv("ANOMALY_MAX_FLAGS", "50")),  # 每个用户保留的最近异常数
+    "recent_days": int(os.getenv("ANOMALY_RECENT_DAYS", "30")),  # 分析时附带最近多少天的异常
+}
+
+# 推测式预取配置（路由LLM调用期间提前查询数据）
+PREFETCH_CONFIG = {
+    "enabled": os.getenv("PREFETCH_ENABLED", "true").lower() == "true",
+    "max_workers": int(os.getenv("PREFETCH_MAX_WORKERS", "4")),
+}
+
+# 全量用户周报批处理配置
+REPORT_CONFIG = {
+    "source": os.getenv("REPORT_SOURCE", "mock"),  # database / mock / synthetic
+    "workers": int(os.getenv("REPORT_WORKERS", "0")),  # 聚合进程数，0表示CPU核数
+    "chunk_size": int(os.getenv("REPORT_CHUNK_SIZE", "200")),  # 每次分发给工作进程的用户数
+    "llm_concurrency": int(os.getenv("REPORT_LLM_CONCURRENCY", "8")),  # 同时进行的点评生成数
+}
+
+# 响应缓存配置
+RESPONSE_CACHE_CONFIG = {
+    "max_entries": int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000")),
+    "ttl_seconds": float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400")),
+}
+
+# 早高峰缓存预热配置
+PREWARM_CONFIG = {
+    "enabled": os.getenv("PREWARM_ENABLED", "false").lower() == "true",
+    "hour": int(os.getenv("PREWARM_HOUR", "5")),  # 每天开始预热的时刻（低峰时段）
+    "active_days": int(os.getenv("PREWARM_ACTIVE_DAYS", "3")),  # 最近几天有运动记录的用户视为活跃
+    "intents": os.getenv("PREWARM_INTENTS", "today_performance,historical_analysis,trend_analysis").split(","),
+    "max_users": int(os.getenv("PREWARM_MAX_USERS", "1000")),
+    "max_llm_calls": int(os.getenv("PREWARM_MAX_LLM_CALLS", "500")),
+    "time_budget_seconds": float(os.getenv("PREWARM_TIME_BUDGET_SECONDS", "1800")),
+}
+
+# 按用户分片配置（未配置时只有一个使用DATABASE_CONFIG的default分片）
+SHARDING_CONFIG = {
+    "config_file": os.getenv("SHARD_CONFIG_FILE", ""),  # JSON文件：{分片名: 数据库配置}
+    "local_shards": int(os.getenv("SHARD_LOCAL_COUNT", "0")),  # 大于0时使用N个SQLite文件作为本地分片
+    "local_dir": os.getenv("SHARD_LOCAL_DIR", "data/shards"),
+    "map_path": os.getenv("SHARD_MAP_PATH", "data/shard_map.json"),  # 分片映射（哈希环与迁移中的用户）
+    "vnodes": int(os.getenv("SHARD_VNODES", "128")),  # 每个分片在哈希环上的虚拟节点数
+    "reload_seconds": float(os.getenv("SHARD_MAP_RELOAD_SECONDS", "1")),  # 各进程检查分片映射文件是否更新的间隔
+    # 迁移切换路由后等待多久再补齐并删除源数据（需大于检查间隔 + 最长的一次写入）
+    "switch_grace_seconds": float(os.getenv("SHARD_SWITCH_GRACE_SECONDS", "5")),
+}
+
+# 设备上传写入缓冲配置（database.ingest）
+INGEST_CONFIG = {
+    "journal_dir": os.getenv("INGEST_JOURNAL_DIR", "data/ingest_journal"),  # 本地追加写日志目录
+    "max_batch": int(os.getenv("INGEST_MAX_BATCH", "500")),  # 每次多行插入的最大行数
+    "flush_interval": float(os.getenv("INGEST_FLUSH_INTERVAL", "0.2")),  # 记录最长等待时间（秒）
+    "max_pending": int(os.getenv("INGEST_MAX_PENDING", "10000")),  # 已接收未提交的记录上限（背压）
+    "writers": int(os.getenv("INGEST_WRITERS", "4")),  # 数据库写入线程数
+    "fsync": os.getenv("INGEST_FSYNC", "false").lower() == "true",  # 日志每次写入后fsync
+    "segment_bytes": int(os.getenv("INGEST_SEGMENT_BYTES", str(16 * 1024 * 1024))),
+}
+
+# 预分叉HTTP服务配置（server.py）
+SERVER_CONFIG = {
+    "host": os.getenv("SERVER_HOST", "127.0.0.1"),
+    "port": int(os.getenv("SERVER_PORT", "8080")),
+    "workers": int(os.getenv("SERVER_WORKERS", "0")),  # 工作进程数，0表示CPU核数
+    "cache_slots": int(os.getenv("SERVER_CACHE_SLOTS", "2048")),  # 共享缓存槽位数
+    "cache_slot_bytes": int(os.getenv("SERVER_CACHE_SLOT_BYTES", "32768")),  # 每个槽位字节数（单条缓存值上限）
+}
+
+# 按请求性能剖析配置
+PROFILING_CONFIG = {
+    "enabled": os.getenv("PROFILING_ENABLED", "false").lower() == "true",
+    "sample_rate": float(os.getenv("PROFILING_SAMPLE_RATE", "0.01")),  # 开启后剖析的请求比例
+    "output_dir": os.getenv("PROFILING_DIR", "data/profiles"),
+    "max_files": int(os.getenv("PROFILING_MAX_FILES", "200")),  # 最多保留的请求数，超出时删除最旧的
+    "top_allocations": int(os.getenv("PROFILING_TOP_ALLOCATIONS", "20")),
+    "trace_memory": os.getenv("PROFILING_TRACE_MEMORY", "true").lower() == "true",
+}
@@ -0,0 +1,342 @@
+"""运动记录异常检测 - 写入时按用户/运动类型流式检测时长、卡路里、心率的异常值
+
+每个（用户, 运动类型, 指标）只保存常数个统计量，每条记录O(1)更新：
+- 稳健中位数/MAD：随机逼近法在线估计，异常值只能把它们推动一小步，稳健z分数不会被离群值带偏；
+- EWMA均值/方差：跟踪近期水平，用于确认偏离的是“最近的平常水平”而不只是长期分布；
+- Welford在线统计（utils.online_stats.RunningStats）：长期均值/方差，预热阶段用来初始化稳健估计。
+稳健z分数和EWMA z分数同时超过阈值才记为异常；异常值按截尾后的值更新EWMA，避免污染基线。
+
+检测结果按用户保存最近的若干条（database.events订阅写入），分析节点直接读取，不必重新扫描历史记录。
+"""
+import math
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+from database.events import subscribe_workout_written
+from database.models import WorkoutRecord
+from utils.online_stats import RunningStats
+import config
+
+
+# 检测的指标 -> (名称, 单位, 尺度下限)；尺度下限避免取值恒定时标准差为0
+METRICS: Tuple[Tuple[str, str, str, float], ...] = (
+    ("duration", "时长", "分钟", 2.0),
+    ("calories_burned", "卡路里", "卡", 10.0),
+    ("heart_rate_avg", "平均心率", "次/分", 2.0),
+)
+
+# MAD换算为正态分布标准差的系数
+MAD_TO_STD = 1.4826
+
+
+class MetricDetector:
+    """单个指标的流式统计"""
+
+    __slots__ = ("floor", "stats", "ewma", "ewvar", "median", "mad")
+
+    def __init__(self, floor: float):
+        self.floor = floor
+        self.stats = RunningStats()
+        self.ewma = 0.0
+        self.ewvar = 0.0
+        self.median = 0.0
+        self.mad = 0.0
+
+    def observe(
+        self,
+        value: float,
+        alpha: float,
+        step: float,
+        min_samples: int,
+        clip: float
+    ) -> Tuple[float, float]:
+        """
+        用一个观测值更新统计量（O(1)），返回更新前该值的稳健z分数和EWMA z分数
+
+        Args:
+            value: 观测值
+            alpha: EWMA平滑系数
+            step: 中位数/MAD随机逼近的步长（相对当前尺度）
+            min_samples: 预热样本数，预热期间不评分
+            clip: 更新EWMA时截尾的稳健尺度倍数
+
+        Returns:
+            (稳健z分数, EWMA z分数)，预热期间均为0
+        """
+        stats = self.stats
+        if stats.count < min_samples:
+            stats.update(value)
+            # 预热：用长期均值/标准差初始化稳健估计和EWMA
+            self.median = self.ewma = stats.mean
+            self.ewvar = stats.variance
+            self.mad = stats.std / MAD_TO_STD
+            return 0.0, 0.0
+
+        floor = self.floor
+        scale = self.mad * MAD_TO_STD
+        if scale < floor:
+            scale = floor
+        median = self.median
+        robust_z = (value - median) / scale
+        ew_std = math.sqrt(self.ewvar)
+        ewma_z = (value - self.ewma) / (ew_std if ew_std > floor else floor)
+
+        stats.update(value)
+        # 截尾后更新EWMA（方差按增量公式），离群值对近期水平的影响有上限
+        bound = clip * scale
+        clipped = median + bound if value > median + bound else median - bound if value < median - bound else value
+        diff = clipped - self.ewma
+        increment = alpha * diff
+        self.ewma += increment
+        self.ewvar = (1 - alpha) * (self.ewvar + diff * increment)
+        # 随机逼近：中位数和MAD每次只朝观测值方向移动固定比例的尺度
+        if value > median:
+            self.median = median + step * scale
+        elif value < median:
+            self.median = median - step * scale
+        mad_step = step * (self.mad if self.mad > floor else floor)
+        self.mad += mad_step if abs(value - self.median) > self.mad else -mad_step
+        return robust_z, ewma_z
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stats": self.stats.to_dict(),
+            "ewma": self.ewma,
+            "ewvar": self.ewvar,
+            "median": self.median,
+            "mad": self.mad,
+        }
+
+
+class AnomalyFlag:
+    """一条被标记为异常的指标"""
+
+    __slots__ = ("record_id", "date", "exercise_type", "metric", "value", "expected", "robust_z", "ewma_z")
+
+    def __init__(
+        self,
+        record_id: Optional[int],
+        date: str,
+        exercise_type: str,
+        metric: str,
+        value: float,
+        expected: float,
+        robust_z: float,
+        ewma_z: float
+    ):
+        self.record_id = record_id
+        self.date = date
+        self.exercise_type = exercise_type
+        self.metric = metric
+        self.value = value
+        self.expected = expected
+        self.robust_z = robust_z
+        self.ewma_z = ewma_z
+
+    def describe(self) -> str:
+        """生成一行描述（供分析提示词使用）"""
+        label, unit = _METRIC_LABELS[self.metric]
+        direction = "高于" if self.robust_z > 0 else "低于"
+        return (
+            f"{self.date} {self.exercise_type} {label}{self.value:g}{unit}，明显{direction}平时"
+            f"（约{self.expected:.0f}{unit}，稳健z={self.robust_z:+.1f}）"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "record_id": self.record_id,
+            "date": self.date,
+            "exercise_type": self.exercise_type,
+            "metric": self.metric,
+            "value": self.value,
+            "expected": round(self.expected, 1),
+            "robust_z": round(self.robust_z, 2),
+            "ewma_z": round(self.ewma_z, 2),
+        }
+
+
+_METRIC_LABELS = {field: (label, unit) for field, label, unit, _ in METRICS}
+
+
+class AnomalyDetector:
+    """每用户/每运动类型的流式异常检测"""
+
+    def __init__(
+        self,
+        alpha: float = config.ANOMALY_CONFIG["alpha"],
+        robust_threshold: float = config.ANOMALY_CONFIG["robust_threshold"],
+        z_threshold: float = config.ANOMALY_CONFIG["z_threshold"],
+        min_samples: int = config.ANOMALY_CONFIG["min_samples"],
+        max_flags: int = config.ANOMALY_CONFIG["max_flags"],
+        step: float = 0.03,
+        clip: float = 3.0
+    ):
+        """
+        Args:
+            alpha: EWMA平滑系数
+            robust_threshold: 稳健z分数阈值
+            z_threshold: EWMA z分数阈值
+            min_samples: 每个运动类型开始评分前的预热样本数
+            max_flags: 每个用户保留的最近异常数
+            step: 中位数/MAD随机逼近的步长
+            clip: 更新EWMA时截尾的稳健尺度倍数
+        """
+        self.alpha = alpha
+        self.robust_threshold = robust_threshold
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.max_flags = max_flags
+        self.step = step
+        self.clip = clip
+        # (用户ID, 运动类型) -> 各指标的检测器（与METRICS顺序一致）
+        self.detectors: Dict[Tuple[int, str], Tuple[MetricDetector, ...]] = {}
+        self.flags: Dict[int, Deque[AnomalyFlag]] = {}
+        self.records = 0
+        self.lock = threading.Lock()
+
+    def observe(self, record: Any) -> List[AnomalyFlag]:
+        """
+        写入新记录时调用：先按已有统计评分，再把记录并入统计
+
+        Args:
+            record: 运动记录（字典或WorkoutRecord）
+
+        Returns:
+            本条记录被标记的异常（通常为空）
+        """
+        if isinstance(record, WorkoutRecord):
+            record = record.to_dict()
+        user_id = record["user_id"]
+        exercise_type = record.get("exercise_type") or "未知"
+        key = (user_id, exercise_type)
+        found = []
+        with self.lock:
+            detectors = self.detectors.get(key)
+            if detectors is None:
+                detectors = self.detectors[key] = tuple(MetricDetector(floor) for _, _, _, floor in METRICS)
+            self.records += 1
+            for (field, _, _, _), detector in zip(METRICS, detectors):
+                value = record.get(field)
+                if not value:
+                    # 缺失的指标（如未佩戴心率设备）不参与统计
+                    continue
+                expected = detector.median
+                robust_z, ewma_z = detector.observe(value, self.alpha, self.step, self.min_samples, self.clip)
+                if abs(robust_z) >= self.robust_threshold and abs(ewma_z) >= self.z_threshold:
+                    found.append(AnomalyFlag(
+                        record.get("id"), str(record.get("date", ""))[:10], exercise_type,
+                        field, value, expected, robust_z, ewma_z
+                    ))
+            if found:
+                flags = self.flags.get(user_id)
+                if flags is None:
+                    flags = self.flags[user_id] = deque(maxlen=self.max_flags)
+                flags.extend(found)
+        return found
+
+    def bootstrap(self, records: Iterable[Any]):
+        """用历史记录初始化（按日期升序回放）"""
+        normalized = [r.to_dict() if isinstance(r, WorkoutRecord) else r for r in records]
+        for record in sorted(normalized, key=lambda r: (str(r["date"]), str(r.get("created_at", "")))):
+            self.observe(record)
+
+    def get_flags(
+        self,
+        user_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[AnomalyFlag]:
+        """
+        读取一个用户已标记的异常
+
+        Args:
+            user_id: 用户ID
+            start_date: 只返回该日期及之后的异常（YYYY-MM-DD）
+            end_date: 只返回该日期及之前的异常
+
+        Returns:
+            按写入顺序排列的异常
+        """
+        with self.lock:
+            flags = list(self.flags.get(user_id, ()))
+        return [
+            flag for flag in flags
+            if not (start_date and flag.date < start_date or end_date and flag.date > end_date)
+        ]
+
+    def summary(self, user_id: int, days: int = config.ANOMALY_CONFIG["recent_days"]) -> str:
+        """
+        最近若干天异常的文本描述（供分析节点使用）
+
+        Args:
+            user_id: 用户ID
+            days: 覆盖最近多少天
+
+        Returns:
+            每条异常一行，无异常时为空字符串
+        """
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        return "\n".join(flag.describe() for flag in self.get_flags(user_id, start_date=since))
+
+    def clear(self, user_id: int):
+        with self.lock:
+            self.flags.pop(user_id, None)
+
+
+def benchmark(records: int = 200_000, users: int = 1000) -> Dict[str, float]:
+    """
+    测量检测吞吐（合成记录，含约1%注入的异常）
+
+    Args:
+        records: 记录数
+        users: 用户数
+
+    Returns:
+        记录数、耗时、每秒记录数、标记的异常数
+    """
+    import random
+    rng = random.Random(42)
+    exercises = ("跑步", "游泳", "力量训练")
+    batch = []
+    for i in range(records):
+        outlier = rng.random() < 0.01
+        batch.append({
+            "id": i,
+            "user_id": i % users,
+            "date": "2024-01-01",
+            "exercise_type": exercises[i % 3],
+            "duration": rng.randint(30, 60) * (3 if outlier else 1),
+            "calories_burned": rng.randint(250, 400),
+            "heart_rate_avg": rng.randint(130, 150),
+        })
+    detector = AnomalyDetector()
+    started = time.perf_counter()
+    for record in batch:
+        detector.observe(record)
+    elapsed = time.perf_counter() - started
+    return {
+        "records": records,
+        "seconds": round(elapsed, 3),
+        "records_per_second": round(records / elapsed),
+        "flags": sum(len(flags) for flags in detector.flags.values()),
+    }
+
+
+def _create_anomaly_detector() -> AnomalyDetector:
+    """创建全局异常检测器（当前使用模拟数据初始化）"""
+    from database.mock_data import MOCK_WORKOUT_RECORDS
+
+    detector = AnomalyDetector()
+    detector.bootstrap(MOCK_WORKOUT_RECORDS)
+    subscribe_workout_written(detector.observe)
+    return detector
+
+
+# 全局异常检测器实例
+anomaly_detector = _create_anomaly_detector()
+
+
+if __name__ == "__main__":
+    print(benchmark())
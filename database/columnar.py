@@ -0,0 +1,465 @@
+"""历史运动记录的列式归档 - 按用户存储的定长整数列 + 字典编码运动类型 + 备注堆，通过mmap零拷贝读取
+
+目录结构：
+    {root}/user_{user_id}/seg_000001.wkc   追加段（每次append一个，层级0）
+    {root}/user_{user_id}/seg_000007.wkc   压缩后的合并段（层级 = 被合并段的层级 + 1）
+
+分层压缩：同一层级的段数达到阈值时只合并这一层，合并结果进入上一层，历史数据不会在每次追加后重写。
+合并段在meta的replaces中记录它取代的段号，并先写临时文件再原子改名，因此合并段出现的同时旧段即失效；
+读取时忽略被取代的段，压缩中途崩溃留下的旧段和临时文件在下次压缩时清理。
+
+段文件格式：
+    | magic "WKCA" | version u16 | reserved u16 | meta_len u32 | meta JSON | 8字节对齐的列块 ... |
+    meta记录每列的偏移、类型码和行数，以及运动类型字典和备注堆的位置。
+    段内记录按(date, created_at, id)升序排列，日期列可直接二分查找。
+"""
+import heapq
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import config
+from database.models import WorkoutRecord
+
+try:
+    import numpy as np
+except ImportError:  # numpy为可选依赖，缺失时使用memoryview读取
+    np = None
+
+
+MAGIC = b"WKCA"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# 定长列：列名 -> array类型码
+INT_COLUMNS = {
+    "id": "q",
+    "date": "i",  # date.toordinal()
+    "created_at": "q",  # 自1970-01-01起的微秒数
+    "duration": "i",
+    "calories_burned": "i",
+    "heart_rate_avg": "i",
+    "exercise_type": "H",  # 指向运动类型字典的编码
+}
+
+NUMPY_DTYPES = {"q": "<i8", "i": "<i4", "H": "<u2", "Q": "<u8"}
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _normalize(record: Any) -> Dict[str, Any]:
+    """统一为字典格式（兼容WorkoutRecord和模拟数据字典）"""
+    return record.to_dict() if isinstance(record, WorkoutRecord) else record
+
+
+def _to_ordinal(value: Any) -> int:
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+def _to_micros(value: Any) -> int:
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value))
+    return (value.replace(tzinfo=None) - EPOCH) // MICROSECOND
+
+
+def _fsync_dir(directory: str):
+    """持久化目录项（改名/删除），不支持目录fsync的平台上跳过"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _segment_number(path: str) -> int:
+    return int(os.path.basename(path)[4:10])
+
+
+def write_segment(path: str, records: Iterable[Any], extra: Optional[Dict[str, Any]] = None) -> int:
+    """
+    把记录写成一个列式段文件（先写临时文件再原子替换）
+
+    Args:
+        path: 段文件路径
+        records: 运动记录（字典或WorkoutRecord）
+        extra: 额外写入meta的字段（如层级level、取代的段号replaces）
+
+    Returns:
+        写入的记录数
+    """
+    rows = [_normalize(record) for record in records]
+    rows.sort(key=lambda r: (_to_ordinal(r["date"]), _to_micros(r["created_at"]), r["id"]))
+    if not rows:
+        return 0
+
+    dictionary: List[str] = []
+    codes: Dict[str, int] = {}
+    columns = {name: array(code) for name, code in INT_COLUMNS.items()}
+    notes_offsets = array("Q", [0])
+    notes_heap = bytearray()
+
+    for row in rows:
+        exercise_type = row.get("exercise_type", "")
+        if exercise_type not in codes:
+            codes[exercise_type] = len(dictionary)
+            dictionary.append(exercise_type)
+        columns["id"].append(row["id"])
+        columns["date"].append(_to_ordinal(row["date"]))
+        columns["created_at"].append(_to_micros(row["created_at"]))
+        columns["duration"].append(row.get("duration") or 0)
+        columns["calories_burned"].append(row.get("calories_burned") or 0)
+        columns["heart_rate_avg"].append(row.get("heart_rate_avg") or 0)
+        columns["exercise_type"].append(codes[exercise_type])
+        notes_heap.extend((row.get("notes") or "").encode("utf-8"))
+        notes_offsets.append(len(notes_heap))
+
+    blocks: List[Tuple[str, bytes, str]] = [(name, column.tobytes(), column.typecode) for name, column in columns.items()]
+    blocks.append(("notes_offsets", notes_offsets.tobytes(), "Q"))
+    blocks.append(("notes_heap", bytes(notes_heap), "B"))
+
+    # meta长度影响数据起点，反复计算偏移直到meta长度不再变化
+    meta: Dict[str, Any] = {**(extra or {}), "rows": len(rows), "dictionary": dictionary, "blocks": {}}
+    meta_bytes = b""
+    while True:
+        offset = _align(HEADER.size + len(meta_bytes))
+        for name, payload, typecode in blocks:
+            meta["blocks"][name] = [offset, len(payload), typecode]
+            offset = _align(offset + len(payload))
+        encoded = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        if len(encoded) == len(meta_bytes):
+            meta_bytes = encoded
+            break
+        meta_bytes = encoded
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(meta_bytes)))
+        f.write(meta_bytes)
+        for name, payload, _ in blocks:
+            f.write(b"\0" * (meta["blocks"][name][0] - f.tell()))
+            f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path) or ".")
+    return len(rows)
+
+
+class Segment:
+    """只读列式段，所有列都是mmap上的零拷贝视图"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, meta_len = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"无法识别的段文件: {path}")
+        self.meta = json.loads(bytes(self.map[HEADER.size:HEADER.size + meta_len]).decode("utf-8"))
+        self.rows: int = self.meta["rows"]
+        self.dictionary: List[str] = self.meta["dictionary"]
+        self.number = _segment_number(path)
+        self.level: int = self.meta.get("level", 0)
+        self.replaces: List[int] = self.meta.get("replaces", [])
+        self.view = memoryview(self.map)
+        self._columns: Dict[str, memoryview] = {}
+
+    def column(self, name: str) -> memoryview:
+        """返回列的类型化memoryview（零拷贝）"""
+        if name not in self._columns:
+            offset, length, typecode = self.meta["blocks"][name]
+            self._columns[name] = self.view[offset:offset + length].cast(typecode)
+        return self._columns[name]
+
+    def numpy_column(self, name: str):
+        """返回列的NumPy数组视图（零拷贝，需要安装numpy）"""
+        if np is None:
+            raise ImportError("numpy未安装，请使用column()")
+        offset, length, typecode = self.meta["blocks"][name]
+        dtype = np.dtype(NUMPY_DTYPES[typecode])
+        return np.frombuffer(self.map, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    def note(self, index: int) -> str:
+        offsets = self.column("notes_offsets")
+        heap_offset = self.meta["blocks"]["notes_heap"][0]
+        return bytes(self.view[heap_offset + offsets[index]:heap_offset + offsets[index + 1]]).decode("utf-8")
+
+    def sort_key(self, index: int) -> Tuple[int, int, int]:
+        return (self.column("date")[index], self.column("created_at")[index], self.column("id")[index])
+
+    def record(self, index: int, user_id: int) -> Dict[str, Any]:
+        """物化一条记录（格式与模拟数据一致）"""
+        return {
+            "id": self.column("id")[index],
+            "user_id": user_id,
+            "date": date.fromordinal(self.column("date")[index]).isoformat(),
+            "exercise_type": self.dictionary[self.column("exercise_type")[index]],
+            "duration": self.column("duration")[index],
+            "calories_burned": self.column("calories_burned")[index],
+            "heart_rate_avg": self.column("heart_rate_avg")[index],
+            "notes": self.note(index),
+            "created_at": (EPOCH + self.column("created_at")[index] * MICROSECOND).isoformat(),
+        }
+
+    def matching_indices(
+        self,
+        start_ordinal: Optional[int],
+        end_ordinal: Optional[int],
+        exercise_type: Optional[str]
+    ) -> Iterator[int]:
+        """按日期二分定位范围，再按运动类型编码过滤"""
+        dates = self.column("date")
+        lo = bisect_left(dates, start_ordinal) if start_ordinal is not None else 0
+        hi = bisect_right(dates, end_ordinal) if end_ordinal is not None else self.rows
+        if exercise_type is None:
+            return iter(range(lo, hi))
+        if exercise_type not in self.dictionary:
+            return iter(())
+        code = self.dictionary.index(exercise_type)
+        types = self.column("exercise_type")
+        return (i for i in range(lo, hi) if types[i] == code)
+
+    def close(self):
+        self._columns.clear()
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+
+class ColumnarArchive:
+    """按用户组织的列式归档（追加段 + 分层压缩）"""
+
+    def __init__(
+        self,
+        root: str = config.ARCHIVE_CONFIG["root"],
+        compact_threshold: int = config.ARCHIVE_CONFIG["compact_threshold"]
+    ):
+        """
+        Args:
+            root: 归档根目录
+            compact_threshold: 单个用户同一层级的段数达到该值时合并这一层
+        """
+        self.root = root
+        self.compact_threshold = compact_threshold
+        self._segments: Dict[int, List[Segment]] = {}
+        self._superseded: Dict[int, set] = {}
+
+    def _user_dir(self, user_id: int) -> str:
+        return os.path.join(self.root, f"user_{user_id}")
+
+    def _segment_paths(self, user_id: int) -> List[str]:
+        """磁盘上的全部段文件（含已被取代、尚未清理的段）"""
+        directory = self._user_dir(user_id)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.startswith("seg_") and name.endswith(".wkc")
+        )
+
+    def segments(self, user_id: int) -> List[Segment]:
+        """打开（并缓存）用户的有效段（忽略已被合并段取代的段）"""
+        if user_id not in self._segments:
+            opened = [Segment(path) for path in self._segment_paths(user_id)]
+            superseded = {number for segment in opened for number in segment.replaces}
+            live = []
+            for segment in opened:
+                if segment.number in superseded:
+                    segment.close()
+                else:
+                    live.append(segment)
+            self._segments[user_id] = live
+            self._superseded[user_id] = superseded
+        return self._segments[user_id]
+
+    def _release(self, user_id: int):
+        self._superseded.pop(user_id, None)
+        for segment in self._segments.pop(user_id, []):
+            segment.close()
+
+    def _next_segment_path(self, user_id: int) -> str:
+        paths = self._segment_paths(user_id)
+        last = _segment_number(paths[-1]) if paths else 0
+        return os.path.join(self._user_dir(user_id), f"seg_{last + 1:06d}.wkc")
+
+    def append(self, user_id: int, records: Iterable[Any]) -> int:
+        """
+        把新记录写成一个追加段，同层段数达到阈值时自动压缩
+
+        Returns:
+            写入的记录数
+        """
+        os.makedirs(self._user_dir(user_id), exist_ok=True)
+        count = write_segment(self._next_segment_path(user_id), records, {"level": 0})
+        self._release(user_id)
+        self.compact(user_id)
+        return count
+
+    def _merge(self, user_id: int, segments: List[Segment], level: int) -> int:
+        """把若干段合并为一个新段，新段出现即取代旧段，随后删除旧段文件"""
+        records = [
+            segment.record(index, user_id)
+            for segment in segments
+            for index in range(segment.rows)
+        ]
+        replaces = sorted(segment.number for segment in segments)
+        target = self._next_segment_path(user_id)
+        count = write_segment(target, records, {"level": level, "replaces": replaces})
+        self._release(user_id)
+        self._collect_garbage(user_id)
+        return count
+
+    def _collect_garbage(self, user_id: int):
+        """删除已被取代的段和崩溃残留的临时文件（每个用户只有一个写入方）"""
+        directory = self._user_dir(user_id)
+        self.segments(user_id)
+        superseded = self._superseded[user_id]
+        removed = False
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp") or (name.startswith("seg_") and name.endswith(".wkc")
+                                         and _segment_number(path) in superseded):
+                os.remove(path)
+                removed = True
+        if removed:
+            _fsync_dir(directory)
+
+    def compact(self, user_id: int, full: bool = False) -> int:
+        """
+        分层压缩：同一层级的段数达到阈值时合并该层（逐层向上，直到各层都低于阈值）
+
+        Args:
+            user_id: 用户ID
+            full: 为True时把所有有效段合并为一个段
+
+        Returns:
+            压缩后的记录数
+        """
+        if not os.path.isdir(self._user_dir(user_id)):
+            return 0
+        if len(self._segment_paths(user_id)) > len(self.segments(user_id)):
+            self._collect_garbage(user_id)
+        if full:
+            segments = self.segments(user_id)
+            if len(segments) > 1:
+                self._merge(user_id, segments, max(segment.level for segment in segments) + 1)
+        while True:
+            levels: Dict[int, List[Segment]] = {}
+            for segment in self.segments(user_id):
+                levels.setdefault(segment.level, []).append(segment)
+            full_levels = [level for level, group in levels.items() if len(group) >= self.compact_threshold]
+            if not full_levels:
+                break
+            level = min(full_levels)
+            self._merge(user_id, levels[level], level + 1)
+        return sum(segment.rows for segment in self.segments(user_id))
+
+    def iter_records(
+        self,
+        user_id: int,
+        date_filter: Optional[str] = None,
+        exercise_type: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        按(date, created_at, id)降序惰性遍历归档记录（多段归并，只物化被取走的记录）
+
+        Yields:
+            运动记录字典
+        """
+        if date_filter:
+            start_ordinal = end_ordinal = _to_ordinal(date_filter)
+        elif start_date and end_date:
+            start_ordinal, end_ordinal = _to_ordinal(start_date), _to_ordinal(end_date)
+        else:
+            start_ordinal = end_ordinal = None
+
+        def descending(segment: Segment):
+            indices = list(segment.matching_indices(start_ordinal, end_ordinal, exercise_type))
+            for index in reversed(indices):
+                yield segment.sort_key(index), segment, index
+
+        merged = heapq.merge(
+            *(descending(segment) for segment in self.segments(user_id)),
+            key=lambda item: item[0],
+            reverse=True
+        )
+        for _, segment, index in merged:
+            yield segment.record(index, user_id)
+
+    def get_records(
+        self,
+        user_id: int = 1,
+        date_filter: Optional[str] = None,
+        exercise_type: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """与get_mock_records参数和返回格式一致的查询接口"""
+        iterator = self.iter_records(user_id, date_filter, exercise_type, start_date, end_date)
+        return [record for _, record in zip(range(limit), iterator)]
+
+    def close(self):
+        for user_id in list(self._segments):
+            self._release(user_id)
+
+
+def build_user_snapshot(archive: ColumnarArchive, user_id: int, batch_size: int = 10000) -> int:
+    """
+    从数据库流式读取用户的全部记录并写入归档（每批一个追加段，按层级压缩）
+
+    Returns:
+        写入的记录数
+    """
+    from database.streaming import iter_workout_batches
+
+    total = 0
+    for batch in iter_workout_batches(user_id, batch_size=batch_size):
+        total += archive.append(user_id, batch)
+    return total
+
+
+# 全局归档实例
+columnar_archive = ColumnarArchive()
+
+
+def get_archived_records(
+    user_id: int = 1,
+    date_filter: str = None,
+    exercise_type: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    limit: int = 100
+) -> List[Dict[str, Any]]:
+    """
+    从列式归档获取运动记录（可直接替换get_mock_records）
+
+    Args:
+        user_id: 用户ID
+        date_filter: 日期过滤（YYYY-MM-DD）
+        exercise_type: 运动类型过滤
+        start_date: 开始日期
+        end_date: 结束日期
+        limit: 返回数量限制
+
+    Returns:
+        按日期降序排列的运动记录列表
+    """
+    return columnar_archive.get_records(user_id, date_filter, exercise_type, start_date, end_date, limit)
@@ -1,24 +1,128 @@
 """数据库连接管理模块"""
-from typing import Optional
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import config
 
-# 伪代码：实际使用时需要根据数据库类型导入相应的驱动
+# 数据库驱动按需导入（见connect），未安装对应驱动时不影响模拟数据流程
 # import pymysql  # MySQL
 # import psycopg2  # PostgreSQL
+# import sqlite3  # SQLite（本地分片/测试）
 
 
-class DatabaseConnection:
-    """数据库连接管理类（伪代码实现）"""
-    
+# 命名查询模板注册表（名称 -> 使用%(name)s占位符的SQL）
+QUERY_TEMPLATES: Dict[str, str] = {}
+
+PLACEHOLDER_PATTERN = re.compile(r"%\((\w+)\)s")
+
+
+def register_query(name: str, sql: str) -> str:
+    """
+    注册命名查询模板，之后可通过DatabaseConnection.execute_named按名称执行
+
+    Args:
+        name: 模板名称
+        sql: 使用%(name)s占位符的SQL
+
+    Returns:
+        模板名称（便于在模块级常量中直接使用）
+    """
+    existing = QUERY_TEMPLATES.get(name)
+    if existing is not None and existing != sql:
+        raise ValueError(f"查询模板重复注册且内容不同: {name}")
+    QUERY_TEMPLATES[name] = sql
+    return name
+
+
+def _statement_handle(name: str) -> str:
+    """把模板名转换为合法的预编译语句标识符"""
+    readable = re.sub(r"\W", "_", name)[:40]
+    digest = hashlib.md5(name.encode("utf-8")).hexdigest()[:8]
+    return f"q_{readable}_{digest}"
+
+
+def _convert_placeholders(sql: str) -> Tuple[str, List[str]]:
+    """
+    把%(name)s占位符转换为PostgreSQL服务端预编译语法
+
+    Returns:
+        ($n占位符的SQL（同名参数复用同一位置）, 按位置排列的参数名)
+    """
+    names: List[str] = []
+
+    def replace(match):
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    return PLACEHOLDER_PATTERN.sub(replace, sql), names
+
+
+def _sqlite_placeholders(sql: str) -> str:
+    """把%(name)s / %s占位符转换为SQLite的:name / ?"""
+    return PLACEHOLDER_PATTERN.sub(r":\1", sql).replace("%s", "?")
+
+
+class PreparedStatement:
+    """已在服务端预编译的语句"""
+
+    __slots__ = ("name", "handle", "param_names")
+
+    def __init__(self, name: str, handle: str, param_names: List[str]):
+        self.name = name
+        self.handle = handle
+        self.param_names = param_names
+
+
+class StatementMetrics:
+    """预编译语句的解析/执行耗时统计"""
+
     def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, float] = {
+            "prepares": 0,
+            "prepare_time": 0.0,
+            "executions": 0,
+            "execute_time": 0.0,
+            "cache_hits": 0,
+            "evictions": 0,
+        }
+
+    def add(self, name: str, value: float = 1):
+        with self.lock:
+            self.counters[name] += value
+
+    def snapshot(self) -> Dict[str, float]:
+        """返回指标快照（含平均解析/执行耗时，单位毫秒）"""
+        with self.lock:
+            result = dict(self.counters)
+        result["avg_prepare_ms"] = round(result["prepare_time"] / result["prepares"] * 1000, 3) if result["prepares"] else 0.0
+        result["avg_execute_ms"] = round(result["execute_time"] / result["executions"] * 1000, 3) if result["executions"] else 0.0
+        return result
+
+
+class DatabaseConnection:
+    """数据库连接管理类"""
+
+    def __init__(self, db_config: Optional[Dict[str, Any]] = None):
         self.connection = None
-        self.config = config.DATABASE_CONFIG
-    
+        self.config = db_config or config.DATABASE_CONFIG
+        # 预编译语句与物理连接绑定，重连后需要重新预编译
+        self.prepared: "OrderedDict[str, PreparedStatement]" = OrderedDict()
+        self.statement_cache_size = self.config.get("statement_cache_size", 64)
+        self.statement_metrics = StatementMetrics()
+
     def connect(self):
-        """建立数据库连接（伪代码）"""
-        """
-        实际实现示例（MySQL/PostgreSQL连接）：
-        
+        """建立数据库连接（MySQL/PostgreSQL/SQLite）"""
+        if self.connection:
+            return
+
         if self.config["type"] == "mysql":
             import pymysql
             self.connection = pymysql.connect(
@@ -38,52 +142,241 @@ class DatabaseConnection:
                 password=self.config["password"],
                 database=self.config["database"]
             )
-        """
-        # 伪代码：实际使用时取消上面的注释并实现数据库连接
-        pass
-    
+        elif self.config["type"] == "sqlite":
+            import sqlite3
+            path = self.config["database"]
+            if path != ":memory:" and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+        else:
+            raise ValueError(f"不支持的数据库类型: {self.config['type']}")
+
     def execute_query(self, query: str, params: Optional[dict] = None):
-        """执行SQL查询（伪代码）"""
         """
-        实际实现示例（MySQL/PostgreSQL查询执行）：
-        
+        执行SQL查询
+
+        Returns:
+            有结果集的语句（SELECT/EXPLAIN等）返回字典列表，其他语句返回影响行数
+        """
         if not self.connection:
             self.connect()
-        
+
+        query = self._native(query)
         cursor = self.connection.cursor()
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        
-        if query.strip().upper().startswith("SELECT"):
-            results = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in results]
-        else:
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+
+            if cursor.description is not None:
+                results = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+                return [dict(zip(columns, row)) for row in results]
+            else:
+                self.connection.commit()
+                return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def execute_many(self, query: str, rows: List[Any]) -> int:
+        """
+        批量执行同一条写入语句（驱动会把INSERT ... VALUES合并为多行插入），只提交一次
+
+        Returns:
+            影响行数
+        """
+        if not self.connection:
+            self.connect()
+
+        query = self._native(query)
+        cursor = self.connection.cursor()
+        try:
+            if self.config["type"] == "postgresql":
+                # psycopg2的executemany逐行往返，execute_batch按页合并
+                from psycopg2.extras import execute_batch
+                execute_batch(cursor, query, rows, page_size=1000)
+            else:
+                cursor.executemany(query, rows)
             self.connection.commit()
             return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def stream_rows(
+        self,
+        query: str,
+        params: Optional[dict] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Tuple[List[str], List[tuple]]]:
         """
-        # 伪代码：实际使用时取消上面的注释并实现数据库查询
-        pass
-    
-    def close(self):
-        """关闭数据库连接（伪代码）"""
+        使用服务端游标流式执行SELECT查询，按批产出原始行元组
+
+        结果集保留在数据库端，客户端每次只用fetchmany取batch_size行，
+        内存占用与结果集大小无关。MySQL使用SSCursor，PostgreSQL使用命名游标。
+
+        Args:
+            query: SELECT语句
+            params: 查询参数
+            batch_size: 每次从服务端拉取的行数
+
+        Yields:
+            (列名列表, 本批行元组列表)
+        """
+        if not self.connection:
+            self.connect()
+
+        if self.config["type"] == "mysql":
+            import pymysql.cursors
+            cursor = self.connection.cursor(pymysql.cursors.SSCursor)
+        elif self.config["type"] == "postgresql":
+            # 命名游标即PostgreSQL的服务端游标
+            cursor = self.connection.cursor(name=f"stream_{uuid.uuid4().hex}")
+            cursor.itersize = batch_size
+        else:
+            # SQLite本身逐步产出结果行
+            cursor = self.connection.cursor()
+
+        try:
+            if params:
+                cursor.execute(self._native(query), params)
+            else:
+                cursor.execute(self._native(query))
+            columns = None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if columns is None:
+                    columns = [desc[0] for desc in cursor.description]
+                yield columns, rows
+        finally:
+            cursor.close()
+            if self.config["type"] == "postgresql":
+                # 命名游标运行在事务内，结束后释放事务
+                self.connection.rollback()
+
+    def stream_query(
+        self,
+        query: str,
+        params: Optional[dict] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        流式执行SELECT查询，逐行产出字典（基于stream_rows）
+
+        Yields:
+            列名到值的字典
+        """
+        for columns, rows in self.stream_rows(query, params, batch_size):
+            for row in rows:
+                yield dict(zip(columns, row))
+
+    def _prepare(self, name: str) -> PreparedStatement:
+        """取得命名模板的PostgreSQL预编译语句，未命中缓存时在服务端预编译（LRU淘汰）"""
+        statement = self.prepared.get(name)
+        if statement is not None:
+            self.prepared.move_to_end(name)
+            self.statement_metrics.add("cache_hits")
+            return statement
+
+        if name not in QUERY_TEMPLATES:
+            raise ValueError(f"未注册的查询模板: {name}")
+
+        text, param_names = _convert_placeholders(QUERY_TEMPLATES[name])
+        handle = _statement_handle(name)
+
+        start = time.perf_counter()
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"PREPARE {handle} AS {text}")
+        finally:
+            cursor.close()
+        self.statement_metrics.add("prepares")
+        self.statement_metrics.add("prepare_time", time.perf_counter() - start)
+
+        statement = PreparedStatement(name, handle, param_names)
+        self.prepared[name] = statement
+        while len(self.prepared) > self.statement_cache_size:
+            _, evicted = self.prepared.popitem(last=False)
+            self._deallocate(evicted)
+        return statement
+
+    def _deallocate(self, statement: PreparedStatement):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"DEALLOCATE PREPARE {statement.handle}")
+        finally:
+            cursor.close()
+        self.statement_metrics.add("evictions")
+
+    def execute_named(self, name: str, params: Optional[dict] = None):
+        """
+        按名称执行已注册的查询模板
+
+        PostgreSQL每个连接只预编译一次；MySQL和SQLite直接参数化执行：
+        pymysql在客户端转义参数，一次往返完成，SQL级PREPARE需额外的SET和EXECUTE往返，反而更慢。
+
+        Args:
+            name: register_query注册的模板名称
+            params: 查询参数
+
+        Returns:
+            有结果集的语句返回字典列表，其他语句返回影响行数
         """
-        实际实现示例（关闭数据库连接）：
-        
+        if not self.connection:
+            self.connect()
+
+        if self.config["type"] != "postgresql":
+            # sqlite3按连接缓存已编译的语句，pymysql在客户端拼接参数，均无需显式预编译
+            if name not in QUERY_TEMPLATES:
+                raise ValueError(f"未注册的查询模板: {name}")
+            start = time.perf_counter()
+            result = self.execute_query(QUERY_TEMPLATES[name], params or {})
+            self.statement_metrics.add("executions")
+            self.statement_metrics.add("execute_time", time.perf_counter() - start)
+            return result
+
+        statement = self._prepare(name)
+        params = params or {}
+        values = [params[key] for key in statement.param_names]
+
+        start = time.perf_counter()
+        cursor = self.connection.cursor()
+        try:
+            arguments = f"({', '.join(['%s'] * len(values))})" if values else ""
+            cursor.execute(f"EXECUTE {statement.handle}{arguments}", values or None)
+
+            if cursor.description is not None:
+                columns = [desc[0] for desc in cursor.description]
+                result = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            else:
+                self.connection.commit()
+                result = cursor.rowcount
+        finally:
+            cursor.close()
+        self.statement_metrics.add("executions")
+        self.statement_metrics.add("execute_time", time.perf_counter() - start)
+        return result
+
+    def _native(self, query: str) -> str:
+        """按数据库类型转换占位符（MySQL/PostgreSQL驱动原生支持%(name)s）"""
+        if self.config["type"] == "sqlite":
+            return _sqlite_placeholders(query)
+        return query
+
+    def close(self):
+        """关闭数据库连接"""
         if self.connection:
             self.connection.close()
             self.connection = None
-        """
-        # 伪代码：实际使用时取消上面的注释并实现数据库连接关闭
-        pass
-    
+        self.prepared.clear()
+
     def __enter__(self):
         """上下文管理器入口"""
         self.connect()
         return self
-    
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         """上下文管理器出口"""
         self.close()
@@ -91,4 +384,3 @@ class DatabaseConnection:
 
 # 全局数据库连接实例
 db_connection = DatabaseConnection()
-
@@ -0,0 +1,40 @@
+"""数据变更事件 - 新运动记录写入后通知各派生数据（画像特征、响应缓存等）"""
+import threading
+from typing import Any, Callable, Dict, List
+
+
+_listeners: List[Callable[[Dict[str, Any]], None]] = []
+_lock = threading.Lock()
+
+
+def subscribe_workout_written(listener: Callable[[Dict[str, Any]], None]):
+    """
+    注册新记录写入的监听函数
+
+    Args:
+        listener: 接收运动记录字典的函数
+    """
+    with _lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def unsubscribe_workout_written(listener: Callable[[Dict[str, Any]], None]):
+    with _lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def publish_workout_written(record: Any):
+    """
+    运动记录写入数据库后调用，依次通知所有监听函数
+
+    Args:
+        record: 运动记录（字典或WorkoutRecord）
+    """
+    if hasattr(record, "to_dict"):
+        record = record.to_dict()
+    with _lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener(record)
@@ -0,0 +1,233 @@
+"""用户画像特征 - 增量维护的每用户日常水平，用于“和平时比怎么样”类问题
+
+每条新记录以O(1)更新特征（Welford在线统计），分析时只需几项紧凑的数字，
+不必再把几十条原始记录交给LLM。
+"""
+import json
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Optional
+from database.events import subscribe_workout_written
+from database.models import WorkoutRecord
+from utils.online_stats import RunningStats
+
+
+def _as_date(value: Any) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+class ExerciseFeatures:
+    """单个运动类型的滚动统计与个人最佳"""
+
+    __slots__ = ("duration", "calories", "heart_rate", "best_duration", "best_calories")
+
+    def __init__(self):
+        self.duration = RunningStats()
+        self.calories = RunningStats()
+        self.heart_rate = RunningStats()
+        self.best_duration = 0
+        self.best_calories = 0
+
+    def update(self, duration: int, calories: int, heart_rate: int):
+        self.duration.update(duration)
+        self.calories.update(calories)
+        if heart_rate:
+            self.heart_rate.update(heart_rate)
+        self.best_duration = max(self.best_duration, duration)
+        self.best_calories = max(self.best_calories, calories)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "duration": self.duration.to_dict(),
+            "calories": self.calories.to_dict(),
+            "heart_rate": self.heart_rate.to_dict(),
+            "best_duration": self.best_duration,
+            "best_calories": self.best_calories,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ExerciseFeatures":
+        features = cls()
+        features.duration = RunningStats.from_dict(data["duration"])
+        features.calories = RunningStats.from_dict(data["calories"])
+        features.heart_rate = RunningStats.from_dict(data["heart_rate"])
+        features.best_duration = data["best_duration"]
+        features.best_calories = data["best_calories"]
+        return features
+
+
+class UserProfile:
+    """单个用户的画像特征"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.exercises: Dict[str, ExerciseFeatures] = {}
+        self.heart_rate = RunningStats()  # 全部运动的平均心率基线
+        self.resting_heart_rate = RunningStats()  # 设备上报静息心率时才有
+        self.weekly_duration = RunningStats()  # 已结束各周的总时长
+        self.weekly_sessions = RunningStats()  # 已结束各周的运动次数
+        self.current_week: Optional[date] = None
+        self.current_week_duration = 0
+        self.current_week_sessions = 0
+        self.last_active_date: Optional[date] = None
+        self.total_sessions = 0
+
+    def observe(self, record: Dict[str, Any]):
+        """
+        用一条新记录更新画像（O(1)）
+
+        周统计按记录到达顺序滚动：进入新的一周时，上一周的合计并入周统计。
+        晚到的旧周记录只计入运动类型和心率统计。
+        """
+        day = _as_date(record["date"])
+        duration = record.get("duration") or 0
+        calories = record.get("calories_burned") or 0
+        heart_rate = record.get("heart_rate_avg") or 0
+
+        exercise_type = record.get("exercise_type") or "未知"
+        features = self.exercises.get(exercise_type)
+        if features is None:
+            features = self.exercises[exercise_type] = ExerciseFeatures()
+        features.update(duration, calories, heart_rate)
+
+        if heart_rate:
+            self.heart_rate.update(heart_rate)
+        if record.get("resting_heart_rate"):
+            self.resting_heart_rate.update(record["resting_heart_rate"])
+
+        week = _week_start(day)
+        if self.current_week is None or week > self.current_week:
+            if self.current_week is not None:
+                self._close_week()
+            self.current_week = week
+        if week == self.current_week:
+            self.current_week_duration += duration
+            self.current_week_sessions += 1
+
+        if self.last_active_date is None or day > self.last_active_date:
+            self.last_active_date = day
+        self.total_sessions += 1
+
+    def _close_week(self):
+        self.weekly_duration.update(self.current_week_duration)
+        self.weekly_sessions.update(self.current_week_sessions)
+        self.current_week_duration = 0
+        self.current_week_sessions = 0
+
+    def summary(self, max_types: int = 5) -> str:
+        """生成紧凑的日常水平描述（供分析提示词使用）"""
+        if not self.total_sessions:
+            return "暂无历史数据"
+
+        lines = [f"累计{self.total_sessions}次运动，最近一次：{self.last_active_date.isoformat()}"]
+        if self.weekly_duration.count:
+            lines.append(
+                f"平常每周：{self.weekly_sessions.mean:.1f}次，{self.weekly_duration.mean:.0f}分钟"
+                f"（本周至今{self.current_week_sessions}次，{self.current_week_duration}分钟）"
+            )
+        else:
+            lines.append(f"本周至今：{self.current_week_sessions}次，{self.current_week_duration}分钟")
+        if self.heart_rate.count:
+            lines.append(f"平均心率基线：{self.heart_rate.mean:.0f}±{self.heart_rate.std:.0f}次/分")
+        if self.resting_heart_rate.count:
+            lines.append(f"静息心率基线：{self.resting_heart_rate.mean:.0f}次/分")
+
+        ranked = sorted(self.exercises.items(), key=lambda item: item[1].duration.count, reverse=True)
+        for exercise_type, features in ranked[:max_types]:
+            line = (
+                f"{exercise_type}：平均{features.duration.mean:.0f}分钟/{features.calories.mean:.0f}卡"
+                f"（{features.duration.count}次），最佳{features.best_duration}分钟/{features.best_calories}卡"
+            )
+            if features.heart_rate.count:
+                line += f"，心率{features.heart_rate.mean:.0f}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "exercises": {name: features.to_dict() for name, features in self.exercises.items()},
+            "heart_rate": self.heart_rate.to_dict(),
+            "resting_heart_rate": self.resting_heart_rate.to_dict(),
+            "weekly_duration": self.weekly_duration.to_dict(),
+            "weekly_sessions": self.weekly_sessions.to_dict(),
+            "current_week": self.current_week.isoformat() if self.current_week else None,
+            "current_week_duration": self.current_week_duration,
+            "current_week_sessions": self.current_week_sessions,
+            "last_active_date": self.last_active_date.isoformat() if self.last_active_date else None,
+            "total_sessions": self.total_sessions,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UserProfile":
+        profile = cls(data["user_id"])
+        profile.exercises = {name: ExerciseFeatures.from_dict(value) for name, value in data["exercises"].items()}
+        for name in ("heart_rate", "resting_heart_rate", "weekly_duration", "weekly_sessions"):
+            setattr(profile, name, RunningStats.from_dict(data[name]))
+        profile.current_week = _as_date(data["current_week"]) if data["current_week"] else None
+        profile.current_week_duration = data["current_week_duration"]
+        profile.current_week_sessions = data["current_week_sessions"]
+        profile.last_active_date = _as_date(data["last_active_date"]) if data["last_active_date"] else None
+        profile.total_sessions = data["total_sessions"]
+        return profile
+
+
+class FeatureStore:
+    """每用户画像特征存储"""
+
+    def __init__(self):
+        self.profiles: Dict[int, UserProfile] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, record: Any):
+        """写入新记录时调用，增量更新对应用户的画像"""
+        if isinstance(record, WorkoutRecord):
+            record = record.to_dict()
+        with self.lock:
+            profile = self.profiles.get(record["user_id"])
+            if profile is None:
+                profile = self.profiles[record["user_id"]] = UserProfile(record["user_id"])
+            profile.observe(record)
+
+    def bootstrap(self, records: Iterable[Any]):
+        """用历史记录初始化（按日期升序回放，保证周统计正确滚动）"""
+        normalized = [r.to_dict() if isinstance(r, WorkoutRecord) else r for r in records]
+        for record in sorted(normalized, key=lambda r: (str(r["date"]), str(r.get("created_at", "")))):
+            self.observe(record)
+
+    def get(self, user_id: int) -> Optional[UserProfile]:
+        return self.profiles.get(user_id)
+
+    def summary(self, user_id: int) -> str:
+        profile = self.get(user_id)
+        return profile.summary() if profile else "暂无历史数据"
+
+    def save(self, path: str):
+        with self.lock:
+            payload = [profile.to_dict() for profile in self.profiles.values()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+    def load(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        with self.lock:
+            self.profiles = {data["user_id"]: UserProfile.from_dict(data) for data in payload}
+
+
+def _create_feature_store() -> FeatureStore:
+    """创建全局特征存储（当前使用模拟数据初始化）"""
+    from database.mock_data import MOCK_WORKOUT_RECORDS
+
+    store = FeatureStore()
+    store.bootstrap(MOCK_WORKOUT_RECORDS)
+    subscribe_workout_written(store.observe)
+    return store
+
+
+# 全局特征存储实例
+feature_store = _create_feature_store()
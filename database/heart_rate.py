@@ -0,0 +1,344 @@
+"""逐秒心率采样 - 批量写入、压缩序列、LTTB保形降采样与心率区间统计
+
+无论运动多长、一天运动几次，发送给模型的心率曲线都限制在固定的点数以内。
+"""
+import random
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import config
+from database.connection import DatabaseConnection, db_connection
+from database.mock_data import get_mock_records
+
+
+# (秒级时间戳, 心率)
+Sample = Tuple[int, int]
+
+# 心率区间：区间名 -> 最大心率百分比下限
+HEART_RATE_ZONES = [
+    ("Z1 热身", 0.50),
+    ("Z2 燃脂", 0.60),
+    ("Z3 有氧", 0.70),
+    ("Z4 乳酸阈", 0.80),
+    ("Z5 极限", 0.90),
+]
+
+INSERT_SAMPLE_QUERY = (
+    "INSERT INTO heart_rate_samples (workout_id, user_id, sample_time, heart_rate) "
+    "VALUES (%s, %s, %s, %s)"
+)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def _write_varint(buffer: bytearray, value: int):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varints(data: bytes) -> Iterator[int]:
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        yield value
+        value = 0
+        shift = 0
+
+
+class HeartRateSeries:
+    """
+    压缩存储的心率序列
+
+    时间和心率都做差分再zigzag变长编码：逐秒采样时时间差恒为1、心率差多在±63以内，
+    每个采样点约占2字节（元组列表每点约需100字节）。
+    """
+
+    __slots__ = ("start", "count", "data", "min", "max", "total")
+
+    def __init__(self, start: int = 0, count: int = 0, data: bytes = b"",
+                 min_hr: int = 0, max_hr: int = 0, total: int = 0):
+        self.start = start
+        self.count = count
+        self.data = data
+        self.min = min_hr
+        self.max = max_hr
+        self.total = total
+
+    @classmethod
+    def from_samples(cls, samples: Iterable[Sample]) -> "HeartRateSeries":
+        """从按时间排序的(时间戳, 心率)采样构建"""
+        buffer = bytearray()
+        start = previous_time = previous_value = None
+        count = total = 0
+        min_hr = max_hr = 0
+        for timestamp, value in samples:
+            if start is None:
+                start = previous_time = timestamp
+                previous_value = 0
+                min_hr = max_hr = value
+            _write_varint(buffer, _zigzag(timestamp - previous_time))
+            _write_varint(buffer, _zigzag(value - previous_value))
+            previous_time, previous_value = timestamp, value
+            count += 1
+            total += value
+            min_hr = min(min_hr, value)
+            max_hr = max(max_hr, value)
+        return cls(start or 0, count, bytes(buffer), min_hr, max_hr, total)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Sample]:
+        timestamp, value = self.start, 0
+        decoded = _read_varints(self.data)
+        for time_delta, value_delta in zip(decoded, decoded):
+            timestamp += _unzigzag(time_delta)
+            value += _unzigzag(value_delta)
+            yield timestamp, value
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+def lttb(points: Sequence[Sample], threshold: int) -> List[Sample]:
+    """
+    Largest-Triangle-Three-Buckets降采样
+
+    保留首尾点，其余按桶选取与相邻桶构成最大三角形面积的点，能保住峰值和拐点。
+
+    Args:
+        points: 按x排序的(x, y, ...)点（只使用前两项，返回原始元素）
+        threshold: 目标点数
+
+    Returns:
+        降采样后的点（不超过threshold个）
+    """
+    length = len(points)
+    if threshold >= length or threshold < 3:
+        return list(points) if threshold >= length else list(points[:1]) + list(points[-1:])
+
+    sampled = [points[0]]
+    bucket_size = (length - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # 下一个桶的平均点
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, length)
+        span = next_end - next_start
+        avg_x = sum(p[0] for p in points[next_start:next_end]) / span
+        avg_y = sum(p[1] for p in points[next_start:next_end]) / span
+
+        # 当前桶中与(a, 下一桶平均点)构成最大三角形的点
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = points[a][0], points[a][1]
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            x, y = points[j][0], points[j][1]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def zone_seconds(series: HeartRateSeries, max_heart_rate: int) -> Dict[str, int]:
+    """统计各心率区间的停留秒数（每个采样点的时长为到下一个采样点的间隔）"""
+    result = {name: 0 for name, _ in HEART_RATE_ZONES}
+    thresholds = [(name, ratio * max_heart_rate) for name, ratio in reversed(HEART_RATE_ZONES)]
+    previous: Optional[Sample] = None
+    for sample in series:
+        if previous is not None:
+            for name, lower in thresholds:
+                if previous[1] >= lower:
+                    result[name] += sample[0] - previous[0]
+                    break
+        previous = sample
+    return result
+
+
+def summarize_series(
+    series: HeartRateSeries,
+    max_points: int = config.HEART_RATE_CONFIG["max_points"],
+    max_heart_rate: int = config.HEART_RATE_CONFIG["max_heart_rate"],
+    curve: Optional[Sequence[Sample]] = None
+) -> str:
+    """
+    把心率序列概括为有界长度的文本（统计值 + 区间分布 + LTTB曲线）
+
+    Args:
+        series: 心率序列
+        max_points: 曲线最多保留的点数
+        max_heart_rate: 用于划分区间的最大心率
+        curve: 已降采样的曲线点（按天统一降采样时传入），None时按max_points降采样
+
+    Returns:
+        供ANALYSIS_PROMPT使用的文本
+    """
+    if not series.count:
+        return "无心率采样"
+
+    points = list(series)
+    duration = points[-1][0] - points[0][0]
+    zones = zone_seconds(series, max_heart_rate)
+    zone_text = "，".join(f"{name} {seconds // 60}分钟" for name, seconds in zones.items() if seconds >= 60)
+    if curve is None:
+        curve = lttb(points, max_points)
+    curve_text = " ".join(f"{(t - series.start) // 60}:{(t - series.start) % 60:02d}/{v}" for t, v in curve)
+    return (
+        f"采样{series.count}个，时长{duration // 60}分钟，平均{series.average:.0f}，"
+        f"最低{series.min}，最高{series.max}次/分\n"
+        f"心率区间：{zone_text or '不足1分钟'}\n"
+        f"心率曲线（分:秒/心率）：{curve_text}"
+    )
+
+
+def ingest_samples(
+    workout_id: int,
+    user_id: int,
+    samples: Iterable[Sample],
+    connection: DatabaseConnection = db_connection,
+    batch_size: int = config.HEART_RATE_CONFIG["ingest_batch_size"]
+) -> int:
+    """
+    批量写入心率采样（每batch_size条一次多行插入、一次提交）
+
+    Returns:
+        写入的采样数
+    """
+    total = 0
+    batch = []
+    for timestamp, value in samples:
+        batch.append((workout_id, user_id, datetime.fromtimestamp(timestamp), value))
+        if len(batch) >= batch_size:
+            total += connection.execute_many(INSERT_SAMPLE_QUERY, batch)
+            batch = []
+    if batch:
+        total += connection.execute_many(INSERT_SAMPLE_QUERY, batch)
+    return total
+
+
+def _mock_samples(record: Dict[str, Any]) -> Iterator[Sample]:
+    """按运动记录生成确定性的逐秒心率（热身 -> 平稳波动 -> 放松）"""
+    rng = random.Random(record["id"])
+    start = int(datetime.fromisoformat(str(record["created_at"])).timestamp())
+    seconds = record["duration"] * 60
+    target = record["heart_rate_avg"]
+    resting = 70
+    value = float(resting)
+    for second in range(seconds):
+        progress = second / seconds
+        if progress < 0.1:
+            goal = resting + (target + 10 - resting) * progress / 0.1
+        elif progress > 0.9:
+            goal = target - (target - resting) * (progress - 0.9) / 0.1 * 0.6
+        else:
+            goal = target + 8 * ((second // 240) % 2 * 2 - 1)
+        value += (goal - value) * 0.05 + rng.uniform(-1.5, 1.5)
+        yield start + second, int(round(value))
+
+
+class HeartRateStore:
+    """按运动记录缓存压缩后的心率序列（超过上限时淘汰最久未使用的序列）"""
+
+    def __init__(self, max_series: int = config.HEART_RATE_CONFIG["cache_series"]):
+        """
+        Args:
+            max_series: 最多缓存的序列数
+        """
+        self.max_series = max_series
+        self.series: "OrderedDict[int, HeartRateSeries]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def put(self, workout_id: int, samples: Iterable[Sample]) -> HeartRateSeries:
+        series = HeartRateSeries.from_samples(samples)
+        with self.lock:
+            self.series[workout_id] = series
+            self.series.move_to_end(workout_id)
+            while len(self.series) > self.max_series:
+                self.series.popitem(last=False)
+                self.evictions += 1
+        return series
+
+    def get(self, record: Dict[str, Any]) -> HeartRateSeries:
+        """
+        获取运动记录的心率序列
+
+        实际实现时从heart_rate_samples表按(workout_id, sample_time)读取：
+            SELECT UNIX_TIMESTAMP(sample_time), heart_rate FROM heart_rate_samples
+            WHERE workout_id = %(workout_id)s ORDER BY sample_time
+        当前使用模拟采样。
+        """
+        with self.lock:
+            series = self.series.get(record["id"])
+            if series is not None:
+                self.series.move_to_end(record["id"])
+        if series is None:
+            series = self.put(record["id"], _mock_samples(record))
+        return series
+
+
+# 全局心率序列缓存
+heart_rate_store = HeartRateStore()
+
+
+def heart_rate_summary_for_date(
+    user_id: int,
+    day: Optional[str] = None,
+    max_points: int = config.HEART_RATE_CONFIG["max_points"]
+) -> str:
+    """
+    汇总某天各次运动的心率概况
+
+    当天所有运动的采样合并后统一做一次LTTB降采样，曲线总点数不超过max_points，
+    再按所属运动拆回各段，文本长度不随运动次数和时长增长。
+
+    Args:
+        user_id: 用户ID
+        day: 日期（YYYY-MM-DD），默认今天
+        max_points: 全天曲线的点数上限
+
+    Returns:
+        心率概况文本，无记录时为空字符串
+    """
+    day = day or date.today().isoformat()
+    records = get_mock_records(user_id=user_id, date_filter=day)
+    series_list = [heart_rate_store.get(record) for record in records]
+    # (时间戳, 心率, 运动序号)：lttb只看前两项，返回原始元素，可据此拆回各次运动
+    combined = sorted(
+        (timestamp, value, index)
+        for index, series in enumerate(series_list)
+        for timestamp, value in series
+    )
+    curves: List[List[Sample]] = [[] for _ in series_list]
+    for timestamp, value, index in lttb(combined, max_points):
+        curves[index].append((timestamp, value))
+    sections = []
+    for record, series, curve in zip(records, series_list, curves):
+        summary = summarize_series(series, curve=curve)
+        sections.append(f"[{record['exercise_type']} {record['duration']}分钟]\n{summary}")
+    return "\n".join(sections)
@@ -0,0 +1,419 @@
+"""设备上传写入缓冲 - asyncio写后缓冲：立即接收、按分片/表合并、批量多行插入
+
+可穿戴设备同步时一次上传大量记录，逐条execute_query（每条一次提交）太慢。写入流程：
+    1. submit把记录追加到本地日志后立即返回；未提交的记录超过max_pending时等待（背压，内存有界）
+    2. 按(分片, 表)合并，攒够max_batch条或最早一条等待超过flush_interval秒时，
+       用一次execute_many（多行插入、一次提交）写入该分片
+    3. 提交成功后在日志中确认，并对运动记录发布database.events.publish_workout_written
+       （多粒度汇总、画像特征、备注索引、异常检测、响应缓存失效）
+进程崩溃后start()重放日志中未确认的记录。写入使用幂等插入（INSERT IGNORE等），
+因此运动记录必须带全局唯一id；提交后、确认前崩溃的批次会被重放一次（至少一次语义）。
+只对本次实际插入的运动记录发布事件：重复上传或重放时已存在的记录被跳过，派生数据不会重复累加。
+
+用法：
+    buffer = WriteBehindBuffer()
+    await buffer.start()
+    await buffer.submit(record)
+    ...
+    await buffer.close()
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import config
+from database.events import publish_workout_written
+from database.models import WORKOUT_FIELDS, _format_value
+from database.sharding import ShardRouter, _insert_ignore
+
+
+# 支持缓冲写入的表 -> 列（按此顺序生成多行插入）
+TABLE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "workout_records": WORKOUT_FIELDS,
+    "heart_rate_samples": ("workout_id", "user_id", "sample_time", "heart_rate"),
+}
+
+
+class IngestJournal:
+    """
+    追加写日志（JSON行），按段切分
+
+    每条记录一行{"seq", "table", "row"}，批次提交后追加一行{"ack": [seq, ...]}。
+    某段及其之前所有段的记录都已确认时删除这些段，日志大小只与未确认的记录数有关。
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024, fsync: bool = False):
+        """
+        Args:
+            directory: 日志目录
+            segment_bytes: 单个日志段的大小上限
+            fsync: 每次写入后是否fsync（关闭时可承受进程崩溃，但不保证断电时不丢失）
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.next_seq = 1
+        self.segment = 0
+        self.file = None
+        # 段号 -> 未确认记录数；序号 -> 所在段号
+        self.outstanding: Dict[int, int] = {}
+        self.segment_of: Dict[int, int] = {}
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"journal-{segment:08d}.log")
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(name[8:16]) for name in os.listdir(self.directory)
+            if name.startswith("journal-") and name.endswith(".log")
+        )
+
+    def open(self) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """
+        打开日志并读取上次运行遗留的未确认记录
+
+        Returns:
+            按序号排列的(序号, 表名, 行)
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        entries: Dict[int, Tuple[int, str, Dict[str, Any]]] = {}
+        acked = set()
+        segments = self._segments()
+        for segment in segments:
+            with open(self._path(segment), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 崩溃时写了一半的最后一行
+                        continue
+                    if "ack" in entry:
+                        acked.update(entry["ack"])
+                    else:
+                        entries[entry["seq"]] = (segment, entry["table"], entry["row"])
+
+        pending = []
+        for seq in sorted(entries):
+            if seq in acked:
+                continue
+            segment, table, row = entries[seq]
+            self.segment_of[seq] = segment
+            self.outstanding[segment] = self.outstanding.get(segment, 0) + 1
+            pending.append((seq, table, row))
+        self.next_seq = max(list(entries) + list(acked), default=0) + 1
+        for segment in segments:
+            self.outstanding.setdefault(segment, 0)
+        self.segment = (segments[-1] + 1) if segments else 1
+        self.outstanding[self.segment] = 0
+        self.file = open(self._path(self.segment), "a", encoding="utf-8")
+        self._compact()
+        return pending
+
+    def append(self, table: str, row: Dict[str, Any]) -> int:
+        """
+        追加一条记录
+
+        Returns:
+            记录序号
+        """
+        seq = self.next_seq
+        self.next_seq += 1
+        self._write({"seq": seq, "table": table, "row": row})
+        self.segment_of[seq] = self.segment
+        self.outstanding[self.segment] += 1
+        if self.file.tell() >= self.segment_bytes:
+            self._rotate()
+        return seq
+
+    def ack(self, seqs: Sequence[int]):
+        """确认一批已提交的记录"""
+        self._write({"ack": list(seqs)})
+        for seq in seqs:
+            segment = self.segment_of.pop(seq, None)
+            if segment is not None:
+                self.outstanding[segment] -= 1
+        self._compact()
+
+    def _write(self, entry: Dict[str, Any]):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def _rotate(self):
+        self.file.close()
+        self.segment += 1
+        self.outstanding[self.segment] = 0
+        self.file = open(self._path(self.segment), "a", encoding="utf-8")
+        self._compact()
+
+    def _compact(self):
+        """删除最前面已全部确认的段（确认行可能记在后面的段中，因此只按前缀删除）"""
+        for segment in sorted(self.outstanding):
+            if segment == self.segment or self.outstanding[segment] > 0:
+                break
+            del self.outstanding[segment]
+            try:
+                os.remove(self._path(segment))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def pending(self) -> int:
+        return len(self.segment_of)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class _Group:
+    """同一(分片, 表)待写入的记录"""
+
+    __slots__ = ("items", "first_at")
+
+    def __init__(self):
+        self.items: List[Tuple[int, Dict[str, Any]]] = []
+        self.first_at: Optional[float] = None
+
+
+def _to_row(record: Any, table: str) -> Dict[str, Any]:
+    """取出表的各列并把日期/时间转为ISO字符串（可写入日志，也可直接作为插入参数）"""
+    if table not in TABLE_COLUMNS:
+        raise ValueError(f"不支持缓冲写入的表: {table}")
+    if hasattr(record, "to_dict"):
+        record = record.to_dict()
+    row = {column: _format_value(record.get(column)) for column in TABLE_COLUMNS[table]}
+    if table == "workout_records":
+        if row["id"] is None:
+            raise ValueError("缓冲写入的运动记录必须带全局唯一id（日志重放依赖幂等插入）")
+        if row["created_at"] is None:
+            row["created_at"] = _format_value(datetime.now().replace(microsecond=0))
+    return row
+
+
+class WriteBehindBuffer:
+    """设备上传的异步写后缓冲"""
+
+    def __init__(
+        self,
+        router: Optional[ShardRouter] = None,
+        journal_dir: str = config.INGEST_CONFIG["journal_dir"],
+        max_batch: int = config.INGEST_CONFIG["max_batch"],
+        flush_interval: float = config.INGEST_CONFIG["flush_interval"],
+        max_pending: int = config.INGEST_CONFIG["max_pending"],
+        writers: int = config.INGEST_CONFIG["writers"],
+        fsync: bool = config.INGEST_CONFIG["fsync"],
+        segment_bytes: int = config.INGEST_CONFIG["segment_bytes"],
+        publish: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        """
+        Args:
+            router: 分片路由，默认全局shard_router
+            journal_dir: 本地日志目录
+            max_batch: 每次多行插入的最大行数
+            flush_interval: 记录最长等待时间（秒）
+            max_pending: 已接收未提交的记录上限，超过时submit等待
+            writers: 执行数据库写入的线程数
+            fsync: 日志每次写入后是否fsync
+            segment_bytes: 日志段大小上限
+            publish: 运动记录提交后的通知函数，默认publish_workout_written
+        """
+        if router is None:
+            from database.sharding import shard_router as router
+        self.router = router
+        self.journal = IngestJournal(journal_dir, segment_bytes, fsync)
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.writers = writers
+        self.publish = publish or publish_workout_written
+        self.groups: Dict[Tuple[str, str], _Group] = {}
+        self.pending = 0
+        self.counters: Dict[str, int] = {
+            "submitted": 0, "replayed": 0, "committed": 0, "batches": 0,
+            "flush_errors": 0, "publish_errors": 0, "backpressure_waits": 0, "peak_pending": 0,
+            "duplicates": 0,
+        }
+        self.last_error: Optional[str] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.task: Optional[asyncio.Task] = None
+        self.closing = False
+
+    async def start(self):
+        """打开日志、重放上次未提交的记录并启动后台刷新任务"""
+        self.loop = asyncio.get_running_loop()
+        self.condition = asyncio.Condition()
+        self.wakeup = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=self.writers, thread_name_prefix="ingest")
+        # 重放的记录不受max_pending限制（它们在崩溃前已被接收）
+        for seq, table, row in self.journal.open():
+            self._enqueue(seq, table, row)
+            self.counters["replayed"] += 1
+        self.task = asyncio.create_task(self._flush_loop())
+
+    async def submit(self, record: Any, table: str = "workout_records"):
+        """
+        接收一条记录（写入日志后返回，不等待数据库提交）
+
+        Args:
+            record: 记录（字典或WorkoutRecord）
+            table: 目标表
+        """
+        row = _to_row(record, table)
+        async with self.condition:
+            if self.pending >= self.max_pending:
+                self.counters["backpressure_waits"] += 1
+                await self.condition.wait_for(lambda: self.pending < self.max_pending)
+            seq = self.journal.append(table, row)
+            self._enqueue(seq, table, row)
+            self.counters["submitted"] += 1
+
+    async def submit_many(self, records: Sequence[Any], table: str = "workout_records"):
+        """接收一次同步上传的多条记录"""
+        for record in records:
+            await self.submit(record, table)
+
+    def _enqueue(self, seq: int, table: str, row: Dict[str, Any]):
+        key = (self.router.shard_for(row["user_id"]), table)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = _Group()
+        if not group.items:
+            group.first_at = time.monotonic()
+        group.items.append((seq, row))
+        self.pending += 1
+        self.counters["peak_pending"] = max(self.counters["peak_pending"], self.pending)
+        if len(group.items) >= self.max_batch:
+            self.wakeup.set()
+
+    async def _flush_loop(self):
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self._flush_due(force=False)
+
+    async def _flush_due(self, force: bool) -> bool:
+        """
+        写入到期的批次（各分片并行）
+
+        Returns:
+            本轮所有批次是否都写入成功
+        """
+        async with self.flush_lock:
+            now = time.monotonic()
+            batches = []
+            for key, group in self.groups.items():
+                if not group.items:
+                    continue
+                if force or len(group.items) >= self.max_batch or now - group.first_at >= self.flush_interval:
+                    batches.append((key, group.items[:self.max_batch]))
+                    del group.items[:self.max_batch]
+                    group.first_at = now if group.items else None
+            if not batches:
+                return True
+            results = await asyncio.gather(*(self._write(key, items) for key, items in batches))
+        # 积压超过一批时不等下一个周期
+        if any(len(group.items) >= self.max_batch for group in self.groups.values()):
+            self.wakeup.set()
+        return all(results)
+
+    async def _write(self, key: Tuple[str, str], items: List[Tuple[int, Dict[str, Any]]]) -> bool:
+        shard, table = key
+        rows = [row for _, row in items]
+        try:
+            inserted = await self.loop.run_in_executor(self.executor, self._execute, shard, table, rows)
+        except Exception as e:
+            # 放回队首，下个周期重试；日志中的记录仍未确认
+            self.counters["flush_errors"] += 1
+            self.last_error = f"{shard}/{table}: {e}"
+            group = self.groups[key]
+            group.items[:0] = items
+            group.first_at = group.first_at or time.monotonic()
+            return False
+
+        self.journal.ack([seq for seq, _ in items])
+        self.counters["committed"] += len(items)
+        self.counters["batches"] += 1
+        self.counters["duplicates"] += len(rows) - len(inserted)
+        if table == "workout_records":
+            for row in inserted:
+                try:
+                    self.publish(row)
+                except Exception as e:
+                    # 派生数据更新失败不影响已提交的记录
+                    self.counters["publish_errors"] += 1
+                    self.last_error = f"publish: {e}"
+        async with self.condition:
+            self.pending -= len(items)
+            self.condition.notify_all()
+        return True
+
+    def _execute(self, shard: str, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        在写入线程中执行一次多行插入（一次提交）
+
+        Returns:
+            实际插入的行：运动记录按id去掉批次内重复和表中已存在的记录（同一(分片, 表)的批次串行写入）
+        """
+        columns = TABLE_COLUMNS[table]
+        connection = self.router.connection(shard)
+        inserted = rows
+        if table == "workout_records":
+            seen, unique = set(), []
+            for row in rows:
+                if row["id"] not in seen:
+                    seen.add(row["id"])
+                    unique.append(row)
+            placeholders = ", ".join(f"%(id{i})s" for i in range(len(unique)))
+            existing = connection.execute_query(
+                f"SELECT id FROM workout_records WHERE id IN ({placeholders})",
+                {f"id{i}": row["id"] for i, row in enumerate(unique)}
+            )
+            existing_ids = {item["id"] for item in existing}
+            inserted = [row for row in unique if row["id"] not in existing_ids]
+        statement = _insert_ignore(connection.config["type"], table, columns)
+        connection.execute_many(statement, [tuple(row[column] for column in columns) for row in rows])
+        return inserted
+
+    async def flush(self) -> bool:
+        """
+        立即写入所有待写记录
+
+        Returns:
+            全部写入成功时为True；写入失败时停止重试并返回False（记录保留在缓冲和日志中）
+        """
+        while self.pending:
+            if not await self._flush_due(force=True):
+                return False
+        return True
+
+    async def close(self) -> bool:
+        """停止后台任务并写入剩余记录；写入失败的记录留在日志中，下次start时重放"""
+        self.closing = True
+        self.wakeup.set()
+        if self.task:
+            await self.task
+        flushed = await self.flush()
+        self.executor.shutdown(wait=True)
+        self.journal.close()
+        return flushed
+
+    def snapshot(self) -> Dict[str, Any]:
+        """缓冲指标"""
+        batches = self.counters["batches"]
+        return {
+            **self.counters,
+            "pending": self.pending,
+            "journal_pending": self.journal.pending,
+            "avg_batch_size": round(self.counters["committed"] / batches, 1) if batches else 0.0,
+            "last_error": self.last_error,
+        }
@@ -1,6 +1,6 @@
 """模拟数据 - 用于测试，替代真实的数据库查询"""
 from datetime import date, datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 import random
 
 
@@ -136,6 +136,47 @@ def get_mock_records(
     return results[:limit]
 
 
+def iter_mock_records(
+    user_id: int = 1,
+    date_filter: str = None,
+    exercise_type: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    after: tuple = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    惰性遍历模拟运动记录（与streaming.iter_workout_records语义一致）
+
+    Args:
+        user_id: 用户ID
+        date_filter: 日期过滤（YYYY-MM-DD）
+        exercise_type: 运动类型过滤
+        start_date: 开始日期
+        end_date: 结束日期
+        after: 键集游标(date, created_at, id)，只返回排在其后的记录
+
+    Yields:
+        按(date, created_at, id)降序排列的运动记录
+    """
+    ordered = sorted(
+        MOCK_WORKOUT_RECORDS,
+        key=lambda r: (r["date"], r["created_at"], r["id"]),
+        reverse=True
+    )
+    for record in ordered:
+        if record["user_id"] != user_id:
+            continue
+        if date_filter and record["date"] != date_filter:
+            continue
+        if start_date and end_date and not (start_date <= record["date"] <= end_date):
+            continue
+        if exercise_type and record["exercise_type"] != exercise_type:
+            continue
+        if after and (record["date"], record["created_at"], record["id"]) >= tuple(after):
+            continue
+        yield record
+
+
 def get_today_summary(user_id: int = 1) -> Dict[str, Any]:
     """
     获取今天的运动汇总
@@ -225,3 +266,49 @@ def get_statistics(user_id: int = 1, days: int = 7) -> List[Dict[str, Any]]:
     
     return result
 
+
+# 生成模拟记录使用的运动类型：(类型, 时长范围, 每分钟卡路里, 平均心率)
+SYNTHETIC_EXERCISES = [
+    ("跑步", (20, 60), 10, 150),
+    ("游泳", (30, 60), 8, 135),
+    ("骑行", (30, 90), 7, 130),
+    ("力量训练", (30, 60), 6, 120),
+    ("瑜伽", (30, 60), 3, 95),
+]
+
+
+def generate_mock_records(user_id: int, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+    """
+    为任意用户确定性地生成一段时间的模拟运动记录（用于批量任务和压测）
+
+    Args:
+        user_id: 用户ID（作为随机种子，同一用户每次生成结果相同）
+        start_date: 开始日期（含）
+        end_date: 结束日期（含）
+
+    Returns:
+        按日期升序排列的运动记录
+    """
+    rng = random.Random(user_id)
+    activity = rng.uniform(0.2, 0.8)  # 每天运动的概率
+    favorites = rng.sample(SYNTHETIC_EXERCISES, 3)
+    records = []
+    day = start_date
+    while day <= end_date:
+        day_rng = random.Random(user_id * 100003 + day.toordinal())
+        if day_rng.random() < activity:
+            exercise_type, (low, high), calories_per_minute, heart_rate = day_rng.choice(favorites)
+            duration = day_rng.randint(low, high)
+            records.append({
+                "id": user_id * 1_000_000 + day.toordinal() % 1_000_000,
+                "user_id": user_id,
+                "date": day.isoformat(),
+                "exercise_type": exercise_type,
+                "duration": duration,
+                "calories_burned": int(duration * calories_per_minute * day_rng.uniform(0.85, 1.15)),
+                "heart_rate_avg": heart_rate + day_rng.randint(-10, 10),
+                "notes": "",
+                "created_at": datetime.combine(day, datetime.min.time()).replace(hour=day_rng.randint(6, 21)).isoformat()
+            })
+        day += timedelta(days=1)
+    return records
@@ -1,10 +1,56 @@
 """数据模型定义 - 定义数据库表结构"""
-from typing import Optional
+from functools import lru_cache
+from itertools import starmap
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence
 from datetime import date, datetime
 
 
+# 运动记录字段（与workout_records表列顺序一致）
+WORKOUT_FIELDS = (
+    "id",
+    "user_id",
+    "date",
+    "exercise_type",
+    "duration",
+    "calories_burned",
+    "heart_rate_avg",
+    "notes",
+    "created_at",
+)
+
+
+@lru_cache(maxsize=8192)
+def _format_date(value: date) -> str:
+    """格式化日期（同一日期在批量转换中反复出现，结果缓存）"""
+    return value.isoformat()
+
+
+def _format_value(value: Any) -> Any:
+    """把日期/时间转为ISO字符串，其余值原样返回"""
+    value_type = type(value)
+    if value_type is date:
+        return _format_date(value)
+    if value_type is datetime or isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _row_getter(columns: Optional[Sequence[str]]):
+    """根据游标列名生成按WORKOUT_FIELDS顺序取值的函数，列顺序一致时返回 None（多余的列忽略）"""
+    if columns is None or tuple(columns) == WORKOUT_FIELDS:
+        return None
+    index = {name: i for i, name in enumerate(columns)}
+    missing = [name for name in WORKOUT_FIELDS if name not in index]
+    if missing:
+        raise ValueError(f"查询结果缺少列: {', '.join(missing)}")
+    return itemgetter(*(index[name] for name in WORKOUT_FIELDS))
+
+
 class WorkoutRecord:
-    """运动记录数据模型"""
+    """运动记录数据模型（使用__slots__，不为每条记录创建__dict__）"""
+    
+    __slots__ = WORKOUT_FIELDS
     
     def __init__(
         self,
@@ -20,7 +66,7 @@ class WorkoutRecord:
     ):
         self.id = id
         self.user_id = user_id
-        self.date = date or date.today()
+        self.date = date or datetime.now().date()
         self.exercise_type = exercise_type
         self.duration = duration
         self.calories_burned = calories_burned
@@ -28,19 +74,112 @@ class WorkoutRecord:
         self.notes = notes
         self.created_at = created_at or datetime.now()
     
+    def to_tuple(self) -> tuple:
+        """按WORKOUT_FIELDS顺序返回字段值"""
+        return (
+            self.id, self.user_id, self.date, self.exercise_type, self.duration,
+            self.calories_burned, self.heart_rate_avg, self.notes, self.created_at
+        )
+    
     def to_dict(self):
         """转换为字典"""
         return {
             "id": self.id,
             "user_id": self.user_id,
-            "date": self.date.isoformat() if isinstance(self.date, date) else str(self.date),
+            "date": _format_value(self.date),
             "exercise_type": self.exercise_type,
             "duration": self.duration,
             "calories_burned": self.calories_burned,
             "heart_rate_avg": self.heart_rate_avg,
             "notes": self.notes,
-            "created_at": self.created_at.isoformat() if isinstance(self.created_at, datetime) else str(self.created_at)
+            "created_at": _format_value(self.created_at)
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "WorkoutRecord":
+        """从字典创建记录（缺失字段取默认值）"""
+        return cls(**{name: data[name] for name in WORKOUT_FIELDS if name in data})
+    
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Iterable[Sequence[Any]],
+        columns: Optional[Sequence[str]] = None
+    ) -> List["WorkoutRecord"]:
+        """
+        从游标返回的行元组批量创建记录
+        
+        列顺序只解析一次。构造耗时与普通类相当，收益在于每条记录不带__dict__，内存约少三成。
+        
+        Args:
+            rows: fetchmany/fetchall返回的行
+            columns: 游标列名（cursor.description），None 表示与WORKOUT_FIELDS顺序一致
+        
+        Returns:
+            运动记录列表
+        """
+        getter = _row_getter(columns)
+        if getter is not None:
+            rows = map(getter, rows)
+        return list(starmap(cls, rows))
+    
+    def __repr__(self):
+        return f"WorkoutRecord(id={self.id}, user_id={self.user_id}, date={self.date}, exercise_type={self.exercise_type!r})"
+
+
+def rows_to_dicts(
+    rows: Iterable[Sequence[Any]],
+    columns: Optional[Sequence[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    把游标行直接转换为可JSON序列化的字典列表（跳过模型对象，省去from_rows + to_dict的对象创建）
+    
+    Args:
+        rows: 游标返回的行
+        columns: 游标列名，None 表示与WORKOUT_FIELDS顺序一致
+    
+    Returns:
+        字典列表，日期/时间已格式化为ISO字符串
+    """
+    getter = _row_getter(columns)
+    if getter is not None:
+        rows = map(getter, rows)
+    fmt = _format_value
+    return [
+        {
+            "id": id, "user_id": user_id, "date": fmt(record_date), "exercise_type": exercise_type,
+            "duration": duration, "calories_burned": calories_burned, "heart_rate_avg": heart_rate_avg,
+            "notes": notes, "created_at": fmt(created_at)
+        }
+        for (id, user_id, record_date, exercise_type, duration,
+             calories_burned, heart_rate_avg, notes, created_at) in rows
+    ]
+
+
+def records_to_columns(records: Iterable[WorkoutRecord]) -> Dict[str, list]:
+    """
+    把记录转置为列式结构（字段名 -> 值列表）
+    
+    使用zip(*rows)在C层完成转置，适合聚合计算。
+    """
+    transposed = list(zip(*(record.to_tuple() for record in records)))
+    if not transposed:
+        return {name: [] for name in WORKOUT_FIELDS}
+    return {name: list(values) for name, values in zip(WORKOUT_FIELDS, transposed)}
+
+
+def dicts_to_columns(items: Iterable[Dict[str, Any]]) -> Dict[str, list]:
+    """把字典列表（如模拟数据或JSON解析结果）转置为列式结构"""
+    getter = itemgetter(*WORKOUT_FIELDS)
+    transposed = list(zip(*map(getter, items)))
+    if not transposed:
+        return {name: [] for name in WORKOUT_FIELDS}
+    return {name: list(values) for name, values in zip(WORKOUT_FIELDS, transposed)}
+
+
+def records_from_columns(columns: Dict[str, Sequence[Any]]) -> List[WorkoutRecord]:
+    """从列式结构批量创建记录"""
+    return WorkoutRecord.from_rows(zip(*(columns[name] for name in WORKOUT_FIELDS)))
 
 
 # 数据库表结构定义（SQL）
@@ -56,6 +195,7 @@ CREATE TABLE IF NOT EXISTS workout_records (
     notes TEXT COMMENT '备注',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     INDEX idx_user_date (user_id, date),
+    INDEX idx_user_date_created_id (user_id, date, created_at, id),
     INDEX idx_date (date)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='运动记录表';
 """
@@ -75,6 +215,152 @@ CREATE TABLE IF NOT EXISTS workout_records (
 );
 
 CREATE INDEX IF NOT EXISTS idx_user_date ON workout_records(user_id, date);
+CREATE INDEX IF NOT EXISTS idx_user_date_created_id ON workout_records(user_id, date, created_at, id);
 CREATE INDEX IF NOT EXISTS idx_date ON workout_records(date);
 """
 
+
+# 按月分区的表结构（MySQL）
+# 分区键必须包含在主键中，因此主键为(id, date)；{partitions}由database.partitioning生成
+WORKOUT_RECORDS_PARTITIONED_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id INT NOT NULL AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    date DATE NOT NULL,
+    exercise_type VARCHAR(50) NOT NULL,
+    duration INT NOT NULL COMMENT '运动时长（分钟）',
+    calories_burned INT DEFAULT 0 COMMENT '消耗卡路里',
+    heart_rate_avg INT DEFAULT 0 COMMENT '平均心率',
+    notes TEXT COMMENT '备注',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, date),
+    INDEX idx_user_date (user_id, date),
+    INDEX idx_user_date_created_id (user_id, date, created_at, id),
+    INDEX idx_date (date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='运动记录表（按月分区）'
+PARTITION BY RANGE COLUMNS(date) (
+{partitions}
+);
+"""
+
+# 按月分区的表结构（PostgreSQL声明式分区），月分区由database.partitioning创建
+WORKOUT_RECORDS_PARTITIONED_TABLE_SCHEMA_POSTGRESQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id SERIAL,
+    user_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    exercise_type VARCHAR(50) NOT NULL,
+    duration INTEGER NOT NULL,
+    calories_burned INTEGER DEFAULT 0,
+    heart_rate_avg INTEGER DEFAULT 0,
+    notes TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+
+CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_{table}_user_date ON {table}(user_id, date);
+CREATE INDEX IF NOT EXISTS idx_{table}_user_date_created_id ON {table}(user_id, date, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_{table}_date ON {table}(date);
+"""
+
+# 逐秒心率采样表（MySQL）
+HEART_RATE_SAMPLES_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS heart_rate_samples (
+    workout_id INT NOT NULL COMMENT '对应workout_records.id',
+    user_id INT NOT NULL,
+    sample_time TIMESTAMP NOT NULL COMMENT '采样时间（秒级）',
+    heart_rate SMALLINT NOT NULL COMMENT '心率（次/分）',
+    PRIMARY KEY (workout_id, sample_time),
+    INDEX idx_user_time (user_id, sample_time)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='心率采样表';
+"""
+
+# PostgreSQL版本的心率采样表
+HEART_RATE_SAMPLES_TABLE_SCHEMA_POSTGRESQL = """
+CREATE TABLE IF NOT EXISTS heart_rate_samples (
+    workout_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    sample_time TIMESTAMP NOT NULL,
+    heart_rate SMALLINT NOT NULL,
+    PRIMARY KEY (workout_id, sample_time)
+);
+
+CREATE INDEX IF NOT EXISTS idx_hr_user_time ON heart_rate_samples(user_id, sample_time);
+"""
+
+# SQLite版本的运动记录表（本地分片/测试使用；id由应用全局分配，跨分片迁移时保持不变）
+WORKOUT_RECORDS_TABLE_SCHEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS workout_records (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    exercise_type TEXT NOT NULL,
+    duration INTEGER NOT NULL,
+    calories_burned INTEGER DEFAULT 0,
+    heart_rate_avg INTEGER DEFAULT 0,
+    notes TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_date_created_id ON workout_records(user_id, date, created_at, id);
+"""
+
+# SQLite版本的心率采样表
+HEART_RATE_SAMPLES_TABLE_SCHEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS heart_rate_samples (
+    workout_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    sample_time TEXT NOT NULL,
+    heart_rate INTEGER NOT NULL,
+    PRIMARY KEY (workout_id, sample_time)
+);
+
+CREATE INDEX IF NOT EXISTS idx_hr_user_time ON heart_rate_samples(user_id, sample_time);
+"""
+
+# 多粒度运动汇总表（MySQL）：每条记录写入时累加日、周、月三行，历史查询按范围读取
+WORKOUT_ROLLUPS_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workout_rollups (
+    user_id INT NOT NULL,
+    resolution ENUM('day', 'week', 'month') NOT NULL COMMENT '汇总粒度',
+    bucket_start DATE NOT NULL COMMENT '桶起始日（当天/周一/每月1日）',
+    workout_count INT NOT NULL DEFAULT 0,
+    total_duration INT NOT NULL DEFAULT 0 COMMENT '总时长（分钟）',
+    total_calories INT NOT NULL DEFAULT 0,
+    heart_rate_sum BIGINT NOT NULL DEFAULT 0 COMMENT '平均心率之和（与次数一起合并计算平均值）',
+    heart_rate_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, resolution, bucket_start)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='运动汇总表';
+"""
+
+# PostgreSQL版本的汇总表
+WORKOUT_ROLLUPS_TABLE_SCHEMA_POSTGRESQL = """
+CREATE TABLE IF NOT EXISTS workout_rollups (
+    user_id INTEGER NOT NULL,
+    resolution VARCHAR(8) NOT NULL,
+    bucket_start DATE NOT NULL,
+    workout_count INTEGER NOT NULL DEFAULT 0,
+    total_duration INTEGER NOT NULL DEFAULT 0,
+    total_calories INTEGER NOT NULL DEFAULT 0,
+    heart_rate_sum BIGINT NOT NULL DEFAULT 0,
+    heart_rate_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, resolution, bucket_start)
+);
+"""
+
+# SQLite版本的汇总表（本地分片/测试使用）
+WORKOUT_ROLLUPS_TABLE_SCHEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS workout_rollups (
+    user_id INTEGER NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    workout_count INTEGER NOT NULL DEFAULT 0,
+    total_duration INTEGER NOT NULL DEFAULT 0,
+    total_calories INTEGER NOT NULL DEFAULT 0,
+    heart_rate_sum INTEGER NOT NULL DEFAULT 0,
+    heart_rate_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, resolution, bucket_start)
+);
+"""
@@ -0,0 +1,286 @@
+"""运动备注检索 - 按用户维护的字符n-gram倒排索引，支持排序检索和数值提取
+
+备注（“晨跑5公里”“自由泳1000米”）没有分词边界，按字符一元/二元/三元组建索引，
+查询切成二元/三元组（单字查询用一元组）后按BM25打分，不需要LIKE '%...%'全表扫描，也不必把所有记录交给LLM。
+同时从备注中提取数值（距离、圈数、组数、次数、时长），查询中带数值时精确匹配的记录排在前面。
+
+新记录写入时增量更新（database.events），每条记录的代价与备注长度成正比。
+"""
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from database.events import subscribe_workout_written
+from database.models import WorkoutRecord
+
+
+# 建索引使用的n；查询只用二元/三元组，单字查询（“跑”“泳”）才用一元组
+NGRAM_SIZES = (1, 2, 3)
+QUERY_NGRAM_SIZES = (2, 3)
+
+# 查询中不参与检索的常见词（按长度从长到短去除）
+STOP_PHRASES = sorted([
+    "帮我", "给我", "看看", "查一下", "查查", "查询", "搜索", "找一下", "找找", "有没有", "有哪些",
+    "哪些", "哪次", "什么时候", "记录", "备注", "笔记", "运动", "的", "了", "过", "我", "吗", "呢",
+], key=len, reverse=True)
+
+# 数值单位 -> (数值类型, 换算系数)
+QUANTITY_UNITS = {
+    "公里": ("distance_m", 1000), "千米": ("distance_m", 1000), "km": ("distance_m", 1000), "k": ("distance_m", 1000),
+    "米": ("distance_m", 1), "m": ("distance_m", 1),
+    "圈": ("laps", 1), "趟": ("laps", 1),
+    "组": ("sets", 1),
+    "个": ("reps", 1), "次": ("reps", 1),
+    "分钟": ("minutes", 1), "min": ("minutes", 1), "小时": ("minutes", 60), "h": ("minutes", 60),
+}
+
+# 紧跟在“个”后面时“个”只是量词（“3个月”“1个小时”“两个星期”），不当作次数
+_MEASURE_WORD_FOLLOWERS = ("月", "小时", "钟头", "星期", "礼拜", "周")
+
+# 查询中含义不确定的单位（“3m”可能指3个月），路由时不据此判断为备注检索
+AMBIGUOUS_UNITS = {"m"}
+
+QUANTITY_LABELS = {"distance_m": "距离（米）", "laps": "圈数", "sets": "组数", "reps": "次数", "minutes": "时长（分钟）"}
+
+_CN_NUMERALS = {"一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9, "十": 10, "半": 0.5}
+
+_QUANTITY_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?|[一二两三四五六七八九十半])\s*(" +
+    "|".join(sorted(map(re.escape, QUANTITY_UNITS), key=len, reverse=True)) +
+    r")(?![a-z])"
+)
+
+
+def normalize(text: str) -> str:
+    """全角转半角、统一小写、去掉空白和标点"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+def ngrams(text: str, sizes: Tuple[int, ...] = NGRAM_SIZES) -> List[str]:
+    """
+    切分字符n-gram（文本短于最小n时整体作为一个词项）
+
+    Args:
+        text: 已归一化的文本
+        sizes: n的取值
+
+    Returns:
+        n-gram列表（含重复，用于词频）
+    """
+    if 0 < len(text) < min(sizes):
+        return [text]
+    return [text[i:i + n] for n in sizes for i in range(len(text) - n + 1)]
+
+
+def extract_quantities(text: str, skip_ambiguous: bool = False) -> Dict[str, float]:
+    """
+    提取文本中的数值（如“5公里”-> distance_m=5000，“20圈”-> laps=20）
+
+    Args:
+        text: 备注或查询文本
+        skip_ambiguous: 是否忽略含义不确定的单位（AMBIGUOUS_UNITS）
+
+    Returns:
+        数值类型 -> 数值（同一类型出现多次时取第一个）
+    """
+    quantities: Dict[str, float] = {}
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    for match in _QUANTITY_PATTERN.finditer(text):
+        number, unit = match.groups()
+        kind, factor = QUANTITY_UNITS[unit]
+        if not number[0].isdigit() and kind == "reps":
+            # “一个”“一次”多为量词，不当作次数
+            continue
+        if unit == "个" and text.startswith(_MEASURE_WORD_FOLLOWERS, match.end()):
+            continue
+        if skip_ambiguous and unit in AMBIGUOUS_UNITS:
+            continue
+        value = float(number) if number[0].isdigit() else _CN_NUMERALS[number]
+        quantities.setdefault(kind, value * factor)
+    return quantities
+
+
+def _document_text(record: Dict[str, Any]) -> str:
+    """参与索引的文本：运动类型 + 备注"""
+    return normalize(f"{record.get('exercise_type', '')}{record.get('notes') or ''}")
+
+
+def _query_text(query: str) -> str:
+    for phrase in STOP_PHRASES:
+        query = query.replace(phrase, " ")
+    return normalize(query)
+
+
+class NoteDocument:
+    """索引中的一条记录"""
+
+    __slots__ = ("record_id", "date", "exercise_type", "notes", "length", "quantities")
+
+    def __init__(self, record: Dict[str, Any], length: int):
+        self.record_id = record["id"]
+        self.date = str(record.get("date", ""))[:10]
+        self.exercise_type = record.get("exercise_type", "")
+        self.notes = record.get("notes") or ""
+        self.length = length
+        self.quantities = extract_quantities(self.notes)
+
+    def to_dict(self, score: float) -> Dict[str, Any]:
+        return {
+            "id": self.record_id,
+            "date": self.date,
+            "exercise_type": self.exercise_type,
+            "notes": self.notes,
+            "quantities": self.quantities,
+            "score": round(score, 3),
+        }
+
+
+class UserNotesIndex:
+    """单个用户的倒排索引"""
+
+    __slots__ = ("postings", "documents", "total_length")
+
+    def __init__(self):
+        # n-gram -> {记录ID: 词频}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.documents: Dict[int, NoteDocument] = {}
+        self.total_length = 0
+
+
+class NotesIndex:
+    """每用户的运动备注倒排索引"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, quantity_boost: float = 2.0):
+        """
+        Args:
+            k1: BM25词频饱和参数
+            b: BM25长度归一化参数
+            quantity_boost: 数值与查询完全一致时的加分倍数（相对最高文本分）
+        """
+        self.k1 = k1
+        self.b = b
+        self.quantity_boost = quantity_boost
+        self.users: Dict[int, UserNotesIndex] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, record: Any):
+        """写入新记录时调用，把运动类型和备注加入该用户的索引"""
+        if isinstance(record, WorkoutRecord):
+            record = record.to_dict()
+        if record.get("id") is None:
+            return
+        grams = Counter(ngrams(_document_text(record)))
+        with self.lock:
+            index = self.users.get(record["user_id"])
+            if index is None:
+                index = self.users[record["user_id"]] = UserNotesIndex()
+            if record["id"] in index.documents:
+                self._remove(index, record["id"])
+            document = NoteDocument(record, sum(grams.values()))
+            index.documents[record["id"]] = document
+            index.total_length += document.length
+            for gram, count in grams.items():
+                index.postings.setdefault(gram, {})[record["id"]] = count
+
+    def _remove(self, index: UserNotesIndex, record_id: int):
+        """删除一条记录（记录被更新时先删后加，调用方持有锁）"""
+        document = index.documents.pop(record_id)
+        index.total_length -= document.length
+        text = _document_text({"exercise_type": document.exercise_type, "notes": document.notes})
+        for gram in set(ngrams(text)):
+            posting = index.postings.get(gram)
+            if posting is not None:
+                posting.pop(record_id, None)
+                if not posting:
+                    del index.postings[gram]
+
+    def bootstrap(self, records: Iterable[Any]):
+        """用已有记录初始化"""
+        for record in records:
+            self.observe(record)
+
+    def search(
+        self,
+        user_id: int,
+        query: str,
+        limit: int = 10,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按相关度检索一个用户的记录
+
+        Args:
+            user_id: 用户ID
+            query: 检索文本（如“跑5公里”），其中的数值用于精确匹配
+            limit: 返回条数
+            start_date: 只返回该日期及之后的记录（YYYY-MM-DD）
+            end_date: 只返回该日期及之前的记录
+
+        Returns:
+            按得分从高到低排列的记录
+        """
+        wanted = extract_quantities(query)
+        grams = Counter(ngrams(_query_text(query), QUERY_NGRAM_SIZES))
+        scores: Dict[int, float] = {}
+        with self.lock:
+            index = self.users.get(user_id)
+            if index is None or not index.documents:
+                return []
+            total = len(index.documents)
+            average_length = index.total_length / total or 1
+            for gram, query_count in grams.items():
+                posting = index.postings.get(gram)
+                if not posting:
+                    continue
+                idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+                for record_id, count in posting.items():
+                    length = index.documents[record_id].length
+                    tf = count * (self.k1 + 1) / (count + self.k1 * (1 - self.b + self.b * length / average_length))
+                    scores[record_id] = scores.get(record_id, 0.0) + idf * tf * query_count
+
+            if wanted:
+                # 数值完全一致的记录加分，同类数值不一致的记录降权
+                best = max(scores.values(), default=1.0)
+                for record_id in list(scores) if scores else list(index.documents):
+                    quantities = index.documents[record_id].quantities
+                    for kind, value in wanted.items():
+                        if kind not in quantities:
+                            continue
+                        if abs(quantities[kind] - value) < 1e-6:
+                            scores[record_id] = scores.get(record_id, 0.0) + self.quantity_boost * best
+                        elif record_id in scores:
+                            scores[record_id] *= 0.5
+
+            results = []
+            for record_id, score in scores.items():
+                document = index.documents[record_id]
+                if start_date and document.date < start_date or end_date and document.date > end_date:
+                    continue
+                results.append(document.to_dict(score))
+        results.sort(key=lambda item: (item["score"], item["date"]), reverse=True)
+        return results[:limit]
+
+    def stats(self, user_id: int) -> Dict[str, int]:
+        with self.lock:
+            index = self.users.get(user_id)
+            if index is None:
+                return {"documents": 0, "terms": 0}
+            return {"documents": len(index.documents), "terms": len(index.postings)}
+
+
+def _create_notes_index() -> NotesIndex:
+    """创建全局备注索引（当前使用模拟数据初始化）"""
+    from database.mock_data import MOCK_WORKOUT_RECORDS
+
+    index = NotesIndex()
+    index.bootstrap(MOCK_WORKOUT_RECORDS)
+    subscribe_workout_written(index.observe)
+    return index
+
+
+# 全局备注索引实例
+notes_index = _create_notes_index()
@@ -0,0 +1,452 @@
+"""workout_records按月分区管理 - 建表、预建分区、归档旧分区、迁移与分区裁剪校验
+
+用法：
+    python -m database.partitioning --ensure            # 预建未来分区
+    python -m database.partitioning --archive           # 归档超出保留期的分区
+    python -m database.partitioning --verify            # 校验工具SQL的分区裁剪
+    python -m database.partitioning --migrate --dry-run # 打印旧表迁移SQL
+"""
+import argparse
+import json
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import config
+from database.connection import DatabaseConnection, db_connection
+from database.models import (
+    WORKOUT_RECORDS_PARTITIONED_TABLE_SCHEMA,
+    WORKOUT_RECORDS_PARTITIONED_TABLE_SCHEMA_POSTGRESQL,
+)
+from database.queries import TODAY_SUMMARY_QUERY, WORKOUT_STATISTICS_QUERY
+from database.streaming import build_workout_records_query
+
+
+PARTITION_NAME_PATTERN = re.compile(r"p(\d{4})(\d{2})$")
+
+
+def month_start(value: date) -> date:
+    """取所在月的第一天"""
+    return value.replace(day=1)
+
+
+def add_months(value: date, months: int) -> date:
+    """月份加减（结果为当月第一天）"""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def iter_months(start: date, end: date) -> List[date]:
+    """返回[start, end]覆盖的所有月份（每月第一天）"""
+    months = []
+    current = month_start(start)
+    while current <= end:
+        months.append(current)
+        current = add_months(current, 1)
+    return months
+
+
+def partition_suffix(month: date) -> str:
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def parse_partition_month(name: str) -> Optional[date]:
+    """从分区名解析月份，pmax/default等返回 None"""
+    match = PARTITION_NAME_PATTERN.search(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def _to_date(value: Any) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def query_date_bounds(params: Dict[str, Any]) -> Tuple[Optional[date], Optional[date]]:
+    """
+    从查询参数推断date列的取值范围
+
+    Returns:
+        (下界, 上界)，无约束的一侧为 None
+    """
+    if params.get("date"):
+        day = _to_date(params["date"])
+        return day, day
+    lower = _to_date(params["start_date"]) if params.get("start_date") else None
+    upper = _to_date(params["end_date"]) if params.get("end_date") else None
+    if params.get("after_date"):
+        after = _to_date(params["after_date"])
+        upper = min(upper, after) if upper else after
+    return lower, upper
+
+
+def expected_partitions(
+    partitions: List[str],
+    lower: Optional[date],
+    upper: Optional[date],
+    first_unbounded: bool = False
+) -> List[str]:
+    """
+    计算日期范围[lower, upper]理论上需要扫描的分区
+
+    Args:
+        partitions: 现有分区名（月分区 + pmax/default兜底分区）
+        lower: 日期下界
+        upper: 日期上界
+        first_unbounded: 第一个月分区是否也容纳更早的日期（MySQL的RANGE分区如此，
+            PostgreSQL中更早的日期落在default分区）
+
+    Returns:
+        应被扫描的分区名列表
+    """
+    monthly = {name: parse_partition_month(name) for name in partitions}
+    covered = sorted(month for month in monthly.values() if month)
+    first_covered = covered[0] if covered else None
+    last_covered = add_months(covered[-1], 1) if covered else None
+
+    result = []
+    for name, month in monthly.items():
+        if month is None:
+            # 兜底分区：范围超出月分区覆盖时才需要扫描
+            beyond_upper = last_covered is None or upper is None or upper >= last_covered
+            beyond_lower = not first_unbounded and (first_covered is None or lower is None or lower < first_covered)
+            if beyond_upper or beyond_lower:
+                result.append(name)
+            continue
+        month_from = date.min if first_unbounded and month == first_covered else month
+        month_end = add_months(month, 1) - timedelta(days=1)
+        if (lower is None or month_end >= lower) and (upper is None or month_from <= upper):
+            result.append(name)
+    return result
+
+
+class PartitionManager:
+    """workout_records按月分区管理"""
+
+    def __init__(self, connection: DatabaseConnection = db_connection, table: str = "workout_records"):
+        self.connection = connection
+        self.table = table
+
+    @property
+    def dialect(self) -> str:
+        return self.connection.config["type"]
+
+    def partition_name(self, month: date, table: Optional[str] = None) -> str:
+        """MySQL分区名为pYYYYMM；PostgreSQL分区是独立的表，名称带表名前缀"""
+        if self.dialect == "mysql":
+            return partition_suffix(month)
+        return f"{table or self.table}_{partition_suffix(month)}"
+
+    def _mysql_partition_clause(self, month: date) -> str:
+        return f"PARTITION {partition_suffix(month)} VALUES LESS THAN ('{add_months(month, 1).isoformat()}')"
+
+    def _postgresql_partition_statement(self, month: date, parent: str, base: str) -> str:
+        return (
+            f"CREATE TABLE IF NOT EXISTS {base}_{partition_suffix(month)} PARTITION OF {parent} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        )
+
+    def create_table_statements(
+        self,
+        first_month: date,
+        last_month: date,
+        table: Optional[str] = None,
+        partition_base: Optional[str] = None
+    ) -> List[str]:
+        """
+        生成创建分区表的DDL
+
+        Args:
+            first_month: 第一个月分区
+            last_month: 最后一个月分区
+            table: 表名，默认为管理的表
+            partition_base: PostgreSQL分区表名前缀（迁移时使用最终表名）
+
+        Returns:
+            DDL语句列表
+        """
+        table = table or self.table
+        months = iter_months(first_month, last_month)
+        if self.dialect == "mysql":
+            clauses = [self._mysql_partition_clause(month) for month in months]
+            clauses.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+            return [WORKOUT_RECORDS_PARTITIONED_TABLE_SCHEMA.format(
+                table=table,
+                partitions=",\n".join(f"    {clause}" for clause in clauses)
+            ).strip()]
+
+        statements = [
+            statement.strip()
+            for statement in WORKOUT_RECORDS_PARTITIONED_TABLE_SCHEMA_POSTGRESQL.format(table=table).split(";")
+            if statement.strip()
+        ]
+        base = partition_base or table
+        statements.extend(self._postgresql_partition_statement(month, table, base) for month in months)
+        return statements
+
+    def list_partitions(self) -> List[str]:
+        """查询表当前的分区名"""
+        if self.dialect == "mysql":
+            rows = self.connection.execute_query(
+                "SELECT PARTITION_NAME AS name FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %(table)s AND PARTITION_NAME IS NOT NULL "
+                "ORDER BY PARTITION_ORDINAL_POSITION",
+                {"table": self.table}
+            )
+        else:
+            rows = self.connection.execute_query(
+                "SELECT c.relname AS name FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = %(table)s ORDER BY c.relname",
+                {"table": self.table}
+            )
+        return [row["name"] for row in rows or []]
+
+    def _monthly_partitions(self) -> List[date]:
+        return sorted(month for month in map(parse_partition_month, self.list_partitions()) if month)
+
+    def ensure_future_partitions(
+        self,
+        months_ahead: int = config.PARTITION_CONFIG["months_ahead"],
+        today: Optional[date] = None,
+        dry_run: bool = False
+    ) -> List[str]:
+        """
+        预建从当月到未来months_ahead个月的分区（已存在的跳过）
+
+        MySQL通过拆分pmax分区实现，PostgreSQL直接创建子表。
+
+        Returns:
+            执行（或dry_run时将要执行）的DDL语句
+        """
+        current = month_start(today or date.today())
+        wanted = iter_months(current, add_months(current, months_ahead))
+        existing = set(self._monthly_partitions())
+        latest = max(existing) if existing else None
+        missing = [month for month in wanted if month not in existing and (latest is None or month > latest)]
+        if not missing:
+            return []
+
+        if self.dialect == "mysql":
+            clauses = [self._mysql_partition_clause(month) for month in missing]
+            clauses.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+            statements = [
+                f"ALTER TABLE {self.table} REORGANIZE PARTITION pmax INTO (\n    "
+                + ",\n    ".join(clauses) + "\n)"
+            ]
+        else:
+            # 若default分区中已有落在新分区范围内的数据，PostgreSQL会拒绝创建，需先搬出
+            statements = [self._postgresql_partition_statement(month, self.table, self.table) for month in missing]
+
+        self._run(statements, dry_run)
+        return statements
+
+    def archive_statements(self, month: date) -> List[str]:
+        """生成把某个月分区移出主表、保留为独立归档表的DDL"""
+        archive = f"{self.table}_archive_{partition_suffix(month)}"
+        if self.dialect == "mysql":
+            partition = partition_suffix(month)
+            return [
+                f"CREATE TABLE IF NOT EXISTS {archive} LIKE {self.table}",
+                f"ALTER TABLE {archive} REMOVE PARTITIONING",
+                f"ALTER TABLE {self.table} EXCHANGE PARTITION {partition} WITH TABLE {archive}",
+                f"ALTER TABLE {self.table} DROP PARTITION {partition}",
+            ]
+        partition = self.partition_name(month)
+        return [
+            f"ALTER TABLE {self.table} DETACH PARTITION {partition}",
+            f"ALTER TABLE {partition} RENAME TO {archive}",
+        ]
+
+    def archive_old_partitions(
+        self,
+        retain_months: int = config.PARTITION_CONFIG["retain_months"],
+        today: Optional[date] = None,
+        dry_run: bool = False
+    ) -> List[str]:
+        """
+        归档早于保留期的月分区（分区被整体摘除，不产生逐行删除）
+
+        Returns:
+            执行（或dry_run时将要执行）的DDL语句
+        """
+        cutoff = add_months(month_start(today or date.today()), -retain_months)
+        statements = []
+        for month in self._monthly_partitions():
+            if month < cutoff:
+                statements.extend(self.archive_statements(month))
+        self._run(statements, dry_run)
+        return statements
+
+    def migration_statements(
+        self,
+        first_month: date,
+        last_month: date,
+        months_ahead: int = config.PARTITION_CONFIG["months_ahead"]
+    ) -> List[str]:
+        """
+        生成把现有未分区表迁移为分区表的SQL（建新表 -> 按月分批复制 -> 追平增量 -> 换名）
+
+        旧表在换名后保留为{table}_legacy，确认无误后再手动删除。
+
+        Args:
+            first_month: 旧表中最早数据所在月份
+            last_month: 旧表中最新数据所在月份
+            months_ahead: 额外预建的未来月份数
+
+        Returns:
+            按顺序执行的SQL语句
+        """
+        new_table = f"{self.table}_partitioned"
+        legacy_table = f"{self.table}_legacy"
+        statements = self.create_table_statements(
+            first_month,
+            add_months(month_start(last_month), months_ahead),
+            table=new_table,
+            partition_base=self.table
+        )
+
+        # 按月分批复制，每批只锁定/扫描一个月的数据
+        for month in iter_months(first_month, last_month):
+            statements.append(
+                f"INSERT INTO {new_table} SELECT * FROM {self.table} "
+                f"WHERE date >= '{month.isoformat()}' AND date < '{add_months(month, 1).isoformat()}'"
+            )
+        # 追平复制期间新写入的记录
+        statements.append(
+            f"INSERT INTO {new_table} SELECT * FROM {self.table} "
+            f"WHERE id > (SELECT COALESCE(MAX(id), 0) FROM {new_table})"
+        )
+
+        if self.dialect == "mysql":
+            statements.append(f"RENAME TABLE {self.table} TO {legacy_table}, {new_table} TO {self.table}")
+        else:
+            statements.extend([
+                f"ALTER TABLE {self.table} RENAME TO {legacy_table}",
+                f"ALTER TABLE {new_table} RENAME TO {self.table}",
+                f"ALTER TABLE {new_table}_default RENAME TO {self.table}_default",
+                f"SELECT setval(pg_get_serial_sequence('{self.table}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM {self.table}))",
+            ])
+            for index in ("user_date", "user_date_created_id", "date"):
+                statements.append(f"ALTER INDEX idx_{new_table}_{index} RENAME TO idx_{self.table}_{index}")
+        return statements
+
+    def migrate_existing_table(self, months_ahead: int = config.PARTITION_CONFIG["months_ahead"],
+                               dry_run: bool = False) -> List[str]:
+        """读取旧表的日期范围并执行迁移"""
+        rows = self.connection.execute_query(
+            f"SELECT MIN(date) AS first_date, MAX(date) AS last_date FROM {self.table}"
+        )
+        today = date.today()
+        first = _to_date(rows[0]["first_date"]) if rows and rows[0]["first_date"] else today
+        last = _to_date(rows[0]["last_date"]) if rows and rows[0]["last_date"] else today
+        statements = self.migration_statements(month_start(first), month_start(max(last, today)), months_ahead)
+        self._run(statements, dry_run)
+        return statements
+
+    def explain_partitions(self, query: str, params: Optional[dict] = None) -> List[str]:
+        """通过EXPLAIN获取查询实际扫描的分区"""
+        if self.dialect == "mysql":
+            rows = self.connection.execute_query(f"EXPLAIN {query}", params) or []
+            scanned = []
+            for row in rows:
+                for name in (row.get("partitions") or "").split(","):
+                    if name and name not in scanned:
+                        scanned.append(name)
+            return scanned
+
+        rows = self.connection.execute_query(f"EXPLAIN (FORMAT JSON) {query}", params) or []
+        plan = rows[0]["QUERY PLAN"] if rows else []
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scanned = []
+
+        def walk(node: Dict[str, Any]):
+            relation = node.get("Relation Name")
+            if relation and relation != self.table and relation not in scanned:
+                scanned.append(relation)
+            for child in node.get("Plans", []):
+                walk(child)
+
+        for entry in plan:
+            walk(entry["Plan"])
+        return scanned
+
+    def verify_pruning(self, query: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        校验查询是否只扫描了日期范围对应的分区
+
+        Returns:
+            {"expected": [...], "scanned": [...], "pruned": bool}
+        """
+        lower, upper = query_date_bounds(params)
+        expected = expected_partitions(
+            self.list_partitions(), lower, upper, first_unbounded=self.dialect == "mysql"
+        )
+        scanned = self.explain_partitions(query, params)
+        return {
+            "expected": expected,
+            "scanned": scanned,
+            "pruned": set(scanned) <= set(expected),
+        }
+
+    def verify_tool_queries(self, user_id: int = 1, today: Optional[date] = None) -> List[Dict[str, Any]]:
+        """对工具层使用的日期查询逐一做分区裁剪校验"""
+        today = today or date.today()
+        week_ago = (today - timedelta(days=6)).isoformat()
+        samples = [
+            ("query_workout_records(date)", *build_workout_records_query(user_id, date=today.isoformat(), limit=100)),
+            ("query_workout_records(range)", *build_workout_records_query(
+                user_id, start_date=week_ago, end_date=today.isoformat(), limit=100)),
+            ("query_workout_records(keyset)", *build_workout_records_query(
+                user_id, after=(week_ago, f"{week_ago} 00:00:00", 0), limit=100)),
+            ("get_today_workout_summary", TODAY_SUMMARY_QUERY, {"user_id": user_id, "date": today.isoformat()}),
+            ("get_workout_statistics", WORKOUT_STATISTICS_QUERY, {
+                "user_id": user_id, "start_date": week_ago, "end_date": today.isoformat()}),
+        ]
+        report = []
+        for name, query, params in samples:
+            if self.dialect == "postgresql" and "GROUP_CONCAT" in query:
+                continue
+            result = self.verify_pruning(query, params)
+            result["query"] = name
+            report.append(result)
+        return report
+
+    def _run(self, statements: List[str], dry_run: bool):
+        if dry_run:
+            return
+        for statement in statements:
+            self.connection.execute_query(statement)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="workout_records按月分区管理")
+    parser.add_argument("--ensure", action="store_true", help="预建未来分区")
+    parser.add_argument("--archive", action="store_true", help="归档超出保留期的分区")
+    parser.add_argument("--verify", action="store_true", help="校验工具SQL的分区裁剪")
+    parser.add_argument("--migrate", action="store_true", help="把现有未分区表迁移为分区表")
+    parser.add_argument("--months-ahead", type=int, default=config.PARTITION_CONFIG["months_ahead"])
+    parser.add_argument("--retain-months", type=int, default=config.PARTITION_CONFIG["retain_months"])
+    parser.add_argument("--dry-run", action="store_true", help="只打印SQL，不执行")
+    args = parser.parse_args()
+
+    manager = PartitionManager()
+    if args.migrate:
+        for statement in manager.migrate_existing_table(args.months_ahead, dry_run=args.dry_run):
+            print(f"{statement};")
+    if args.ensure:
+        for statement in manager.ensure_future_partitions(args.months_ahead, dry_run=args.dry_run):
+            print(f"{statement};")
+    if args.archive:
+        for statement in manager.archive_old_partitions(args.retain_months, dry_run=args.dry_run):
+            print(f"{statement};")
+    if args.verify:
+        for result in manager.verify_tool_queries():
+            status = "✅" if result["pruned"] else "❌"
+            print(f"{status} {result['query']}: 扫描{result['scanned']}，期望{result['expected']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""SQL查询定义 - 工具使用的固定SQL集中在此，便于复用、预编译和分区裁剪校验"""
+from database.connection import register_query
+
+
+# 今日运动汇总（MySQL语法）
+TODAY_SUMMARY_QUERY = """
+SELECT 
+    COUNT(*) as total_workouts,
+    SUM(duration) as total_duration,
+    SUM(calories_burned) as total_calories,
+    AVG(heart_rate_avg) as avg_heart_rate,
+    GROUP_CONCAT(DISTINCT exercise_type) as exercise_types
+FROM workout_records
+WHERE user_id = %(user_id)s AND date = %(date)s
+"""
+
+# 按日统计（日期范围查询）
+WORKOUT_STATISTICS_QUERY = """
+SELECT 
+    date,
+    COUNT(*) as workout_count,
+    SUM(duration) as total_duration,
+    SUM(calories_burned) as total_calories,
+    AVG(heart_rate_avg) as avg_heart_rate
+FROM workout_records
+WHERE user_id = %(user_id)s 
+    AND date BETWEEN %(start_date)s AND %(end_date)s
+GROUP BY date
+ORDER BY date DESC
+"""
+
+# 预计算汇总的范围读取（按主键(user_id, resolution, bucket_start)范围扫描）
+ROLLUP_RANGE_QUERY = """
+SELECT 
+    bucket_start,
+    workout_count,
+    total_duration,
+    total_calories,
+    heart_rate_sum,
+    heart_rate_count
+FROM workout_rollups
+WHERE user_id = %(user_id)s 
+    AND resolution = %(resolution)s
+    AND bucket_start BETWEEN %(start_date)s AND %(end_date)s
+ORDER BY bucket_start
+"""
+
+
+# 注册为命名模板，通过db_connection.execute_named按名称执行（PostgreSQL每个连接只预编译一次）
+TODAY_SUMMARY = register_query("today_summary", TODAY_SUMMARY_QUERY)
+WORKOUT_STATISTICS = register_query("workout_statistics", WORKOUT_STATISTICS_QUERY)
+ROLLUP_RANGE = register_query("rollup_range", ROLLUP_RANGE_QUERY)
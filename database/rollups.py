@@ -0,0 +1,297 @@
+"""多粒度运动汇总 - 按查询范围自动选择日/周/月粒度，任意范围都返回有界且完整的统计
+
+每条记录写入时以O(1)同时累加到所在日、周、月三个汇总桶（预计算的周/月汇总），
+查询时：
+    1. 按范围天数和行数上限选择粒度（day -> week -> month，取第一个不超过上限的）
+    2. 完全落在范围内的周/月直接读取汇总桶
+    3. 范围两端只覆盖部分天数的周/月，用这几天的日汇总补齐（最多两个桶的天数）
+因此一年的“历史分析”最多几十行，结果覆盖范围内的全部记录，不会被LIMIT截断。
+
+平均心率以(总和, 次数)保存，合并任意多个桶后仍然精确。
+"""
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import config
+from database.events import subscribe_workout_written
+from database.models import WorkoutRecord
+
+
+RESOLUTIONS = ("day", "week", "month")
+
+RESOLUTION_LABELS = {"day": "日", "week": "周", "month": "月"}
+
+
+def _as_date(value: Any) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def bucket_start(day: date, resolution: str) -> date:
+    """日期所在汇总桶的起始日（周一 / 每月1日）"""
+    if resolution == "day":
+        return day
+    if resolution == "week":
+        return day - timedelta(days=day.weekday())
+    if resolution == "month":
+        return day.replace(day=1)
+    raise ValueError(f"未知的汇总粒度: {resolution}")
+
+
+def next_bucket(start: date, resolution: str) -> date:
+    """下一个汇总桶的起始日"""
+    if resolution == "day":
+        return start + timedelta(days=1)
+    if resolution == "week":
+        return start + timedelta(days=7)
+    if resolution == "month":
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    raise ValueError(f"未知的汇总粒度: {resolution}")
+
+
+def bucket_count(start: date, end: date, resolution: str) -> int:
+    """范围[start, end]覆盖的汇总桶数"""
+    if end < start:
+        return 0
+    if resolution == "day":
+        return (end - start).days + 1
+    if resolution == "week":
+        return (bucket_start(end, "week") - bucket_start(start, "week")).days // 7 + 1
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def choose_resolution(start: date, end: date, max_rows: int = config.ROLLUP_CONFIG["max_rows"]) -> str:
+    """
+    选择让结果行数不超过上限的最细粒度
+
+    Args:
+        start: 开始日期
+        end: 结束日期
+        max_rows: 结果行数上限
+
+    Returns:
+        "day" / "week" / "month"（范围超过max_rows个月时仍按月汇总）
+    """
+    for resolution in RESOLUTIONS:
+        if bucket_count(start, end, resolution) <= max_rows:
+            return resolution
+    return "month"
+
+
+class RollupBucket:
+    """一个时间桶的累加汇总"""
+
+    __slots__ = ("workout_count", "total_duration", "total_calories", "heart_rate_sum", "heart_rate_count")
+
+    def __init__(self):
+        self.workout_count = 0
+        self.total_duration = 0
+        self.total_calories = 0
+        self.heart_rate_sum = 0
+        self.heart_rate_count = 0
+
+    def add(self, duration: int, calories: int, heart_rate: int):
+        self.workout_count += 1
+        self.total_duration += duration
+        self.total_calories += calories
+        if heart_rate:
+            self.heart_rate_sum += heart_rate
+            self.heart_rate_count += 1
+
+    def merge(self, other: "RollupBucket"):
+        self.workout_count += other.workout_count
+        self.total_duration += other.total_duration
+        self.total_calories += other.total_calories
+        self.heart_rate_sum += other.heart_rate_sum
+        self.heart_rate_count += other.heart_rate_count
+
+    @property
+    def avg_heart_rate(self) -> float:
+        return round(self.heart_rate_sum / self.heart_rate_count, 1) if self.heart_rate_count else 0
+
+    def to_row(self, period_start: date, period_end: date) -> Dict[str, Any]:
+        return {
+            "period_start": period_start.isoformat(),
+            "period_end": period_end.isoformat(),
+            "workout_count": self.workout_count,
+            "total_duration": self.total_duration,
+            "total_calories": self.total_calories,
+            "avg_heart_rate": self.avg_heart_rate,
+        }
+
+
+class RollupStore:
+    """每用户的日/周/月汇总（对应workout_rollups表）"""
+
+    def __init__(self):
+        # (user_id, resolution) -> {桶起始日: 汇总}
+        self.buckets: Dict[Tuple[int, str], Dict[date, RollupBucket]] = {}
+        # user_id -> 有记录的日期（升序，用于补齐部分覆盖的周/月）
+        self.days: Dict[int, List[date]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, record: Any):
+        """写入新记录时调用，增量更新所在的日、周、月汇总"""
+        if isinstance(record, WorkoutRecord):
+            record = record.to_dict()
+        user_id = record["user_id"]
+        day = _as_date(record["date"])
+
+        """
+        实际数据库实现（伪代码）：
+
+        # 与运动记录写在同一事务中（同一分片），三条UPSERT分别累加日、周、月汇总
+        connection = shard_router.connection_for(user_id)
+        connection.execute_many(rollup_upsert_sql(connection.config["type"]), rollup_params(record))
+        """
+
+        with self.lock:
+            for resolution in RESOLUTIONS:
+                buckets = self.buckets.setdefault((user_id, resolution), {})
+                start = bucket_start(day, resolution)
+                bucket = buckets.get(start)
+                if bucket is None:
+                    bucket = buckets[start] = RollupBucket()
+                    if resolution == "day":
+                        insort(self.days.setdefault(user_id, []), start)
+                bucket.add(
+                    record.get("duration", 0) or 0,
+                    record.get("calories_burned", 0) or 0,
+                    record.get("heart_rate_avg", 0) or 0
+                )
+
+    def bootstrap(self, records: Iterable[Any]):
+        """用已有记录初始化"""
+        for record in records:
+            self.observe(record)
+
+    def _sum_days(self, user_id: int, start: date, end: date) -> RollupBucket:
+        """合并[start, end]内的日汇总（调用方持有锁）"""
+        total = RollupBucket()
+        days = self.days.get(user_id, [])
+        daily = self.buckets.get((user_id, "day"), {})
+        for day in days[bisect_left(days, start):bisect_right(days, end)]:
+            total.merge(daily[day])
+        return total
+
+    def summarize(
+        self,
+        user_id: int,
+        start: date,
+        end: date,
+        max_rows: int = config.ROLLUP_CONFIG["max_rows"],
+        resolution: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        按自动选择的粒度汇总一个时间范围
+
+        Args:
+            user_id: 用户ID
+            start: 开始日期（含）
+            end: 结束日期（含）
+            max_rows: 结果行数上限
+            resolution: 指定粒度，默认自动选择
+
+        Returns:
+            {"resolution", "start_date", "end_date", "rows", "total"}，rows按时间升序，
+            只包含有记录的时间段；首尾时间段会裁剪到查询范围内
+        """
+        resolution = resolution or choose_resolution(start, end, max_rows)
+        rows = []
+        total = RollupBucket()
+        with self.lock:
+            buckets = self.buckets.get((user_id, resolution), {})
+            period = bucket_start(start, resolution)
+            while period <= end:
+                following = next_bucket(period, resolution)
+                period_end = following - timedelta(days=1)
+                if period >= start and period_end <= end:
+                    bucket = buckets.get(period)
+                else:
+                    # 部分覆盖的首尾桶：用日汇总补齐
+                    period_start, period_end = max(period, start), min(period_end, end)
+                    bucket = self._sum_days(user_id, period_start, period_end)
+                    period = period_start
+                if bucket is not None and bucket.workout_count:
+                    rows.append(bucket.to_row(period, period_end))
+                    total.merge(bucket)
+                period = following
+        return {
+            "resolution": resolution,
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "rows": rows,
+            "total": total.to_row(start, end),
+        }
+
+
+def rollup_upsert_sql(dialect: str) -> str:
+    """累加汇总的UPSERT语句（%(name)s占位符，参数见rollup_params）"""
+    columns = "user_id, resolution, bucket_start, workout_count, total_duration, total_calories, heart_rate_sum, heart_rate_count"
+    values = (
+        "%(user_id)s, %(resolution)s, %(bucket_start)s, 1, %(duration)s, %(calories)s, "
+        "%(heart_rate)s, %(heart_rate_count)s"
+    )
+    increments = ("workout_count", "total_duration", "total_calories", "heart_rate_sum", "heart_rate_count")
+    if dialect == "mysql":
+        updates = ", ".join(f"{column} = {column} + VALUES({column})" for column in increments)
+        return f"INSERT INTO workout_rollups ({columns}) VALUES ({values}) ON DUPLICATE KEY UPDATE {updates}"
+    updates = ", ".join(f"{column} = workout_rollups.{column} + excluded.{column}" for column in increments)
+    return (
+        f"INSERT INTO workout_rollups ({columns}) VALUES ({values}) "
+        f"ON CONFLICT (user_id, resolution, bucket_start) DO UPDATE SET {updates}"
+    )
+
+
+def rollup_params(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """一条运动记录对应的日、周、月三条UPSERT参数"""
+    day = _as_date(record["date"])
+    heart_rate = record.get("heart_rate_avg", 0) or 0
+    return [
+        {
+            "user_id": record["user_id"],
+            "resolution": resolution,
+            "bucket_start": bucket_start(day, resolution).isoformat(),
+            "duration": record.get("duration", 0) or 0,
+            "calories": record.get("calories_burned", 0) or 0,
+            "heart_rate": heart_rate,
+            "heart_rate_count": 1 if heart_rate else 0,
+        }
+        for resolution in RESOLUTIONS
+    ]
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    """把汇总结果格式化为发送给LLM/用户的文本（最近的时间段在前）"""
+    label = RESOLUTION_LABELS[summary["resolution"]]
+    lines = [f"{summary['start_date']}至{summary['end_date']}的运动统计（按{label}汇总）："]
+    for row in reversed(summary["rows"]):
+        period = row["period_start"]
+        if row["period_end"] != row["period_start"]:
+            period = f"{row['period_start']}~{row['period_end']}"
+        lines.append(
+            f"  {period}: {row['workout_count']}次运动, "
+            f"总时长{row['total_duration']}分钟, "
+            f"消耗{row['total_calories']}卡路里, "
+            f"平均心率{row['avg_heart_rate']:.1f}次/分"
+        )
+    total = summary["total"]
+    lines.append(
+        f"合计：{total['workout_count']}次运动, 总时长{total['total_duration']}分钟, "
+        f"消耗{total['total_calories']}卡路里"
+    )
+    return "\n".join(lines)
+
+
+def _create_rollup_store() -> RollupStore:
+    """创建全局汇总存储（当前使用模拟数据初始化）"""
+    from database.mock_data import MOCK_WORKOUT_RECORDS
+
+    store = RollupStore()
+    store.bootstrap(MOCK_WORKOUT_RECORDS)
+    subscribe_workout_written(store.observe)
+    return store
+
+
+# 全局汇总存储实例
+rollup_store = _create_rollup_store()
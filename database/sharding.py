@@ -0,0 +1,631 @@
+"""按用户分片 - user_id一致性哈希路由到多个数据库，跨分片汇总，不停写迁移
+
+分片映射 = 一致性哈希环（分片名 + 虚拟节点）+ 按用户的显式覆盖（迁移中的用户）。
+增加分片时只有约1/N的用户需要迁移，迁移逐个用户进行：
+    1. 按主键键集分批从源分片复制到目标分片（重复执行幂等）
+    2. 切换该用户的路由（去掉覆盖，哈希环已指向目标分片），保存映射文件
+       并等待switch_grace_seconds：各进程每reload_seconds检查一次映射文件，
+       等待时间需大于检查间隔 + 最长的一次写入，之后不再有写入进入源分片
+    3. 补齐复制期间写入源分片的新行（汇总表等原地累加的表在此时整体累加到目标分片）
+    4. 校验行数后删除源分片上的数据
+各分片上的记录id需全局唯一（如MySQL的auto_increment_increment/offset），迁移时id保持不变。
+
+用法：
+    python -m database.sharding --init-schema
+    python -m database.sharding --status
+    python -m database.sharding --rebalance --shards shard0,shard1,shard2
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import config
+from database.connection import DatabaseConnection
+from database.models import (
+    WORKOUT_RECORDS_TABLE_SCHEMA, WORKOUT_RECORDS_TABLE_SCHEMA_POSTGRESQL, WORKOUT_RECORDS_TABLE_SCHEMA_SQLITE,
+    HEART_RATE_SAMPLES_TABLE_SCHEMA, HEART_RATE_SAMPLES_TABLE_SCHEMA_POSTGRESQL, HEART_RATE_SAMPLES_TABLE_SCHEMA_SQLITE,
+    WORKOUT_ROLLUPS_TABLE_SCHEMA, WORKOUT_ROLLUPS_TABLE_SCHEMA_POSTGRESQL, WORKOUT_ROLLUPS_TABLE_SCHEMA_SQLITE
+)
+
+
+# 按用户分片的表：表名 -> 用户内的主键列（迁移时按其键集分批复制）
+SHARDED_TABLES: Dict[str, Tuple[str, ...]] = {
+    "workout_records": ("id",),
+    "heart_rate_samples": ("workout_id", "sample_time"),
+    "workout_rollups": ("resolution", "bucket_start"),
+}
+
+# 原地累加的表：表名 -> 累加列。已有行在复制后仍会被更新，不能按键集补齐，
+# 改为切换路由后一次性把源分片的行累加到目标分片（目标分片上切换后的新增量随之合并）
+ACCUMULATED_TABLES: Dict[str, Tuple[str, ...]] = {
+    "workout_rollups": ("workout_count", "total_duration", "total_calories", "heart_rate_sum", "heart_rate_count"),
+}
+
+SCHEMAS = {
+    "mysql": [WORKOUT_RECORDS_TABLE_SCHEMA, HEART_RATE_SAMPLES_TABLE_SCHEMA, WORKOUT_ROLLUPS_TABLE_SCHEMA],
+    "postgresql": [
+        WORKOUT_RECORDS_TABLE_SCHEMA_POSTGRESQL, HEART_RATE_SAMPLES_TABLE_SCHEMA_POSTGRESQL,
+        WORKOUT_ROLLUPS_TABLE_SCHEMA_POSTGRESQL
+    ],
+    "sqlite": [
+        WORKOUT_RECORDS_TABLE_SCHEMA_SQLITE, HEART_RATE_SAMPLES_TABLE_SCHEMA_SQLITE, WORKOUT_ROLLUPS_TABLE_SCHEMA_SQLITE
+    ],
+}
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class ConsistentHashRing:
+    """一致性哈希环"""
+
+    def __init__(self, shards: Iterable[str], vnodes: int = 128):
+        self.vnodes = vnodes
+        self.shards: List[str] = list(shards)
+        self.points: List[int] = []
+        self.owners: List[str] = []
+        self._rebuild()
+
+    def _rebuild(self):
+        ring = sorted(
+            (_hash(f"{shard}#{i}"), shard)
+            for shard in self.shards
+            for i in range(self.vnodes)
+        )
+        self.points = [point for point, _ in ring]
+        self.owners = [shard for _, shard in ring]
+
+    def add(self, shard: str):
+        if shard not in self.shards:
+            self.shards.append(shard)
+            self._rebuild()
+
+    def remove(self, shard: str):
+        if shard in self.shards:
+            self.shards.remove(shard)
+            self._rebuild()
+
+    def shard_for(self, user_id: int) -> str:
+        """用户所在的分片（顺时针方向第一个虚拟节点）"""
+        if not self.points:
+            raise ValueError("哈希环上没有分片")
+        index = bisect.bisect(self.points, _hash(f"user:{user_id}")) % len(self.points)
+        return self.owners[index]
+
+
+class ShardMap:
+    """分片映射：哈希环 + 按用户覆盖，可持久化为JSON
+
+    多个进程（如预分叉服务的工作进程与迁移工具）共用同一个映射文件：每次保存递增版本号并原子替换文件，
+    路由时最多每reload_seconds检查一次文件，文件被其他进程更新时重新加载。本进程有未保存的修改时不重新加载。
+    """
+
+    def __init__(
+        self,
+        shards: Iterable[str],
+        vnodes: int = 128,
+        overrides: Optional[Dict[int, str]] = None,
+        path: Optional[str] = None,
+        reload_seconds: float = 0.0,
+        version: int = 0
+    ):
+        """
+        Args:
+            shards: 哈希环上的分片
+            vnodes: 每个分片的虚拟节点数
+            overrides: 按用户的显式覆盖
+            path: 映射文件路径
+            reload_seconds: 检查映射文件是否被其他进程更新的间隔，0表示不检查
+            version: 映射版本号（每次保存递增）
+        """
+        self.ring = ConsistentHashRing(shards, vnodes)
+        self.overrides: Dict[int, str] = dict(overrides or {})
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.version = version
+        self.dirty = False
+        self.lock = threading.Lock()
+        self._signature = self._file_signature()
+        self._next_check = time.monotonic() + reload_seconds
+
+    @property
+    def shards(self) -> List[str]:
+        return list(self.ring.shards)
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        """映射文件的(inode, 修改时间, 大小)，原子替换后inode必然变化"""
+        try:
+            stat = os.stat(self.path) if self.path else None
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size) if stat else None
+
+    def _maybe_reload(self):
+        """到了检查时间且文件已被其他进程更新时重新加载（调用方持有锁）"""
+        if self.reload_seconds <= 0 or not self.path:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_seconds
+        signature = self._file_signature()
+        if signature is None or signature == self._signature or self.dirty:
+            return
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.ring = ConsistentHashRing(data["shards"], data.get("vnodes", self.ring.vnodes))
+        self.overrides = {int(user_id): shard for user_id, shard in data.get("overrides", {}).items()}
+        self.version = data.get("version", 0)
+        self._signature = signature
+
+    def reload(self):
+        """立即检查映射文件（不等检查间隔）"""
+        with self.lock:
+            self._next_check = 0.0
+            self._maybe_reload()
+
+    def shard_for(self, user_id: int) -> str:
+        with self.lock:
+            self._maybe_reload()
+            return self.overrides.get(user_id) or self.ring.shard_for(user_id)
+
+    def set_override(self, user_id: int, shard: str):
+        with self.lock:
+            self.overrides[user_id] = shard
+            self.dirty = True
+
+    def clear_override(self, user_id: int):
+        with self.lock:
+            self.overrides.pop(user_id, None)
+            self.dirty = True
+
+    def set_shards(self, shards: Sequence[str]):
+        """替换哈希环上的分片集合"""
+        with self.lock:
+            self.ring = ConsistentHashRing(shards, self.ring.vnodes)
+            self.dirty = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return self._to_dict()
+
+    def _to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "shards": list(self.ring.shards),
+            "vnodes": self.ring.vnodes,
+            "overrides": {str(user_id): shard for user_id, shard in self.overrides.items()},
+        }
+
+    def save(self):
+        """持久化（版本号加一，先写临时文件再替换，迁移中断后可从覆盖表恢复）"""
+        if not self.path:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.lock:
+            self.version += 1
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._to_dict(), f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self._signature = self._file_signature()
+            self.dirty = False
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        default_shards: Iterable[str],
+        vnodes: int = 128,
+        reload_seconds: float = 0.0
+    ) -> "ShardMap":
+        """从文件加载，文件不存在时按default_shards新建"""
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            overrides = {int(user_id): shard for user_id, shard in data.get("overrides", {}).items()}
+            return cls(
+                data["shards"], data.get("vnodes", vnodes), overrides, path, reload_seconds, data.get("version", 0)
+            )
+        return cls(sorted(default_shards), vnodes, path=path, reload_seconds=reload_seconds)
+
+
+class ShardRouter:
+    """按用户路由到分片数据库连接（每个线程每个分片一个连接）"""
+
+    def __init__(self, shard_configs: Dict[str, Dict[str, Any]], shard_map: ShardMap):
+        """
+        Args:
+            shard_configs: 分片名 -> 数据库配置（可包含哈希环之外、正在下线的分片）
+            shard_map: 分片映射
+        """
+        self.shard_configs = dict(shard_configs)
+        self.shard_map = shard_map
+        self.local = threading.local()
+        self.connections: List[DatabaseConnection] = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, sharding_config: Dict[str, Any] = config.SHARDING_CONFIG) -> "ShardRouter":
+        """
+        按配置创建路由：分片配置文件 > N个本地SQLite分片 > 单个default分片（DATABASE_CONFIG）
+        """
+        if sharding_config.get("config_file"):
+            with open(sharding_config["config_file"], encoding="utf-8") as f:
+                shard_configs = json.load(f)
+        elif sharding_config.get("local_shards", 0) > 0:
+            shard_configs = {
+                f"shard{i}": {
+                    "type": "sqlite",
+                    "database": os.path.join(sharding_config["local_dir"], f"shard{i}.db"),
+                }
+                for i in range(sharding_config["local_shards"])
+            }
+        else:
+            shard_configs = {"default": config.DATABASE_CONFIG}
+        shard_map = ShardMap.load(
+            sharding_config.get("map_path"), shard_configs, sharding_config.get("vnodes", 128),
+            sharding_config.get("reload_seconds", 0.0)
+        )
+        return cls(shard_configs, shard_map)
+
+    @property
+    def shards(self) -> List[str]:
+        """所有已配置的分片"""
+        return list(self.shard_configs)
+
+    def add_shard(self, name: str, db_config: Dict[str, Any]):
+        """登记新分片的连接配置（不改变路由，需经Rebalancer迁移后生效）"""
+        self.shard_configs[name] = db_config
+
+    def connection(self, shard: str) -> DatabaseConnection:
+        """当前线程到指定分片的连接"""
+        cache = getattr(self.local, "connections", None)
+        if cache is None:
+            cache = self.local.connections = {}
+        connection = cache.get(shard)
+        if connection is None:
+            if shard not in self.shard_configs:
+                raise ValueError(f"未配置的分片: {shard}")
+            connection = cache[shard] = DatabaseConnection(self.shard_configs[shard])
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def shard_for(self, user_id: int) -> str:
+        return self.shard_map.shard_for(user_id)
+
+    def connection_for(self, user_id: int) -> DatabaseConnection:
+        """用户所在分片的连接"""
+        return self.connection(self.shard_for(user_id))
+
+    def execute_for(self, user_id: int, query: str, params: Optional[dict] = None):
+        """在用户所在分片执行查询"""
+        return self.connection_for(user_id).execute_query(query, params)
+
+    def scatter_gather(
+        self,
+        query: str,
+        params: Optional[dict] = None,
+        shards: Optional[Iterable[str]] = None,
+        max_workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        在多个分片上并行执行同一查询（跨用户任务使用）
+
+        Args:
+            query: SQL
+            params: 查询参数
+            shards: 目标分片，默认全部已配置分片
+            max_workers: 并行度，默认分片数
+
+        Returns:
+            分片名 -> 该分片的执行结果
+        """
+        shards = list(shards or self.shards)
+        if not shards:
+            return {}
+        with ThreadPoolExecutor(max_workers=max_workers or len(shards), thread_name_prefix="shard") as pool:
+            futures = {shard: pool.submit(self._execute_on, shard, query, params) for shard in shards}
+            return {shard: future.result() for shard, future in futures.items()}
+
+    def gather_rows(self, query: str, params: Optional[dict] = None) -> List[Dict[str, Any]]:
+        """scatter_gather并合并各分片的结果行"""
+        rows: List[Dict[str, Any]] = []
+        for result in self.scatter_gather(query, params).values():
+            rows.extend(result)
+        return rows
+
+    def _execute_on(self, shard: str, query: str, params: Optional[dict]):
+        # 工作线程结束后连接随线程对象释放，这里使用独立连接
+        connection = DatabaseConnection(self.shard_configs[shard])
+        try:
+            return connection.execute_query(query, params)
+        finally:
+            connection.close()
+
+    def create_schema(self, shards: Optional[Iterable[str]] = None):
+        """在各分片上建表"""
+        for shard in shards or self.shards:
+            connection = self.connection(shard)
+            for schema in SCHEMAS[self.shard_configs[shard]["type"]]:
+                for statement in schema.split(";"):
+                    if statement.strip():
+                        connection.execute_query(statement)
+
+    def close(self):
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for connection in connections:
+            connection.close()
+        self.local = threading.local()
+
+
+def _insert_ignore(dialect: str, table: str, columns: Sequence[str]) -> str:
+    """幂等插入语句（迁移中断后重跑不会因主键冲突失败）"""
+    column_list = ", ".join(columns)
+    values = ", ".join(["%s"] * len(columns))
+    if dialect == "mysql":
+        return f"INSERT IGNORE INTO {table} ({column_list}) VALUES ({values})"
+    if dialect == "sqlite":
+        return f"INSERT OR IGNORE INTO {table} ({column_list}) VALUES ({values})"
+    return f"INSERT INTO {table} ({column_list}) VALUES ({values}) ON CONFLICT DO NOTHING"
+
+
+def _insert_add(
+    dialect: str, table: str, columns: Sequence[str], keys: Sequence[str], increments: Sequence[str]
+) -> str:
+    """累加插入语句（目标分片已有同键行时把累加列相加）"""
+    column_list = ", ".join(columns)
+    values = ", ".join(["%s"] * len(columns))
+    if dialect == "mysql":
+        updates = ", ".join(f"{column} = {column} + VALUES({column})" for column in increments)
+        return f"INSERT INTO {table} ({column_list}) VALUES ({values}) ON DUPLICATE KEY UPDATE {updates}"
+    conflict = ", ".join(("user_id",) + tuple(keys))
+    updates = ", ".join(f"{column} = {table}.{column} + excluded.{column}" for column in increments)
+    return f"INSERT INTO {table} ({column_list}) VALUES ({values}) ON CONFLICT ({conflict}) DO UPDATE SET {updates}"
+
+
+class Rebalancer:
+    """分片迁移工具（服务进程需通过同一映射文件的定期重新加载感知路由切换）"""
+
+    def __init__(
+        self,
+        router: ShardRouter,
+        tables: Optional[Dict[str, Tuple[str, ...]]] = None,
+        batch_size: int = 1000,
+        switch_grace: Optional[float] = None,
+        switch_batch: int = 100
+    ):
+        """
+        Args:
+            router: 分片路由
+            tables: 迁移的表及其主键列
+            batch_size: 每批复制的行数
+            switch_grace: 切换路由后等待多久再补齐并删除源数据，默认取配置switch_grace_seconds
+            switch_batch: rebalance时一次切换路由（共用一次等待）的用户数
+        """
+        self.router = router
+        self.tables = tables or SHARDED_TABLES
+        self.batch_size = batch_size
+        self.switch_grace = (
+            config.SHARDING_CONFIG.get("switch_grace_seconds", 5.0) if switch_grace is None else switch_grace
+        )
+        self.switch_batch = switch_batch
+
+    def users_by_shard(self) -> Dict[str, List[int]]:
+        """各分片上实际存有数据的用户"""
+        result = self.router.scatter_gather("SELECT DISTINCT user_id FROM workout_records")
+        return {shard: sorted(row["user_id"] for row in rows) for shard, rows in result.items()}
+
+    def _copy_table(
+        self,
+        user_id: int,
+        table: str,
+        keys: Tuple[str, ...],
+        source: DatabaseConnection,
+        target: DatabaseConnection,
+        after: Optional[tuple] = None
+    ) -> Tuple[int, Optional[tuple]]:
+        """按主键键集分批复制一个用户的行，返回(复制行数, 最后一行的主键)；累加表的行累加到目标分片"""
+        increments = ACCUMULATED_TABLES.get(table)
+        order = ", ".join(keys)
+        copied = 0
+        while True:
+            params: Dict[str, Any] = {"user_id": user_id, "limit": self.batch_size}
+            condition = ""
+            if after is not None:
+                placeholders = ", ".join(f"%(k_{i})s" for i in range(len(keys)))
+                condition = f" AND ({order}) > ({placeholders})"
+                params.update({f"k_{i}": value for i, value in enumerate(after)})
+            rows = source.execute_query(
+                f"SELECT * FROM {table} WHERE user_id = %(user_id)s{condition} "
+                f"ORDER BY {order} LIMIT %(limit)s",
+                params
+            )
+            if not rows:
+                return copied, after
+            columns = list(rows[0])
+            dialect = target.config["type"]
+            target.execute_many(
+                _insert_add(dialect, table, columns, keys, increments) if increments
+                else _insert_ignore(dialect, table, columns),
+                [tuple(row[column] for column in columns) for row in rows]
+            )
+            copied += len(rows)
+            after = tuple(rows[-1][key] for key in keys)
+            if len(rows) < self.batch_size:
+                return copied, after
+
+    @staticmethod
+    def _count(connection: DatabaseConnection, table: str, user_id: int) -> int:
+        rows = connection.execute_query(
+            f"SELECT COUNT(*) AS n FROM {table} WHERE user_id = %(user_id)s", {"user_id": user_id}
+        )
+        return rows[0]["n"]
+
+    def _copy_user(self, user_id: int, source: DatabaseConnection, target: DatabaseConnection) -> Dict[str, tuple]:
+        """1. 批量复制（累加表留到切换路由后一次性合并），返回各表的(复制行数, 最后主键)"""
+        return {
+            table: (0, None) if table in ACCUMULATED_TABLES else self._copy_table(user_id, table, keys, source, target)
+            for table, keys in self.tables.items()
+        }
+
+    def _switch_route(self, user_id: int, target_shard: str):
+        """2. 切换路由（调用方负责save）：各进程重新加载映射后写入目标分片"""
+        shard_map = self.router.shard_map
+        if shard_map.ring.shard_for(user_id) == target_shard:
+            shard_map.clear_override(user_id)
+        else:
+            shard_map.set_override(user_id, target_shard)
+
+    def _finish_user(
+        self,
+        user_id: int,
+        source: DatabaseConnection,
+        target: DatabaseConnection,
+        progress: Dict[str, tuple]
+    ) -> Dict[str, int]:
+        """3. 补齐复制期间写入源分片的行（累加表此时整体合并），4. 校验后删除源数据"""
+        moved = {}
+        for table, keys in self.tables.items():
+            copied, last = progress[table]
+            extra, _ = self._copy_table(user_id, table, keys, source, target, after=last)
+            source_count = self._count(source, table, user_id)
+            target_count = self._count(target, table, user_id)
+            if target_count < source_count:
+                raise RuntimeError(
+                    f"用户{user_id}的{table}迁移校验失败：源{source_count}行，目标{target_count}行"
+                )
+            source.execute_query(f"DELETE FROM {table} WHERE user_id = %(user_id)s", {"user_id": user_id})
+            moved[table] = copied + extra
+        return moved
+
+    def migrate_user(self, user_id: int, source_shard: str, target_shard: str) -> Dict[str, int]:
+        """
+        把一个用户的数据从源分片迁移到目标分片
+
+        调用前该用户应通过覆盖固定在源分片；本方法复制完成后切换路由，
+        等待switch_grace让其他进程重新加载映射、写完进行中的写入，再补齐并删除源数据。
+
+        Returns:
+            表名 -> 迁移行数
+        """
+        source = self.router.connection(source_shard)
+        target = self.router.connection(target_shard)
+        progress = self._copy_user(user_id, source, target)
+        self._switch_route(user_id, target_shard)
+        self.router.shard_map.save()
+        time.sleep(self.switch_grace)
+        return self._finish_user(user_id, source, target, progress)
+
+    def plan(self, target_shards: Sequence[str]) -> List[Tuple[int, str, str]]:
+        """
+        计算切换到target_shards后需要迁移的用户
+
+        Returns:
+            [(用户ID, 当前分片, 目标分片)]
+        """
+        new_ring = ConsistentHashRing(target_shards, self.router.shard_map.ring.vnodes)
+        moves = []
+        for shard, user_ids in self.users_by_shard().items():
+            for user_id in user_ids:
+                target = new_ring.shard_for(user_id)
+                if target != shard:
+                    moves.append((user_id, shard, target))
+        return moves
+
+    def rebalance(self, target_shards: Sequence[str]) -> Dict[str, Any]:
+        """
+        切换到新的分片集合（增加或下线分片），服务进程无需停写
+
+        先把需要迁移的用户固定在当前分片，再替换哈希环，然后每switch_batch个用户一批：
+        复制、一次保存切换这批用户的路由、等待switch_grace、补齐并删除源数据。
+        中断后重新执行即可继续：已迁移的用户不再出现在计划中，幂等复制可安全重放。
+
+        Returns:
+            迁移报告
+        """
+        missing = [shard for shard in target_shards if shard not in self.router.shard_configs]
+        if missing:
+            raise ValueError(f"未配置的分片: {', '.join(missing)}")
+
+        shard_map = self.router.shard_map
+        moves = self.plan(target_shards)
+        for user_id, source_shard, _ in moves:
+            shard_map.set_override(user_id, source_shard)
+        shard_map.set_shards(target_shards)
+        shard_map.save()
+        # 等其他进程看到固定覆盖后再复制，避免其按新哈希环写入目标分片
+        if moves:
+            time.sleep(self.switch_grace)
+
+        rows = 0
+        for offset in range(0, len(moves), self.switch_batch):
+            batch = [
+                (user_id, self.router.connection(source_shard), self.router.connection(target_shard), target_shard)
+                for user_id, source_shard, target_shard in moves[offset:offset + self.switch_batch]
+            ]
+            progress = [self._copy_user(user_id, source, target) for user_id, source, target, _ in batch]
+            for user_id, _, _, target_shard in batch:
+                self._switch_route(user_id, target_shard)
+            shard_map.save()
+            time.sleep(self.switch_grace)
+            for (user_id, source, target, _), user_progress in zip(batch, progress):
+                rows += sum(self._finish_user(user_id, source, target, user_progress).values())
+        return {"users_moved": len(moves), "rows_moved": rows, "shards": list(target_shards)}
+
+    def status(self) -> Dict[str, Any]:
+        """各分片的用户数和记录数，以及迁移中（有覆盖）的用户"""
+        counts = self.router.scatter_gather(
+            "SELECT COUNT(DISTINCT user_id) AS users, COUNT(*) AS records FROM workout_records"
+        )
+        return {
+            "version": self.router.shard_map.version,
+            "ring": self.router.shard_map.shards,
+            "shards": {shard: rows[0] for shard, rows in counts.items()},
+            "overrides": dict(self.router.shard_map.overrides),
+        }
+
+
+# 全局分片路由（未配置分片时只有default一个分片）
+shard_router = ShardRouter.from_config()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="用户分片管理")
+    parser.add_argument("--init-schema", action="store_true", help="在所有分片上建表")
+    parser.add_argument("--status", action="store_true", help="查看各分片的数据分布")
+    parser.add_argument("--rebalance", action="store_true", help="迁移到--shards指定的分片集合")
+    parser.add_argument("--shards", help="目标分片集合（逗号分隔），默认全部已配置分片")
+    parser.add_argument("--dry-run", action="store_true", help="只输出迁移计划")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    rebalancer = Rebalancer(shard_router, batch_size=args.batch_size)
+    if args.init_schema:
+        shard_router.create_schema()
+        print(f"已在{len(shard_router.shards)}个分片上建表")
+    if args.rebalance:
+        target_shards = args.shards.split(",") if args.shards else shard_router.shards
+        if args.dry_run:
+            for user_id, source_shard, target_shard in rebalancer.plan(target_shards):
+                print(f"用户{user_id}: {source_shard} -> {target_shard}")
+        else:
+            print(json.dumps(rebalancer.rebalance(target_shards), ensure_ascii=False))
+    if args.status or not (args.init_schema or args.rebalance):
+        print(json.dumps(rebalancer.status(), ensure_ascii=False, indent=2))
+    shard_router.close()
+
+
+if __name__ == "__main__":
+    main()
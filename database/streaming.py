@@ -0,0 +1,203 @@
+"""运动记录流式读取 - 服务端游标 + 基于(date, created_at, id)的键集分页"""
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from database.connection import DatabaseConnection, QUERY_TEMPLATES, db_connection, register_query
+from database.models import WorkoutRecord
+
+
+# 键集分页游标：上一页最后一条记录的(date, created_at, id)
+KeysetCursor = Tuple[str, str, int]
+
+
+@lru_cache(maxsize=None)
+def workout_records_template(
+    by_date: bool,
+    by_range: bool,
+    by_type: bool,
+    keyset: bool,
+    limited: bool
+) -> str:
+    """
+    按过滤条件组合生成并注册运动记录查询模板（每种组合只拼接一次SQL）
+
+    Returns:
+        模板名称，可用于DatabaseConnection.execute_named
+    """
+    query = "SELECT * FROM workout_records WHERE user_id = %(user_id)s"
+    if by_date:
+        query += " AND date = %(date)s"
+    elif by_range:
+        query += " AND date BETWEEN %(start_date)s AND %(end_date)s"
+    if by_type:
+        query += " AND exercise_type = %(exercise_type)s"
+    if keyset:
+        # 单独的date上界让分区表可以按日期裁剪（行值比较本身不参与裁剪）
+        query += (
+            " AND date <= %(after_date)s"
+            " AND (date, created_at, id) < (%(after_date)s, %(after_created_at)s, %(after_id)s)"
+        )
+    query += " ORDER BY date DESC, created_at DESC, id DESC"
+    if limited:
+        query += " LIMIT %(limit)s"
+
+    flags = "".join(flag if on else "-" for flag, on in zip("drtkl", (by_date, by_range, by_type, keyset, limited)))
+    return register_query(f"workout_records[{flags}]", query)
+
+
+def build_workout_records_named(
+    user_id: int,
+    date: Optional[str] = None,
+    exercise_type: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    after: Optional[KeysetCursor] = None,
+    limit: Optional[int] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    选择运动记录查询模板并组装参数
+
+    排序键为(date, created_at, id)降序，与idx_user_date_created_id索引一致，
+    传入after时只返回排在该游标之后的记录，翻页代价与页码无关。
+
+    Args:
+        user_id: 用户ID
+        date: 指定日期
+        exercise_type: 运动类型
+        start_date: 开始日期
+        end_date: 结束日期
+        after: 上一页最后一条记录的键集游标
+        limit: 返回数量限制，None 表示不限制（用于流式读取）
+
+    Returns:
+        (模板名称, 参数字典)
+    """
+    params: Dict[str, Any] = {"user_id": user_id}
+    by_range = bool(not date and start_date and end_date)
+    if date:
+        params["date"] = date
+    elif by_range:
+        params["start_date"] = start_date
+        params["end_date"] = end_date
+    if exercise_type:
+        params["exercise_type"] = exercise_type
+    if after:
+        params["after_date"], params["after_created_at"], params["after_id"] = after
+    if limit is not None:
+        params["limit"] = limit
+
+    name = workout_records_template(bool(date), by_range, bool(exercise_type), bool(after), limit is not None)
+    return name, params
+
+
+def build_workout_records_query(
+    user_id: int,
+    date: Optional[str] = None,
+    exercise_type: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    after: Optional[KeysetCursor] = None,
+    limit: Optional[int] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    构建运动记录查询SQL（参数同build_workout_records_named）
+
+    Returns:
+        (SQL语句, 参数字典)
+    """
+    name, params = build_workout_records_named(user_id, date, exercise_type, start_date, end_date, after, limit)
+    return QUERY_TEMPLATES[name], params
+
+
+def record_cursor(record: Dict[str, Any]) -> KeysetCursor:
+    """取一条记录的键集游标"""
+    return (str(record["date"]), str(record["created_at"]), record["id"])
+
+
+def encode_cursor(cursor: KeysetCursor) -> str:
+    """把键集游标编码为字符串，便于在接口间传递"""
+    return "|".join(str(part) for part in cursor)
+
+
+def decode_cursor(value: str) -> KeysetCursor:
+    """解析encode_cursor生成的字符串"""
+    record_date, created_at, record_id = value.split("|")
+    return (record_date, created_at, int(record_id))
+
+
+def fetch_workout_page(
+    user_id: int,
+    page_size: int = 100,
+    after: Optional[KeysetCursor] = None,
+    connection: DatabaseConnection = db_connection,
+    **filters
+) -> Tuple[List[Dict[str, Any]], Optional[KeysetCursor]]:
+    """
+    按键集分页读取一页运动记录
+
+    Returns:
+        (本页记录, 下一页游标)；没有更多数据时游标为 None
+    """
+    name, params = build_workout_records_named(user_id, after=after, limit=page_size, **filters)
+    rows = connection.execute_named(name, params) or []
+    next_cursor = record_cursor(rows[-1]) if len(rows) == page_size else None
+    return rows, next_cursor
+
+
+def iter_workout_records(
+    user_id: int,
+    page_size: int = 1000,
+    batch_size: int = 500,
+    connection: DatabaseConnection = db_connection,
+    **filters
+) -> Iterator[Dict[str, Any]]:
+    """
+    惰性遍历用户的全部运动记录
+
+    按page_size逐页发起键集查询，每页再经服务端游标以batch_size行为单位拉取，
+    长历史也不会在数据库端产生大偏移扫描或在客户端堆积结果。
+
+    Args:
+        user_id: 用户ID
+        page_size: 每页记录数（每页一条SQL）
+        batch_size: 每次fetchmany的行数
+        connection: 数据库连接
+        **filters: date / exercise_type / start_date / end_date 过滤条件
+
+    Yields:
+        运动记录字典，按(date, created_at, id)降序
+    """
+    after = None
+    while True:
+        query, params = build_workout_records_query(user_id, after=after, limit=page_size, **filters)
+        count = 0
+        last = None
+        for row in connection.stream_query(query, params, batch_size=batch_size):
+            count += 1
+            last = row
+            yield row
+        if count < page_size:
+            return
+        after = record_cursor(last)
+
+
+def iter_workout_batches(
+    user_id: int,
+    batch_size: int = 1000,
+    connection: DatabaseConnection = db_connection,
+    **filters
+) -> Iterator[List[WorkoutRecord]]:
+    """
+    按批惰性读取用户的全部运动记录，直接从行元组批量构造WorkoutRecord
+
+    Args:
+        user_id: 用户ID
+        batch_size: 每批（每次fetchmany）的行数
+        connection: 数据库连接
+        **filters: date / exercise_type / start_date / end_date 过滤条件
+
+    Yields:
+        运动记录列表，按(date, created_at, id)降序
+    """
+    query, params = build_workout_records_query(user_id, **filters)
+    for columns, rows in connection.stream_rows(query, params, batch_size=batch_size):
+        yield WorkoutRecord.from_rows(rows, columns)
@@ -0,0 +1 @@
+"""批处理任务模块 - 面向全部用户的离线任务"""
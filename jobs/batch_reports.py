@@ -0,0 +1,399 @@
+"""全量用户周报批处理 - 多进程计算周统计，有界并发的异步阶段生成LLM点评
+
+两个阶段流水线执行：
+    聚合阶段：用户按块分发到ProcessPoolExecutor，每个工作进程持有自己的分片路由和连接，
+             流式读取两周的记录并按列计算统计量（纯CPU，随核数线性扩展）
+    点评阶段：每块聚合结果一返回就进入有界队列，由固定数量的协程调用LLM生成点评（I/O密集）
+
+用法：
+    python -m jobs.batch_reports --users 1-10000 --source synthetic --no-llm
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, timedelta
+from itertools import compress
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import config
+from database.connection import DatabaseConnection
+from database.sharding import ShardRouter
+from database.mock_data import generate_mock_records, iter_mock_records
+from database.models import dicts_to_columns
+
+
+# 工作进程内的数据源和分片路由（由_init_worker设置）
+_worker_source = "mock"
+_worker_router: Optional[ShardRouter] = None
+
+
+def _init_worker(source: str):
+    """工作进程初始化：每个进程建立自己的分片路由和连接（连接不能跨进程共享）"""
+    global _worker_source, _worker_router
+    _worker_source = source
+    if source == "database":
+        _worker_router = ShardRouter.from_config()
+
+
+def load_user_records(
+    user_id: int,
+    start: date,
+    end: date,
+    source: str = "mock",
+    connection: Optional[DatabaseConnection] = None
+) -> Iterable[Dict[str, Any]]:
+    """
+    读取用户在[start, end]内的运动记录
+
+    Args:
+        user_id: 用户ID
+        start: 开始日期
+        end: 结束日期
+        source: 数据源（database / mock / synthetic）
+        connection: source为database时使用的连接
+
+    Returns:
+        运动记录（database数据源为流式迭代器）
+    """
+    if source == "synthetic":
+        return generate_mock_records(user_id, start, end)
+    if source == "mock":
+        return iter_mock_records(user_id, start_date=start.isoformat(), end_date=end.isoformat())
+    from database.streaming import iter_workout_records
+    return iter_workout_records(
+        user_id,
+        connection=connection,
+        start_date=start.isoformat(),
+        end_date=end.isoformat()
+    )
+
+
+def _period_totals(columns: Dict[str, list], mask: Sequence[bool]) -> Dict[str, Any]:
+    sessions = sum(mask)
+    duration = sum(compress(columns["duration"], mask))
+    heart_rates = [hr for hr in compress(columns["heart_rate_avg"], mask) if hr]
+    return {
+        "sessions": sessions,
+        "duration": duration,
+        "calories": sum(compress(columns["calories_burned"], mask)),
+        "avg_heart_rate": round(sum(heart_rates) / len(heart_rates), 1) if heart_rates else 0,
+    }
+
+
+def weekly_aggregates(user_id: int, records: Iterable[Dict[str, Any]], week_start: date) -> Dict[str, Any]:
+    """
+    计算一个用户的周统计（本周 + 上周对比）
+
+    记录先转置为列，再以布尔掩码在列上求和，避免逐条记录构造中间字典。
+
+    Args:
+        user_id: 用户ID
+        records: 覆盖上周一至本周日的运动记录
+        week_start: 本周一
+
+    Returns:
+        周统计字典
+    """
+    columns = dicts_to_columns(records)
+    dates = [str(value)[:10] for value in columns["date"]]
+    current_from = week_start.isoformat()
+    current_to = (week_start + timedelta(days=7)).isoformat()
+    previous_from = (week_start - timedelta(days=7)).isoformat()
+    current = [current_from <= d < current_to for d in dates]
+    previous = [previous_from <= d < current_from for d in dates]
+
+    daily_minutes = [0] * 7
+    week_ordinal = week_start.toordinal()
+    for day, duration in compress(zip(dates, columns["duration"]), current):
+        daily_minutes[date.fromisoformat(day).toordinal() - week_ordinal] += duration
+
+    type_minutes: Counter = Counter()
+    for exercise_type, duration in compress(zip(columns["exercise_type"], columns["duration"]), current):
+        type_minutes[exercise_type] += duration
+
+    return {
+        "user_id": user_id,
+        "week_start": current_from,
+        **_period_totals(columns, current),
+        "active_days": sum(1 for minutes in daily_minutes if minutes),
+        "longest_session": max(compress(columns["duration"], current), default=0),
+        "daily_minutes": daily_minutes,
+        "type_minutes": dict(type_minutes.most_common()),
+        "previous": _period_totals(columns, previous),
+    }
+
+
+def _aggregate_chunk(user_ids: List[int], week_start_ordinal: int) -> Tuple[List[Dict[str, Any]], float]:
+    """工作进程：计算一块用户的周统计，返回(结果, CPU耗时)"""
+    started = time.process_time()
+    week_start = date.fromordinal(week_start_ordinal)
+    start = week_start - timedelta(days=7)
+    end = week_start + timedelta(days=6)
+    reports = [
+        weekly_aggregates(
+            user_id,
+            load_user_records(
+                user_id, start, end, _worker_source,
+                _worker_router.connection_for(user_id) if _worker_router else None
+            ),
+            week_start
+        )
+        for user_id in user_ids
+    ]
+    return reports, time.process_time() - started
+
+
+def format_stats(report: Dict[str, Any]) -> str:
+    """把周统计格式化为文本（LLM输入，也是不生成点评时的周报正文）"""
+    previous = report["previous"]
+    types = "，".join(f"{name}{minutes}分钟" for name, minutes in report["type_minutes"].items()) or "无"
+    return (
+        f"本周（{report['week_start']}起）：运动{report['sessions']}次，{report['active_days']}天，"
+        f"共{report['duration']}分钟，消耗{report['calories']}卡，平均心率{report['avg_heart_rate']}\n"
+        f"最长一次：{report['longest_session']}分钟；运动类型：{types}\n"
+        f"每日分钟（周一至周日）：{' '.join(map(str, report['daily_minutes']))}\n"
+        f"上周：运动{previous['sessions']}次，共{previous['duration']}分钟，消耗{previous['calories']}卡"
+    )
+
+
+def template_narrative(report: Dict[str, Any]) -> str:
+    """不调用LLM的周报"""
+    return format_stats(report)
+
+
+def llm_narrative(report: Dict[str, Any]) -> str:
+    """调用LLM生成周报点评（与Agent共享限流器）"""
+    from agents.nodes import report_llm
+    from utils.prompts import WEEKLY_REPORT_PROMPT
+
+    response = report_llm.invoke(WEEKLY_REPORT_PROMPT.format_messages(stats=format_stats(report)))
+    return response.content
+
+
+class StageMetrics:
+    """单个阶段的吞吐统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.first_started: Optional[float] = None
+        self.last_finished: Optional[float] = None
+
+    def record(self, items: int, busy_seconds: float, started: float, finished: float):
+        self.items += items
+        self.busy_seconds += busy_seconds
+        if self.first_started is None or started < self.first_started:
+            self.first_started = started
+        if self.last_finished is None or finished > self.last_finished:
+            self.last_finished = finished
+
+    def snapshot(self) -> Dict[str, Any]:
+        wall = (self.last_finished - self.first_started) if self.items else 0.0
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "errors": self.errors,
+            "wall_seconds": round(wall, 3),
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(self.items / wall, 1) if wall > 0 else 0.0,
+        }
+
+
+def _chunks(items: Sequence[int], size: int) -> Iterator[List[int]]:
+    for start in range(0, len(items), size):
+        yield list(items[start:start + size])
+
+
+async def _run_pipeline(
+    user_ids: Sequence[int],
+    week_start: date,
+    source: str,
+    workers: int,
+    chunk_size: int,
+    llm_concurrency: int,
+    narrate: Callable[[Dict[str, Any]], str],
+    sink: Callable[[Dict[str, Any]], None],
+    aggregate_metrics: StageMetrics,
+    narrative_metrics: StageMetrics,
+    failed_users: List[int]
+):
+    loop = asyncio.get_running_loop()
+    # 有界队列 + 有界的在途分块：点评阶段跟不上时不再分发新的分块，聚合结果不会堆积在内存里
+    queue: asyncio.Queue = asyncio.Queue(maxsize=llm_concurrency * 4)
+    max_in_flight = workers * 2
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(source,)) as pool, \
+            ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="report-llm") as threads:
+        submitted = time.monotonic()
+        chunks = _chunks(user_ids, chunk_size)
+        in_flight: Dict[asyncio.Future, List[int]] = {}
+
+        def submit_next():
+            chunk = next(chunks, None)
+            if chunk is not None:
+                in_flight[loop.run_in_executor(pool, _aggregate_chunk, chunk, week_start.toordinal())] = chunk
+
+        async def produce():
+            for _ in range(max_in_flight):
+                submit_next()
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    chunk = in_flight.pop(future)
+                    try:
+                        reports, cpu_seconds = future.result()
+                    except Exception:
+                        # 单个分块失败不影响其余用户，记录后继续
+                        aggregate_metrics.errors += len(chunk)
+                        failed_users.extend(chunk)
+                        submit_next()
+                        continue
+                    aggregate_metrics.record(len(reports), cpu_seconds, submitted, time.monotonic())
+                    for report in reports:
+                        await queue.put(report)
+                    # 该分块的结果全部进入队列后才分发下一个分块
+                    submit_next()
+            for _ in range(llm_concurrency):
+                await queue.put(None)
+
+        async def consume():
+            while True:
+                report = await queue.get()
+                if report is None:
+                    return
+                started = time.monotonic()
+                try:
+                    report["narrative"] = await loop.run_in_executor(threads, narrate, report)
+                except Exception as e:
+                    # 点评失败不影响周报本身
+                    narrative_metrics.errors += 1
+                    report["narrative"] = template_narrative(report)
+                    report["narrative_error"] = str(e)
+                finished = time.monotonic()
+                narrative_metrics.record(1, finished - started, started, finished)
+                sink(report)
+
+        await asyncio.gather(produce(), *(consume() for _ in range(llm_concurrency)))
+
+
+def last_week_start(today: Optional[date] = None) -> date:
+    """上一个完整自然周的周一"""
+    today = today or date.today()
+    return today - timedelta(days=today.weekday() + 7)
+
+
+def run_batch_reports(
+    user_ids: Sequence[int],
+    week_start: Optional[date] = None,
+    source: str = config.REPORT_CONFIG["source"],
+    workers: int = config.REPORT_CONFIG["workers"],
+    chunk_size: int = config.REPORT_CONFIG["chunk_size"],
+    llm_concurrency: int = config.REPORT_CONFIG["llm_concurrency"],
+    use_llm: bool = True,
+    narrate: Optional[Callable[[Dict[str, Any]], str]] = None,
+    sink: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    为一批用户生成周报
+
+    Args:
+        user_ids: 用户ID列表
+        week_start: 周报所在周的周一，默认上一个完整周
+        source: 数据源（database / mock / synthetic）
+        workers: 聚合进程数，0表示CPU核数
+        chunk_size: 每次分发给工作进程的用户数
+        llm_concurrency: 同时进行的LLM调用数
+        use_llm: 为False时使用模板周报，不调用LLM
+        narrate: 自定义点评函数（优先于use_llm）
+        sink: 每份周报完成时的回调，默认收集到返回值的reports中
+
+    Returns:
+        {"reports": [...]（未指定sink时）, "stages": [各阶段吞吐], "wall_seconds": 总耗时,
+         "failed_users": 聚合失败的用户（可重新运行）}
+    """
+    week_start = week_start or last_week_start()
+    workers = workers or os.cpu_count() or 1
+    narrate = narrate or (llm_narrative if use_llm else template_narrative)
+    collected: List[Dict[str, Any]] = []
+    aggregate_metrics = StageMetrics("aggregate")
+    narrative_metrics = StageMetrics("narrative")
+    failed_users: List[int] = []
+
+    started = time.monotonic()
+    asyncio.run(_run_pipeline(
+        user_ids, week_start, source, workers, chunk_size, llm_concurrency,
+        narrate, sink or collected.append, aggregate_metrics, narrative_metrics, failed_users
+    ))
+    wall = time.monotonic() - started
+
+    result = {
+        "week_start": week_start.isoformat(),
+        "workers": workers,
+        "stages": [aggregate_metrics.snapshot(), narrative_metrics.snapshot()],
+        "wall_seconds": round(wall, 3),
+        "users_per_second": round(len(user_ids) / wall, 1) if wall > 0 else 0.0,
+        "failed_users": sorted(failed_users),
+    }
+    if sink is None:
+        result["reports"] = collected
+    return result
+
+
+def parse_user_ids(value: str) -> List[int]:
+    """解析用户ID：'1-1000'、'1,5,9' 或二者组合"""
+    user_ids = []
+    for part in value.split(","):
+        if "-" in part:
+            low, high = part.split("-", 1)
+            user_ids.extend(range(int(low), int(high) + 1))
+        elif part.strip():
+            user_ids.append(int(part))
+    return user_ids
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="为全部用户生成周报")
+    parser.add_argument("--users", required=True, help="用户ID，如 1-10000 或 1,2,3")
+    parser.add_argument("--week", help="周报所在周的周一（YYYY-MM-DD），默认上一个完整周")
+    parser.add_argument("--source", default=config.REPORT_CONFIG["source"], choices=["database", "mock", "synthetic"])
+    parser.add_argument("--workers", type=int, default=config.REPORT_CONFIG["workers"], help="聚合进程数，0为CPU核数")
+    parser.add_argument("--chunk-size", type=int, default=config.REPORT_CONFIG["chunk_size"])
+    parser.add_argument("--llm-concurrency", type=int, default=config.REPORT_CONFIG["llm_concurrency"])
+    parser.add_argument("--no-llm", action="store_true", help="只生成模板周报")
+    parser.add_argument("--output", help="周报输出文件（JSON Lines），默认不落盘")
+    args = parser.parse_args(argv)
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    sink = (lambda report: output.write(json.dumps(report, ensure_ascii=False) + "\n")) if output else (lambda report: None)
+    try:
+        result = run_batch_reports(
+            parse_user_ids(args.users),
+            week_start=date.fromisoformat(args.week) if args.week else None,
+            source=args.source,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            llm_concurrency=args.llm_concurrency,
+            use_llm=not args.no_llm,
+            sink=sink
+        )
+    finally:
+        if output:
+            output.close()
+
+    print(f"周报周：{result['week_start']}，进程数：{result['workers']}")
+    for stage in result["stages"]:
+        print(
+            f"  {stage['stage']:<10} {stage['items']:>8}份  {stage['wall_seconds']:>8.2f}s  "
+            f"{stage['items_per_second']:>10.1f}份/秒  错误{stage['errors']}"
+        )
+    print(f"总耗时：{result['wall_seconds']:.2f}s（{result['users_per_second']:.1f}用户/秒）")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""早高峰缓存预热 - 低峰时段为最近活跃的用户预先计算工具结果和分析结果
+
+预热结果写入Agent的响应缓存（进程内），因此调度器运行在提供查询服务的进程中；
+新记录写入时缓存按用户失效，早高峰的“今天/最近”类查询直接命中缓存。
+"""
+import argparse
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import config
+
+
+# 分析阶段不调用LLM的意图（使用分析工具或固定文案）
+NON_LLM_INTENTS = {"trend_analysis", "historical_analysis", "comparison"}
+
+
+def select_active_users(
+    active_days: int = config.PREWARM_CONFIG["active_days"],
+    limit: int = config.PREWARM_CONFIG["max_users"],
+    today: Optional[date] = None,
+    store=None
+) -> List[int]:
+    """
+    选出最近活跃的用户（最近活跃的排在前面）
+
+    Args:
+        active_days: 最近几天内有运动记录视为活跃
+        limit: 最多返回的用户数
+        today: 当前日期
+        store: 画像特征存储，默认全局feature_store
+
+    Returns:
+        用户ID列表
+    """
+    if store is None:
+        from database.feature_store import feature_store as store
+    since = (today or date.today()) - timedelta(days=active_days)
+    active = [
+        profile for profile in list(store.profiles.values())
+        if profile.last_active_date and profile.last_active_date >= since
+    ]
+    active.sort(key=lambda p: (p.last_active_date, p.total_sessions), reverse=True)
+    return [profile.user_id for profile in active[:limit]]
+
+
+def prewarm(
+    user_ids: Iterable[int],
+    intents: List[str] = config.PREWARM_CONFIG["intents"],
+    max_llm_calls: int = config.PREWARM_CONFIG["max_llm_calls"],
+    time_budget_seconds: float = config.PREWARM_CONFIG["time_budget_seconds"],
+    fetch: Optional[Callable[..., str]] = None,
+    analyze: Optional[Callable[..., str]] = None
+) -> Dict[str, Any]:
+    """
+    为一批用户预热缓存：先查询数据，再生成分析
+
+    Args:
+        user_ids: 用户ID（按优先级排序）
+        intents: 需要预热的意图
+        max_llm_calls: 本次最多发起的LLM分析次数（已缓存的分析也计入，预算偏保守）
+        time_budget_seconds: 本次预热的时间上限
+        fetch: 带缓存的查询函数，默认agents.nodes.cached_fetch_data
+        analyze: 带缓存的分析函数，默认agents.nodes.cached_analyze
+
+    Returns:
+        预热报告
+    """
+    if fetch is None or analyze is None:
+        from agents import nodes
+        fetch = fetch or nodes.cached_fetch_data
+        analyze = analyze or nodes.cached_analyze
+
+    started = time.monotonic()
+    report = {
+        "users": 0, "data_entries": 0, "analyses": 0, "llm_calls": 0,
+        "skipped_analyses": 0, "errors": 0, "stopped_by": None,
+    }
+    for user_id in user_ids:
+        if time.monotonic() - started >= time_budget_seconds:
+            report["stopped_by"] = "time_budget"
+            break
+        report["users"] += 1
+        for intent in intents:
+            try:
+                data = fetch(intent, user_id, prewarmed=True)
+                report["data_entries"] += 1
+                uses_llm = intent not in NON_LLM_INTENTS
+                if uses_llm and report["llm_calls"] >= max_llm_calls:
+                    report["skipped_analyses"] += 1
+                    continue
+                if uses_llm:
+                    report["llm_calls"] += 1
+                analyze(intent, data, user_id, prewarmed=True)
+                report["analyses"] += 1
+            except Exception:
+                # 单个用户失败不影响其余用户，查询时会按正常路径重新计算
+                report["errors"] += 1
+    if report["stopped_by"] is None and report["skipped_analyses"]:
+        report["stopped_by"] = "llm_budget"
+    report["elapsed_seconds"] = round(time.monotonic() - started, 3)
+    return report
+
+
+def run_prewarm(prewarm_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """按配置选出活跃用户并预热"""
+    prewarm_config = {**config.PREWARM_CONFIG, **(prewarm_config or {})}
+    user_ids = select_active_users(prewarm_config["active_days"], prewarm_config["max_users"])
+    report = prewarm(
+        user_ids,
+        intents=prewarm_config["intents"],
+        max_llm_calls=prewarm_config["max_llm_calls"],
+        time_budget_seconds=prewarm_config["time_budget_seconds"]
+    )
+    report["selected_users"] = len(user_ids)
+    return report
+
+
+def seconds_until(hour: int, now: Optional[datetime] = None) -> float:
+    """距离下一个hour点整的秒数"""
+    now = now or datetime.now()
+    target = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+class PrewarmScheduler:
+    """每天在低峰时刻执行一次预热的后台调度器"""
+
+    def __init__(
+        self,
+        hour: int = config.PREWARM_CONFIG["hour"],
+        run: Callable[[], Dict[str, Any]] = run_prewarm,
+        cache=None
+    ):
+        """
+        Args:
+            hour: 每天执行的时刻（0-23）
+            run: 预热函数
+            cache: 用于报告命中率的响应缓存，默认Agent的response_cache
+        """
+        self.hour = hour
+        self.run = run
+        self.cache = cache
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.last_run_at: Optional[str] = None
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="prewarm-scheduler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run_now(self) -> Dict[str, Any]:
+        self.last_run_at = datetime.now().isoformat(timespec="seconds")
+        self.last_report = self.run()
+        return self.last_report
+
+    def _loop(self):
+        while not self.stop_event.wait(seconds_until(self.hour)):
+            try:
+                self.run_now()
+            except Exception as e:
+                self.last_report = {"error": str(e)}
+
+    def report(self) -> Dict[str, Any]:
+        """最近一次预热的结果和缓存命中情况（prewarmed_hit_rate为预热条目贡献的命中率）"""
+        cache = self.cache
+        if cache is None:
+            from agents.nodes import response_cache as cache
+        return {
+            "last_run_at": self.last_run_at,
+            "last_run": self.last_report,
+            "cache": cache.snapshot(),
+        }
+
+
+def start_prewarm_scheduler(hour: int = config.PREWARM_CONFIG["hour"]) -> PrewarmScheduler:
+    """在当前（提供查询服务的）进程中启动预热调度器"""
+    scheduler = PrewarmScheduler(hour=hour)
+    scheduler.start()
+    return scheduler
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="立即执行一次缓存预热（用于评估预热预算）")
+    parser.add_argument("--max-users", type=int, default=config.PREWARM_CONFIG["max_users"])
+    parser.add_argument("--max-llm-calls", type=int, default=config.PREWARM_CONFIG["max_llm_calls"])
+    parser.add_argument("--time-budget", type=float, default=config.PREWARM_CONFIG["time_budget_seconds"])
+    args = parser.parse_args(argv)
+
+    report = run_prewarm({
+        "max_users": args.max_users,
+        "max_llm_calls": args.max_llm_calls,
+        "time_budget_seconds": args.time_budget,
+    })
+    for name, value in report.items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+"""闭环多用户压测 - 模拟N个虚拟用户按意图比例发起查询，统计各意图的吞吐与延迟分位数
+
+每个虚拟用户发出请求 -> 等待回复 -> 思考一段时间 -> 再发下一个请求（闭环）。
+按阶梯逐级增加并发用户数，吞吐不再随用户数增长（或延迟/错误率超限）的位置即为饱和点。
+
+用法：
+    # 进程内驱动Agent，LLM使用本地桩服务
+    python load_test.py --stub --users 1,2,4,8,16 --stage-seconds 20
+    # 对比固定流程与工具调用模式的延迟
+    python load_test.py --stub --mode compare --users 1,4,8
+    # 通过HTTP前端压测
+    python load_test.py --target http --url http://127.0.0.1:8080 --users 8,16,32
+"""
+import argparse
+import bisect
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+# 各意图的查询样例（与路由节点的关键词规则对应）
+INTENT_QUERIES = {
+    "today": ["我今天的运动表现如何？", "帮我看看今日的训练", "今天练得怎么样"],
+    "history": ["帮我分析最近的运动记录", "看看我过去的运动历史", "最近都练了什么"],
+    "trend": ["我的运动趋势怎么样", "分析一下心率趋势", "时长有什么趋势"],
+    "comparison": ["对比一下上周和这周", "和上个月比较一下", "对比两周的卡路里"],
+}
+
+DEFAULT_MIX = {"today": 0.4, "history": 0.3, "trend": 0.2, "comparison": 0.1}
+
+# 进程内调用时Agent把异常转成以此开头的回复
+AGENT_ERROR_PREFIX = "Agent执行出错"
+
+
+class InProcessTarget:
+    """在当前进程中直接调用Agent"""
+
+    def __init__(self, mode: str = "pipeline"):
+        """
+        Args:
+            mode: pipeline（固定流程）或tool_calling（工具调用模式）
+        """
+        from agents.fitness_agent import get_agent
+        from agents.nodes import hedge_snapshot, llm_usage
+        self.agent = get_agent(mode)
+        self.usage = llm_usage
+        self.hedging = hedge_snapshot
+
+    def __call__(self, query: str, user_id: int) -> str:
+        response = self.agent.invoke(query, user_id=user_id)
+        if response.startswith(AGENT_ERROR_PREFIX):
+            raise RuntimeError(response)
+        return response
+
+
+class HttpTarget:
+    """通过HTTP前端调用：POST {url}/v1/query {"query", "user_id"} -> {"response"}"""
+
+    def __init__(self, url: str, timeout: float = 120.0):
+        self.endpoint = url.rstrip("/") + "/v1/query"
+        self.timeout = timeout
+
+    def __call__(self, query: str, user_id: int) -> str:
+        body = json.dumps({"query": query, "user_id": user_id}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            self.endpoint, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = json.loads(response.read().decode("utf-8"))
+        return payload["response"]
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """最近秩法分位数（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(values[-1], 4) if values else 0.0,
+        "mean": round(sum(values) / len(values), 4) if values else 0.0,
+    }
+
+
+class StageRecorder:
+    """单个阶段的请求结果记录"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.error_samples: List[str] = []
+
+    def record(self, intent: str, latency: float, error: Optional[str] = None):
+        with self.lock:
+            if error is None:
+                self.latencies.setdefault(intent, []).append(latency)
+            else:
+                self.errors[intent] = self.errors.get(intent, 0) + 1
+                if len(self.error_samples) < 5:
+                    self.error_samples.append(error[:200])
+
+    def summary(self, users: int, elapsed: float) -> Dict[str, Any]:
+        with self.lock:
+            intents = sorted(set(self.latencies) | set(self.errors))
+            per_intent = {}
+            all_latencies: List[float] = []
+            total_errors = 0
+            for intent in intents:
+                latencies = self.latencies.get(intent, [])
+                errors = self.errors.get(intent, 0)
+                all_latencies.extend(latencies)
+                total_errors += errors
+                per_intent[intent] = {
+                    "completed": len(latencies),
+                    "errors": errors,
+                    "error_rate": round(errors / (len(latencies) + errors), 4) if latencies or errors else 0.0,
+                    **summarize_latencies(latencies),
+                }
+            total = len(all_latencies) + total_errors
+            return {
+                "users": users,
+                "elapsed_seconds": round(elapsed, 3),
+                "completed": len(all_latencies),
+                "errors": total_errors,
+                "error_rate": round(total_errors / total, 4) if total else 0.0,
+                "throughput_rps": round(len(all_latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+                "latency": summarize_latencies(all_latencies),
+                "intents": per_intent,
+                "error_samples": list(self.error_samples),
+            }
+
+
+class IntentSampler:
+    """按权重抽取意图和对应的查询"""
+
+    def __init__(self, mix: Dict[str, float]):
+        unknown = set(mix) - set(INTENT_QUERIES)
+        if unknown:
+            raise ValueError(f"未知的意图: {', '.join(sorted(unknown))}")
+        self.intents = [intent for intent, weight in mix.items() if weight > 0]
+        total = sum(mix[intent] for intent in self.intents)
+        self.cumulative = []
+        acc = 0.0
+        for intent in self.intents:
+            acc += mix[intent] / total
+            self.cumulative.append(acc)
+
+    def sample(self, rng: random.Random):
+        index = min(bisect.bisect(self.cumulative, rng.random()), len(self.intents) - 1)
+        intent = self.intents[index]
+        return intent, rng.choice(INTENT_QUERIES[intent])
+
+
+def run_stage(
+    target: Callable[[str, int], str],
+    users: int,
+    duration: float,
+    mix: Dict[str, float] = DEFAULT_MIX,
+    think_time: float = 1.0,
+    user_ids: Sequence[int] = (1,),
+    ramp_up: float = 0.0,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    以固定虚拟用户数运行一个阶段
+
+    Args:
+        target: 请求函数 (query, user_id) -> response，抛异常视为错误
+        users: 虚拟用户数
+        duration: 阶段时长（秒），到时后不再发起新请求，已发出的请求等待完成
+        mix: 意图比例
+        think_time: 平均思考时间（秒，指数分布），0表示不等待
+        user_ids: 虚拟用户使用的用户ID（依次轮换）
+        ramp_up: 在这段时间内均匀启动全部虚拟用户
+        seed: 随机种子（每个虚拟用户在此基础上派生）
+
+    Returns:
+        阶段统计
+    """
+    sampler = IntentSampler(mix)
+    recorder = StageRecorder()
+    started = time.monotonic()
+    deadline = started + duration
+
+    def virtual_user(index: int):
+        rng = random.Random(seed * 100003 + index)
+        user_id = user_ids[index % len(user_ids)]
+        if ramp_up > 0 and users > 1:
+            time.sleep(ramp_up * index / users)
+        while time.monotonic() < deadline:
+            intent, query = sampler.sample(rng)
+            request_started = time.monotonic()
+            try:
+                target(query, user_id)
+                recorder.record(intent, time.monotonic() - request_started)
+            except Exception as e:
+                recorder.record(intent, time.monotonic() - request_started, f"{type(e).__name__}: {e}")
+            if think_time > 0:
+                pause = rng.expovariate(1 / think_time)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(pause, remaining))
+
+    threads = [threading.Thread(target=virtual_user, args=(i,), daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(users, time.monotonic() - started)
+
+
+def find_saturation(
+    stages: List[Dict[str, Any]],
+    min_gain: float = 0.1,
+    p95_limit: Optional[float] = None,
+    error_limit: float = 0.05
+) -> Optional[Dict[str, Any]]:
+    """
+    找出饱和点：吞吐增幅低于min_gain，或p95延迟/错误率超限的第一个阶段
+
+    Returns:
+        {"users": 饱和时的虚拟用户数, "reason": 原因, "max_throughput_rps": 此前的最高吞吐}，未饱和返回None
+    """
+    best = 0.0
+    previous = None
+    for stage in stages:
+        reason = None
+        if stage["error_rate"] > error_limit:
+            reason = f"错误率{stage['error_rate']:.1%}超过{error_limit:.1%}"
+        elif p95_limit is not None and stage["latency"]["p95"] > p95_limit:
+            reason = f"p95延迟{stage['latency']['p95']:.3f}s超过{p95_limit}s"
+        elif previous is not None and previous["throughput_rps"] > 0:
+            gain = stage["throughput_rps"] / previous["throughput_rps"] - 1
+            if gain < min_gain:
+                reason = f"吞吐仅增长{gain:.1%}（用户数{previous['users']}->{stage['users']}）"
+        if reason:
+            return {"users": stage["users"], "reason": reason, "max_throughput_rps": max(best, stage["throughput_rps"])}
+        best = max(best, stage["throughput_rps"])
+        previous = stage
+    return None
+
+
+def run_load_test(
+    target: Callable[[str, int], str],
+    user_steps: Sequence[int],
+    stage_seconds: float,
+    mix: Dict[str, float] = DEFAULT_MIX,
+    think_time: float = 1.0,
+    user_ids: Sequence[int] = (1,),
+    ramp_up: float = 0.0,
+    seed: int = 0,
+    min_gain: float = 0.1,
+    p95_limit: Optional[float] = None,
+    error_limit: float = 0.05,
+    on_stage: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    按阶梯用户数依次运行各阶段
+
+    Returns:
+        {"config": ..., "stages": [...], "saturation": ...}
+    """
+    stages = []
+    for step, users in enumerate(user_steps):
+        stage = run_stage(target, users, stage_seconds, mix, think_time, user_ids, ramp_up, seed + step)
+        stages.append(stage)
+        if on_stage:
+            on_stage(stage)
+    return {
+        "config": {
+            "user_steps": list(user_steps),
+            "stage_seconds": stage_seconds,
+            "mix": mix,
+            "think_time": think_time,
+            "user_ids": list(user_ids),
+            "seed": seed,
+        },
+        "stages": stages,
+        "saturation": find_saturation(stages, min_gain, p95_limit, error_limit),
+    }
+
+
+def format_stage(stage: Dict[str, Any]) -> str:
+    latency = stage["latency"]
+    lines = [
+        f"[{stage['users']:>4}用户] 吞吐 {stage['throughput_rps']:>8.2f}/s  "
+        f"p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  p99 {latency['p99']:.3f}s  "
+        f"错误率 {stage['error_rate']:.2%}（{stage['completed']}完成/{stage['errors']}失败）"
+    ]
+    for intent, summary in stage["intents"].items():
+        lines.append(
+            f"      {intent:<11} {summary['completed']:>6}次  p50 {summary['p50']:.3f}s  "
+            f"p95 {summary['p95']:.3f}s  p99 {summary['p99']:.3f}s  错误率 {summary['error_rate']:.2%}"
+        )
+    return "\n".join(lines)
+
+
+def format_llm_usage(usage: Dict[str, Dict[str, Any]]) -> List[str]:
+    """各模型层级的调用次数、延迟和费用"""
+    lines = []
+    for tier, stats in usage.items():
+        lines.append(
+            f"      {tier:<9} {stats['model']:<14} {stats['calls']:>6}次  p50 {stats['latency_p50']:.3f}s  "
+            f"p95 {stats['latency_p95']:.3f}s  token {stats['prompt_tokens']}+{stats['completion_tokens']}  "
+            f"费用 ${stats['cost']:.4f}（${stats['cost_per_call']:.5f}/次）"
+        )
+    return lines
+
+
+def format_summary(result: Dict[str, Any]) -> str:
+    """文本摘要"""
+    lines = ["压测结果："]
+    lines.extend(format_stage(stage) for stage in result["stages"])
+    if result.get("llm_usage"):
+        lines.append("模型分层用量：")
+        lines.extend(format_llm_usage(result["llm_usage"]))
+    saturation = result["saturation"]
+    if saturation:
+        lines.append(
+            f"饱和点：{saturation['users']}用户（{saturation['reason']}），最高吞吐{saturation['max_throughput_rps']:.2f}/s"
+        )
+    else:
+        lines.append("在测试的用户数范围内未饱和")
+    return "\n".join(lines)
+
+
+def format_comparison(results: Dict[str, Dict[str, Any]]) -> str:
+    """按阶段对比不同Agent模式的吞吐和延迟（第一个模式为基准）"""
+    modes = list(results)
+    baseline = results[modes[0]]["stages"]
+    lines = [f"模式对比（基准：{modes[0]}）："]
+    for index, stage in enumerate(baseline):
+        lines.append(f"[{stage['users']:>4}用户]")
+        for mode in modes:
+            current = results[mode]["stages"][index]
+            latency = current["latency"]
+            delta = ""
+            if mode != modes[0] and stage["latency"]["p50"] > 0:
+                delta = f"  p50 {latency['p50'] / stage['latency']['p50'] - 1:+.1%}"
+            lines.append(
+                f"      {mode:<13} 吞吐 {current['throughput_rps']:>8.2f}/s  p50 {latency['p50']:.3f}s  "
+                f"p95 {latency['p95']:.3f}s  错误率 {current['error_rate']:.2%}{delta}"
+            )
+    return "\n".join(lines)
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """解析意图比例：'today=4,history=3,trend=2,comparison=1'"""
+    mix = {}
+    for part in value.split(","):
+        intent, weight = part.split("=", 1)
+        mix[intent.strip()] = float(weight)
+    return mix
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="闭环多用户压测")
+    parser.add_argument("--target", default="inprocess", choices=["inprocess", "http"])
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="HTTP前端地址")
+    parser.add_argument("--stub", action="store_true", help="进程内模式下启动本地LLM桩服务")
+    parser.add_argument("--stub-latency", type=float, default=0.3, help="桩服务平均延迟（秒，lognormal）")
+    parser.add_argument("--stub-slow-rate", type=float, default=0.0, help="桩服务额外变慢的请求比例")
+    parser.add_argument("--stub-slow-seconds", type=float, default=5.0, help="桩服务变慢请求额外增加的秒数")
+    parser.add_argument("--mode", default="pipeline", choices=["pipeline", "tool_calling", "compare"],
+                        help="进程内Agent模式；compare依次压测两种模式并对比延迟")
+    parser.add_argument("--users", default="1,2,4,8,16", help="阶梯虚拟用户数")
+    parser.add_argument("--stage-seconds", type=float, default=30)
+    parser.add_argument("--ramp-up", type=float, default=0, help="每个阶段内启动全部用户的时间（秒）")
+    parser.add_argument("--think-time", type=float, default=1.0, help="平均思考时间（秒）")
+    parser.add_argument("--mix", default="today=0.4,history=0.3,trend=0.2,comparison=0.1")
+    parser.add_argument("--user-ids", default="1", help="虚拟用户使用的用户ID，如 1 或 1-100")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-gain", type=float, default=0.1, help="吞吐增幅低于该比例视为饱和")
+    parser.add_argument("--p95-limit", type=float, default=None, help="p95延迟上限（秒）")
+    parser.add_argument("--error-limit", type=float, default=0.05)
+    parser.add_argument("--output", help="JSON结果输出文件")
+    args = parser.parse_args(argv)
+
+    stub_server = None
+    if args.target == "http":
+        targets = {"http": HttpTarget(args.url)}
+    else:
+        if args.stub:
+            # 必须在导入Agent之前指向桩服务
+            import config
+            from stub_llm_server import StubConfig, start_stub_server
+            stub_server, base_url = start_stub_server(
+                StubConfig(
+                    latency="lognormal", latency_mean=args.stub_latency, seed=args.seed,
+                    slow_rate=args.stub_slow_rate, slow_seconds=args.stub_slow_seconds
+                )
+            )
+            config.OPENAI_BASE_URL = base_url
+            config.OPENAI_API_KEY = config.OPENAI_API_KEY or "stub"
+        modes = ["pipeline", "tool_calling"] if args.mode == "compare" else [args.mode]
+        targets = {mode: InProcessTarget(mode) for mode in modes}
+
+    from jobs.batch_reports import parse_user_ids
+    results = {}
+    try:
+        for name, target in targets.items():
+            if len(targets) > 1:
+                print(f"== {name} ==", flush=True)
+            usage = getattr(target, "usage", None)
+            if usage is not None:
+                usage.reset()
+            results[name] = run_load_test(
+                target,
+                [int(users) for users in args.users.split(",")],
+                args.stage_seconds,
+                mix=parse_mix(args.mix),
+                think_time=args.think_time,
+                user_ids=parse_user_ids(args.user_ids),
+                ramp_up=args.ramp_up,
+                seed=args.seed,
+                min_gain=args.min_gain,
+                p95_limit=args.p95_limit,
+                error_limit=args.error_limit,
+                on_stage=lambda stage: print(format_stage(stage), flush=True)
+            )
+            if usage is not None:
+                results[name]["llm_usage"] = usage.snapshot()
+            hedging = getattr(target, "hedging", None)
+            if hedging is not None and hedging():
+                results[name]["llm_hedging"] = hedging()
+    finally:
+        if stub_server is not None:
+            stub_server.shutdown()
+
+    for name, result in results.items():
+        print()
+        if len(results) > 1:
+            print(f"== {name} ==")
+        print(format_summary(result))
+    if len(results) > 1:
+        print()
+        print(format_comparison(results))
+    if args.output:
+        payload = next(iter(results.values())) if len(results) == 1 else results
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        print(f"JSON结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
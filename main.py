@@ -1,6 +1,6 @@
 """主入口文件 - 提供命令行交互界面"""
 import sys
-from agents.fitness_agent import fitness_agent
+from agents.fitness_agent import get_agent
 import config
 
 
@@ -51,6 +51,16 @@ def main():
         if response.lower() != 'y':
             sys.exit(1)
     
+    # 低峰时段预热早高峰查询的缓存
+    if config.PREWARM_CONFIG["enabled"]:
+        from jobs.prewarm import start_prewarm_scheduler
+        start_prewarm_scheduler()
+        print(f"⏰ 缓存预热已启用（每天{config.PREWARM_CONFIG['hour']}点）")
+    
+    agent = get_agent()
+    if config.AGENT_CONFIG["mode"] == "tool_calling":
+        print("🛠️  工具调用模式：模型自行选择并并行调用工具")
+    
     print("\n✅ Agent已就绪，可以开始查询了！")
     print_help()
     print("\n" + "="*50)
@@ -77,7 +87,7 @@ def main():
             print("\n🤔 正在分析中...")
             print("-" * 50)
             
-            response = fitness_agent.invoke(user_query)
+            response = agent.invoke(user_query)
             
             print("\n📊 分析结果:")
             print(response)
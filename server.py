@@ -0,0 +1,257 @@
+"""预分叉多进程HTTP服务 - 多个工作进程共享监听端口和共享内存响应缓存
+
+父进程先编译Agent图、加载画像/汇总等进程内数据并创建共享内存缓存，再fork出N个工作进程：
+图和只读数据按写时复制共享，不在每个进程重复构建；工具结果和分析结果（含按用户的多粒度汇总）
+存放在utils.shared_cache的共享内存段中，所有进程共用一份。图的Python计算分布在多个CPU核上。
+
+接口：
+    POST /v1/query  {"query": "...", "user_id": 1, "deadline_seconds": 5}
+                    ->  {"response": "...", "degraded": false, "degraded_nodes": []}
+    GET  /healthz                                    ->  {"status": "ok", "pid": ...}
+    GET  /v1/stats                                   ->  共享缓存指标
+
+用法：
+    python server.py --port 8080 --workers 4
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+import config
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """处理查询请求（每个工作进程内多线程）"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "FitnessAgent/1.0"
+
+    def log_message(self, format, *args):
+        if getattr(self.server, "verbose", False):
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/healthz":
+            self._send_json(200, {"status": "ok", "pid": os.getpid()})
+        elif path == "/v1/stats":
+            cache = self.server.cache
+            self._send_json(200, {"pid": os.getpid(), "cache": cache.snapshot() if cache else None})
+        else:
+            self._send_json(404, {"error": f"未知路径: {self.path}"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/query":
+            self._send_json(404, {"error": f"未知路径: {self.path}"})
+            return
+
+        length = int(self.headers.get("Content-Length", "0"))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "请求体不是合法JSON"})
+            return
+        query = request.get("query") if isinstance(request, dict) else None
+        user_id = request.get("user_id", 1) if isinstance(request, dict) else None
+        if not isinstance(query, str) or not query.strip():
+            self._send_json(400, {"error": "缺少query"})
+            return
+        if not isinstance(user_id, int) or isinstance(user_id, bool):
+            self._send_json(400, {"error": "user_id必须是整数"})
+            return
+        deadline_seconds = request.get("deadline_seconds")
+        if deadline_seconds is not None and (
+            not isinstance(deadline_seconds, (int, float)) or isinstance(deadline_seconds, bool) or deadline_seconds < 0
+        ):
+            self._send_json(400, {"error": "deadline_seconds必须是非负数"})
+            return
+
+        agent = self.server.agent
+        if hasattr(agent, "run"):
+            # 支持时间预算的Agent同时返回降级信息
+            result = agent.run(query.strip(), user_id, deadline_seconds=deadline_seconds)
+        else:
+            result = {"response": agent.invoke(query.strip(), user_id), "degraded": []}
+        self._send_json(200, {
+            "response": result["response"],
+            "degraded": bool(result["degraded"]),
+            "degraded_nodes": result["degraded"]
+        })
+
+
+class PreforkServer:
+    """预分叉服务：父进程监听并管理工作进程，工作进程accept并处理请求"""
+
+    def __init__(
+        self,
+        agent: Any,
+        host: str = config.SERVER_CONFIG["host"],
+        port: int = config.SERVER_CONFIG["port"],
+        workers: int = config.SERVER_CONFIG["workers"],
+        cache: Optional[Any] = None,
+        verbose: bool = False
+    ):
+        """
+        Args:
+            agent: 提供invoke(query, user_id)的Agent（在fork之前创建）；同时提供run时返回降级信息
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+            workers: 工作进程数，0表示CPU核数
+            cache: 共享响应缓存（父进程创建，退出时删除）
+            verbose: 是否输出访问日志
+        """
+        self.agent = agent
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = cache
+        self.verbose = verbose
+        self.socket: Optional[socket.socket] = None
+        self.children: List[int] = []
+        self.running = False
+
+    def bind(self) -> int:
+        """创建监听socket（工作进程继承），返回实际端口"""
+        self.socket = socket.create_server((self.host, self.port), backlog=128)
+        self.port = self.socket.getsockname()[1]
+        return self.port
+
+    def start(self):
+        """fork全部工作进程"""
+        if self.socket is None:
+            self.bind()
+        self.running = True
+        for _ in range(self.workers):
+            self._spawn()
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children.append(pid)
+            return
+        # 工作进程：恢复默认信号处理，在继承的socket上处理请求，永不返回
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        code = 0
+        try:
+            server = ThreadingHTTPServer((self.host, self.port), QueryHandler, bind_and_activate=False)
+            server.socket.close()
+            server.socket = self.socket
+            server.daemon_threads = True
+            server.agent = self.agent
+            server.cache = self.cache
+            server.verbose = self.verbose
+            server.serve_forever()
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+
+    def supervise(self):
+        """等待工作进程退出并重新拉起（收到SIGTERM/SIGINT后调用stop结束）"""
+        while self.running:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            if pid in self.children:
+                self.children.remove(pid)
+                if self.running:
+                    print(f"工作进程{pid}退出（状态{status}），重新拉起")
+                    self._spawn()
+
+    def stop(self, timeout: float = 5.0):
+        """结束全部工作进程并释放socket和共享内存"""
+        self.running = False
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout
+        for pid in list(self.children):
+            while time.monotonic() < deadline:
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if done:
+                    break
+                time.sleep(0.01)
+            else:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+        self.children = []
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def serve_forever(self):
+        """启动并阻塞直到收到SIGTERM/SIGINT"""
+        def handle(signum, frame):
+            self.running = False
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, handle)
+        signal.signal(signal.SIGINT, handle)
+        self.start()
+        try:
+            self.supervise()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def create_shared_cache():
+    """按SERVER_CONFIG创建共享内存响应缓存"""
+    from utils.shared_cache import SharedResponseCache
+
+    return SharedResponseCache(
+        slots=config.SERVER_CONFIG["cache_slots"],
+        slot_bytes=config.SERVER_CONFIG["cache_slot_bytes"],
+        ttl_seconds=config.RESPONSE_CACHE_CONFIG["ttl_seconds"]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="健身记录分析Agent预分叉HTTP服务")
+    parser.add_argument("--host", default=config.SERVER_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=config.SERVER_CONFIG["port"])
+    parser.add_argument("--workers", type=int, default=config.SERVER_CONFIG["workers"], help="工作进程数，0表示CPU核数")
+    parser.add_argument("--mode", default=config.AGENT_CONFIG["mode"], choices=["pipeline", "tool_calling"])
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    # fork之前：编译图、加载进程内数据，并把响应缓存换成共享内存缓存
+    from agents.fitness_agent import get_agent
+    from agents.nodes import use_response_cache
+    cache = create_shared_cache()
+    use_response_cache(cache)
+    agent = get_agent(args.mode)
+
+    server = PreforkServer(agent, args.host, args.port, args.workers, cache=cache, verbose=args.verbose)
+    port = server.bind()
+    print(f"服务已启动: http://{args.host}:{port}（{server.workers}个工作进程，共享缓存{cache.size // (1024 * 1024)}MB）")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
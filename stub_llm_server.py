@@ -0,0 +1,455 @@
+"""本地OpenAI兼容桩服务 - 用于离线压测和端到端吞吐测试
+
+用法：
+    python stub_llm_server.py --port 8000 --latency lognormal --latency-mean 0.8 --error-429 0.05
+    # 2%的请求额外慢5秒（模拟服务商偶发的长尾慢响应）
+    python stub_llm_server.py --port 8000 --slow-rate 0.02 --slow-seconds 5
+    export OPENAI_BASE_URL=http://127.0.0.1:8000/v1
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 与agents/nodes.py中的关键词路由保持一致，保证桩输出与真实流程的意图一致
+INTENT_KEYWORDS = [
+    (("今天", "今日"), "today_performance"),
+    (("历史", "过去", "最近"), "historical_analysis"),
+    (("对比", "比较"), "comparison"),
+    (("趋势",), "trend_analysis"),
+]
+
+# 工具调用模式下各意图首轮同时发出的工具调用（工具名, 参数）
+INTENT_TOOL_CALLS = {
+    "today_performance": [("get_today_workout_summary", {}), ("get_workout_statistics", {"days": 7})],
+    "historical_analysis": [("get_workout_rollups", {}), ("query_workout_records", {"limit": 20})],
+    "trend_analysis": [("get_workout_statistics", {"days": 30}), ("get_workout_rollups", {"days": 90})],
+    "comparison": [("get_workout_statistics", {"days": 7}), ("get_workout_statistics", {"days": 14})],
+    "general_query": [("query_workout_records", {"limit": 20})],
+}
+
+CANNED_ANALYSES = [
+    "从数据来看，运动频率保持稳定，有氧与力量训练搭配合理。平均心率处于中等强度区间，卡路里消耗与运动时长基本成正比。",
+    "整体运动量充足，跑步占比较高。建议适当增加拉伸和恢复类训练，心率数据显示强度控制得当。",
+    "近期运动时长有所波动，但总消耗保持在较高水平。游泳和力量训练有助于均衡发展，建议保持规律。",
+]
+
+CANNED_RESPONSES = [
+    "你好！根据你的运动记录，你最近的表现很不错，继续保持规律训练，同时注意休息和补水哦。",
+    "看了你的数据，运动强度和频率都很合理。建议下周尝试增加一次有氧训练，让进步更明显！",
+    "你的训练很有规律，心率控制也不错。记得训练后充分拉伸，帮助肌肉恢复。",
+]
+
+
+class StubConfig:
+    """桩服务行为配置"""
+
+    def __init__(
+        self,
+        latency: str = "fixed",
+        latency_mean: float = 0.05,
+        latency_sigma: float = 0.5,
+        tokens_per_second: float = 0,
+        error_429: float = 0.0,
+        error_500: float = 0.0,
+        error_timeout: float = 0.0,
+        timeout_seconds: float = 30.0,
+        retry_after: float = 1.0,
+        slow_rate: float = 0.0,
+        slow_seconds: float = 5.0,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            latency: 首token延迟分布，fixed / uniform / exponential / lognormal
+            latency_mean: 延迟均值（秒）
+            latency_sigma: lognormal分布的sigma（uniform时为相对半宽）
+            tokens_per_second: 输出token速率，0 表示不限速
+            error_429: 返回429的概率
+            error_500: 返回500的概率
+            error_timeout: 挂起直至客户端超时的概率
+            timeout_seconds: 模拟超时时挂起的秒数
+            retry_after: 429响应中Retry-After头的秒数
+            slow_rate: 额外变慢的请求比例（注入长尾延迟）
+            slow_seconds: 变慢的请求额外增加的秒数
+            seed: 随机种子，固定后延迟与错误注入序列可复现
+        """
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_429 = error_429
+        self.error_500 = error_500
+        self.error_timeout = error_timeout
+        self.timeout_seconds = timeout_seconds
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_seconds = slow_seconds
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample_latency(self) -> float:
+        """按配置的分布采样一次延迟"""
+        mean = self.latency_mean
+        with self.lock:
+            if self.latency == "uniform":
+                return max(0.0, self.rng.uniform(mean * (1 - self.latency_sigma), mean * (1 + self.latency_sigma)))
+            if self.latency == "exponential":
+                return self.rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+            if self.latency == "lognormal":
+                # 选择mu使分布均值等于latency_mean
+                mu = math.log(mean) - self.latency_sigma ** 2 / 2 if mean > 0 else 0.0
+                return self.rng.lognormvariate(mu, self.latency_sigma) if mean > 0 else 0.0
+        return mean
+
+    def sample_slowdown(self) -> float:
+        """按slow_rate抽取是否为长尾慢请求，返回额外延迟秒数"""
+        if self.slow_rate <= 0:
+            return 0.0
+        with self.lock:
+            return self.slow_seconds if self.rng.random() < self.slow_rate else 0.0
+
+    def sample_error(self) -> Optional[str]:
+        """按配置的概率抽取一种注入错误，返回 None 表示正常响应"""
+        with self.lock:
+            roll = self.rng.random()
+        for kind, probability in (("429", self.error_429), ("500", self.error_500), ("timeout", self.error_timeout)):
+            if roll < probability:
+                return kind
+            roll -= probability
+        return None
+
+
+class StubMetrics:
+    """桩服务请求统计"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+
+    def incr(self, name: str):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.counters)
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def _pick(options: List[str], key: str) -> str:
+    """根据内容哈希确定性地选择一条输出"""
+    digest = hashlib.md5(key.encode("utf-8")).digest()
+    return options[digest[0] % len(options)]
+
+
+def canned_reply(messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """
+    根据提示词类型生成确定性的桩输出
+
+    Args:
+        messages: OpenAI格式的消息列表
+
+    Returns:
+        (提示词类型, 回复文本)
+    """
+    system = "".join(_message_text(m) for m in messages if m.get("role") == "system")
+    conversation = "\n".join(_message_text(m) for m in messages if m.get("role") != "system")
+
+    if "查询意图识别" in system:
+        for keywords, intent in INTENT_KEYWORDS:
+            if any(keyword in conversation for keyword in keywords):
+                return "router", intent
+        return "router", "general_query"
+    if "数据分析专家" in system:
+        return "analysis", _pick(CANNED_ANALYSES, conversation)
+    if "健身助手" in system:
+        return "response", _pick(CANNED_RESPONSES, conversation)
+    return "other", _pick(CANNED_RESPONSES, conversation)
+
+
+def tool_reply(messages: List[Dict[str, Any]], tools: List[Dict[str, Any]]) -> Tuple[str, str, Optional[List[Dict[str, Any]]]]:
+    """
+    绑定了工具的请求：首轮按意图同时发出多个工具调用，拿到工具结果后给出最终回复
+
+    Args:
+        messages: OpenAI格式的消息列表
+        tools: 请求中声明的工具
+
+    Returns:
+        (提示词类型, 回复文本, 工具调用列表或None)
+    """
+    conversation = "\n".join(_message_text(m) for m in messages if m.get("role") != "system")
+    if any(m.get("role") == "tool" for m in messages):
+        return "tool_answer", _pick(CANNED_RESPONSES, conversation), None
+
+    available = {tool.get("function", {}).get("name") for tool in tools}
+    user_text = "\n".join(_message_text(m) for m in messages if m.get("role") == "user")
+    intent = "general_query"
+    for keywords, candidate in INTENT_KEYWORDS:
+        if any(keyword in user_text for keyword in keywords):
+            intent = candidate
+            break
+    calls = [(name, args) for name, args in INTENT_TOOL_CALLS[intent] if name in available]
+    if not calls:
+        return "tool_answer", _pick(CANNED_RESPONSES, conversation), None
+    digest = hashlib.md5(conversation.encode("utf-8")).hexdigest()[:8]
+    return "tool_call", "", [
+        {
+            "id": f"call_{digest}_{index}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps(args, ensure_ascii=False)},
+        }
+        for index, (name, args) in enumerate(calls)
+    ]
+
+
+def count_tokens(text: str) -> int:
+    """粗略估算token数（中文每字1个，其余每4字符1个）"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + ascii_chars // 4 + 1
+
+
+def split_tokens(text: str, size: int = 2) -> List[str]:
+    """把文本切成小块用于流式输出"""
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """处理OpenAI兼容的HTTP请求"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "StubLLM/1.0"
+
+    def log_message(self, format, *args):
+        if getattr(self.server, "verbose", False):
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub-model", "object": "model", "owned_by": "stub"}]})
+        elif path.endswith("/stub/metrics"):
+            self._send_json(200, self.server.metrics.snapshot())
+        else:
+            self._send_json(404, {"error": {"message": f"未知路径: {self.path}", "type": "not_found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"未知路径: {self.path}", "type": "not_found"}})
+            return
+
+        length = int(self.headers.get("Content-Length", "0"))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "请求体不是合法JSON", "type": "invalid_request_error"}})
+            return
+
+        stub_config: StubConfig = self.server.stub_config
+        metrics: StubMetrics = self.server.metrics
+        metrics.incr("requests")
+
+        error = stub_config.sample_error()
+        if error == "429":
+            metrics.incr("errors_429")
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+                headers={"Retry-After": str(stub_config.retry_after)}
+            )
+            return
+        if error == "500":
+            metrics.incr("errors_500")
+            self._send_json(500, {"error": {"message": "Internal server error (stub)", "type": "server_error"}})
+            return
+        if error == "timeout":
+            metrics.incr("errors_timeout")
+            time.sleep(stub_config.timeout_seconds)
+            self.close_connection = True
+            return
+
+        slowdown = stub_config.sample_slowdown()
+        if slowdown:
+            metrics.incr("slow")
+        time.sleep(stub_config.sample_latency() + slowdown)
+
+        messages = request.get("messages", [])
+        tool_calls = None
+        if request.get("tools"):
+            kind, text, tool_calls = tool_reply(messages, request["tools"])
+        else:
+            kind, text = canned_reply(messages)
+        metrics.incr(f"prompt_{kind}")
+        prompt_tokens = sum(count_tokens(_message_text(m)) for m in messages)
+        completion_tokens = count_tokens(text or json.dumps(tool_calls))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        model = request.get("model", "stub-model")
+        completion_id = f"chatcmpl-stub-{hashlib.md5((text or json.dumps(tool_calls)).encode('utf-8')).hexdigest()[:12]}"
+
+        if request.get("stream") and tool_calls is None:
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            self._stream(completion_id, model, text, usage if include_usage else None)
+            return
+
+        if stub_config.tokens_per_second > 0:
+            time.sleep(completion_tokens / stub_config.tokens_per_second)
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": (
+                    {"role": "assistant", "content": None, "tool_calls": tool_calls}
+                    if tool_calls else {"role": "assistant", "content": text}
+                ),
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _stream(self, completion_id: str, model: str, text: str, usage: Optional[Dict[str, int]]):
+        """以SSE格式逐块输出"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        tokens_per_second = self.server.stub_config.tokens_per_second
+        created = int(time.time())
+
+        def emit(delta: Dict[str, Any], finish_reason: Optional[str] = None, extra: Optional[Dict[str, Any]] = None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if extra:
+                chunk.update(extra)
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        emit({"role": "assistant", "content": ""})
+        for piece in split_tokens(text):
+            if tokens_per_second > 0:
+                time.sleep(count_tokens(piece) / tokens_per_second)
+            emit({"content": piece})
+        emit({}, finish_reason="stop")
+        if usage:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def create_stub_server(stub_config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0,
+                       verbose: bool = False) -> ThreadingHTTPServer:
+    """
+    创建桩服务实例（port=0 时自动分配端口）
+
+    Returns:
+        已绑定端口的服务实例，通过 server.server_address 获取实际地址
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.stub_config = stub_config or StubConfig()
+    server.metrics = StubMetrics()
+    server.verbose = verbose
+    return server
+
+
+def start_stub_server(stub_config: Optional[StubConfig] = None, host: str = "127.0.0.1",
+                      port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    在后台线程中启动桩服务（用于测试）
+
+    Returns:
+        (服务实例, 可直接用作OPENAI_BASE_URL的地址)
+    """
+    server = create_stub_server(stub_config, host, port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", default="fixed", choices=["fixed", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--latency-mean", type=float, default=0.05, help="延迟均值（秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="输出token速率，0表示不限")
+    parser.add_argument("--error-429", type=float, default=0.0, help="429错误概率")
+    parser.add_argument("--error-500", type=float, default=0.0, help="500错误概率")
+    parser.add_argument("--error-timeout", type=float, default=0.0, help="超时挂起概率")
+    parser.add_argument("--timeout-seconds", type=float, default=30.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="额外变慢的请求比例")
+    parser.add_argument("--slow-seconds", type=float, default=5.0, help="变慢请求额外增加的秒数")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    stub_config = StubConfig(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        error_429=args.error_429,
+        error_500=args.error_500,
+        error_timeout=args.error_timeout,
+        timeout_seconds=args.timeout_seconds,
+        retry_after=args.retry_after,
+        slow_rate=args.slow_rate,
+        slow_seconds=args.slow_seconds,
+        seed=args.seed
+    )
+    server = create_stub_server(stub_config, args.host, args.port, verbose=args.verbose)
+    print(f"桩服务已启动: http://{args.host}:{server.server_address[1]}/v1")
+    print(f"设置 OPENAI_BASE_URL=http://{args.host}:{server.server_address[1]}/v1 即可使用")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n桩服务已停止")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
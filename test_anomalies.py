@@ -0,0 +1,108 @@
+"""测试写入时异常检测 - 稳健z分数、按运动类型隔离、常数内存与吞吐"""
+import random
+from database.anomalies import AnomalyDetector, MetricDetector, benchmark
+
+
+def _record(i, user_id=1, exercise_type="跑步", duration=40, calories=350, heart_rate=145, day="2024-05-01"):
+    return {
+        "id": i, "user_id": user_id, "date": day, "exercise_type": exercise_type,
+        "duration": duration, "calories_burned": calories, "heart_rate_avg": heart_rate,
+    }
+
+
+def _history(detector, count=40, seed=0, **overrides):
+    rng = random.Random(seed)
+    for i in range(count):
+        detector.observe(_record(
+            i, duration=rng.randint(35, 45), calories=rng.randint(320, 380),
+            heart_rate=rng.randint(140, 150), **overrides
+        ))
+
+
+def test_flags_outlier():
+    """明显偏离平时的心率被标记，正常记录不被标记"""
+    print("\n1. 测试异常标记:")
+    detector = AnomalyDetector(min_samples=10)
+    _history(detector)
+    assert detector.get_flags(1) == []
+    flags = detector.observe(_record(100, heart_rate=182, day="2024-05-20"))
+    for flag in flags:
+        print(f"   {flag.describe()}")
+    assert [flag.metric for flag in flags] == ["heart_rate_avg"]
+    assert flags[0].robust_z > 3.5 and flags[0].record_id == 100
+    assert detector.observe(_record(101, duration=41, calories=350, heart_rate=146)) == []
+    assert [flag.record_id for flag in detector.get_flags(1, start_date="2024-05-10")] == [100]
+
+
+def test_outliers_do_not_shift_baseline():
+    """连续的离群值只能缓慢移动稳健基线，正常值随后仍不会被误报"""
+    print("\n2. 测试基线稳健性:")
+    detector = AnomalyDetector(min_samples=10)
+    _history(detector)
+    for i in range(3):
+        detector.observe(_record(200 + i, duration=180))
+    running = detector.detectors[(1, "跑步")][0]
+    print(f"   离群后中位数≈{running.median:.1f}，EWMA≈{running.ewma:.1f}，长期均值≈{running.stats.mean:.1f}")
+    assert 35 <= running.median <= 50
+    assert running.ewma < running.stats.mean
+    assert detector.observe(_record(300, duration=40)) == []
+
+
+def test_per_exercise_and_warmup():
+    """统计按用户/运动类型隔离；预热样本不足时不评分；缺失指标跳过"""
+    print("\n3. 测试隔离与预热:")
+    detector = AnomalyDetector(min_samples=10)
+    _history(detector)
+    # 游泳没有历史：90分钟不算异常
+    assert detector.observe(_record(1, exercise_type="游泳", duration=90, heart_rate=120)) == []
+    # 其他用户的跑步也没有历史
+    assert detector.observe(_record(2, user_id=2, heart_rate=185)) == []
+    running = detector.detectors[(1, "跑步")]
+    count = running[2].stats.count
+    detector.observe(_record(3, heart_rate=0))
+    assert running[2].stats.count == count
+    assert len(detector.detectors) == 3
+
+
+def test_constant_memory():
+    """单个检测器的状态大小与处理的记录数无关，且稳健估计收敛到真实分布"""
+    print("\n4. 测试常数内存:")
+    metric = MetricDetector(floor=2.0)
+    rng = random.Random(1)
+    medians, mads = [], []
+    for i in range(10000):
+        metric.observe(rng.gauss(40, 5), alpha=0.1, step=0.03, min_samples=10, clip=3.0)
+        if i >= 1000:
+            medians.append(metric.median)
+            mads.append(metric.mad)
+    median, mad = sum(medians) / len(medians), sum(mads) / len(mads)
+    print(f"   稳定后平均：中位数{median:.1f}，MAD{mad:.2f}（理论值40、3.37）")
+    assert abs(median - 40) < 1
+    # 正态分布的MAD约为0.674σ
+    assert 2.8 < mad < 3.8
+    assert set(metric.to_dict()) == {"stats", "ewma", "ewvar", "median", "mad"}
+
+
+def test_throughput():
+    """吞吐基准（目标10万条/秒，测试机器较慢时放宽断言）"""
+    print("\n5. 测试吞吐:")
+    result = benchmark(records=50_000, users=500)
+    print(f"   {result['records']}条记录，{result['seconds']}秒，{result['records_per_second']}条/秒，标记{result['flags']}条")
+    assert result["records_per_second"] > 20_000
+    # 注入约1%的时长异常
+    assert 0.005 * result["records"] < result["flags"] < 0.02 * result["records"]
+
+
+if __name__ == "__main__":
+    print("开始测试异常检测...")
+    try:
+        test_flags_outlier()
+        test_outliers_do_not_shift_baseline()
+        test_per_exercise_and_warmup()
+        test_constant_memory()
+        test_throughput()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
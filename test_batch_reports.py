@@ -0,0 +1,109 @@
+"""测试周报批处理 - 多进程聚合结果与单进程一致，点评失败时回退为模板周报"""
+from datetime import date, timedelta
+from database.mock_data import generate_mock_records
+from jobs import batch_reports
+from jobs.batch_reports import (
+    run_batch_reports, weekly_aggregates, parse_user_ids, last_week_start
+)
+
+
+WEEK = date(2024, 3, 4)  # 周一
+
+
+def test_weekly_aggregates():
+    """周统计与逐条计算一致"""
+    print("\n1. 测试周统计:")
+    records = generate_mock_records(42, WEEK - timedelta(days=7), WEEK + timedelta(days=6))
+    report = weekly_aggregates(42, records, WEEK)
+    current = [r for r in records if r["date"] >= WEEK.isoformat()]
+    print(f"   {report}")
+    assert report["sessions"] == len(current)
+    assert report["duration"] == sum(r["duration"] for r in current) == sum(report["daily_minutes"])
+    assert report["previous"]["sessions"] == len(records) - len(current)
+    assert sum(report["type_minutes"].values()) == report["duration"]
+
+
+def test_pipeline_matches_serial():
+    """多进程流水线的结果与直接计算一致，每个用户一份周报"""
+    print("\n2. 测试批处理流水线:")
+    user_ids = list(range(1, 121))
+    result = run_batch_reports(
+        user_ids, week_start=WEEK, source="synthetic", workers=2, chunk_size=16,
+        llm_concurrency=4, use_llm=False
+    )
+    print(f"   {result['stages']}")
+    reports = {report["user_id"]: report for report in result["reports"]}
+    assert sorted(reports) == user_ids
+    expected = weekly_aggregates(
+        7, generate_mock_records(7, WEEK - timedelta(days=7), WEEK + timedelta(days=6)), WEEK
+    )
+    assert {k: v for k, v in reports[7].items() if k != "narrative"} == expected
+    assert all(stage["items"] == len(user_ids) for stage in result["stages"])
+
+
+def test_narrative_errors_fall_back():
+    """点评生成失败时保留模板周报并计数"""
+    print("\n3. 测试点评失败回退:")
+
+    def narrate(report):
+        if report["user_id"] % 2:
+            raise RuntimeError("LLM不可用")
+        return "点评"
+
+    collected = []
+    result = run_batch_reports(
+        [1, 2, 3, 4], week_start=WEEK, source="synthetic", workers=1,
+        llm_concurrency=2, narrate=narrate, sink=collected.append
+    )
+    assert "reports" not in result
+    assert result["stages"][1]["errors"] == 2
+    by_user = {report["user_id"]: report for report in collected}
+    assert by_user[2]["narrative"] == "点评"
+    assert "本周" in by_user[1]["narrative"] and by_user[1]["narrative_error"] == "LLM不可用"
+
+
+def test_chunk_errors_counted():
+    """单个分块聚合失败时计数并继续，其余用户的周报照常生成"""
+    print("\n4. 测试分块失败:")
+    original = batch_reports.weekly_aggregates
+
+    def flaky(user_id, records, week_start):
+        if user_id == 6:
+            raise ValueError("坏数据")
+        return original(user_id, records, week_start)
+
+    # 工作进程在首次提交时fork，继承替换后的函数
+    batch_reports.weekly_aggregates = flaky
+    try:
+        result = run_batch_reports(
+            list(range(1, 13)), week_start=WEEK, source="synthetic", workers=1, chunk_size=4,
+            llm_concurrency=2, use_llm=False
+        )
+    finally:
+        batch_reports.weekly_aggregates = original
+    print(f"   {result['stages'][0]}，失败用户{result['failed_users']}")
+    assert result["failed_users"] == [5, 6, 7, 8]
+    assert result["stages"][0]["errors"] == 4 and result["stages"][0]["items"] == 8
+    assert sorted(report["user_id"] for report in result["reports"]) == [1, 2, 3, 4, 9, 10, 11, 12]
+
+
+def test_helpers():
+    """用户ID解析和默认周"""
+    print("\n5. 测试辅助函数:")
+    assert parse_user_ids("1-3,7") == [1, 2, 3, 7]
+    assert last_week_start(date(2024, 3, 13)) == WEEK
+
+
+if __name__ == "__main__":
+    print("开始测试周报批处理...")
+    try:
+        test_weekly_aggregates()
+        test_pipeline_matches_serial()
+        test_narrative_errors_fall_back()
+        test_chunk_errors_counted()
+        test_helpers()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
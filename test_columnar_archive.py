@@ -0,0 +1,100 @@
+"""测试列式归档 - 写入临时目录，与模拟数据的查询结果对比"""
+import os
+import tempfile
+from database.columnar import ColumnarArchive, write_segment
+from database.mock_data import MOCK_WORKOUT_RECORDS, get_mock_records
+
+
+def test_append_and_query():
+    """分两个追加段写入后，查询结果应与模拟数据一致"""
+    print("\n1. 测试追加段与查询:")
+    with tempfile.TemporaryDirectory() as root:
+        archive = ColumnarArchive(root, compact_threshold=100)
+        archive.append(1, MOCK_WORKOUT_RECORDS[:4])
+        archive.append(1, MOCK_WORKOUT_RECORDS[4:])
+        print(f"   段数: {len(archive.segments(1))}")
+        assert len(archive.segments(1)) == 2
+
+        expected = {r["id"]: r for r in get_mock_records(user_id=1, exercise_type="跑步")}
+        actual = archive.get_records(user_id=1, exercise_type="跑步")
+        print(f"   跑步记录: {[r['id'] for r in actual]}")
+        assert {r["id"]: r for r in actual} == expected
+
+        dates = [r["date"] for r in archive.get_records(user_id=1)]
+        assert dates == sorted(dates, reverse=True)
+        archive.close()
+
+
+def test_compaction():
+    """压缩后只剩一个段且记录不丢失"""
+    print("\n2. 测试压缩:")
+    with tempfile.TemporaryDirectory() as root:
+        archive = ColumnarArchive(root, compact_threshold=3)
+        for record in MOCK_WORKOUT_RECORDS[:3]:
+            archive.append(1, [record])
+        records = archive.get_records(user_id=1)
+        print(f"   段数: {len(archive.segments(1))}, 记录数: {len(records)}")
+        assert len(archive.segments(1)) == 1
+        assert sorted(r["id"] for r in records) == [1, 2, 3]
+        assert archive.segments(1)[0].column("duration").tolist() is not None
+        archive.close()
+
+
+def test_tiered_compaction():
+    """只合并段数达到阈值的层级，已合并的历史段不随每次追加重写"""
+    print("\n3. 测试分层压缩:")
+    with tempfile.TemporaryDirectory() as root:
+        archive = ColumnarArchive(root, compact_threshold=3)
+        for record in MOCK_WORKOUT_RECORDS[:5]:
+            archive.append(1, [record])
+        levels = [(segment.number, segment.level, segment.rows) for segment in archive.segments(1)]
+        print(f"   (段号, 层级, 行数): {levels}")
+        assert levels == [(4, 1, 3), (5, 0, 1), (6, 0, 1)]
+
+        archive.append(1, [MOCK_WORKOUT_RECORDS[5]])
+        levels = [(segment.number, segment.level, segment.rows) for segment in archive.segments(1)]
+        print(f"   第6次追加后: {levels}")
+        assert levels == [(4, 1, 3), (8, 1, 3)]
+        assert archive.compact(1, full=True) == 6
+        assert [(segment.level, segment.rows) for segment in archive.segments(1)] == [(2, 6)]
+        assert len(os.listdir(os.path.join(root, "user_1"))) == 1
+        archive.close()
+
+
+def test_crash_during_compaction():
+    """合并段写入后、旧段删除前崩溃：读取时忽略被取代的段，下次压缩清理残留"""
+    print("\n4. 测试压缩中途崩溃:")
+    with tempfile.TemporaryDirectory() as root:
+        archive = ColumnarArchive(root, compact_threshold=100)
+        archive.append(1, MOCK_WORKOUT_RECORDS[:4])
+        archive.append(1, MOCK_WORKOUT_RECORDS[4:])
+        user_dir = os.path.join(root, "user_1")
+        # 模拟崩溃：合并段已原子改名生效，旧段和另一个未完成的临时文件还在
+        write_segment(os.path.join(user_dir, "seg_000003.wkc"), MOCK_WORKOUT_RECORDS, {"level": 1, "replaces": [1, 2]})
+        with open(os.path.join(user_dir, "seg_000004.wkc.tmp"), "wb") as f:
+            f.write(b"partial")
+        archive.close()
+
+        reopened = ColumnarArchive(root, compact_threshold=100)
+        records = reopened.get_records(user_id=1)
+        print(f"   有效段: {[segment.number for segment in reopened.segments(1)]}, 记录数: {len(records)}")
+        assert [segment.number for segment in reopened.segments(1)] == [3]
+        assert sorted(r["id"] for r in records) == sorted(r["id"] for r in MOCK_WORKOUT_RECORDS)
+
+        reopened.compact(1)
+        assert os.listdir(user_dir) == ["seg_000003.wkc"]
+        reopened.close()
+
+
+if __name__ == "__main__":
+    print("开始测试列式归档...")
+    try:
+        test_append_and_query()
+        test_compaction()
+        test_tiered_compaction()
+        test_crash_during_compaction()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,110 @@
+"""测试时间范围解析 - 常见中英文表达解析为精确日期范围，且不依赖LLM"""
+import time
+from datetime import date
+from agents.prefetch import SpeculativePrefetcher
+from utils.date_range import parse_date_range
+
+TODAY = date(2024, 5, 15)  # 周三
+
+
+def _range(query):
+    parsed = parse_date_range(query, today=TODAY)
+    return (parsed.start.isoformat(), parsed.end.isoformat()) if parsed else None
+
+
+def test_relative_ranges():
+    """相对时间：最近N天/周/月、上个月、本周等"""
+    print("\n1. 测试相对时间:")
+    cases = {
+        "上个月跑了多少": ("2024-04-01", "2024-04-30"),
+        "最近两周的运动": ("2024-05-02", "2024-05-15"),
+        "过去30天": ("2024-04-16", "2024-05-15"),
+        "近三个月趋势": ("2024-02-16", "2024-05-15"),
+        "过去一年的历史": ("2023-05-16", "2024-05-15"),
+        "最近半年": ("2023-11-16", "2024-05-15"),
+        "本周练了几次": ("2024-05-13", "2024-05-15"),
+        "上周": ("2024-05-06", "2024-05-12"),
+        "昨天": ("2024-05-14", "2024-05-14"),
+        "last month": ("2024-04-01", "2024-04-30"),
+        "past 2 weeks": ("2024-05-02", "2024-05-15"),
+    }
+    for query, expected in cases.items():
+        print(f"   {query} -> {_range(query)}")
+        assert _range(query) == expected
+
+
+def test_absolute_ranges():
+    """绝对时间：月份、年份、日期和日期区间（未写年份时取不晚于今天的最近一次）"""
+    print("\n2. 测试绝对时间:")
+    cases = {
+        "3月份的运动": ("2024-03-01", "2024-03-31"),
+        "十二月练得怎么样": ("2023-12-01", "2023-12-31"),
+        "2023年3月": ("2023-03-01", "2023-03-31"),
+        "去年": ("2023-01-01", "2023-12-31"),
+        "今年": ("2024-01-01", "2024-05-15"),
+        "3月5日跑步": ("2024-03-05", "2024-03-05"),
+        "2024-03-01到2024-03-15": ("2024-03-01", "2024-03-15"),
+        "12月28日至1月3日": ("2023-12-28", "2024-01-03"),
+        "1月到3月的记录": ("2024-01-01", "2024-03-31"),
+        "3月至5月": ("2024-03-01", "2024-05-15"),
+        "11月到2月": ("2023-11-01", "2024-02-29"),
+        "2022年11月至2023年2月": ("2022-11-01", "2023-02-28"),
+        "2023年3月到6月": ("2023-03-01", "2023-06-30"),
+        "in March": ("2024-03-01", "2024-03-31"),
+    }
+    for query, expected in cases.items():
+        print(f"   {query} -> {_range(query)}")
+        assert _range(query) == expected
+
+
+def test_no_range():
+    """没有时间表达或日期无效时返回None，交由各意图的默认窗口"""
+    print("\n3. 测试无时间表达:")
+    for query in ("给我点建议", "最近怎么样", "may I see my runs", "2024-02-30", "2024-06-01"):
+        print(f"   {query} -> {_range(query)}")
+        assert _range(query) is None
+
+
+def test_parse_speed():
+    """单次解析应在微秒级"""
+    print("\n4. 测试解析速度:")
+    queries = ["最近两周跑步怎么样", "我的运动记录", "3月份的趋势", "last 3 months"] * 2500
+    started = time.perf_counter()
+    for query in queries:
+        parse_date_range(query, today=TODAY)
+    per_call = (time.perf_counter() - started) / len(queries) * 1e6
+    print(f"   平均{per_call:.1f}微秒/次")
+    assert per_call < 200
+
+
+def test_prefetch_forwards_range():
+    """推测式预取把解析出的范围透传给查询函数"""
+    print("\n5. 测试预取透传时间范围:")
+    seen = []
+
+    def fetch(intent, user_id, date_range=None):
+        seen.append(date_range)
+        return "data"
+
+    prefetcher = SpeculativePrefetcher(fetch)
+    date_range = parse_date_range("最近两周的历史", today=TODAY)
+    speculation = prefetcher.start("最近两周的历史", 1, date_range=date_range)
+    assert prefetcher.resolve(speculation, "historical_analysis") == "data"
+    assert seen == [date_range]
+    assert date_range.as_params() == {"start_date": "2024-05-02", "end_date": "2024-05-15"}
+    prefetcher.shutdown()
+
+
+if __name__ == "__main__":
+    print("开始测试时间范围解析...")
+    try:
+        test_relative_ranges()
+        test_absolute_ranges()
+        test_no_range()
+        test_parse_speed()
+        test_prefetch_forwards_range()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,183 @@
+"""测试请求级时间预算 - 按节点切分、超时执行、模型调用超时与模板化简要回复"""
+import concurrent.futures
+import math
+import time
+from agents.prefetch import SpeculativePrefetcher
+from test_fitness_agent import stub_agent
+from utils.deadline import Deadline, DeadlineExceeded, degraded_response, is_timeout, run_with_timeout
+from utils.llm_limiter import LLMLimiter, RateLimitedLLM
+
+
+SHARES = {"router": 0.1, "database": 0.2, "analysis": 0.3, "response": 0.4}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class SlowLLM:
+    """按给定延迟返回的模型，记录每次收到的超时参数"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.timeouts = []
+
+    def invoke(self, messages, timeout=None):
+        self.timeouts.append(timeout)
+        if timeout is not None and timeout < self.delay:
+            time.sleep(timeout)
+            raise TimeoutError("Request timed out.")
+        time.sleep(self.delay)
+        return "ok"
+
+
+class FlakyTimeoutLLM:
+    """每次都超时的模型（APITimeoutError可重试）"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages, timeout=None):
+        self.calls += 1
+        raise type("APITimeoutError", (Exception,), {})("timed out")
+
+
+def test_node_split():
+    """节点可用时间 = 剩余预算 - 后续节点预留，前面节点省下的时间顺延给后面"""
+    print("\n1. 测试按节点切分预算:")
+    clock = FakeClock()
+    deadline = Deadline(10, SHARES, clock=clock)
+    assert math.isclose(deadline.node_timeout("router"), 1.0)
+    clock.now += 0.2  # 路由提前完成
+    assert math.isclose(deadline.node_timeout("database"), 9.8 - 7.0)
+    clock.now += 3.0
+    assert math.isclose(deadline.node_timeout("analysis"), 6.8 - 4.0)
+    assert math.isclose(deadline.node_timeout("response", cap=2.0), 2.0)
+    clock.now += 7.0
+    print(f"   剩余{deadline.remaining()}秒，分析可用{deadline.node_timeout('analysis')}秒")
+    assert deadline.expired() and deadline.node_timeout("response") == 0.0
+
+    unlimited = Deadline(0, SHARES)
+    assert unlimited.unlimited and math.isinf(unlimited.node_timeout("router"))
+    assert unlimited.node_timeout("router", cap=5) == 5
+
+
+def test_run_with_timeout():
+    """超时不等待调用完成；调用自身的异常照常抛出"""
+    print("\n2. 测试超时执行:")
+    assert run_with_timeout(lambda: 42, math.inf) == 42
+    assert run_with_timeout(lambda: 42, 1.0) == 42
+    started = time.monotonic()
+    try:
+        run_with_timeout(lambda: time.sleep(0.5), 0.05)
+        assert False, "应超时"
+    except DeadlineExceeded as e:
+        elapsed = time.monotonic() - started
+        print(f"   {elapsed:.3f}秒后放弃: {e}")
+        assert elapsed < 0.3 and is_timeout(e)
+    # Python 3.11之前futures的超时异常不是内置TimeoutError
+    assert is_timeout(concurrent.futures.TimeoutError())
+    try:
+        run_with_timeout(lambda: 1 / 0, 1.0)
+        assert False, "应抛出原异常"
+    except ZeroDivisionError:
+        pass
+    try:
+        run_with_timeout(lambda: 42, 0)
+        assert False, "预算已用完"
+    except DeadlineExceeded:
+        pass
+
+
+def test_llm_timeout():
+    """模型调用以剩余时间作为请求超时，重试不超过截止时间"""
+    print("\n3. 测试模型调用超时:")
+    slow = SlowLLM(delay=0.5)
+    llm = RateLimitedLLM(slow, LLMLimiter(max_retries=0))
+    started = time.monotonic()
+    try:
+        llm.invoke("你好", timeout=0.1)
+        assert False, "应超时"
+    except TimeoutError:
+        elapsed = time.monotonic() - started
+    print(f"   请求超时参数{slow.timeouts[0]:.3f}秒，{elapsed:.3f}秒后返回")
+    assert slow.timeouts[0] <= 0.1 and elapsed < 0.3
+    # 不传timeout时保持原调用方式
+    assert RateLimitedLLM(SlowLLM(delay=0), LLMLimiter()).invoke("你好") == "ok"
+
+    flaky = FlakyTimeoutLLM()
+    limiter = LLMLimiter(max_retries=10, backoff_base=0.2, backoff_max=0.2)
+    started = time.monotonic()
+    try:
+        RateLimitedLLM(flaky, limiter).invoke("你好", timeout=0.3)
+        assert False, "应失败"
+    except Exception as e:
+        assert is_timeout(e)
+    elapsed = time.monotonic() - started
+    print(f"   可重试超时{flaky.calls}次，{elapsed:.3f}秒后放弃")
+    assert flaky.calls < 10 and elapsed < 0.5
+    assert limiter.snapshot()["failures"] == 1
+
+
+def test_prefetch_timeout():
+    """预取未在预算内完成时放弃等待"""
+    print("\n4. 测试预取等待超时:")
+    prefetcher = SpeculativePrefetcher(lambda intent, user_id: time.sleep(0.5) or "data")
+    speculation = prefetcher.start("今天练得怎么样", 1)
+    assert prefetcher.resolve(speculation, "today_performance", timeout=0.05) is None
+    snapshot = prefetcher.snapshot()
+    print(f"   指标{snapshot}")
+    assert snapshot["timeouts"] == 1 and snapshot["issued"] == 1
+    prefetcher.shutdown()
+
+
+def test_degraded_response():
+    """模板化简要回复引用有限行数据并附带已有分析"""
+    print("\n5. 测试简要回复:")
+    data = "\n".join(f"2024-01-{day:02d} 跑步 30分钟" for day in range(1, 21))
+    text = degraded_response(data, "本周运动频率稳定", max_lines=5)
+    print(f"   {text}")
+    assert text.startswith("（当前请求较多")
+    assert "2024-01-05" in text and "2024-01-06" not in text
+    assert "另有15行未列出" in text and "本周运动频率稳定" in text
+    assert "暂时没有查询到相关数据" in degraded_response("")
+
+
+def test_agent_degrades_within_budget():
+    """经过完整的Agent图：预算不足时在预算内返回简要回复，有缓存的回答时优先返回缓存"""
+    print("\n6. 测试Agent端到端降级:")
+    query = "今天练得怎么样？（预算测试）"
+    with stub_agent(latency_mean=0.5) as agent:
+        started = time.monotonic()
+        result = agent.run(query, user_id=1, deadline_seconds=1.0)
+        elapsed = time.monotonic() - started
+        print(f"   {elapsed:.3f}秒返回，降级{result['degraded']}: {result['response'][:40]}")
+        assert elapsed < 1.0
+        assert result["response"].startswith("（当前请求较多")
+        assert {"router", "response"} <= set(result["degraded"])
+
+        full = agent.run(query, user_id=1, deadline_seconds=0)
+        assert full["degraded"] == [] and not full["response"].startswith("（当前请求较多")
+        cached = agent.run(query, user_id=1, deadline_seconds=1.0)
+        print(f"   再次降级时返回缓存的回答，降级{cached['degraded']}")
+        assert cached["response"] == full["response"] and "response" in cached["degraded"]
+
+
+if __name__ == "__main__":
+    print("开始测试时间预算...")
+    try:
+        test_node_split()
+        test_run_with_timeout()
+        test_llm_timeout()
+        test_prefetch_timeout()
+        test_degraded_response()
+        test_agent_degrades_within_budget()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,59 @@
+"""测试用户画像特征 - 增量统计应与全量计算一致"""
+import statistics
+from datetime import date, timedelta
+from database.feature_store import FeatureStore
+from database.mock_data import MOCK_WORKOUT_RECORDS
+from utils.online_stats import RunningStats
+
+
+def test_running_stats_matches_batch():
+    """Welford增量结果应与statistics模块的全量结果一致"""
+    print("\n1. 测试在线统计:")
+    values = [30, 45, 60, 40, 30, 50, 35, 45]
+    stats = RunningStats()
+    for value in values:
+        stats.update(value)
+    print(f"   均值{stats.mean:.2f}，标准差{stats.std:.2f}")
+    assert abs(stats.mean - statistics.mean(values)) < 1e-9
+    assert abs(stats.variance - statistics.variance(values)) < 1e-9
+    assert stats.min == 30 and stats.max == 60
+
+
+def test_profile_from_mock_records():
+    """用模拟数据初始化后，画像应包含各运动类型和个人最佳"""
+    print("\n2. 测试画像特征:")
+    store = FeatureStore()
+    store.bootstrap(MOCK_WORKOUT_RECORDS)
+    profile = store.get(1)
+    print(store.summary(1))
+    running = [r["duration"] for r in MOCK_WORKOUT_RECORDS if r["exercise_type"] == "跑步"]
+    assert profile.exercises["跑步"].best_duration == max(running)
+    assert abs(profile.exercises["跑步"].duration.mean - statistics.mean(running)) < 1e-9
+    assert profile.total_sessions == len(MOCK_WORKOUT_RECORDS)
+
+
+def test_weekly_rollover():
+    """跨周时上一周的合计应并入周统计"""
+    print("\n3. 测试周统计滚动:")
+    store = FeatureStore()
+    monday = date(2024, 1, 1)
+    for offset, duration in ((0, 30), (2, 40), (7, 50)):
+        store.observe({"user_id": 2, "date": (monday + timedelta(days=offset)).isoformat(),
+                       "exercise_type": "跑步", "duration": duration})
+    profile = store.get(2)
+    print(f"   已结束周数{profile.weekly_duration.count}，周均{profile.weekly_duration.mean}分钟")
+    assert profile.weekly_duration.count == 1 and profile.weekly_duration.mean == 70
+    assert profile.current_week_duration == 50
+
+
+if __name__ == "__main__":
+    print("开始测试用户画像特征...")
+    try:
+        test_running_stats_matches_batch()
+        test_profile_from_mock_records()
+        test_weekly_rollover()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,59 @@
+"""测试Agent端到端流程 - 在本地LLM桩服务上运行完整的流水线图"""
+from contextlib import contextmanager
+import config
+from agents import nodes
+from agents.fitness_agent import FitnessAgent
+from stub_llm_server import StubConfig, start_stub_server
+
+
+NODE_TIERS = ("router", "analysis", "response", "report")
+
+
+@contextmanager
+def stub_agent(**stub_options):
+    """
+    启动桩服务并把各节点的模型指向它，返回新建的FitnessAgent
+
+    节点模块可能已被其他测试导入，因此按当前配置重新创建各节点的模型，结束后恢复。
+    """
+    server, base_url = start_stub_server(StubConfig(**stub_options))
+    saved_config = (config.OPENAI_BASE_URL, config.OPENAI_API_KEY)
+    saved_llms = {name: getattr(nodes, name) for name in [f"{tier}_llm" for tier in NODE_TIERS] + ["llm"]}
+    config.OPENAI_BASE_URL = base_url
+    config.OPENAI_API_KEY = config.OPENAI_API_KEY or "stub"
+    try:
+        for tier in NODE_TIERS:
+            setattr(nodes, f"{tier}_llm", nodes.create_node_llm(tier))
+        nodes.llm = nodes.response_llm
+        yield FitnessAgent()
+    finally:
+        for name, model in saved_llms.items():
+            setattr(nodes, name, model)
+        config.OPENAI_BASE_URL, config.OPENAI_API_KEY = saved_config
+        server.shutdown()
+
+
+def test_pipeline_end_to_end():
+    """各类查询都经过路由、预取、查询、分析和回复节点，返回正常回复"""
+    print("\n1. 测试流水线端到端:")
+    queries = ["我今天的运动表现如何？", "最近一个月的运动情况", "备注里提到膝盖的记录", "给我点建议"]
+    with stub_agent(latency_mean=0.01) as agent:
+        hits_before = nodes.prefetcher.snapshot()["hits"]
+        for query in queries:
+            result = agent.run(query, user_id=1, deadline_seconds=0)
+            print(f"   {query} -> {result['response'][:30]}")
+            assert result["response"] and not result["response"].startswith("Agent执行出错")
+            assert result["degraded"] == []
+        # 带关键词的查询预测命中，直接采用预取结果
+        assert nodes.prefetcher.snapshot()["hits"] > hits_before
+
+
+if __name__ == "__main__":
+    print("开始测试Agent端到端流程...")
+    try:
+        test_pipeline_end_to_end()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
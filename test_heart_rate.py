@@ -0,0 +1,119 @@
+"""测试心率采样 - 压缩编码可逆，降采样与概况长度有界"""
+from collections import Counter
+from database.heart_rate import (
+    HeartRateSeries, HeartRateStore, lttb, zone_seconds, summarize_series, ingest_samples,
+    heart_rate_summary_for_date
+)
+from database.mock_data import MOCK_WORKOUT_RECORDS
+
+
+class RecordingConnection:
+    """记录execute_many调用的假连接"""
+
+    def __init__(self):
+        self.batches = []
+
+    def execute_many(self, query, rows):
+        self.batches.append(list(rows))
+        return len(rows)
+
+
+def _samples(seconds=7200, start=1_700_000_000):
+    return [(start + i, 120 + (i // 60) % 40 - (i % 7)) for i in range(seconds)]
+
+
+def test_series_roundtrip():
+    """压缩序列解码后应与原始采样完全一致，且远小于元组列表"""
+    print("\n1. 测试压缩序列:")
+    samples = _samples()
+    series = HeartRateSeries.from_samples(samples)
+    print(f"   {len(series)}个采样，{series.nbytes}字节")
+    assert list(series) == samples
+    assert series.nbytes <= 2 * len(samples) + 4
+    assert series.min == min(v for _, v in samples) and series.max == max(v for _, v in samples)
+
+
+def test_lttb_keeps_extremes():
+    """降采样保留首尾点和尖峰"""
+    print("\n2. 测试LTTB:")
+    points = [(i, 100) for i in range(1000)]
+    points[537] = (537, 190)
+    sampled = lttb(points, 20)
+    assert len(sampled) == 20
+    assert sampled[0] == points[0] and sampled[-1] == points[-1]
+    assert (537, 190) in sampled
+    assert lttb(points[:10], 20) == points[:10]
+
+
+def test_zones_and_summary():
+    """区间时长之和等于序列时长，概况长度与运动时长无关"""
+    print("\n3. 测试心率区间与概况:")
+    short = HeartRateSeries.from_samples(_samples(1800))
+    long = HeartRateSeries.from_samples(_samples(4 * 3600))
+    zones = zone_seconds(long, 190)
+    assert sum(zones.values()) == 4 * 3600 - 1
+    short_text = summarize_series(short, max_points=32)
+    long_text = summarize_series(long, max_points=32)
+    print(long_text)
+    assert abs(len(long_text) - len(short_text)) < 80
+
+
+def test_ingest_batches():
+    """批量写入按batch_size切分"""
+    print("\n4. 测试批量写入:")
+    connection = RecordingConnection()
+    written = ingest_samples(1, 1, _samples(2500), connection=connection, batch_size=1000)
+    assert written == 2500
+    assert [len(batch) for batch in connection.batches] == [1000, 1000, 500]
+
+
+def test_summary_for_mock_day():
+    """模拟记录当天的心率概况包含每次运动"""
+    print("\n5. 测试当日心率概况:")
+    day = MOCK_WORKOUT_RECORDS[0]["date"]
+    text = heart_rate_summary_for_date(1, day)
+    print(text)
+    assert text.count("心率曲线") == sum(1 for r in MOCK_WORKOUT_RECORDS if r["date"] == day and r["user_id"] == 1)
+
+
+def test_day_curve_budget():
+    """一天多次运动时，全天曲线总点数不超过点数上限"""
+    print("\n6. 测试全天曲线点数上限:")
+    counts = Counter(r["date"] for r in MOCK_WORKOUT_RECORDS if r["user_id"] == 1)
+    day, workouts = counts.most_common(1)[0]
+    text = heart_rate_summary_for_date(1, day, max_points=24)
+    curves = [line.split("：", 1)[1].split() for line in text.splitlines() if line.startswith("心率曲线")]
+    print(f"   {day}共{workouts}次运动，各段曲线点数: {[len(curve) for curve in curves]}")
+    assert len(curves) == workouts
+    assert sum(len(curve) for curve in curves) <= 24
+
+
+def test_store_lru_bound():
+    """心率序列缓存超过上限时淘汰最久未使用的序列"""
+    print("\n7. 测试序列缓存上限:")
+    store = HeartRateStore(max_series=2)
+    records = [dict(r) for r in MOCK_WORKOUT_RECORDS[:3]]
+    first = store.get(records[0])
+    store.get(records[1])
+    assert store.get(records[0]) is first  # 命中后成为最近使用
+    store.get(records[2])
+    print(f"   缓存: {list(store.series)}，淘汰{store.evictions}个")
+    assert list(store.series) == [records[0]["id"], records[2]["id"]]
+    assert store.evictions == 1
+
+
+if __name__ == "__main__":
+    print("开始测试心率采样...")
+    try:
+        test_series_roundtrip()
+        test_lttb_keeps_extremes()
+        test_zones_and_summary()
+        test_ingest_batches()
+        test_summary_for_mock_day()
+        test_day_curve_budget()
+        test_store_lru_bound()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
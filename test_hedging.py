@@ -0,0 +1,151 @@
+"""测试LLM对冲请求 - 慢调用时再发一路、先返回者胜出、额外负载上限，并在注入长尾延迟的桩服务上验证"""
+import json
+import time
+import urllib.request
+from stub_llm_server import StubConfig, start_stub_server
+from utils.llm_limiter import Hedger, HedgeCancelled, LLMLimiter, RateLimitedLLM
+
+
+class StubChat:
+    """经标准库HTTP客户端调用桩服务的最小聊天模型"""
+
+    def __init__(self, base_url):
+        self.endpoint = f"{base_url}/chat/completions"
+
+    def invoke(self, messages, timeout=None):
+        payload = {"model": "stub", "messages": [{"role": "user", "content": str(messages)}]}
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=timeout or 10) as response:
+            return json.loads(response.read())["choices"][0]["message"]["content"]
+
+
+def _warm(hedger, latency=0.01, count=20):
+    for _ in range(count):
+        hedger.call(lambda cancelled: time.sleep(latency))
+
+
+def test_hedge_wins_slow_call():
+    """主调用超过对冲等待时间时再发一路，先返回的一路胜出"""
+    print("\n1. 测试对冲胜出:")
+    hedger = Hedger(percentile=95, min_delay=0.01, min_samples=20)
+    assert hedger.hedge_delay() is None
+    _warm(hedger)
+    attempts = []
+
+    def call(cancelled):
+        attempts.append(time.monotonic())
+        time.sleep(0.5 if len(attempts) == 1 else 0.01)
+        return len(attempts)
+
+    started = time.monotonic()
+    result = hedger.call(call)
+    elapsed = time.monotonic() - started
+    snapshot = hedger.snapshot()
+    print(f"   {elapsed:.3f}秒返回第{result}路，对冲等待{snapshot['hedge_delay']}秒，指标{snapshot}")
+    assert result == 2 and elapsed < 0.2
+    assert snapshot["hedged"] == 1 and snapshot["hedge_wins"] == 1
+    assert snapshot["hedge_rate"] == round(1 / 21, 4) and snapshot["hedge_win_rate"] == 1.0
+
+    # 主调用在等待时间内失败：直接抛出，不对冲
+    def fail(cancelled):
+        raise ValueError("bad request")
+
+    try:
+        hedger.call(fail)
+        assert False, "应抛出原异常"
+    except ValueError:
+        pass
+    assert hedger.snapshot()["hedged"] == 1
+    hedger.shutdown()
+
+
+def test_extra_load_capped():
+    """对冲次数不超过 burst + max_extra_ratio × 调用数"""
+    print("\n2. 测试额外负载上限:")
+    hedger = Hedger(percentile=50, min_delay=0.01, max_extra_ratio=0.1, burst=1, min_samples=5)
+    _warm(hedger, count=5)
+    for _ in range(40):
+        hedger.call(lambda cancelled: time.sleep(0.03))
+    snapshot = hedger.snapshot()
+    print(f"   调用{snapshot['calls']}次，对冲{snapshot['hedged']}次，额度不足{snapshot['budget_exhausted']}次")
+    assert 0 < snapshot["hedged"] <= 1 + 0.1 * snapshot["calls"]
+    assert snapshot["budget_exhausted"] > 0
+    hedger.shutdown()
+
+
+def test_loser_cancelled_in_limiter():
+    """落败一路还在限流器中排队时不再发出请求，归还槽位且不计为失败"""
+    print("\n3. 测试取消排队中的一路:")
+    sent = []
+
+    class SlowFirst:
+        def invoke(self, messages):
+            sent.append(messages)
+            time.sleep(0.2)
+            return "ok"
+
+    limiter = LLMLimiter(initial_concurrency=1, max_concurrency=1)
+    hedger = Hedger(percentile=50, min_delay=0.05, min_samples=1)
+    hedger.latencies.append(0.05)
+    llm = RateLimitedLLM(SlowFirst(), limiter, hedger=hedger)
+    assert llm.invoke("你好") == "ok"
+    time.sleep(0.1)
+    snapshot = limiter.snapshot()
+    print(f"   发出{len(sent)}个请求，限流器指标{snapshot}，对冲指标{hedger.snapshot()}")
+    assert len(sent) == 1
+    assert snapshot["hedges_cancelled"] == 1 and snapshot["failures"] == 0
+    assert snapshot["in_flight"] == 0
+    assert hedger.snapshot()["cancelled"] == 1 and hedger.snapshot()["primary_wins"] == 1
+    assert issubclass(HedgeCancelled, Exception)
+    hedger.shutdown()
+
+
+def test_against_stub_tail_latency():
+    """桩服务注入5%的慢请求：不对冲时出现长尾，对冲后长尾被消除"""
+    print("\n4. 测试桩服务长尾延迟:")
+    server, base_url = start_stub_server(StubConfig(latency_mean=0.01, slow_rate=0.05, slow_seconds=0.6, seed=3))
+    try:
+        plain = RateLimitedLLM(StubChat(base_url), LLMLimiter())
+        latencies = []
+        for i in range(40):
+            started = time.monotonic()
+            plain.invoke(f"查询{i}")
+            latencies.append(time.monotonic() - started)
+        slow_plain = sum(1 for latency in latencies if latency > 0.3)
+
+        hedger = Hedger(percentile=90, min_delay=0.02, max_extra_ratio=0.2, burst=5, min_samples=20)
+        hedged = RateLimitedLLM(StubChat(base_url), LLMLimiter(), hedger=hedger)
+        for i in range(20):
+            hedged.invoke(f"预热{i}")
+        latencies = []
+        for i in range(80):
+            started = time.monotonic()
+            hedged.invoke(f"查询{i}")
+            latencies.append(time.monotonic() - started)
+        slow_hedged = sum(1 for latency in latencies if latency > 0.3)
+        snapshot = hedger.snapshot()
+        print(f"   不对冲：40次中{slow_plain}次超过0.3秒；对冲：80次中{slow_hedged}次，最慢{max(latencies):.3f}秒")
+        print(f"   对冲指标{snapshot}，桩服务指标{server.metrics.snapshot()}")
+        assert slow_plain > 0
+        assert slow_hedged <= 1
+        assert snapshot["hedge_wins"] > 0
+        assert snapshot["hedged"] <= 5 + 0.2 * snapshot["calls"]
+        hedger.shutdown()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    print("开始测试对冲请求...")
+    try:
+        test_hedge_wins_slow_call()
+        test_extra_load_capped()
+        test_loser_cancelled_in_limiter()
+        test_against_stub_tail_latency()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,259 @@
+"""测试设备上传写入缓冲 - 批量合并、背压、失败重试与崩溃后日志重放（SQLite本地分片）"""
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date
+from database.ingest import WriteBehindBuffer, IngestJournal
+from database.mock_data import generate_mock_records
+from database.rollups import RollupStore
+from database.sharding import ShardRouter
+
+
+def _router(root, count=2):
+    return ShardRouter.from_config({
+        "local_shards": count,
+        "local_dir": os.path.join(root, "shards"),
+        "map_path": os.path.join(root, "shard_map.json"),
+        "vnodes": 64,
+    })
+
+
+def _records(users=range(1, 11)):
+    records = []
+    for user_id in users:
+        records.extend(generate_mock_records(user_id, date(2024, 1, 1), date(2024, 3, 31)))
+    return records
+
+
+def _count(router):
+    counts = router.scatter_gather("SELECT COUNT(*) AS n FROM workout_records")
+    return sum(rows[0]["n"] for rows in counts.values())
+
+
+def _buffer(root, router, published, **kwargs):
+    options = {"max_batch": 100, "flush_interval": 0.05, "writers": 2}
+    options.update(kwargs)
+    return WriteBehindBuffer(router, journal_dir=os.path.join(root, "journal"), publish=published.append, **options)
+
+
+def test_batches_and_notifies():
+    """记录按分片合并为多行插入；提交后逐条通知；日志清空"""
+    print("\n1. 测试批量写入:")
+    records = _records()
+    published = []
+    with tempfile.TemporaryDirectory() as root:
+        router = _router(root)
+        router.create_schema()
+
+        async def run():
+            buffer = _buffer(root, router, published)
+            await buffer.start()
+            await buffer.submit_many(records)
+            await buffer.close()
+            return buffer.snapshot()
+
+        stats = asyncio.run(run())
+        print(f"   {stats['committed']}条记录，{stats['batches']}批，平均每批{stats['avg_batch_size']}条")
+        assert _count(router) == len(records)
+        assert stats["batches"] <= len(records) // 100 + 4
+        assert sorted(row["id"] for row in published) == sorted(r["id"] for r in records)
+        assert stats["journal_pending"] == 0
+        # 只剩当前段
+        assert len(os.listdir(os.path.join(root, "journal"))) == 1
+        router.close()
+
+
+def test_backpressure():
+    """未提交的记录不超过max_pending，超过时submit等待"""
+    print("\n2. 测试背压:")
+    records = _records(range(1, 4))
+    published = []
+    with tempfile.TemporaryDirectory() as root:
+        router = _router(root)
+        router.create_schema()
+
+        async def run():
+            buffer = _buffer(root, router, published, max_batch=20, max_pending=50)
+            await buffer.start()
+            await buffer.submit_many(records)
+            await buffer.close()
+            return buffer.snapshot()
+
+        stats = asyncio.run(run())
+        print(f"   峰值待写{stats['peak_pending']}条，等待{stats['backpressure_waits']}次")
+        assert stats["peak_pending"] <= 50
+        assert stats["backpressure_waits"] > 0
+        assert _count(router) == len(records)
+        router.close()
+
+
+def test_retry_and_crash_replay():
+    """写入失败的记录保留重试；进程崩溃后重放未确认的记录，已提交的不重复"""
+    print("\n3. 测试失败重试与崩溃重放:")
+    records = _records(range(1, 4))
+    first, second = records[:100], records[100:]
+    published = []
+    with tempfile.TemporaryDirectory() as root:
+        router = _router(root)
+
+        async def crash():
+            buffer = _buffer(root, router, published, flush_interval=60)
+            await buffer.start()
+            # 表还不存在：写入失败，记录留在缓冲和日志中
+            await buffer.submit_many(first)
+            assert not await buffer.flush()
+            assert buffer.snapshot()["flush_errors"] > 0
+            router.create_schema()
+            assert await buffer.flush()
+            # 之后的记录只写入了日志，进程“崩溃”
+            await buffer.submit_many(second)
+            buffer.task.cancel()
+            buffer.executor.shutdown()
+            buffer.journal.close()
+
+        asyncio.run(crash())
+        # 模拟崩溃时写了一半的日志行
+        journal_dir = os.path.join(root, "journal")
+        with open(os.path.join(journal_dir, sorted(os.listdir(journal_dir))[-1]), "a", encoding="utf-8") as f:
+            f.write('{"seq": 99999, "tab')
+        assert _count(router) == len(first)
+
+        async def recover():
+            buffer = _buffer(root, router, published)
+            await buffer.start()
+            replayed = buffer.snapshot()["replayed"]
+            await buffer.close()
+            return replayed
+
+        replayed = asyncio.run(recover())
+        print(f"   重放{replayed}条，数据库共{_count(router)}条")
+        assert replayed == len(second)
+        assert _count(router) == len(records)
+        assert len(published) == len(records)
+        router.close()
+
+
+def test_duplicates_not_republished():
+    """重复上传和提交后、确认前崩溃的重放只插入一次，也只发布一次（派生汇总不重复累加）"""
+    print("\n4. 测试重复记录不重复发布:")
+    record = {**_records(range(1, 2))[0], "id": 9001, "duration": 30}
+    others = _records(range(2, 3))[:20]
+    store = RollupStore()
+    with tempfile.TemporaryDirectory() as root:
+        router = _router(root)
+        router.create_schema()
+
+        async def resubmit():
+            buffer = _buffer(root, router, [], flush_interval=60)
+            buffer.publish = store.observe
+            await buffer.start()
+            # 同一批次内重复、跨批次再次上传
+            await buffer.submit(record)
+            await buffer.submit(dict(record))
+            await buffer.flush()
+            await buffer.submit(dict(record))
+            await buffer.close()
+            return buffer.snapshot()
+
+        stats = asyncio.run(resubmit())
+        day = date.fromisoformat(str(record["date"])[:10])
+        total = store.summarize(1, day, day)["total"]
+        print(f"   提交{stats['committed']}条，跳过重复{stats['duplicates']}条，汇总{total['workout_count']}次")
+        assert _count(router) == 1 and stats["duplicates"] == 2
+        assert total["workout_count"] == 1 and total["total_duration"] == 30
+
+        async def crash_before_ack():
+            buffer = _buffer(root, router, [], flush_interval=60)
+            buffer.publish = store.observe
+            await buffer.start()
+            await buffer.submit_many(others)
+            # 写入数据库但在确认和发布之前崩溃
+            for key, group in buffer.groups.items():
+                buffer._execute(key[0], key[1], [row for _, row in group.items])
+            buffer.task.cancel()
+            buffer.executor.shutdown()
+            buffer.journal.close()
+
+        asyncio.run(crash_before_ack())
+        # 重启后派生数据从数据库重建，已包含这些记录
+        store.bootstrap(others)
+        published = []
+
+        async def recover():
+            buffer = _buffer(root, router, published)
+            await buffer.start()
+            await buffer.close()
+            return buffer.snapshot()
+
+        stats = asyncio.run(recover())
+        print(f"   重放{stats['replayed']}条，重新发布{len(published)}条")
+        assert stats["replayed"] == len(others) and published == []
+        assert _count(router) == 1 + len(others)
+        assert stats["journal_pending"] == 0
+        router.close()
+
+
+def test_journal_segments():
+    """日志按段切分，前缀段全部确认后删除"""
+    print("\n5. 测试日志分段:")
+    with tempfile.TemporaryDirectory() as root:
+        journal = IngestJournal(root, segment_bytes=200)
+        assert journal.open() == []
+        seqs = [journal.append("workout_records", {"id": i, "user_id": 1}) for i in range(10)]
+        segments = len(os.listdir(root))
+        journal.ack(seqs[:5])
+        assert journal.pending == 5
+        journal.ack(seqs[5:])
+        print(f"   写入时{segments}段，全部确认后{len(os.listdir(root))}段")
+        assert segments > 2 and len(os.listdir(root)) == 1
+        journal.close()
+
+
+def test_faster_than_per_record_commits():
+    """批量写入应明显快于逐条execute_query（每条一次提交）"""
+    print("\n6. 测试写入速度:")
+    records = _records(range(1, 6))
+    columns = ("id", "user_id", "date", "exercise_type", "duration", "calories_burned", "heart_rate_avg", "notes", "created_at")
+    insert = (
+        f"INSERT INTO workout_records ({', '.join(columns)}) "
+        f"VALUES ({', '.join('%(' + c + ')s' for c in columns)})"
+    )
+    with tempfile.TemporaryDirectory() as root:
+        router = _router(root, 1)
+        router.create_schema()
+        started = time.perf_counter()
+        for record in records:
+            router.connection_for(record["user_id"]).execute_query(insert, record)
+        per_record = time.perf_counter() - started
+        router.scatter_gather("DELETE FROM workout_records")
+
+        async def run():
+            buffer = _buffer(root, router, [], max_batch=500)
+            await buffer.start()
+            await buffer.submit_many(records)
+            await buffer.close()
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        buffered = time.perf_counter() - started
+        print(f"   {len(records)}条：逐条提交{per_record:.3f}s，缓冲写入{buffered:.3f}s")
+        assert _count(router) == len(records)
+        assert buffered < per_record
+        router.close()
+
+
+if __name__ == "__main__":
+    print("开始测试写入缓冲...")
+    try:
+        test_batches_and_notifies()
+        test_backpressure()
+        test_retry_and_crash_replay()
+        test_duplicates_not_republished()
+        test_journal_segments()
+        test_faster_than_per_record_commits()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,150 @@
+"""测试LLM限流器 - 使用伪造的模型调用，不依赖真实API"""
+import threading
+import time
+from utils.llm_limiter import LLMLimiter, RateLimitedLLM, TokenBucket, UsageTracker, classify_error
+
+
+class FakeRateLimitError(Exception):
+    """模拟openai返回的429错误"""
+    status_code = 429
+
+
+def test_retry_on_rate_limit():
+    """429错误应被重试，并触发并发上限缩减"""
+    print("\n1. 测试429重试与AIMD缩减:")
+    limiter = LLMLimiter(initial_concurrency=8, max_retries=3, backoff_base=0.01, backoff_max=0.02)
+    attempts = {"count": 0}
+
+    def flaky_call():
+        attempts["count"] += 1
+        if attempts["count"] < 3:
+            raise FakeRateLimitError("Too Many Requests")
+        return "ok"
+
+    result = limiter.call(flaky_call)
+    snapshot = limiter.snapshot()
+    print(f"   调用结果: {result}, 尝试次数: {attempts['count']}")
+    print(f"   指标: {snapshot}")
+    assert result == "ok"
+    assert snapshot["retries"] == 2
+    assert snapshot["rate_limited"] == 2
+    assert snapshot["concurrency_limit"] < 8
+
+
+def test_fatal_error_not_retried():
+    """非限流类错误不应重试"""
+    print("\n2. 测试不可重试错误:")
+    limiter = LLMLimiter(max_retries=3, backoff_base=0.01)
+    attempts = {"count": 0}
+
+    def bad_call():
+        attempts["count"] += 1
+        raise ValueError("bad request")
+
+    try:
+        limiter.call(bad_call)
+    except ValueError:
+        pass
+    print(f"   尝试次数: {attempts['count']}")
+    assert attempts["count"] == 1
+    assert classify_error(ValueError()) == "fatal"
+
+
+def test_concurrency_cap():
+    """同时进行的调用数不应超过并发上限"""
+    print("\n3. 测试并发上限:")
+    limiter = LLMLimiter(initial_concurrency=2, max_concurrency=2)
+    state = {"active": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def slow_call():
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return "ok"
+
+    threads = [threading.Thread(target=limiter.call, args=(slow_call,)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"   峰值并发: {state['peak']}, 排队p95: {limiter.snapshot()['queue_time_p95']}s")
+    assert state["peak"] <= 2
+
+
+def test_token_bucket():
+    """令牌桶在令牌耗尽后应阻塞等待"""
+    print("\n4. 测试令牌桶:")
+    bucket = TokenBucket(rate_per_minute=600, capacity=1)  # 每秒10个
+    bucket.acquire(1)
+    waited = bucket.acquire(1)
+    print(f"   第二次获取等待: {waited:.3f}s")
+    assert waited > 0.05
+
+
+class FakeReply:
+    def __init__(self, content, usage):
+        self.content = content
+        self.usage_metadata = usage
+
+
+class FakeModel:
+    """返回固定用量的伪造模型"""
+
+    def __init__(self, delay, usage, fail=False):
+        self.delay = delay
+        self.usage = usage
+        self.fail = fail
+
+    def invoke(self, messages, **kwargs):
+        time.sleep(self.delay)
+        if self.fail:
+            raise ValueError("bad request")
+        return FakeReply("ok", self.usage)
+
+
+def test_tier_usage_accounting():
+    """各层级分别统计延迟、token和费用"""
+    print("\n5. 测试模型分层用量统计:")
+    limiter = LLMLimiter(max_retries=0)
+    usage = UsageTracker({"small": (0.1, 0.2), "large": (1.0, 2.0)})
+    router = RateLimitedLLM(
+        FakeModel(0.01, {"input_tokens": 100, "output_tokens": 5, "total_tokens": 105}),
+        limiter, max_output_tokens=20, tier="router", model="small", usage=usage
+    )
+    response = RateLimitedLLM(
+        FakeModel(0.05, {"input_tokens": 1000, "output_tokens": 500, "total_tokens": 1500}),
+        limiter, tier="response", model="large", usage=usage
+    )
+    for _ in range(3):
+        router.invoke("路由")
+    response.invoke("回复")
+    try:
+        RateLimitedLLM(FakeModel(0, {}, fail=True), limiter, tier="response", model="large", usage=usage).invoke("x")
+    except ValueError:
+        pass
+    snapshot = usage.snapshot()
+    print(f"   {snapshot}")
+    assert snapshot["router"]["calls"] == 3 and snapshot["router"]["prompt_tokens"] == 300
+    assert abs(snapshot["router"]["cost"] - 3 * (100 * 0.1 + 5 * 0.2) / 1000) < 1e-9
+    assert snapshot["response"]["calls"] == 2 and snapshot["response"]["failures"] == 1
+    assert abs(snapshot["response"]["cost"] - (1000 * 1.0 + 500 * 2.0) / 1000) < 1e-9
+    assert snapshot["router"]["latency_p50"] < snapshot["response"]["latency_p95"]
+
+
+if __name__ == "__main__":
+    print("开始测试LLM限流器...")
+    try:
+        test_retry_on_rate_limit()
+        test_fatal_error_not_retried()
+        test_concurrency_cap()
+        test_token_bucket()
+        test_tier_usage_accounting()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,108 @@
+"""测试压测工具 - 统计正确，能识别吞吐饱和点"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from load_test import (
+    INTENT_QUERIES, IntentSampler, HttpTarget, percentile, run_stage, run_load_test, find_saturation, format_summary
+)
+
+
+def test_percentile_and_sampler():
+    """最近秩分位数；意图抽样比例接近配置"""
+    print("\n1. 测试分位数与意图比例:")
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50 and percentile(values, 99) == 99 and percentile(values, 100) == 100
+    sampler = IntentSampler({"today": 3, "trend": 1})
+    rng = random.Random(0)
+    picks = [sampler.sample(rng)[0] for _ in range(4000)]
+    assert abs(picks.count("today") / 4000 - 0.75) < 0.03
+
+
+def test_stage_records_errors_per_intent():
+    """错误按意图计数，成功请求计入延迟"""
+    print("\n2. 测试阶段统计:")
+
+    def target(query, user_id):
+        time.sleep(0.005)
+        if query in INTENT_QUERIES["comparison"]:
+            raise RuntimeError("比较失败")
+        return "ok"
+
+    stage = run_stage(target, users=3, duration=0.3, mix={"today": 1, "comparison": 1}, think_time=0)
+    print(f"   {stage['completed']}完成，{stage['errors']}失败，吞吐{stage['throughput_rps']}/s")
+    assert stage["intents"]["comparison"]["completed"] == 0
+    assert stage["intents"]["comparison"]["error_rate"] == 1.0
+    assert stage["intents"]["today"]["errors"] == 0 and stage["intents"]["today"]["p50"] >= 0.005
+    assert stage["error_samples"][0].startswith("RuntimeError")
+
+
+def test_saturation_detected():
+    """服务端并发上限为2时，吞吐在2个用户之后不再增长"""
+    print("\n3. 测试饱和点:")
+    capacity = threading.Semaphore(2)
+
+    def target(query, user_id):
+        with capacity:
+            time.sleep(0.02)
+        return "ok"
+
+    result = run_load_test(target, [1, 2, 4, 8], stage_seconds=0.4, think_time=0)
+    print(format_summary(result))
+    assert result["saturation"]["users"] == 4
+    # 闭环下排队等待使平均延迟随用户数增长（Little定律）
+    assert result["stages"][3]["latency"]["mean"] > result["stages"][0]["latency"]["mean"] * 2
+    json.dumps(result)
+
+
+def test_saturation_limits():
+    """错误率或p95超限同样视为饱和"""
+    stages = [
+        {"users": 1, "throughput_rps": 10, "error_rate": 0.0, "latency": {"p95": 0.1}},
+        {"users": 2, "throughput_rps": 20, "error_rate": 0.0, "latency": {"p95": 0.5}},
+    ]
+    assert find_saturation(stages, p95_limit=0.3)["users"] == 2
+    stages[1]["error_rate"] = 0.2
+    assert "错误率" in find_saturation(stages)["reason"]
+
+
+def test_http_target():
+    """HTTP目标按/v1/query协议调用"""
+    print("\n4. 测试HTTP目标:")
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            payload = json.dumps({"response": f"{body['user_id']}:{body['query']}"}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        target = HttpTarget(f"http://127.0.0.1:{server.server_address[1]}")
+        assert target("今天", 7) == "7:今天"
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    print("开始测试压测工具...")
+    try:
+        test_percentile_and_sampler()
+        test_stage_records_errors_per_intent()
+        test_saturation_detected()
+        test_saturation_limits()
+        test_http_target()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,101 @@
+"""测试数据模型的批量转换 - 字典、模型对象、游标行与列式结构之间的往返"""
+from datetime import date, datetime
+from database.models import (
+    WORKOUT_FIELDS, WorkoutRecord, _format_value, dicts_to_columns, records_from_columns,
+    records_to_columns, rows_to_dicts
+)
+
+
+ROW = (7, 2, date(2024, 3, 5), "跑步", 30, 300, 150, "晨跑", datetime(2024, 3, 5, 7, 30, 15))
+ROW_DICT = {
+    "id": 7, "user_id": 2, "date": "2024-03-05", "exercise_type": "跑步", "duration": 30,
+    "calories_burned": 300, "heart_rate_avg": 150, "notes": "晨跑", "created_at": "2024-03-05T07:30:15",
+}
+
+
+class Day(date):
+    """date的子类（如驱动返回的自定义日期类型）"""
+
+
+def test_format_value():
+    """日期/时间转为ISO字符串（包括子类），其余值原样返回"""
+    print("\n1. 测试值格式化:")
+    assert _format_value(date(2024, 3, 5)) == "2024-03-05"
+    assert _format_value(datetime(2024, 3, 5, 7, 30, 15)) == "2024-03-05T07:30:15"
+    assert _format_value(datetime(2024, 3, 5, 7, 30, 15, 120)) == "2024-03-05T07:30:15.000120"
+    assert _format_value(Day(2024, 3, 5)) == "2024-03-05"
+    for value in ("2024-03-05", None, 42, 1.5):
+        assert _format_value(value) == value
+
+
+def test_dict_record_round_trip():
+    """字典 -> 模型 -> 元组/字典，字段不变"""
+    print("\n2. 测试字典与模型往返:")
+    record = WorkoutRecord(*ROW)
+    assert record.to_tuple() == ROW
+    assert record.to_dict() == ROW_DICT
+    assert WorkoutRecord.from_dict(record.to_dict()).to_dict() == ROW_DICT
+
+    partial = WorkoutRecord.from_dict({"id": 8, "exercise_type": "游泳", "date": date(2024, 3, 6)})
+    print(f"   缺失字段取默认值: {partial}")
+    assert partial.user_id == 1 and partial.duration == 0 and partial.notes == ""
+    assert isinstance(partial.created_at, datetime)
+    assert not hasattr(partial, "__dict__")
+
+
+def test_rows_with_column_order():
+    """游标行按列名重排；列顺序一致、重排、多余列都能转换，缺列时报错"""
+    print("\n3. 测试游标行转换:")
+    assert WorkoutRecord.from_rows([ROW])[0].to_tuple() == ROW
+    assert rows_to_dicts([ROW]) == [ROW_DICT]
+    assert rows_to_dicts([ROW], WORKOUT_FIELDS) == [ROW_DICT]
+
+    reordered = tuple(reversed(WORKOUT_FIELDS)) + ("extra",)
+    reordered_row = tuple(reversed(ROW)) + ("ignored",)
+    print(f"   重排后的列: {reordered}")
+    assert rows_to_dicts([reordered_row], reordered) == [ROW_DICT]
+    assert WorkoutRecord.from_rows([reordered_row], reordered)[0].to_tuple() == ROW
+
+    missing = [name for name in WORKOUT_FIELDS if name != "notes"]
+    row = tuple(value for name, value in zip(WORKOUT_FIELDS, ROW) if name != "notes")
+    for convert in (rows_to_dicts, WorkoutRecord.from_rows):
+        try:
+            convert([row], missing)
+            assert False, "缺列应报错"
+        except ValueError as e:
+            print(f"   {e}")
+            assert "notes" in str(e)
+
+
+def test_columns_round_trip():
+    """模型/字典 -> 列式结构 -> 模型，与原记录一致"""
+    print("\n4. 测试列式结构往返:")
+    second = ROW[:2] + (date(2024, 3, 6), "游泳", 45, 400, 130, "", datetime(2024, 3, 6, 18, 0))
+    records = [WorkoutRecord(*ROW), WorkoutRecord(*second)]
+    columns = records_to_columns(records)
+    assert list(columns) == list(WORKOUT_FIELDS)
+    assert columns["duration"] == [30, 45] and columns["date"] == [date(2024, 3, 5), date(2024, 3, 6)]
+    assert [record.to_tuple() for record in records_from_columns(columns)] == [ROW, second]
+
+    dicts = [record.to_dict() for record in records]
+    dict_columns = dicts_to_columns(dicts)
+    assert dict_columns["date"] == ["2024-03-05", "2024-03-06"]
+    assert [record.to_dict() for record in records_from_columns(dict_columns)] == dicts
+
+    empty = {name: [] for name in WORKOUT_FIELDS}
+    assert records_to_columns([]) == empty and dicts_to_columns([]) == empty
+    assert records_from_columns(empty) == []
+
+
+if __name__ == "__main__":
+    print("开始测试数据模型...")
+    try:
+        test_format_value()
+        test_dict_record_round_trip()
+        test_rows_with_column_order()
+        test_columns_round_trip()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
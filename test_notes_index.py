@@ -0,0 +1,118 @@
+"""测试备注检索 - n-gram切分、数值提取、相关度排序与增量更新"""
+import time
+from datetime import date
+from agents.prefetch import keyword_intent
+from database.mock_data import generate_mock_records
+from database.notes_index import NotesIndex, ngrams, normalize, extract_quantities
+
+
+RECORDS = [
+    {"id": 1, "user_id": 1, "date": "2024-05-01", "exercise_type": "跑步", "notes": "晨跑5公里"},
+    {"id": 2, "user_id": 1, "date": "2024-05-02", "exercise_type": "游泳", "notes": "自由泳1000米，20圈"},
+    {"id": 3, "user_id": 1, "date": "2024-05-03", "exercise_type": "跑步", "notes": "夜跑6公里"},
+    {"id": 4, "user_id": 1, "date": "2024-05-04", "exercise_type": "力量训练", "notes": "俯卧撑3组，每组15个"},
+    {"id": 5, "user_id": 2, "date": "2024-05-01", "exercise_type": "跑步", "notes": "晨跑5公里"},
+]
+
+
+def _index():
+    index = NotesIndex()
+    index.bootstrap(RECORDS)
+    return index
+
+
+def test_ngrams_and_quantities():
+    """中文按字符n-gram切分；数值统一换算单位"""
+    print("\n1. 测试切分与数值提取:")
+    assert normalize("晨跑 ５ＫＭ！") == "晨跑5km"
+    assert ngrams("晨跑5", (2, 3)) == ["晨跑", "跑5", "晨跑5"]
+    assert ngrams("跑", (2, 3)) == ["跑"]
+    assert ngrams("晨跑") == ["晨", "跑", "晨跑"]
+    cases = {
+        "晨跑5公里": {"distance_m": 5000.0},
+        "10km": {"distance_m": 10000.0},
+        "自由泳1000米，20圈": {"distance_m": 1000.0, "laps": 20.0},
+        "俯卧撑3组，每组15个": {"sets": 3.0, "reps": 15.0},
+        "跑了半小时": {"minutes": 30.0},
+        "查一个记录": {},
+        "给我看看3个月的数据": {},
+        "1个小时以上的运动": {},
+        "上个月跑了10次吗": {"reps": 10.0},
+        "深蹲做了20个": {"reps": 20.0},
+    }
+    for text, expected in cases.items():
+        print(f"   {text} -> {extract_quantities(text)}")
+        assert extract_quantities(text) == expected
+
+
+def test_ranking():
+    """文本和数值都匹配的记录排在最前；数值不一致的同类记录降权"""
+    print("\n2. 测试相关度排序:")
+    index = _index()
+    results = index.search(1, "我跑5公里的记录")
+    for item in results:
+        print(f"   {item['notes']} {item['score']}")
+    assert [item["id"] for item in results[:2]] == [1, 3]
+    assert index.search(1, "游了20圈")[0]["id"] == 2
+    assert index.search(1, "俯卧撑")[0]["id"] == 4
+    # 只检索当前用户
+    assert all(item["id"] != 5 for item in results)
+    assert index.search(1, "攀岩") == []
+    assert index.search(3, "跑步") == []
+
+
+def test_incremental_update_and_dates():
+    """新记录写入即可检索；更新备注后旧内容不再命中；按日期过滤"""
+    print("\n3. 测试增量更新与日期过滤:")
+    index = _index()
+    index.observe({"id": 6, "user_id": 1, "date": "2024-05-06", "exercise_type": "骑行", "notes": "环湖骑行30公里"})
+    assert index.search(1, "骑行")[0]["id"] == 6
+    index.observe({"id": 6, "user_id": 1, "date": "2024-05-06", "exercise_type": "骑行", "notes": "通勤"})
+    assert index.search(1, "环湖") == []
+    assert index.search(1, "通勤")[0]["id"] == 6
+    dated = index.search(1, "跑", start_date="2024-05-02", end_date="2024-05-31")
+    print(f"   5月2日之后的跑步: {[item['notes'] for item in dated]}")
+    assert [item["id"] for item in dated] == [3]
+    assert index.stats(1)["documents"] == 5
+
+
+def test_search_speed():
+    """一年多的记录中检索应在毫秒级"""
+    print("\n4. 测试检索速度:")
+    index = NotesIndex()
+    index.bootstrap(generate_mock_records(1, date(2023, 1, 1), date(2024, 12, 31)))
+    queries = ["晨跑5公里", "自由泳1000米", "背部训练", "拉伸"] * 50
+    started = time.perf_counter()
+    for query in queries:
+        index.search(1, query)
+    per_query = (time.perf_counter() - started) / len(queries) * 1000
+    print(f"   {index.stats(1)['documents']}条记录，平均{per_query:.2f}毫秒/次")
+    assert per_query < 20
+
+
+def test_notes_intent():
+    """带具体数值或提到备注的查询按备注检索，其他关键词优先"""
+    print("\n5. 测试备注检索意图:")
+    assert keyword_intent("我跑5公里的那次") == "notes_search"
+    assert keyword_intent("备注里写了拉伸的记录") == "notes_search"
+    assert keyword_intent("今天跑了5公里表现如何") == "today_performance"
+    assert keyword_intent("给我点建议") is None
+    # 只有次数、时长或含义不确定的单位时不按备注检索
+    for query in ("给我看看3个月的数据", "上个月跑了10次吗", "1个小时以上的运动", "3m的记录"):
+        assert keyword_intent(query) is None, query
+    assert keyword_intent("游了400m，20圈") == "notes_search"
+
+
+if __name__ == "__main__":
+    print("开始测试备注检索...")
+    try:
+        test_ngrams_and_quantities()
+        test_ranking()
+        test_incremental_update_and_dates()
+        test_search_speed()
+        test_notes_intent()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
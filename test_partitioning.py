@@ -0,0 +1,79 @@
+"""测试分区管理 - 只测试DDL生成和分区裁剪推断，不需要真实数据库"""
+from datetime import date
+from database.connection import DatabaseConnection
+from database.partitioning import (
+    PartitionManager,
+    add_months,
+    expected_partitions,
+    query_date_bounds,
+)
+from database.streaming import build_workout_records_query
+
+
+def make_manager(dialect: str) -> PartitionManager:
+    return PartitionManager(DatabaseConnection({"type": dialect}))
+
+
+def test_month_arithmetic():
+    """月份加减应正确跨年"""
+    print("\n1. 测试月份计算:")
+    assert add_months(date(2024, 11, 15), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    print("   通过")
+
+
+def test_create_table_statements():
+    """两种方言都应生成按月分区的建表语句"""
+    print("\n2. 测试建表DDL:")
+    mysql = make_manager("mysql").create_table_statements(date(2024, 1, 1), date(2024, 3, 1))
+    print(mysql[0].splitlines()[-5])
+    assert "PARTITION BY RANGE COLUMNS(date)" in mysql[0]
+    assert "PARTITION p202403 VALUES LESS THAN ('2024-04-01')" in mysql[0]
+    assert "PARTITION pmax VALUES LESS THAN (MAXVALUE)" in mysql[0]
+
+    postgresql = make_manager("postgresql").create_table_statements(date(2024, 1, 1), date(2024, 3, 1))
+    print(postgresql[-1])
+    assert any("PARTITION BY RANGE (date)" in s for s in postgresql)
+    assert postgresql[-1].startswith("CREATE TABLE IF NOT EXISTS workout_records_p202403 PARTITION OF workout_records")
+
+
+def test_expected_partitions_for_tool_queries():
+    """工具层的日期查询应只命中对应月份的分区"""
+    print("\n3. 测试分区裁剪推断:")
+    partitions = ["p202401", "p202402", "p202403", "pmax"]
+
+    _, params = build_workout_records_query(1, start_date="2024-02-20", end_date="2024-03-05")
+    expected = expected_partitions(partitions, *query_date_bounds(params), first_unbounded=True)
+    print(f"   范围查询: {expected}")
+    assert expected == ["p202402", "p202403"]
+
+    _, params = build_workout_records_query(1, after=("2024-01-10", "2024-01-10 08:00:00", 5))
+    expected = expected_partitions(partitions, *query_date_bounds(params), first_unbounded=True)
+    print(f"   键集翻页: {expected}")
+    assert expected == ["p202401"]
+
+
+def test_migration_statements():
+    """迁移应先按月复制，再追平增量，最后换名"""
+    print("\n4. 测试迁移SQL:")
+    statements = make_manager("mysql").migration_statements(date(2024, 1, 1), date(2024, 2, 1), months_ahead=1)
+    for statement in statements[1:]:
+        print(f"   {statement}")
+    assert statements[-1] == (
+        "RENAME TABLE workout_records TO workout_records_legacy, workout_records_partitioned TO workout_records"
+    )
+    assert sum(s.startswith("INSERT INTO") for s in statements) == 3
+
+
+if __name__ == "__main__":
+    print("开始测试分区管理...")
+    try:
+        test_month_arithmetic()
+        test_create_table_statements()
+        test_expected_partitions_for_tool_queries()
+        test_migration_statements()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,91 @@
+"""测试推测式预取 - 命中时复用预取结果并与路由调用重叠，未命中时丢弃"""
+import threading
+import time
+from agents.prefetch import DEFAULT_INTENT, SpeculativePrefetcher, keyword_intent
+
+
+def test_keyword_intent():
+    """关键词规则与路由节点的意图映射一致"""
+    print("\n1. 测试关键词意图:")
+    assert keyword_intent("我今天的运动表现如何？") == "today_performance"
+    assert keyword_intent("最近一周跑了多少") == "historical_analysis"
+    assert keyword_intent("对比一下上周") == "comparison"
+    assert keyword_intent("心率趋势") == "trend_analysis"
+    assert keyword_intent("给我点建议") is None
+
+
+def test_hit_overlaps_router():
+    """预测命中时，查询与路由LLM调用并行执行"""
+    print("\n2. 测试预取命中:")
+    calls = []
+
+    def fetch(intent, user_id):
+        calls.append((intent, user_id))
+        time.sleep(0.2)
+        return f"{intent}:{user_id}"
+
+    prefetcher = SpeculativePrefetcher(fetch)
+    started = time.monotonic()
+    speculation = prefetcher.start("今天练得怎么样", 7)
+    time.sleep(0.2)  # 模拟路由LLM调用
+    data = prefetcher.resolve(speculation, "today_performance")
+    elapsed = time.monotonic() - started
+    snapshot = prefetcher.snapshot()
+    print(f"   耗时{elapsed:.2f}s，指标{snapshot}")
+    assert data == "today_performance:7"
+    assert elapsed < 0.35
+    assert snapshot["hits"] == 1 and snapshot["hit_rate"] == 1.0
+    assert snapshot["overlap_seconds"] > 0.15
+    prefetcher.shutdown()
+
+
+def test_miss_is_discarded():
+    """预测未命中时返回None；尚未开始的预取会被取消"""
+    print("\n3. 测试预取未命中:")
+    gate = threading.Event()
+
+    def fetch(intent, user_id):
+        gate.wait(1)
+        return intent
+
+    prefetcher = SpeculativePrefetcher(fetch, max_workers=1)
+    first = prefetcher.start("今天", 1)
+    second = prefetcher.start("趋势", 1)
+    assert prefetcher.resolve(second, "comparison") is None  # 排队中，被取消
+    assert prefetcher.resolve(first, "comparison") is None  # 已在执行，丢弃
+    gate.set()
+    snapshot = prefetcher.snapshot()
+    print(f"   指标{snapshot}")
+    assert snapshot["cancelled"] == 1 and snapshot["misses"] == 1 and snapshot["hit_rate"] == 0.0
+    prefetcher.shutdown()
+
+
+def test_skip_without_keyword():
+    """预测与路由的关键词规则一致：无关键词时不预取（确认的意图为默认意图）"""
+    print("\n4. 测试无关键词不预取:")
+    prefetcher = SpeculativePrefetcher(lambda intent, user_id: intent)
+    for _ in range(3):
+        assert prefetcher.start("随便聊聊", 3) is None
+        prefetcher.resolve(None, DEFAULT_INTENT)
+    for query in ("最近一个月的趋势", "跑了5公里的那次", "和上周比较"):
+        speculation = prefetcher.start(query, 3)
+        assert speculation.intent == (keyword_intent(query) or DEFAULT_INTENT)
+        assert prefetcher.resolve(speculation, keyword_intent(query) or DEFAULT_INTENT) == speculation.intent
+    snapshot = prefetcher.snapshot()
+    print(f"   指标{snapshot}")
+    assert snapshot["skipped"] == 3 and snapshot["hits"] == 3
+    prefetcher.shutdown()
+
+
+if __name__ == "__main__":
+    print("开始测试推测式预取...")
+    try:
+        test_keyword_intent()
+        test_hit_overlaps_router()
+        test_miss_is_discarded()
+        test_skip_without_keyword()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
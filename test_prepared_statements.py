@@ -0,0 +1,109 @@
+"""测试命名查询模板与预编译语句缓存 - 使用记录SQL的伪DB-API连接"""
+from database.connection import DatabaseConnection, QUERY_TEMPLATES, register_query, _convert_placeholders
+from database.streaming import build_workout_records_named
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+        self.description = None
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.log.append(sql)
+        self.description = [("value",)] if sql.startswith(("EXECUTE", "SELECT")) else None
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.log = []
+
+    def cursor(self):
+        return FakeCursor(self.log)
+
+    def commit(self):
+        pass
+
+
+def make_connection(dialect: str, cache_size: int = 2) -> DatabaseConnection:
+    db = DatabaseConnection({"type": dialect, "statement_cache_size": cache_size})
+    db.connection = FakeConnection()
+    return db
+
+
+def test_placeholder_conversion():
+    """PostgreSQL复用同名参数的位置"""
+    print("\n1. 测试占位符转换:")
+    sql = "SELECT 1 WHERE a = %(x)s AND b = %(y)s AND c = %(x)s"
+    pg_sql, pg_names = _convert_placeholders(sql)
+    print(f"   {pg_sql} {pg_names}")
+    assert pg_sql.endswith("c = $1") and pg_names == ["x", "y"]
+
+
+def test_prepare_once_per_connection():
+    """同一模板在同一连接上只预编译一次"""
+    print("\n2. 测试预编译缓存命中:")
+    name = register_query("test_prepare_once", "SELECT 1 WHERE user_id = %(user_id)s")
+    db = make_connection("postgresql")
+    for _ in range(3):
+        assert db.execute_named(name, {"user_id": 1}) == [{"value": 1}]
+    prepares = [sql for sql in db.connection.log if sql.startswith("PREPARE")]
+    metrics = db.statement_metrics.snapshot()
+    print(f"   {metrics}")
+    assert len(prepares) == 1
+    assert metrics["cache_hits"] == 2 and metrics["executions"] == 3
+
+
+def test_lru_eviction():
+    """超过缓存容量时淘汰最久未用的语句并在服务端释放"""
+    print("\n3. 测试LRU淘汰:")
+    db = make_connection("postgresql", cache_size=2)
+    names = [register_query(f"test_lru_{i}", f"SELECT {i} WHERE id = %(id)s") for i in range(3)]
+    for name in names:
+        db.execute_named(name, {"id": 1})
+    deallocated = [sql for sql in db.connection.log if sql.startswith("DEALLOCATE")]
+    print(f"   {deallocated}")
+    assert list(db.prepared) == names[1:]
+    assert len(deallocated) == 1
+
+
+def test_mysql_single_round_trip():
+    """MySQL直接参数化执行：每次调用一条语句，不预编译"""
+    print("\n4. 测试MySQL参数化执行:")
+    name = register_query("test_mysql_direct", "SELECT 1 WHERE user_id = %(user_id)s")
+    db = make_connection("mysql")
+    for _ in range(3):
+        assert db.execute_named(name, {"user_id": 1}) == [{"value": 1}]
+    print(f"   {db.connection.log}")
+    assert db.connection.log == [QUERY_TEMPLATES[name]] * 3
+    assert not db.prepared and db.statement_metrics.snapshot()["executions"] == 3
+
+
+def test_workout_records_templates_are_shared():
+    """相同过滤条件组合应复用同一个模板"""
+    print("\n5. 测试运动记录查询模板:")
+    first, _ = build_workout_records_named(1, date="2024-01-01", limit=10)
+    second, params = build_workout_records_named(2, date="2024-02-01", limit=5)
+    print(f"   {first}")
+    assert first == second and params["user_id"] == 2
+
+
+if __name__ == "__main__":
+    print("开始测试预编译语句缓存...")
+    try:
+        test_placeholder_conversion()
+        test_prepare_once_per_connection()
+        test_lru_eviction()
+        test_mysql_single_round_trip()
+        test_workout_records_templates_are_shared()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,103 @@
+"""测试按请求剖析 - 输出文件、轮转、最慢请求汇总与关闭时的开销"""
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.deadline import run_with_timeout
+from utils.profiling import RequestProfiler, NULL_SESSION, profile_worker, worst_requests, combine_stats
+
+
+def _busy_work(n):
+    data = [str(i) * 3 for i in range(n)]
+    return sum(len(item) for item in data)
+
+
+def test_session_writes_profile():
+    """强制剖析的请求生成.prof和.json，包含标签、热点函数和内存分配"""
+    print("\n1. 测试剖析输出:")
+    with tempfile.TemporaryDirectory() as root:
+        profiler = RequestProfiler(output_dir=root)
+        with profiler.session(force=True, user_id=7, query="今天") as session:
+            _busy_work(20000)
+            session.tag(intent="today_performance")
+        profiles = worst_requests(root)
+        assert len(profiles) == 1
+        meta = profiles[0]
+        print(f"   {meta['wall_seconds']}s，峰值{meta['peak_memory_kb']}KB")
+        assert meta["tags"] == {"user_id": 7, "query": "今天", "intent": "today_performance"}
+        assert any("_busy_work" in f["function"] for f in meta["top_functions"])
+        assert meta["top_allocations"] and meta["peak_memory_kb"] > 0
+        assert os.path.exists(os.path.join(root, meta["profile_file"]))
+        assert "_busy_work" in combine_stats(profiles, root)
+
+
+def test_rotation_and_ranking():
+    """超出max_files时删除最旧的请求；按耗时排序"""
+    print("\n2. 测试轮转与排序:")
+    with tempfile.TemporaryDirectory() as root:
+        profiler = RequestProfiler(output_dir=root, max_files=2, trace_memory=False)
+        for n, delay in ((1, 0.0), (2, 0.03), (3, 0.01)):
+            with profiler.session(force=True, user_id=n):
+                time.sleep(delay)
+        files = os.listdir(root)
+        assert len(files) == 4
+        worst = worst_requests(root, top=2)
+        assert [p["tags"]["user_id"] for p in worst] == [2, 3]
+
+
+def test_disabled_and_busy():
+    """关闭时返回空会话且开销可忽略；已有请求在剖析时不再嵌套剖析"""
+    print("\n3. 测试关闭与并发:")
+    profiler = RequestProfiler(enabled=False, output_dir=tempfile.gettempdir())
+    assert profiler.session() is NULL_SESSION
+    started = time.perf_counter()
+    for _ in range(100000):
+        with profiler.session(user_id=1) as session:
+            session.tag(intent="x")
+    per_call = (time.perf_counter() - started) / 100000
+    print(f"   关闭时每请求开销：{per_call * 1e6:.2f}µs")
+    assert per_call < 20e-6
+
+    with tempfile.TemporaryDirectory() as root:
+        profiler = RequestProfiler(output_dir=root, trace_memory=False)
+        with profiler.session(force=True):
+            assert profiler.session(force=True) is NULL_SESSION
+        assert profiler.skipped_busy == 1
+
+
+def _worker_only_work(n):
+    return _busy_work(n)
+
+
+def test_worker_threads_profiled():
+    """会话期间提交到线程池的任务在工作线程中采集并合并；会话结束后完成的任务不计入"""
+    print("\n4. 测试工作线程剖析:")
+    executor = ThreadPoolExecutor(max_workers=2)
+    assert profile_worker(_worker_only_work) is _worker_only_work  # 未剖析时不包装
+    with tempfile.TemporaryDirectory() as root:
+        profiler = RequestProfiler(output_dir=root, trace_memory=False)
+        with profiler.session(force=True, user_id=1):
+            executor.submit(profile_worker(_worker_only_work), 20000).result()
+            run_with_timeout(lambda: _worker_only_work(1000), 1.0)
+            late = executor.submit(profile_worker(lambda: time.sleep(0.1)))
+        late.result()
+        meta = worst_requests(root)[0]
+        print(f"   合并{meta['worker_profiles']}个工作线程任务，会话结束时未完成{meta['unfinished_worker_tasks']}个")
+        assert meta["worker_profiles"] == 2 and meta["unfinished_worker_tasks"] == 1
+        assert any("_worker_only_work" in f["function"] for f in meta["top_functions"])
+        assert "_worker_only_work" in combine_stats([meta], root)
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    print("开始测试按请求剖析...")
+    try:
+        test_session_writes_profile()
+        test_rotation_and_ranking()
+        test_disabled_and_busy()
+        test_worker_threads_profiled()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,138 @@
+"""测试响应缓存与预热 - 新记录写入后失效，预热条目在查询时命中"""
+from datetime import date, datetime
+from database.events import publish_workout_written, subscribe_workout_written, unsubscribe_workout_written
+from database.feature_store import FeatureStore
+from jobs.prewarm import prewarm, select_active_users, seconds_until, PrewarmScheduler
+from agents.prefetch import keyword_intent
+from utils.date_range import parse_date_range
+from utils.response_cache import ResponseCache, data_cache_key
+
+
+def test_invalidation_on_new_record():
+    """新记录写入事件使该用户的缓存失效，其他用户不受影响"""
+    print("\n1. 测试写入失效:")
+    cache = ResponseCache()
+    subscribe_workout_written(cache.on_workout_written)
+    try:
+        cache.put(1, "summary", "旧结果")
+        cache.put(2, "summary", "用户2")
+        publish_workout_written({"user_id": 1, "date": "2024-01-01", "duration": 30})
+        assert cache.get(1, "summary") is None
+        assert cache.get(2, "summary") == "用户2"
+    finally:
+        unsubscribe_workout_written(cache.on_workout_written)
+
+
+def test_stale_put_rejected():
+    """计算期间有新记录写入时，旧结果不会写入缓存"""
+    print("\n2. 测试计算期间失效:")
+    cache = ResponseCache()
+
+    def compute():
+        cache.invalidate_user(1)
+        return "计算期间数据已变化"
+
+    assert cache.get_or_compute(1, "k", compute) == "计算期间数据已变化"
+    assert not cache.contains(1, "k")
+    assert cache.snapshot()["stale_puts"] == 1
+
+
+def test_lru_and_ttl():
+    """超出容量淘汰最久未使用的条目，过期条目不返回"""
+    print("\n3. 测试淘汰与过期:")
+    cache = ResponseCache(max_entries=2)
+    cache.put(1, "a", 1)
+    cache.put(1, "b", 2)
+    cache.get(1, "a")
+    cache.put(1, "c", 3)
+    assert cache.contains(1, "a") and not cache.contains(1, "b")
+    expired = ResponseCache(ttl_seconds=0)
+    expired.put(1, "a", 1)
+    assert expired.get(1, "a") is None
+
+
+def test_prewarm_hit_rate_and_budget():
+    """预热后查询命中预热条目；LLM预算用尽时跳过剩余分析"""
+    print("\n4. 测试预热:")
+    cache = ResponseCache()
+    llm_calls = []
+
+    def fetch(intent, user_id, prewarmed=False):
+        return cache.get_or_compute(user_id, ("data", intent), lambda: f"{intent}-{user_id}", prewarmed)
+
+    def analyze(intent, data, user_id, prewarmed=False):
+        def compute():
+            llm_calls.append((intent, user_id))
+            return f"分析:{data}"
+        return cache.get_or_compute(user_id, ("analysis", intent), compute, prewarmed)
+
+    report = prewarm(
+        [1, 2, 3], intents=["today_performance", "trend_analysis"],
+        max_llm_calls=2, time_budget_seconds=60, fetch=fetch, analyze=analyze
+    )
+    print(f"   {report}")
+    assert report["users"] == 3 and report["data_entries"] == 6
+    assert report["llm_calls"] == 2 and report["skipped_analyses"] == 1
+    assert report["stopped_by"] == "llm_budget"
+
+    # 早高峰查询
+    assert fetch("today_performance", 1) == "today_performance-1"
+    assert analyze("today_performance", "today_performance-1", 1) == "分析:today_performance-1"
+    analyze("today_performance", "today_performance-3", 3)  # 未预热，需要计算
+    snapshot = PrewarmScheduler(cache=cache).report()["cache"]
+    print(f"   {snapshot}")
+    assert snapshot["prewarmed_hits"] == 2 and snapshot["misses"] == 1
+    assert abs(snapshot["hit_rate"] - 2 / 3) < 1e-9
+
+
+def test_prewarm_hit_by_parsed_today_query():
+    """“今天…”查询解析出当天范围，仍命中预热时按无范围写入的条目（与查询节点的缓存键一致）"""
+    print("\n5. 测试预热条目被今天的查询命中:")
+    cache = ResponseCache()
+    computed = []
+
+    def fetch(intent, user_id, prewarmed=False, date_range=None, query=""):
+        def compute():
+            computed.append((intent, date_range))
+            return f"{intent}-{user_id}"
+        return cache.get_or_compute(user_id, data_cache_key(intent, date_range, query), compute, prewarmed)
+
+    prewarm([1], intents=["today_performance"], max_llm_calls=0, time_budget_seconds=60,
+            fetch=fetch, analyze=lambda *args, **kwargs: None)
+    query = "我今天的运动表现如何？"
+    date_range = parse_date_range(query)
+    print(f"   解析范围{date_range}，缓存键{data_cache_key(keyword_intent(query), date_range, query)}")
+    assert date_range is not None and date_range.start == date_range.end == date.today()
+    assert fetch(keyword_intent(query), 1, date_range=date_range, query=query) == "today_performance-1"
+    snapshot = cache.snapshot()
+    assert len(computed) == 1 and snapshot["prewarmed_hits"] == 1
+    # 使用时间范围的意图仍按范围区分
+    assert data_cache_key("trend_analysis", date_range) != data_cache_key("trend_analysis")
+
+
+def test_active_users_and_schedule():
+    """按最近活跃程度选择用户；调度时刻计算正确"""
+    print("\n6. 测试活跃用户与调度:")
+    store = FeatureStore()
+    today = date(2024, 3, 10)
+    for user_id, day in ((1, "2024-03-09"), (2, "2024-02-01"), (3, "2024-03-10")):
+        store.observe({"user_id": user_id, "date": day, "duration": 30, "exercise_type": "跑步"})
+    assert select_active_users(active_days=3, limit=10, today=today, store=store) == [3, 1]
+    assert seconds_until(5, datetime(2024, 3, 10, 4, 30)) == 1800
+    assert seconds_until(5, datetime(2024, 3, 10, 6, 0)) == 23 * 3600
+
+
+if __name__ == "__main__":
+    print("开始测试响应缓存与预热...")
+    try:
+        test_invalidation_on_new_record()
+        test_stale_put_rejected()
+        test_lru_and_ttl()
+        test_prewarm_hit_rate_and_budget()
+        test_prewarm_hit_by_parsed_today_query()
+        test_active_users_and_schedule()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,73 @@
+"""测试多粒度汇总 - 粒度选择、行数上限，以及与原始记录逐条计算的一致性"""
+from datetime import date, timedelta
+from database.mock_data import generate_mock_records
+from database.rollups import RollupStore, choose_resolution, bucket_count, format_summary
+
+
+def _brute_force(records, start, end):
+    selected = [r for r in records if start.isoformat() <= r["date"] <= end.isoformat()]
+    return len(selected), sum(r["duration"] for r in selected), sum(r["calories_burned"] for r in selected)
+
+
+def test_choose_resolution():
+    """范围越长粒度越粗，且行数不超过上限"""
+    print("\n1. 测试粒度选择:")
+    end = date(2024, 12, 31)
+    for days, expected in ((7, "day"), (60, "day"), (90, "week"), (365, "week"), (730, "month")):
+        start = end - timedelta(days=days - 1)
+        resolution = choose_resolution(start, end, max_rows=60)
+        print(f"   {days}天 -> {resolution}（{bucket_count(start, end, resolution)}行）")
+        assert resolution == expected
+        assert bucket_count(start, end, resolution) <= 60
+
+
+def test_summary_matches_raw_records():
+    """任意范围（含只覆盖部分周/月的首尾）合计都应与原始记录一致"""
+    print("\n2. 测试汇总完整性:")
+    records = generate_mock_records(7, date(2023, 1, 1), date(2024, 12, 31))
+    store = RollupStore()
+    store.bootstrap(records)
+    ranges = [
+        (date(2024, 1, 10), date(2024, 1, 20)),
+        (date(2023, 3, 15), date(2024, 2, 7)),
+        (date(2023, 1, 1), date(2024, 12, 31)),
+        (date(2024, 5, 29), date(2024, 8, 2)),
+    ]
+    for start, end in ranges:
+        summary = store.summarize(7, start, end, max_rows=30)
+        count, duration, calories = _brute_force(records, start, end)
+        rows = summary["rows"]
+        print(f"   {start}~{end}: 按{summary['resolution']} {len(rows)}行，{count}次运动")
+        assert len(rows) <= 30 or summary["resolution"] == "month"
+        assert sum(row["workout_count"] for row in rows) == count
+        assert sum(row["total_duration"] for row in rows) == duration
+        assert summary["total"]["total_calories"] == calories
+        assert rows[0]["period_start"] >= start.isoformat()
+        assert rows[-1]["period_end"] <= end.isoformat()
+
+
+def test_incremental_update():
+    """新记录写入后对应的日/周/月汇总立即更新"""
+    print("\n3. 测试增量更新:")
+    store = RollupStore()
+    store.observe({"user_id": 3, "date": "2024-03-04", "duration": 30, "calories_burned": 300, "heart_rate_avg": 140})
+    store.observe({"user_id": 3, "date": "2024-03-06", "duration": 60, "calories_burned": 400, "heart_rate_avg": 120})
+    summary = store.summarize(3, date(2024, 3, 1), date(2024, 3, 31), resolution="week")
+    print(format_summary(summary))
+    assert len(summary["rows"]) == 1
+    assert summary["rows"][0]["period_start"] == "2024-03-04"
+    assert summary["rows"][0]["avg_heart_rate"] == 130
+    assert summary["total"]["workout_count"] == 2
+
+
+if __name__ == "__main__":
+    print("开始测试多粒度汇总...")
+    try:
+        test_choose_resolution()
+        test_summary_matches_raw_records()
+        test_incremental_update()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
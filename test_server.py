@@ -0,0 +1,134 @@
+"""测试预分叉服务 - 共享内存缓存跨进程可见、失效与淘汰，多工作进程共享监听端口"""
+import json
+import multiprocessing
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from server import PreforkServer
+from utils.shared_cache import SharedResponseCache
+
+
+class CachingAgent:
+    """测试用Agent：结果经共享缓存计算，值里带计算它的进程号"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def invoke(self, query, user_id=1):
+        return self.cache.get_or_compute(user_id, ("answer", query), lambda: f"{os.getpid()}:{query}")
+
+
+def _post(port, payload):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/v1/query",
+        data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def _get(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=10) as response:
+        return json.loads(response.read())
+
+
+def _child_put(cache):
+    cache.put(1, "today", {"summary": "子进程写入"})
+    cache.invalidate_user(2)
+
+
+def test_shared_across_processes():
+    """子进程写入和失效，父进程立即可见"""
+    print("\n1. 测试跨进程共享:")
+    cache = SharedResponseCache(slots=64, slot_bytes=1024, stripes=4)
+    try:
+        cache.put(2, "week", "旧结果")
+        process = multiprocessing.get_context("fork").Process(target=_child_put, args=(cache,))
+        process.start()
+        process.join(5)
+        assert process.exitcode == 0
+        print(f"   父进程读取: {cache.get(1, 'today')}")
+        assert cache.get(1, "today") == {"summary": "子进程写入"}
+        # 用户2在子进程中失效
+        assert cache.get(2, "week") is None
+        snapshot = cache.snapshot()
+        assert snapshot["puts"] == 2 and snapshot["invalidations"] == 1
+    finally:
+        cache.close()
+
+
+def test_version_ttl_and_eviction():
+    """计算期间数据变化时放弃写入；过期条目不返回；探测窗口满时覆盖最久未访问的条目；超大值不缓存"""
+    print("\n2. 测试版本、过期与淘汰:")
+    cache = SharedResponseCache(slots=8, slot_bytes=256, stripes=1, probe=8, ttl_seconds=0.2)
+    try:
+        version = cache.version(1)
+        cache.invalidate_user(1)
+        assert not cache.put(1, "a", "旧", version=version)
+        assert cache.put(1, "a", "新")
+        assert cache.get(1, "a") == "新"
+        time.sleep(0.25)
+        assert cache.get(1, "a") is None
+        for i in range(12):
+            cache.put(3, i, f"值{i}")
+        assert cache.get(3, 11) == "值11" and cache.get(3, 0) is None
+        # 命中刷新访问时间：再写入一条时淘汰其他条目，而不是刚读过的最早条目
+        assert cache.get(3, 4) == "值4"
+        cache.put(3, 12, "值12")
+        assert cache.get(3, 4) == "值4" and cache.get(3, 12) == "值12"
+        assert sum(cache.get(3, i) is None for i in range(5, 12)) == 1
+        assert not cache.put(3, "big", "x" * 1000)
+        snapshot = cache.snapshot()
+        print(f"   淘汰{snapshot['evictions']}次，过期{snapshot['expired']}次，超大{snapshot['too_large']}次")
+        assert snapshot["evictions"] >= 5 and snapshot["expired"] == 1 and snapshot["too_large"] == 1
+        assert snapshot["entries"] == 8
+    finally:
+        cache.close()
+
+
+def test_prefork_server():
+    """多个工作进程共享端口；同一查询只计算一次，其他进程直接命中共享缓存"""
+    print("\n3. 测试预分叉服务:")
+    cache = SharedResponseCache(slots=64, slot_bytes=1024, stripes=4)
+    server = PreforkServer(CachingAgent(cache), host="127.0.0.1", port=0, workers=2, cache=cache)
+    port = server.bind()
+    server.start()
+    try:
+        pids = {_get(port, "/healthz")["pid"] for _ in range(6)}
+        result = _post(port, {"query": "今天的运动表现", "user_id": 1})
+        assert result["degraded"] is False and result["degraded_nodes"] == []
+        first = result["response"]
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            answers = list(pool.map(lambda _: _post(port, {"query": "今天的运动表现", "user_id": 1})["response"], range(12)))
+        stats = _get(port, "/v1/stats")["cache"]
+        print(f"   工作进程{sorted(server.children)}，响应进程{sorted(pids)}，命中{stats['hits']}次")
+        assert len(server.children) == 2
+        assert pids <= set(server.children)
+        assert set(answers) == {first} and first.endswith(":今天的运动表现")
+        assert stats["hits"] == 12 and stats["misses"] == 1
+
+        for payload in ({"user_id": 1}, {"query": "今天", "user_id": "1"}, {"query": "今天", "deadline_seconds": -1}):
+            try:
+                _post(port, payload)
+                assert False, "应返回400"
+            except urllib.error.HTTPError as e:
+                assert e.code == 400
+    finally:
+        server.stop()
+    assert server.children == [] and server.cache is None
+
+
+if __name__ == "__main__":
+    print("开始测试预分叉服务...")
+    try:
+        test_shared_across_processes()
+        test_version_ttl_and_eviction()
+        test_prefork_server()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
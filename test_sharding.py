@@ -0,0 +1,223 @@
+"""测试用户分片 - 使用多个SQLite文件作为本地分片"""
+import os
+import tempfile
+import threading
+from datetime import date
+from database.connection import DatabaseConnection
+from database.mock_data import generate_mock_records
+from database.rollups import rollup_params, rollup_upsert_sql
+from database.sharding import ConsistentHashRing, ShardMap, ShardRouter, Rebalancer
+from database.streaming import iter_workout_records
+
+
+INSERT_QUERY = (
+    "INSERT INTO workout_records (id, user_id, date, exercise_type, duration, calories_burned, "
+    "heart_rate_avg, notes, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"
+)
+FIELDS = ("id", "user_id", "date", "exercise_type", "duration", "calories_burned", "heart_rate_avg", "notes", "created_at")
+
+
+def _router(root, count, map_name="shard_map.json", reload_seconds=0):
+    return ShardRouter.from_config({
+        "local_shards": count,
+        "local_dir": root,
+        "map_path": os.path.join(root, map_name),
+        "vnodes": 64,
+        "reload_seconds": reload_seconds,
+    })
+
+
+def _load_users(router, user_ids):
+    router.create_schema()
+    total = 0
+    for user_id in user_ids:
+        records = generate_mock_records(user_id, date(2024, 1, 1), date(2024, 1, 31))
+        router.connection_for(user_id).execute_many(
+            INSERT_QUERY, [tuple(r[f] for f in FIELDS) for r in records]
+        )
+        total += len(records)
+    return total
+
+
+def test_ring_moves_few_users():
+    """增加一个分片时只有约1/N的用户改变归属"""
+    print("\n1. 测试一致性哈希:")
+    before = ConsistentHashRing(["a", "b", "c"], vnodes=128)
+    after = ConsistentHashRing(["a", "b", "c", "d"], vnodes=128)
+    users = range(10000)
+    moved = [u for u in users if before.shard_for(u) != after.shard_for(u)]
+    print(f"   迁移比例：{len(moved) / 10000:.1%}")
+    assert 0.15 < len(moved) / 10000 < 0.35
+    assert all(after.shard_for(u) == "d" for u in moved)
+
+
+def test_routing_and_scatter_gather():
+    """每个用户的数据只在其分片上，跨分片汇总得到全部数据"""
+    print("\n2. 测试路由与汇总:")
+    with tempfile.TemporaryDirectory() as root:
+        router = _router(root, 3)
+        total = _load_users(router, range(1, 31))
+        counts = router.scatter_gather("SELECT COUNT(*) AS n FROM workout_records")
+        print(f"   各分片记录数：{ {k: v[0]['n'] for k, v in counts.items()} }")
+        assert sum(rows[0]["n"] for rows in counts.values()) == total
+        assert sum(1 for rows in counts.values() if rows[0]["n"]) == 3
+        for user_id in (1, 17):
+            shard = router.shard_for(user_id)
+            for other in router.shards:
+                rows = router.connection(other).execute_query(
+                    "SELECT COUNT(*) AS n FROM workout_records WHERE user_id = %(user_id)s", {"user_id": user_id}
+                )
+                assert (rows[0]["n"] > 0) == (other == shard)
+        # 分片连接上的键集流式读取
+        streamed = list(iter_workout_records(5, page_size=4, batch_size=2, connection=router.connection_for(5)))
+        expected = len(generate_mock_records(5, date(2024, 1, 1), date(2024, 1, 31)))
+        assert len(streamed) == expected
+        assert [r["date"] for r in streamed] == sorted((r["date"] for r in streamed), reverse=True)
+        router.close()
+
+
+def test_rebalance_adds_shard():
+    """从2个分片扩容到3个：数据不丢失，用户落在新哈希环指定的分片，映射可恢复"""
+    print("\n3. 测试在线扩容:")
+    with tempfile.TemporaryDirectory() as root:
+        router = _router(root, 3)
+        router.shard_map.set_shards(["shard0", "shard1"])
+        total = _load_users(router, range(1, 41))
+        rebalancer = Rebalancer(router, tables={"workout_records": ("id",)}, batch_size=7, switch_grace=0)
+        plan = rebalancer.plan(["shard0", "shard1", "shard2"])
+        assert plan and all(target == "shard2" for _, _, target in plan)
+
+        report = rebalancer.rebalance(["shard0", "shard1", "shard2"])
+        print(f"   {report}")
+        status = rebalancer.status()
+        assert sum(s["records"] for s in status["shards"].values()) == total
+        assert status["overrides"] == {}
+        assert report["users_moved"] == len(plan)
+        for user_id in range(1, 41):
+            shard = router.shard_for(user_id)
+            assert shard == router.shard_map.ring.shard_for(user_id)
+            rows = router.execute_for(
+                user_id, "SELECT COUNT(*) AS n FROM workout_records WHERE user_id = %(user_id)s", {"user_id": user_id}
+            )
+            assert rows[0]["n"] == len(generate_mock_records(user_id, date(2024, 1, 1), date(2024, 1, 31)))
+        assert rebalancer.plan(["shard0", "shard1", "shard2"]) == []
+
+        reloaded = ShardMap.load(os.path.join(root, "shard_map.json"), [])
+        assert reloaded.shards == ["shard0", "shard1", "shard2"]
+        router.close()
+
+
+def test_rebalance_moves_rollups():
+    """汇总表随用户迁移：源分片的累加值与切换后写入目标分片的增量合并"""
+    print("\n4. 测试汇总表迁移:")
+    with tempfile.TemporaryDirectory() as root:
+        router = _router(root, 3)
+        router.shard_map.set_shards(["shard0", "shard1"])
+        _load_users(router, range(1, 21))
+        upsert = rollup_upsert_sql("sqlite")
+        for user_id in range(1, 21):
+            for record in generate_mock_records(user_id, date(2024, 1, 1), date(2024, 1, 31)):
+                for params in rollup_params(record):
+                    router.execute_for(user_id, upsert, params)
+
+        rebalancer = Rebalancer(router, batch_size=2, switch_grace=0)
+        plan = rebalancer.plan(["shard0", "shard1", "shard2"])
+        moved_user = plan[0][0]
+        # 切换路由后、合并前写入目标分片的一条新记录
+        late = {"user_id": moved_user, "date": "2024-01-31", "duration": 10, "calories_burned": 50, "heart_rate_avg": 0}
+        for params in rollup_params(late):
+            router.connection("shard2").execute_query(upsert, params)
+
+        report = rebalancer.rebalance(["shard0", "shard1", "shard2"])
+        print(f"   {report}")
+        month_query = (
+            "SELECT workout_count, total_duration FROM workout_rollups "
+            "WHERE user_id = %(user_id)s AND resolution = 'month'"
+        )
+        for user_id in range(1, 21):
+            records = generate_mock_records(user_id, date(2024, 1, 1), date(2024, 1, 31))
+            rows = router.execute_for(user_id, month_query, {"user_id": user_id})
+            extra = 1 if user_id == moved_user else 0
+            assert rows[0]["workout_count"] == len(records) + extra
+            assert rows[0]["total_duration"] == sum(r["duration"] for r in records) + extra * 10
+        for shard, user_ids in rebalancer.users_by_shard().items():
+            counts = router.connection(shard).execute_query(
+                "SELECT COUNT(DISTINCT user_id) AS n FROM workout_rollups"
+            )
+            assert counts[0]["n"] == len(user_ids)
+        router.close()
+
+
+def test_rebalance_with_concurrent_writer():
+    """另一个进程（独立的路由与映射）在迁移期间持续写入：重新加载映射后写入不丢失、不重复"""
+    print("\n5. 测试迁移期间的并发写入:")
+    with tempfile.TemporaryDirectory() as root:
+        router = _router(root, 3)
+        router.shard_map.set_shards(["shard0", "shard1"])
+        router.shard_map.save()
+        _load_users(router, range(1, 31))
+        worker = _router(root, 3, reload_seconds=0.02)
+        rebalancer = Rebalancer(router, batch_size=5, switch_grace=0.3, switch_batch=4)
+        moved_users = [user_id for user_id, _, _ in rebalancer.plan(["shard0", "shard1", "shard2"])]
+        assert moved_users
+
+        reports = []
+        thread = threading.Thread(
+            target=lambda: reports.append(rebalancer.rebalance(["shard0", "shard1", "shard2"]))
+        )
+        thread.start()
+        written = []
+        # 新记录id大于已有记录（模拟数据的id约为user_id * 10^6）
+        next_id = 10 ** 9
+        while thread.is_alive():
+            user_id = moved_users[next_id % len(moved_users)]
+            worker.execute_for(
+                user_id, INSERT_QUERY,
+                (next_id, user_id, "2024-02-01", "跑步", 30, 300, 140, "迁移期间写入", "2024-02-01 08:00:00")
+            )
+            written.append((next_id, user_id))
+            next_id += 1
+        thread.join()
+        print(f"   迁移期间写入{len(written)}条，映射版本{router.shard_map.version}")
+        assert reports and reports[0]["users_moved"] == len(moved_users)
+        assert written
+        assert worker.shard_map.version == router.shard_map.version
+
+        for record_id, user_id in written:
+            owners = [
+                shard for shard in router.shards
+                if router.connection(shard).execute_query(
+                    "SELECT COUNT(*) AS n FROM workout_records WHERE id = %(id)s", {"id": record_id}
+                )[0]["n"]
+            ]
+            assert owners == [router.shard_for(user_id)], (record_id, owners)
+        worker.close()
+        router.close()
+
+
+def test_sqlite_named_queries():
+    """SQLite连接支持%(name)s占位符和命名查询模板"""
+    print("\n6. 测试SQLite占位符:")
+    from database.connection import register_query
+    connection = DatabaseConnection({"type": "sqlite", "database": ":memory:"})
+    connection.execute_query("CREATE TABLE t (a INTEGER, b TEXT)")
+    connection.execute_many("INSERT INTO t VALUES (%s, %s)", [(1, "x"), (2, "y")])
+    name = register_query("test_sharding_t", "SELECT b FROM t WHERE a = %(a)s")
+    assert connection.execute_named(name, {"a": 2}) == [{"b": "y"}]
+    connection.close()
+
+
+if __name__ == "__main__":
+    print("开始测试用户分片...")
+    try:
+        test_ring_moves_few_users()
+        test_routing_and_scatter_gather()
+        test_rebalance_adds_shard()
+        test_rebalance_moves_rollups()
+        test_rebalance_with_concurrent_writer()
+        test_sqlite_named_queries()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,69 @@
+"""测试流式读取与键集分页 - 使用基于模拟数据的伪连接，不需要真实数据库"""
+from itertools import islice
+from database.mock_data import iter_mock_records, get_mock_records
+from database.streaming import (
+    build_workout_records_query,
+    iter_workout_records,
+    record_cursor,
+    encode_cursor,
+    decode_cursor,
+)
+
+
+class FakeStreamingConnection:
+    """按键集参数从模拟数据中取数的伪连接，并记录执行过的SQL"""
+
+    def __init__(self):
+        self.queries = []
+
+    def stream_query(self, query, params=None, batch_size=1000):
+        self.queries.append(query)
+        after = None
+        if "after_id" in params:
+            after = (params["after_date"], params["after_created_at"], params["after_id"])
+        rows = iter_mock_records(user_id=params["user_id"], after=after)
+        return islice(rows, params.get("limit"))
+
+
+def test_build_query():
+    """带游标时应生成行值比较条件并按三列降序"""
+    print("\n1. 测试SQL构建:")
+    query, params = build_workout_records_query(1, after=("2024-01-15", "2024-01-15T08:00:00", 42), limit=10)
+    print(f"   {query}")
+    assert "(date, created_at, id) <" in query
+    assert query.endswith("ORDER BY date DESC, created_at DESC, id DESC LIMIT %(limit)s")
+    assert params["after_id"] == 42
+
+
+def test_keyset_iteration():
+    """小页遍历应不重不漏地返回全部记录"""
+    print("\n2. 测试键集分页遍历:")
+    connection = FakeStreamingConnection()
+    records = list(iter_workout_records(1, page_size=3, connection=connection))
+    print(f"   共{len(records)}条记录，发出{len(connection.queries)}条SQL")
+    ids = [r["id"] for r in records]
+    assert sorted(ids) == sorted(r["id"] for r in get_mock_records(limit=1000))
+    assert len(ids) == len(set(ids))
+    assert len(connection.queries) == len(records) // 3 + 1
+
+
+def test_cursor_roundtrip():
+    """游标编码后应能还原"""
+    print("\n3. 测试游标编解码:")
+    record = next(iter_mock_records())
+    cursor = record_cursor(record)
+    print(f"   {encode_cursor(cursor)}")
+    assert decode_cursor(encode_cursor(cursor)) == cursor
+
+
+if __name__ == "__main__":
+    print("开始测试流式读取...")
+    try:
+        test_build_query()
+        test_keyset_iteration()
+        test_cursor_roundtrip()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,99 @@
+"""测试本地OpenAI兼容桩服务 - 使用标准库HTTP客户端，不依赖openai SDK"""
+import json
+import urllib.error
+import urllib.request
+from stub_llm_server import StubConfig, start_stub_server
+from utils.llm_limiter import LLMLimiter
+
+
+ROUTER_SYSTEM = "你是一个查询意图识别助手。根据用户的查询，判断用户的意图类型。"
+
+
+class StubHTTPError(Exception):
+    """携带状态码的HTTP错误，便于限流器分类"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def post_chat(base_url: str, payload: dict) -> urllib.request.addinfourl:
+    request = urllib.request.Request(
+        f"{base_url}/chat/completions",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"}
+    )
+    try:
+        return urllib.request.urlopen(request, timeout=5)
+    except urllib.error.HTTPError as e:
+        raise StubHTTPError(e.code)
+
+
+def test_router_completion():
+    """路由提示词应得到确定性的意图输出"""
+    print("\n1. 测试路由提示词:")
+    server, base_url = start_stub_server(StubConfig(latency_mean=0))
+    try:
+        payload = {"model": "stub", "messages": [
+            {"role": "system", "content": ROUTER_SYSTEM},
+            {"role": "user", "content": "用户查询：帮我看看今天的运动表现"},
+        ]}
+        body = json.loads(post_chat(base_url, payload).read())
+        content = body["choices"][0]["message"]["content"]
+        print(f"   意图: {content}, 用量: {body['usage']}")
+        assert content == "today_performance"
+    finally:
+        server.shutdown()
+
+
+def test_streaming_completion():
+    """流式输出应拼接为完整回复并以[DONE]结束"""
+    print("\n2. 测试流式输出:")
+    server, base_url = start_stub_server(StubConfig(latency_mean=0))
+    try:
+        payload = {"model": "stub", "stream": True, "messages": [
+            {"role": "system", "content": "你是一个友好的健身助手。"},
+            {"role": "user", "content": "用户查询：最近怎么样"},
+        ]}
+        lines = post_chat(base_url, payload).read().decode("utf-8").split("\n\n")
+        events = [line[len("data: "):] for line in lines if line.startswith("data: ")]
+        text = "".join(
+            json.loads(e)["choices"][0]["delta"].get("content", "")
+            for e in events[:-1] if json.loads(e)["choices"]
+        )
+        print(f"   收到{len(events)}个事件: {text[:30]}...")
+        assert events[-1] == "[DONE]"
+        assert text
+    finally:
+        server.shutdown()
+
+
+def test_limiter_against_injected_429():
+    """限流器在桩服务注入429时应重试并最终成功"""
+    print("\n3. 测试限流器对429的处理:")
+    server, base_url = start_stub_server(StubConfig(latency_mean=0, error_429=0.5, seed=7))
+    limiter = LLMLimiter(max_retries=10, backoff_base=0.01, backoff_max=0.02)
+    try:
+        payload = {"model": "stub", "messages": [{"role": "user", "content": "你好"}]}
+        for _ in range(10):
+            limiter.call(lambda: post_chat(base_url, payload).read())
+        snapshot = limiter.snapshot()
+        print(f"   限流器指标: {snapshot}")
+        print(f"   桩服务指标: {server.metrics.snapshot()}")
+        assert snapshot["successes"] == 10
+        assert snapshot["rate_limited"] == server.metrics.snapshot().get("errors_429", 0)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    print("开始测试桩服务...")
+    try:
+        test_router_completion()
+        test_streaming_completion()
+        test_limiter_against_injected_429()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
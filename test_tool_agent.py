@@ -0,0 +1,130 @@
+"""测试工具调用模式 - 同一轮工具调用并发执行、结果保序、user_id不可被模型篡改"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from agents.tool_executor import run_tool_calls
+from load_test import format_comparison
+from stub_llm_server import tool_reply
+
+
+class FakeTool:
+    """与LangChain工具接口一致的测试工具"""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.args = {"user_id": {}, "days": {}}
+        self.seen = []
+        self.threads = set()
+
+    def invoke(self, args):
+        self.seen.append(args)
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("数据库不可用")
+        return f"{self.name}:{args.get('days')}"
+
+
+def test_parallel_execution_keeps_order():
+    """多个调用并发执行，总耗时接近最慢的一个，结果顺序与调用顺序一致"""
+    print("\n1. 测试并发执行:")
+    tools = {"slow": FakeTool("slow", 0.3), "fast": FakeTool("fast", 0.1)}
+    calls = [
+        {"name": "slow", "args": {"days": 30}, "id": "a"},
+        {"name": "fast", "args": {"days": 7}, "id": "b"},
+        {"name": "slow", "args": {"days": 90}, "id": "c"},
+    ]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        started = time.perf_counter()
+        results = run_tool_calls(calls, tools, user_id=1, executor=executor)
+        elapsed = time.perf_counter() - started
+    print(f"   3个调用耗时{elapsed:.2f}s（串行约0.7s）")
+    assert [r.call_id for r in results] == ["a", "b", "c"]
+    assert [r.content for r in results] == ["slow:30", "fast:7", "slow:90"]
+    assert elapsed < 0.5
+
+
+def test_user_id_enforced_and_errors_isolated():
+    """user_id以请求为准；单个工具失败或未知工具不影响其他调用"""
+    print("\n2. 测试参数约束与错误隔离:")
+    good, bad = FakeTool("good"), FakeTool("bad", fail=True)
+    calls = [
+        {"name": "good", "args": {"user_id": 999, "days": 7}, "id": "a"},
+        {"name": "bad", "args": {}, "id": "b"},
+        {"name": "missing", "args": {}, "id": "c"},
+    ]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = run_tool_calls(calls, {"good": good, "bad": bad}, user_id=5, executor=executor)
+    for result in results:
+        print(f"   {result.name}: {result.content}")
+    assert good.seen[0]["user_id"] == 5
+    assert not results[0].error
+    assert results[1].error and "数据库不可用" in results[1].content
+    assert results[2].error and "未知工具" in results[2].content
+
+
+def test_timeout():
+    """超时的调用返回错误结果，不阻塞整轮"""
+    print("\n3. 测试超时:")
+    tools = {"slow": FakeTool("slow", 0.5), "fast": FakeTool("fast")}
+    calls = [{"name": "slow", "args": {}, "id": "a"}, {"name": "fast", "args": {}, "id": "b"}]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        started = time.perf_counter()
+        results = run_tool_calls(calls, tools, executor=executor, timeout=0.1)
+        elapsed = time.perf_counter() - started
+    print(f"   {results[0].content}，耗时{elapsed:.2f}s")
+    assert results[0].error and "超时" in results[0].content
+    assert not results[1].error
+    assert elapsed < 0.3
+
+
+def test_stub_emits_parallel_tool_calls():
+    """桩服务首轮按意图同时发出多个工具调用，收到工具结果后给出最终回复"""
+    print("\n4. 测试桩服务工具调用:")
+    tools = [{"type": "function", "function": {"name": name}} for name in (
+        "get_today_workout_summary", "get_workout_statistics", "get_workout_rollups", "query_workout_records"
+    )]
+    messages = [{"role": "system", "content": "你是一个专业的健身记录分析助手"},
+                {"role": "user", "content": "我今天的运动表现如何？"}]
+    kind, text, calls = tool_reply(messages, tools)
+    print(f"   首轮: {[call['function']['name'] for call in calls]}")
+    assert kind == "tool_call" and len(calls) == 2
+    followup = messages + [
+        {"role": "assistant", "content": None, "tool_calls": calls},
+        {"role": "tool", "tool_call_id": calls[0]["id"], "content": "今天共完成2次运动"},
+    ]
+    kind, text, calls = tool_reply(followup, tools)
+    assert kind == "tool_answer" and text and calls is None
+
+
+def test_format_comparison():
+    """模式对比输出包含各模式的延迟和相对基准的变化"""
+    print("\n5. 测试模式对比输出:")
+
+    def stage(p50):
+        return {"users": 4, "throughput_rps": 2.0, "error_rate": 0.0,
+                "latency": {"p50": p50, "p95": p50 * 2, "p99": p50 * 3}}
+
+    text = format_comparison({
+        "pipeline": {"stages": [stage(1.0)]},
+        "tool_calling": {"stages": [stage(0.8)]},
+    })
+    print(text)
+    assert "-20.0%" in text
+
+
+if __name__ == "__main__":
+    print("开始测试工具调用模式...")
+    try:
+        test_parallel_execution_keeps_order()
+        test_user_id_enforced_and_errors_isolated()
+        test_timeout()
+        test_stub_emits_parallel_tool_calls()
+        test_format_comparison()
+        print("\n✅ 所有测试完成！")
+    except Exception as e:
+        print(f"\n❌ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
@@ -10,7 +10,7 @@ def analyze_workout_trends(data: str) -> str:
     分析运动趋势
     
     Args:
-        data: JSON格式的运动记录数据字符串
+        data: JSON格式的运动记录数据字符串（或get_workout_rollups返回的汇总）
     
     Returns:
         趋势分析结果
@@ -18,6 +18,10 @@ def analyze_workout_trends(data: str) -> str:
     try:
         records = json.loads(data) if isinstance(data, str) else data
         
+        # 多粒度汇总（get_workout_rollups）：每行是一个日/周/月的合计
+        if isinstance(records, dict) and "rows" in records:
+            records = records["rows"]
+        
         if not records:
             return "没有足够的数据进行趋势分析"
         
@@ -28,9 +32,9 @@ def analyze_workout_trends(data: str) -> str:
         # - 卡路里消耗趋势
         # - 心率变化趋势
         
-        total_workouts = len(records)
-        total_duration = sum(r.get("duration", 0) for r in records)
-        total_calories = sum(r.get("calories_burned", 0) for r in records)
+        total_workouts = sum(r.get("workout_count", 1) for r in records)
+        total_duration = sum(r.get("total_duration", r.get("duration", 0)) for r in records)
+        total_calories = sum(r.get("total_calories", r.get("calories_burned", 0)) for r in records)
         
         analysis = f"""
 趋势分析结果：
@@ -1,9 +1,16 @@
 """数据库查询工具 - 封装为LangChain Tool"""
 from typing import Optional, List, Dict, Any
+from itertools import islice
+import json
 from langchain_core.tools import tool
-from database.connection import db_connection
+from database.sharding import shard_router
 from database.models import WorkoutRecord
-from database.mock_data import get_mock_records, get_today_summary, get_statistics
+from database.mock_data import get_mock_records, iter_mock_records, get_today_summary
+from database.streaming import build_workout_records_named
+from database.queries import TODAY_SUMMARY, ROLLUP_RANGE
+from database.rollups import rollup_store, choose_resolution, format_summary as format_rollup_summary
+from database.notes_index import notes_index
+import config
 
 
 @tool
@@ -30,47 +37,38 @@ def query_workout_records(
         JSON格式的运动记录数据字符串
     """
     try:
-        # 构建SQL查询
-        query = "SELECT * FROM workout_records WHERE user_id = %(user_id)s"
-        params = {"user_id": user_id}
-        
-        if date:
-            query += " AND date = %(date)s"
-            params["date"] = date
-        elif start_date and end_date:
-            query += " AND date BETWEEN %(start_date)s AND %(end_date)s"
-            params["start_date"] = start_date
-            params["end_date"] = end_date
-        
-        if exercise_type:
-            query += " AND exercise_type = %(exercise_type)s"
-            params["exercise_type"] = exercise_type
-        
-        query += " ORDER BY date DESC, created_at DESC LIMIT %(limit)s"
-        params["limit"] = limit
+        # 选择预注册的查询模板（键集排序，与流式读取共用）
+        query_name, params = build_workout_records_named(
+            user_id,
+            date=date,
+            exercise_type=exercise_type,
+            start_date=start_date,
+            end_date=end_date,
+            limit=limit
+        )
         
         """
         实际MySQL查询实现（伪代码）：
         
-        results = db_connection.execute_query(query, params)
+        # 按user_id路由到所在分片
+        results = shard_router.connection_for(user_id).execute_named(query_name, params)
         """
         
         # 使用模拟数据替代数据库查询
-        results = get_mock_records(
+        results = iter_mock_records(
             user_id=user_id,
             date_filter=date,
             exercise_type=exercise_type,
             start_date=start_date,
-            end_date=end_date,
-            limit=limit
+            end_date=end_date
         )
         
-        if not results:
+        # 惰性迭代只物化前limit条记录
+        records = list(islice(results, limit))
+        if not records:
             return "未找到匹配的运动记录"
         
-        # 格式化返回结果
-        import json
-        return json.dumps(results, ensure_ascii=False, indent=2)
+        return json.dumps(records, ensure_ascii=False, indent=2)
     
     except Exception as e:
         return f"查询失败: {str(e)}"
@@ -92,22 +90,13 @@ def get_today_workout_summary(user_id: int = 1) -> str:
         today = date.today().isoformat()
         
         # 查询今天的记录
-        query = """
-        SELECT 
-            COUNT(*) as total_workouts,
-            SUM(duration) as total_duration,
-            SUM(calories_burned) as total_calories,
-            AVG(heart_rate_avg) as avg_heart_rate,
-            GROUP_CONCAT(DISTINCT exercise_type) as exercise_types
-        FROM workout_records
-        WHERE user_id = %(user_id)s AND date = %(date)s
-        """
         params = {"user_id": user_id, "date": today}
         
         """
         实际MySQL查询实现（伪代码）：
         
-        results = db_connection.execute_query(query, params)
+        # 按user_id路由到所在分片
+        results = shard_router.connection_for(user_id).execute_named(TODAY_SUMMARY, params)
         if results:
             summary = results[0]
             return f"今天共完成{summary['total_workouts']}次运动，总时长{summary['total_duration']}分钟，消耗{summary['total_calories']}卡路里，平均心率{summary['avg_heart_rate']:.0f}次/分，运动类型：{summary['exercise_types']}"
@@ -130,74 +119,157 @@ def get_today_workout_summary(user_id: int = 1) -> str:
 @tool
 def get_workout_statistics(
     user_id: int = 1,
-    days: int = 7
+    days: int = 7,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    max_rows: int = config.ROLLUP_CONFIG["max_rows"]
 ) -> str:
     """
-    获取指定天数内的运动统计数据
+    获取一段时间内的运动统计数据（按范围自动选择按日、按周或按月汇总）
     
     Args:
         user_id: 用户ID，默认为1
-        days: 统计天数，默认7天
+        days: 统计最近多少天，默认7天（未指定start_date时使用）
+        start_date: 开始日期（格式：YYYY-MM-DD），如"2024-01-01"
+        end_date: 结束日期（格式：YYYY-MM-DD），默认今天
+        max_rows: 返回的统计行数上限，范围较长时自动改为按周/按月汇总
     
     Returns:
         统计信息字符串
     """
     try:
-        from datetime import date, timedelta
-        end_date = date.today()
-        start_date = end_date - timedelta(days=days-1)
+        summary = _summarize_range(user_id, days, start_date, end_date, max_rows)
         
-        query = """
-        SELECT 
-            date,
-            COUNT(*) as workout_count,
-            SUM(duration) as total_duration,
-            SUM(calories_burned) as total_calories,
-            AVG(heart_rate_avg) as avg_heart_rate
-        FROM workout_records
-        WHERE user_id = %(user_id)s 
-            AND date BETWEEN %(start_date)s AND %(end_date)s
-        GROUP BY date
-        ORDER BY date DESC
-        """
-        params = {
-            "user_id": user_id,
-            "start_date": start_date.isoformat(),
-            "end_date": end_date.isoformat()
-        }
+        if not summary["rows"]:
+            if start_date is None and end_date is None:
+                return f"过去{days}天没有运动记录"
+            return f"{summary['start_date']}至{summary['end_date']}没有运动记录"
         
+        return format_rollup_summary(summary)
+    
+    except Exception as e:
+        return f"查询失败: {str(e)}"
+
+
+@tool
+def get_workout_rollups(
+    user_id: int = 1,
+    days: int = 365,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    max_rows: int = config.ROLLUP_CONFIG["max_rows"]
+) -> str:
+    """
+    获取长时间范围的多粒度运动汇总（JSON），用于历史和趋势分析
+    
+    Args:
+        user_id: 用户ID，默认为1
+        days: 汇总最近多少天，默认365天（未指定start_date时使用）
+        start_date: 开始日期（格式：YYYY-MM-DD）
+        end_date: 结束日期（格式：YYYY-MM-DD），默认今天
+        max_rows: 返回的汇总行数上限
+    
+    Returns:
+        JSON格式的汇总数据字符串（resolution、rows、total）
+    """
+    try:
+        summary = _summarize_range(user_id, days, start_date, end_date, max_rows)
+        if not summary["rows"]:
+            return "未找到匹配的运动记录"
+        return json.dumps(summary, ensure_ascii=False, indent=2)
+    
+    except Exception as e:
+        return f"查询失败: {str(e)}"
+
+
+@tool
+def search_workout_notes(
+    user_id: int = 1,
+    query: str = "",
+    limit: int = 10,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> str:
+    """
+    按备注内容检索运动记录（如“晨跑5公里”“自由泳”“20圈”），按相关度排序
+    
+    Args:
+        user_id: 用户ID，默认为1
+        query: 检索文本，其中的数值（距离、圈数、组数等）会精确匹配
+        limit: 返回记录数量限制，默认10条
+        start_date: 开始日期（格式：YYYY-MM-DD）
+        end_date: 结束日期（格式：YYYY-MM-DD）
+    
+    Returns:
+        JSON格式的匹配记录（含提取出的数值和相关度得分）
+    """
+    try:
         """
-        实际MySQL查询实现（伪代码）：
+        实际实现（伪代码）：
         
-        results = db_connection.execute_query(query, params)
-        # 格式化统计结果并返回
+        # 备注不经过数据库LIKE '%...%'全表扫描：写入时增量维护每用户的n-gram倒排索引
+        # （database.events订阅），查询只读取命中n-gram的倒排列表；
+        # 多实例部署时索引随用户所在分片一起分布：
+        # results = shard_router.node_for(user_id).notes_index.search(user_id, query, ...)
         """
         
-        # 使用模拟数据替代数据库查询
-        stats = get_statistics(user_id=user_id, days=days)
-        
-        if not stats:
-            return f"过去{days}天没有运动记录"
-        
-        result_lines = [f"过去{days}天的运动统计数据："]
-        for stat in stats:
-            result_lines.append(
-                f"  {stat['date']}: {stat['workout_count']}次运动, "
-                f"总时长{stat['total_duration']}分钟, "
-                f"消耗{stat['total_calories']}卡路里, "
-                f"平均心率{stat['avg_heart_rate']:.1f}次/分"
-            )
-        
-        return "\n".join(result_lines)
+        results = notes_index.search(
+            user_id,
+            query,
+            limit=limit,
+            start_date=start_date,
+            end_date=end_date
+        )
+        if not results:
+            return "未找到匹配的运动记录"
+        return json.dumps(results, ensure_ascii=False, indent=2)
     
     except Exception as e:
         return f"查询失败: {str(e)}"
 
 
+def _summarize_range(
+    user_id: int,
+    days: int,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    max_rows: int
+) -> Dict[str, Any]:
+    """按日期范围读取预计算汇总（粒度由范围和行数上限决定）"""
+    from datetime import date, timedelta
+    end = date.fromisoformat(end_date) if end_date else date.today()
+    start = date.fromisoformat(start_date) if start_date else end - timedelta(days=days-1)
+    if start > end:
+        raise ValueError(f"开始日期{start}晚于结束日期{end}")
+    resolution = choose_resolution(start, end, max_rows)
+    
+    params = {
+        "user_id": user_id,
+        "resolution": resolution,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat()
+    }
+    
+    """
+    实际MySQL查询实现（伪代码）：
+    
+    # 按user_id路由到所在分片，按主键范围读取汇总行（行数不超过max_rows）
+    connection = shard_router.connection_for(user_id)
+    rows = connection.execute_named(ROLLUP_RANGE, params)
+    # 首尾只覆盖部分天数的周/月，改用日汇总补齐：
+    # connection.execute_named(ROLLUP_RANGE, {**params, "resolution": "day", ...})
+    """
+    
+    # 使用模拟数据的汇总替代数据库查询
+    return rollup_store.summarize(user_id, start, end, max_rows=max_rows, resolution=resolution)
+
+
 # 导出所有工具
 DATABASE_TOOLS = [
     query_workout_records,
     get_today_workout_summary,
-    get_workout_statistics
+    get_workout_statistics,
+    get_workout_rollups,
+    search_workout_notes
 ]
 
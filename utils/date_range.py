@@ -0,0 +1,284 @@
+"""时间范围解析 - 把查询中的“上个月”“最近两周”“3月份”等表达解析为具体日期范围
+
+纯规则实现（预编译正则 + 日期运算），单次解析在微秒级，不调用LLM；
+解析结果直接作为查询工具的start_date/end_date参数，只查询需要的时间窗口。
+支持中文和常见英文表达：
+    今天 / 昨天 / 前天                today / yesterday
+    本周 / 上周 / 本月 / 上个月        this week / last week / this month / last month
+    今年 / 去年 / 2024年               this year / last year
+    最近(过去、近)N天/周/个月/年、半年  last (past) N days/weeks/months/years
+    3月份 / 2024年3月 / 三月            March / March 2024
+    3月5日 / 2024-03-05                2024-03-05
+    2024-03-01到2024-03-15 / 3月1日至3月15日
+    1月到3月 / 2023年11月至2024年2月
+"""
+import re
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class DateRange:
+    """一个闭区间日期范围"""
+
+    __slots__ = ("start", "end", "text")
+
+    def __init__(self, start: date, end: date, text: str = ""):
+        self.start = start
+        self.end = end
+        self.text = text
+
+    @property
+    def days(self) -> int:
+        return (self.end - self.start).days + 1
+
+    def key(self) -> Tuple[str, str]:
+        """用于缓存键"""
+        return self.start.isoformat(), self.end.isoformat()
+
+    def as_params(self) -> Dict[str, str]:
+        """查询工具的start_date/end_date参数"""
+        return {"start_date": self.start.isoformat(), "end_date": self.end.isoformat()}
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DateRange) and (self.start, self.end) == (other.start, other.end)
+
+    def __hash__(self) -> int:
+        return hash((self.start, self.end))
+
+    def __repr__(self) -> str:
+        return f"DateRange({self.start.isoformat()}, {self.end.isoformat()}, {self.text!r})"
+
+
+_CN_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5,
+              "六": 6, "七": 7, "八": 8, "九": 9}
+
+_EN_NUMBERS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+               "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12}
+
+_EN_MONTHS = {name: index + 1 for index, name in enumerate((
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december"
+))}
+_EN_MONTHS.update({name[:3]: number for name, number in list(_EN_MONTHS.items())})
+_EN_MONTHS["sept"] = 9
+
+
+def _number(token: str) -> Optional[int]:
+    """解析阿拉伯数字或中文数字（0-99）"""
+    if token.isdigit():
+        return int(token)
+    token = token.lower()
+    if token in _EN_NUMBERS:
+        return _EN_NUMBERS[token]
+    if "十" in token:
+        tens, _, ones = token.partition("十")
+        value = (_CN_DIGITS.get(tens, 0) if tens else 1) * 10
+        return value + (_CN_DIGITS.get(ones, 0) if ones else 0)
+    if len(token) == 1 and token in _CN_DIGITS:
+        return _CN_DIGITS[token]
+    return None
+
+
+def _shift_months(day: date, months: int) -> date:
+    """按月平移，日期超出目标月天数时取月末"""
+    index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(index, 12)
+    month += 1
+    last_day = (date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)).day
+    return date(year, month, min(day.day, last_day))
+
+
+def _month_range(year: int, month: int) -> Tuple[date, date]:
+    start = date(year, month, 1)
+    return start, _shift_months(start, 1) - timedelta(days=1)
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _infer_year(month: int, day: int, today: date) -> int:
+    """未写年份的月/日：不晚于今天的最近一次"""
+    try:
+        candidate = date(today.year, month, day)
+    except ValueError:
+        return today.year - 1
+    return today.year if candidate <= today else today.year - 1
+
+
+def _last_n(count: int, unit: str, today: date) -> Tuple[date, date]:
+    """截至今天（含）的最近N个单位"""
+    if unit in ("day", "天", "日"):
+        return today - timedelta(days=count - 1), today
+    if unit in ("week", "周", "星期", "礼拜"):
+        return today - timedelta(days=7 * count - 1), today
+    if unit in ("month", "月"):
+        return _shift_months(today, -count) + timedelta(days=1), today
+    return _shift_months(today, -12 * count) + timedelta(days=1), today
+
+
+_NUM = r"(\d{1,3}|[零〇一二两三四五六七八九十]{1,3}|半)"
+_EN_NUM = r"(\d{1,3}|an?|one|two|three|four|five|six|seven|eight|nine|ten|twelve)"
+_ISO = r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})"
+_CN_DATE = r"(?:(\d{4})年)?(\d{1,2})月(\d{1,2})[日号]"
+_RANGE_SEP = r"\s*(?:到|至|~|～|—|-|to|until|through)\s*"
+_CN_MONTH = r"(?:(\d{4})年)?(?<![个0-9])(\d{1,2}|十[一二]?|[一二三四五六七八九])月份?"
+_EN_MONTH_NAMES = "|".join(sorted(_EN_MONTHS, key=len, reverse=True))
+
+
+def _iso_range(m, today):
+    return (date(int(m[1]), int(m[2]), int(m[3])), date(int(m[4]), int(m[5]), int(m[6])))
+
+
+def _cn_date_range(m, today):
+    start_year = int(m[1]) if m[1] else _infer_year(int(m[2]), int(m[3]), today)
+    start = date(start_year, int(m[2]), int(m[3]))
+    end_month = int(m[5]) if m[5] else start.month
+    end_year = int(m[4]) if m[4] else start_year + (1 if end_month < start.month else 0)
+    return start, date(end_year, end_month, int(m[6]))
+
+
+def _iso_date(m, today):
+    day = date(int(m[1]), int(m[2]), int(m[3]))
+    return day, day
+
+
+def _cn_date(m, today):
+    year = int(m[1]) if m[1] else _infer_year(int(m[2]), int(m[3]), today)
+    day = date(year, int(m[2]), int(m[3]))
+    return day, day
+
+
+def _cn_last_n(m, today):
+    unit = m[2].lstrip("个")
+    if m[1] == "半":
+        if unit == "年":
+            return _last_n(6, "月", today)
+        if unit == "月":
+            return _last_n(15, "天", today)
+        return None
+    count = _number(m[1])
+    return _last_n(count, unit, today) if count else None
+
+
+def _en_last_n(m, today):
+    count = _number(m[1] or "1")
+    return _last_n(count, m[2], today) if count else None
+
+
+def _cn_year_month(m, today):
+    month = _number(m[2])
+    if not month or not 1 <= month <= 12:
+        return None
+    year = int(m[1]) if m[1] else _infer_year(month, 1, today)
+    return _month_range(year, month)
+
+
+def _cn_month_range(m, today):
+    start_month, end_month = _number(m[2]), _number(m[4])
+    if not (start_month and end_month and 1 <= start_month <= 12 and 1 <= end_month <= 12):
+        return None
+    wraps = start_month > end_month  # 跨年，如“11月到2月”
+    if m[3]:
+        end_year = int(m[3])
+        start_year = int(m[1]) if m[1] else end_year - wraps
+    elif m[1]:
+        start_year = int(m[1])
+        end_year = start_year + wraps
+    else:
+        end_year = _infer_year(end_month, 1, today)
+        start_year = end_year - wraps
+    return date(start_year, start_month, 1), _month_range(end_year, end_month)[1]
+
+
+def _en_month(m, today):
+    if m[1] == "may" and not m[0].startswith("in") and not m[2]:
+        # “may”多为情态动词，只在“in may”或带年份时当作月份
+        return None
+    month = _EN_MONTHS[m[1]]
+    year = int(m[2]) if m[2] else _infer_year(month, 1, today)
+    return _month_range(year, month)
+
+
+def _year(m, today):
+    year = int(m[1] or m[2])
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def _fixed(resolve: Callable[[date], Tuple[date, date]]):
+    return lambda m, today: resolve(today)
+
+
+_NAMED = {
+    "today": lambda t: (t, t),
+    "yesterday": lambda t: (t - timedelta(days=1),) * 2,
+    "day_before": lambda t: (t - timedelta(days=2),) * 2,
+    "this_week": lambda t: (_week_start(t), t),
+    "last_week": lambda t: (_week_start(t) - timedelta(days=7), _week_start(t) - timedelta(days=1)),
+    "this_month": lambda t: (t.replace(day=1), t),
+    "last_month": lambda t: _month_range(_shift_months(t, -1).year, _shift_months(t, -1).month),
+    "this_year": lambda t: (date(t.year, 1, 1), t),
+    "last_year": lambda t: (date(t.year - 1, 1, 1), date(t.year - 1, 12, 31)),
+}
+
+# (正则, 解析函数)，按顺序匹配，先匹配的优先（显式日期优先于相对表达，带数字的优先于不带数字的）
+_RULES: List[Tuple["re.Pattern", Callable]] = [
+    (re.compile(_ISO + _RANGE_SEP + _ISO), _iso_range),
+    (re.compile(_CN_DATE + r"\s*(?:到|至|~|～|—|-)\s*" + r"(?:(\d{4})年)?(?:(\d{1,2})月)?(\d{1,2})[日号]"), _cn_date_range),
+    (re.compile(_ISO), _iso_date),
+    (re.compile(_CN_DATE), _cn_date),
+    (re.compile(r"(?:最近|过去|近|前)\s*" + _NUM + r"\s*(天|日|周|个?星期|个?礼拜|个?月|年)"), _cn_last_n),
+    (re.compile(r"\b(?:last|past|previous)\s+" + _EN_NUM + r"\s+(day|week|month|year)s?\b"), _en_last_n),
+    (re.compile(r"\bpast\s+()(day|week|month|year)\b"), _en_last_n),
+    (re.compile(r"上上(?:个)?(?:周|星期|礼拜)"), _fixed(lambda t: (
+        _week_start(t) - timedelta(days=14), _week_start(t) - timedelta(days=8)))),
+    (re.compile(r"今天|今日|\btoday\b"), _fixed(_NAMED["today"])),
+    (re.compile(r"昨天|昨日|\byesterday\b"), _fixed(_NAMED["yesterday"])),
+    (re.compile(r"前天"), _fixed(_NAMED["day_before"])),
+    (re.compile(r"本周|这周|这个?星期|本星期|这个?礼拜|\bthis week\b"), _fixed(_NAMED["this_week"])),
+    (re.compile(r"上周|上个?星期|上个?礼拜|\blast week\b"), _fixed(_NAMED["last_week"])),
+    (re.compile(r"本月|这个?月|\bthis month\b"), _fixed(_NAMED["this_month"])),
+    (re.compile(r"上个?月|\blast month\b"), _fixed(_NAMED["last_month"])),
+    (re.compile(_CN_MONTH + r"\s*(?:到|至|~|～|—|-)\s*" + _CN_MONTH), _cn_month_range),
+    (re.compile(_CN_MONTH), _cn_year_month),
+    (re.compile(r"\b(?:in\s+)?(" + _EN_MONTH_NAMES + r")\b(?:\s+(\d{4}))?"), _en_month),
+    (re.compile(r"今年|本年|\bthis year\b"), _fixed(_NAMED["this_year"])),
+    (re.compile(r"去年|\blast year\b"), _fixed(_NAMED["last_year"])),
+    (re.compile(r"(\d{4})\s*年|\bin\s+(\d{4})\b"), _year),
+]
+
+
+def parse_date_range(text: str, today: Optional[date] = None) -> Optional[DateRange]:
+    """
+    解析查询中的时间范围
+
+    Args:
+        text: 用户查询
+        today: 当前日期，默认今天
+
+    Returns:
+        解析出的日期范围（结束日期不晚于今天）；没有时间表达或日期无效时返回None
+    """
+    if not text:
+        return None
+    today = today or date.today()
+    lowered = text.lower()
+    for pattern, resolve in _RULES:
+        match = pattern.search(lowered)
+        if match is None:
+            continue
+        try:
+            resolved = resolve(match, today)
+        except ValueError:
+            # 如2月30日之类的无效日期
+            return None
+        if resolved is None:
+            continue
+        start, end = resolved
+        if start > end:
+            start, end = end, start
+        end = min(end, today)
+        if start > end:
+            return None
+        return DateRange(start, end, match.group(0))
+    return None
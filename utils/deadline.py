@@ -0,0 +1,160 @@
+"""请求级时间预算 - 端到端截止时间按节点切分，预算不足时降级为更便宜的回答路径
+
+每个请求创建一个Deadline，按DEADLINE_CONFIG["shares"]为后续节点预留预算：
+    节点可用时间 = 剩余预算 - 之后各节点的预留
+前面节点提前完成时，省下的时间顺延给后面的节点。数据库查询和模型调用以节点可用时间为超时，
+超时或预算不足时节点降级（路由改用关键词、跳过分析、模板化简要回复），并在状态中记录降级的节点。
+"""
+import concurrent.futures
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from utils.profiling import profile_worker
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求的时间预算已用完"""
+
+
+class Deadline:
+    """单个请求的截止时间"""
+
+    def __init__(
+        self,
+        budget_seconds: Optional[float] = None,
+        shares: Optional[Dict[str, float]] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            budget_seconds: 端到端预算（秒），None或<=0表示不限
+            shares: 各节点（按执行顺序）占总预算的比例，用于为后续节点预留时间
+            clock: 单调时钟（测试时可替换）
+        """
+        self.budget = budget_seconds if budget_seconds and budget_seconds > 0 else None
+        self.shares = dict(shares or {})
+        self.clock = clock
+        self.started = clock()
+        self.expires_at = self.started + self.budget if self.budget else math.inf
+
+    @classmethod
+    def from_config(cls, budget_seconds: Optional[float] = None) -> "Deadline":
+        """按DEADLINE_CONFIG创建，budget_seconds为None时使用配置的默认预算"""
+        import config
+
+        if budget_seconds is None:
+            budget_seconds = config.DEADLINE_CONFIG["budget_seconds"]
+        return cls(budget_seconds, config.DEADLINE_CONFIG["shares"])
+
+    @property
+    def unlimited(self) -> bool:
+        return self.budget is None
+
+    def elapsed(self) -> float:
+        return self.clock() - self.started
+
+    def remaining(self) -> float:
+        """剩余预算（秒），不限时为inf"""
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def reserved_after(self, node: str) -> float:
+        """为node之后的节点预留的秒数"""
+        if self.unlimited or node not in self.shares:
+            return 0.0
+        nodes = list(self.shares)
+        later = nodes[nodes.index(node) + 1:]
+        return self.budget * sum(self.shares[name] for name in later)
+
+    def node_timeout(self, node: str, cap: Optional[float] = None) -> float:
+        """
+        节点可用的时间
+
+        Args:
+            node: 节点名（shares中的键；未配置的节点不预留）
+            cap: 上限（如节点模型配置的超时）
+
+        Returns:
+            可用秒数，不限时为inf（或cap）
+        """
+        available = max(0.0, self.remaining() - self.reserved_after(node))
+        return min(available, cap) if cap is not None else available
+
+
+def is_timeout(exc: BaseException) -> bool:
+    """是否为超时类异常（预算用完、futures超时或openai/httpx的超时）"""
+    # Python 3.11之前concurrent.futures.TimeoutError不是内置TimeoutError的子类
+    return isinstance(exc, (TimeoutError, concurrent.futures.TimeoutError)) or type(exc).__name__ in (
+        "APITimeoutError", "ReadTimeout", "Timeout"
+    )
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="deadline")
+        return _executor
+
+
+def run_with_timeout(fn: Callable[[], Any], timeout: float) -> Any:
+    """
+    在超时内执行不支持超时参数的调用（如数据库查询）
+
+    超时后不等待也不取消：调用在后台继续完成（结果仍会写入响应缓存，下次请求可直接命中）。
+
+    Args:
+        fn: 无参调用
+        timeout: 超时秒数，inf时在当前线程直接执行
+
+    Returns:
+        fn 的返回值
+
+    Raises:
+        DeadlineExceeded: 超时或预算已用完
+    """
+    if math.isinf(timeout):
+        return fn()
+    if timeout <= 0:
+        raise DeadlineExceeded("预算已用完")
+    future = _get_executor().submit(profile_worker(fn))
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        if future.done():
+            raise
+        raise DeadlineExceeded(f"{timeout:.2f}秒内未完成") from None
+
+
+def degraded_response(data: str, analysis: str = "", max_lines: int = 12) -> str:
+    """
+    预算不足时不调用模型，按查询结果生成模板化的简要回复
+
+    Args:
+        data: 工具返回的数据
+        analysis: 已有的分析结果（可为空）
+        max_lines: 最多引用的数据行数
+
+    Returns:
+        简要回复
+    """
+    parts = ["（当前请求较多，以下为根据查询结果整理的简要回复）"]
+    lines: List[str] = [line for line in (data or "").splitlines() if line.strip()]
+    if lines:
+        shown = lines[:max_lines]
+        if len(lines) > max_lines:
+            shown.append(f"……（另有{len(lines) - max_lines}行未列出）")
+        parts.append("\n".join(shown))
+    else:
+        parts.append("暂时没有查询到相关数据，请稍后再试。")
+    if analysis:
+        parts.append(f"分析：\n{analysis}")
+    return "\n\n".join(parts)
@@ -0,0 +1,664 @@
+"""LLM调用限流器 - 令牌桶限速、AIMD自适应并发、抖动重试、排队耗时统计与对冲请求"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+from utils.deadline import DeadlineExceeded
+from utils.profiling import profile_worker
+
+
+class RateLimitExceeded(Exception):
+    """在限流器内排队超时时抛出"""
+
+
+class HedgeCancelled(Exception):
+    """对冲的另一路调用已先返回，本路在发出请求前放弃"""
+
+
+class TokenBucket:
+    """令牌桶 - 按固定速率补充令牌，允许一定突发"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate_per_minute: 每分钟补充的令牌数，<=0 表示不限速
+            capacity: 桶容量（允许的突发量），默认等于每分钟速率
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, amount: float = 1.0, timeout: Optional[float] = None) -> float:
+        """
+        获取令牌，不足时阻塞等待
+
+        Args:
+            amount: 需要的令牌数（超过容量时按容量计，避免永久阻塞）
+            timeout: 最长等待秒数，None 表示一直等待
+
+        Returns:
+            实际等待的秒数
+        """
+        if self.unlimited:
+            return 0.0
+
+        amount = min(amount, self.capacity)
+        start = time.monotonic()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return now - start
+                wait = (amount - self.tokens) / self.rate
+
+            if timeout is not None and now - start + wait > timeout:
+                raise RateLimitExceeded(f"等待令牌超时（需要{amount:.0f}个）")
+            time.sleep(min(wait, 1.0))
+
+    def adjust(self, delta: float):
+        """按实际用量修正令牌余额（delta>0 为补扣，可短暂透支）"""
+        if self.unlimited or not delta:
+            return
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class AdaptiveConcurrency:
+    """AIMD自适应并发窗口 - 成功时加性增大，遇到429或高延迟时乘性减小"""
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        decrease_factor: float = 0.5,
+        latency_threshold: float = 20.0,
+        cooldown: float = 2.0
+    ):
+        """
+        Args:
+            initial: 初始并发上限
+            min_limit: 并发上限的下界
+            max_limit: 并发上限的上界
+            decrease_factor: 拥塞时的乘性缩减系数
+            latency_threshold: 单次调用超过该秒数视为拥塞信号
+            cooldown: 两次缩减之间的最小间隔（秒），避免一次拥塞被重复惩罚
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_threshold = latency_threshold
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """占用一个并发槽位，返回等待秒数"""
+        start = time.monotonic()
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                if remaining is not None and remaining <= 0:
+                    raise RateLimitExceeded("等待并发槽位超时")
+                self.cond.wait(remaining)
+            self.in_flight += 1
+        return time.monotonic() - start
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify()
+
+    def on_success(self, latency: float):
+        """成功回调：延迟正常时加性增大（每个窗口约+1）"""
+        if latency > self.latency_threshold:
+            self.on_overload()
+            return
+        with self.cond:
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+            self.cond.notify_all()
+
+    def on_overload(self):
+        """拥塞回调：乘性减小并发上限"""
+        with self.cond:
+            now = time.monotonic()
+            if now - self.last_decrease < self.cooldown:
+                return
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            self.last_decrease = now
+
+
+class LimiterMetrics:
+    """限流器运行指标"""
+
+    def __init__(self, window: int = 1000):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "rate_limited": 0,
+        }
+        self.queue_times = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+
+    def incr(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, queue_time: Optional[float] = None, latency: Optional[float] = None):
+        with self.lock:
+            if queue_time is not None:
+                self.queue_times.append(queue_time)
+            if latency is not None:
+                self.latencies.append(latency)
+
+    @staticmethod
+    def _percentile(samples, pct: float) -> float:
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回当前指标快照"""
+        with self.lock:
+            queue_times = list(self.queue_times)
+            latencies = list(self.latencies)
+            result: Dict[str, Any] = dict(self.counters)
+        for name, samples in (("queue_time", queue_times), ("latency", latencies)):
+            result[f"{name}_p50"] = round(self._percentile(samples, 50), 4)
+            result[f"{name}_p95"] = round(self._percentile(samples, 95), 4)
+            result[f"{name}_max"] = round(max(samples), 4) if samples else 0.0
+        return result
+
+
+def classify_error(exc: Exception) -> str:
+    """
+    对模型调用异常进行分类
+
+    Returns:
+        "rate_limit"（429）、"retryable"（5xx/超时/连接错误）或 "fatal"
+    """
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    name = type(exc).__name__
+
+    if status == 429 or name == "RateLimitError":
+        return "rate_limit"
+    if (status is not None and status >= 500) or name in (
+        "APITimeoutError", "APIConnectionError", "InternalServerError", "TimeoutError", "ConnectionError"
+    ):
+        return "retryable"
+    return "fatal"
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """读取服务端返回的Retry-After头（秒）"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMLimiter:
+    """共享的LLM调用限流器"""
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        latency_threshold: float = 20.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        queue_timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            requests_per_minute: 每分钟请求数上限，<=0 表示不限
+            tokens_per_minute: 每分钟token数上限，<=0 表示不限
+            initial_concurrency: 初始并发上限
+            min_concurrency: 并发上限下界
+            max_concurrency: 并发上限上界
+            latency_threshold: 视为拥塞的单次调用延迟（秒）
+            max_retries: 失败后的最大重试次数
+            backoff_base: 指数退避的基础秒数
+            backoff_max: 单次退避的最大秒数
+            queue_timeout: 排队等待的最长秒数，None 表示一直等待
+        """
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(
+            initial=initial_concurrency,
+            min_limit=min_concurrency,
+            max_limit=max_concurrency,
+            latency_threshold=latency_threshold
+        )
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self.metrics = LimiterMetrics()
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        """带完全抖动的指数退避，服务端给出Retry-After时以其为下限"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _queue_timeout(self, deadline: Optional[float]) -> Optional[float]:
+        """排队等待上限：queue_timeout与截止时间取较早者"""
+        if deadline is None:
+            return self.queue_timeout
+        remaining = max(0.0, deadline - time.monotonic())
+        return remaining if self.queue_timeout is None else min(remaining, self.queue_timeout)
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0, deadline: Optional[float] = None) -> Any:
+        """
+        在限流保护下执行一次模型调用
+
+        Args:
+            fn: 实际发起调用的无参函数
+            estimated_tokens: 预估消耗的token数，用于token限速
+            deadline: 截止时间（time.monotonic()时刻），排队和重试都不超过它；None表示不限
+
+        Returns:
+            fn 的返回值
+        """
+        self.metrics.incr("calls")
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            self.request_bucket.acquire(1, timeout=self._queue_timeout(deadline))
+            self.token_bucket.acquire(estimated_tokens, timeout=self._queue_timeout(deadline))
+            self.concurrency.acquire(timeout=self._queue_timeout(deadline))
+            queue_time = time.monotonic() - start
+
+            call_start = time.monotonic()
+            try:
+                result = fn()
+            except HedgeCancelled:
+                # 未发出请求：归还槽位和预扣的令牌，不计为失败
+                self.concurrency.release()
+                self.request_bucket.adjust(-1)
+                self.token_bucket.adjust(-estimated_tokens)
+                self.metrics.incr("hedges_cancelled")
+                raise
+            except Exception as e:
+                self.concurrency.release()
+                kind = classify_error(e)
+                if kind == "rate_limit":
+                    self.metrics.incr("rate_limited")
+                    self.concurrency.on_overload()
+                self.metrics.observe(queue_time=queue_time)
+                delay = self._backoff(attempt + 1, e)
+                if kind == "fatal" or attempt >= self.max_retries or (
+                    deadline is not None and time.monotonic() + delay >= deadline
+                ):
+                    self.metrics.incr("failures")
+                    raise
+                attempt += 1
+                self.metrics.incr("retries")
+                time.sleep(delay)
+                continue
+
+            self.concurrency.release()
+            latency = time.monotonic() - call_start
+            self.concurrency.on_success(latency)
+            self.metrics.incr("successes")
+            self.metrics.observe(queue_time=queue_time, latency=latency)
+
+            actual_tokens = _usage_tokens(result)
+            if actual_tokens is not None:
+                self.token_bucket.adjust(actual_tokens - estimated_tokens)
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回指标快照（包含当前并发上限）"""
+        result = self.metrics.snapshot()
+        result["concurrency_limit"] = round(self.concurrency.limit, 2)
+        result["in_flight"] = self.concurrency.in_flight
+        return result
+
+
+def estimate_tokens(messages) -> int:
+    """粗略估算消息的token数（中文约每字1个token，英文约每4字符1个token）"""
+    total = 0
+    for message in messages if isinstance(messages, (list, tuple)) else [messages]:
+        content = getattr(message, "content", message)
+        text = content if isinstance(content, str) else str(content)
+        ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+        total += (len(text) - ascii_chars) + ascii_chars // 4 + 4
+    return total
+
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    """从模型返回中读取实际token用量"""
+    usage = getattr(result, "usage_metadata", None)
+    if isinstance(usage, dict) and "total_tokens" in usage:
+        return usage["total_tokens"]
+    return None
+
+
+class UsageTracker:
+    """按模型层级（路由/分析/回复等节点）统计调用次数、延迟、token和费用"""
+
+    def __init__(self, prices: Optional[Dict[str, Any]] = None, window: int = 1000):
+        """
+        Args:
+            prices: 模型名 -> (每千输入token价格, 每千输出token价格)
+            window: 每个层级保留的最近延迟样本数
+        """
+        self.prices = prices or {}
+        self.window = window
+        self.lock = threading.Lock()
+        self.tiers: Dict[str, Dict[str, Any]] = {}
+
+    def _tier(self, tier: str, model: str) -> Dict[str, Any]:
+        stats = self.tiers.get(tier)
+        if stats is None:
+            stats = self.tiers[tier] = {
+                "model": model, "calls": 0, "failures": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+                "latencies": deque(maxlen=self.window),
+            }
+        return stats
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """按价格表计算费用（未配置价格的模型记为0）"""
+        input_price, output_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+
+    def record(
+        self,
+        tier: str,
+        model: str,
+        latency: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        failed: bool = False
+    ):
+        """记录一次调用（延迟包含排队和重试）"""
+        with self.lock:
+            stats = self._tier(tier, model)
+            stats["calls"] += 1
+            stats["latencies"].append(latency)
+            if failed:
+                stats["failures"] += 1
+                return
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["cost"] += self.cost(model, prompt_tokens, completion_tokens)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """各层级的指标快照"""
+        with self.lock:
+            tiers = {tier: {**stats, "latencies": list(stats["latencies"])} for tier, stats in self.tiers.items()}
+        result = {}
+        for tier, stats in tiers.items():
+            latencies = stats.pop("latencies")
+            stats["cost"] = round(stats["cost"], 6)
+            stats["latency_p50"] = round(LimiterMetrics._percentile(latencies, 50), 4)
+            stats["latency_p95"] = round(LimiterMetrics._percentile(latencies, 95), 4)
+            stats["cost_per_call"] = round(stats["cost"] / stats["calls"], 6) if stats["calls"] else 0.0
+            result[tier] = stats
+        return result
+
+    def reset(self):
+        with self.lock:
+            self.tiers = {}
+
+
+def _usage_breakdown(messages, result: Any) -> tuple:
+    """(输入token, 输出token)，模型未返回用量时按文本估算"""
+    usage = getattr(result, "usage_metadata", None)
+    if isinstance(usage, dict) and "input_tokens" in usage:
+        return usage["input_tokens"], usage.get("output_tokens", 0)
+    return estimate_tokens(messages), estimate_tokens([result])
+
+
+class Hedger:
+    """
+    对冲请求 - 调用超过近期延迟的指定分位数仍未返回时，再发一个相同的请求，先成功返回的一路胜出
+
+    额外请求受预算限制：每次调用积累max_extra_ratio个额度（上限burst），每次对冲消耗1个，
+    因此长期额外负载不超过调用数的max_extra_ratio。胜出后另一路被取消：还在限流器中排队的
+    不再发出；已发出的同步HTTP请求无法中断，结果被丢弃，槽位在其返回后归还。
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        min_delay: float = 0.05,
+        max_extra_ratio: float = 0.1,
+        burst: float = 5.0,
+        window: int = 500,
+        min_samples: int = 20,
+        max_workers: int = 32
+    ):
+        """
+        Args:
+            percentile: 以近期延迟的该分位数作为发出对冲请求的等待时间
+            min_delay: 等待时间下限（秒）
+            max_extra_ratio: 对冲请求占调用数的上限
+            burst: 对冲额度的上限（允许短时集中对冲的次数）
+            window: 保留的最近延迟样本数
+            min_samples: 样本数不足时不对冲
+            max_workers: 执行调用的线程数
+        """
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_extra_ratio = max_extra_ratio
+        self.burst = burst
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.budget = burst
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self.counters: Dict[str, int] = {
+            "calls": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "cancelled": 0,
+            "budget_exhausted": 0,
+        }
+
+    def _incr(self, name: str):
+        with self.lock:
+            self.counters[name] += 1
+
+    def hedge_delay(self) -> Optional[float]:
+        """发出对冲请求前的等待秒数，样本不足时返回None（不对冲）"""
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            samples = list(self.latencies)
+        return max(self.min_delay, LimiterMetrics._percentile(samples, self.percentile))
+
+    def _spend(self) -> bool:
+        with self.lock:
+            if self.budget >= 1:
+                self.budget -= 1
+                return True
+            self.counters["budget_exhausted"] += 1
+            return False
+
+    def _run(self, fn: Callable[[threading.Event], Any], cancelled: threading.Event) -> Any:
+        started = time.monotonic()
+        try:
+            result = fn(cancelled)
+        except HedgeCancelled:
+            self._incr("cancelled")
+            raise
+        # 落败一路完成时同样记录延迟，避免样本只剩较快的一路而低估分位数
+        with self.lock:
+            self.latencies.append(time.monotonic() - started)
+        return result
+
+    def call(self, fn: Callable[[threading.Event], Any]) -> Any:
+        """
+        执行调用，超过对冲等待时间仍未返回时再发一路
+
+        Args:
+            fn: 发起一次调用的函数，参数为取消标志（已置位时应在发出请求前抛出HedgeCancelled）
+
+        Returns:
+            先成功返回的一路的结果；主调用在对冲前失败时直接抛出，两路都失败时抛出后失败的异常
+        """
+        with self.lock:
+            self.counters["calls"] += 1
+            self.budget = min(self.burst, self.budget + self.max_extra_ratio)
+        cancelled = threading.Event()
+        primary = self.executor.submit(profile_worker(self._run), fn, cancelled)
+        delay = self.hedge_delay()
+        if delay is None or wait([primary], timeout=delay).done or not self._spend():
+            return primary.result()
+
+        hedge = self.executor.submit(profile_worker(self._run), fn, cancelled)
+        self._incr("hedged")
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                cancelled.set()
+                for loser in pending:
+                    if loser.cancel():
+                        self._incr("cancelled")
+                self._incr("hedge_wins" if future is hedge else "primary_wins")
+                return future.result()
+        raise error
+
+    def snapshot(self) -> Dict[str, Any]:
+        """对冲指标：对冲率、对冲胜出率和当前等待时间"""
+        with self.lock:
+            counters = dict(self.counters)
+            budget = self.budget
+        delay = self.hedge_delay()
+        return {
+            **counters,
+            "hedge_rate": round(counters["hedged"] / counters["calls"], 4) if counters["calls"] else 0.0,
+            "hedge_win_rate": round(counters["hedge_wins"] / counters["hedged"], 4) if counters["hedged"] else 0.0,
+            "hedge_delay": round(delay, 4) if delay is not None else None,
+            "budget": round(budget, 2),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+class RateLimitedLLM:
+    """带限流保护的聊天模型包装器，接口与被包装的模型保持一致"""
+
+    def __init__(
+        self,
+        llm: Any,
+        limiter: LLMLimiter,
+        max_output_tokens: int = 512,
+        tier: str = "default",
+        model: Optional[str] = None,
+        usage: Optional[UsageTracker] = None,
+        hedger: Optional[Hedger] = None
+    ):
+        """
+        Args:
+            llm: 被包装的聊天模型（如ChatOpenAI实例）
+            limiter: 共享的限流器
+            max_output_tokens: 预估token时为输出预留的数量
+            tier: 模型层级名（通常是使用它的节点），用于分层统计
+            model: 模型名，用于按价格表计算费用
+            usage: 分层用量统计，None时不统计
+            hedger: 对冲请求策略（按层级各自统计延迟），None时不对冲
+        """
+        self.llm = llm
+        self.limiter = limiter
+        self.max_output_tokens = max_output_tokens
+        self.tier = tier
+        self.model = model or getattr(llm, "model_name", "") or ""
+        self.usage = usage
+        self.hedger = hedger
+
+    def invoke(self, messages, timeout: Optional[float] = None, **kwargs):
+        """
+        在限流保护下调用模型
+
+        Args:
+            messages: 输入消息
+            timeout: 本次调用（含排队和重试）的总超时秒数；每次尝试以剩余时间作为请求超时
+            **kwargs: 透传给模型的参数
+        """
+        estimated = estimate_tokens(messages) + self.max_output_tokens
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+
+        def attempt(cancelled: Optional[threading.Event] = None):
+            if cancelled is not None and cancelled.is_set():
+                raise HedgeCancelled("另一路对冲调用已返回")
+            if deadline is None:
+                result = self.llm.invoke(messages, **kwargs)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceeded("模型调用预算已用完")
+                result = self.llm.invoke(messages, timeout=remaining, **kwargs)
+            if cancelled is not None:
+                # 在归还并发槽位之前置位，排队中的另一路拿到槽位后即放弃
+                cancelled.set()
+            return result
+
+        def limited(cancelled: Optional[threading.Event] = None):
+            # 对冲的每一路都经过限流器（额外请求同样受限速和并发上限约束）
+            return self.limiter.call(lambda: attempt(cancelled), estimated, deadline)
+
+        try:
+            result = self.hedger.call(limited) if self.hedger is not None else limited()
+        except Exception:
+            if self.usage is not None:
+                self.usage.record(self.tier, self.model, time.monotonic() - started, failed=True)
+            raise
+        if self.usage is not None:
+            prompt_tokens, completion_tokens = _usage_breakdown(messages, result)
+            self.usage.record(self.tier, self.model, time.monotonic() - started, prompt_tokens, completion_tokens)
+        return result
+
+    def bind_tools(self, tools, **kwargs) -> "RateLimitedLLM":
+        """绑定工具后仍经过同一个限流器（直接委托会绕过限流）"""
+        return RateLimitedLLM(
+            self.llm.bind_tools(tools, **kwargs), self.limiter, self.max_output_tokens,
+            tier=self.tier, model=self.model, usage=self.usage, hedger=self.hedger
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
@@ -0,0 +1,367 @@
+"""按请求的性能剖析 - 对单次Agent调用采集cProfile与tracemalloc数据
+
+开启方式（任选其一）：
+    PROFILING_ENABLED=true 且 PROFILING_SAMPLE_RATE=0.01   按比例采样
+    fitness_agent.invoke(query, profile=True)              单个请求强制剖析
+
+每个被剖析的请求在输出目录下生成两份文件（超出上限时删除最旧的）：
+    {时间}_{用户}_{序号}.prof   cProfile原始数据（可用pstats/snakeviz查看）
+    {时间}_{用户}_{序号}.json   耗时、意图、热点函数和内存分配最多的代码行
+
+关闭时每个请求只多一次布尔判断。汇总最慢的N个请求：
+    python -m utils.profiling --top 10 --combine
+
+cProfile只采集调用它的线程（Python 3.12之前）。预取、查询超时、对冲和并行工具调用的线程池在提交时
+用profile_worker包装任务：剖析会话进行中提交的任务在工作线程里单独采集，会话结束时合并进同一份数据；
+会话结束后才完成的任务（如超时后在后台继续的查询）不计入。其他未包装的线程（如框架内部的线程池）
+不在剖析范围内。元数据中worker_profiles为合并的任务数，unfinished_worker_tasks为会话结束时仍未完成的任务数。
+"""
+import argparse
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from contextvars import ContextVar
+from datetime import datetime
+from itertools import count
+from typing import Any, Callable, Dict, List, Optional
+import config
+
+
+class _NullSession:
+    """未剖析时使用的空会话"""
+
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def tag(self, **tags):
+        pass
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+
+NULL_SESSION = _NullSession()
+
+# 当前线程（上下文）正在进行的剖析会话，提交到线程池的任务据此归属
+_active_session: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+
+
+class ProfileSession:
+    """一次请求的剖析会话"""
+
+    enabled = True
+
+    def __init__(self, profiler: "RequestProfiler", tags: Dict[str, Any]):
+        self.profiler = profiler
+        self.tags = dict(tags)
+        self.profile = cProfile.Profile()
+        self.started_tracemalloc = False
+        self.wall_start = 0.0
+        self.cpu_start = 0.0
+        self.error: Optional[str] = None
+        self.worker_profiles: List[cProfile.Profile] = []
+        self.pending_workers = 0
+        self.closed = False
+        self.lock = threading.Lock()
+        self.token = None
+
+    def __enter__(self):
+        if self.profiler.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.profiler.traceback_depth)
+            self.started_tracemalloc = True
+        if tracemalloc.is_tracing() and hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+            tracemalloc.reset_peak()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.token = _active_session.set(self)
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.profile.disable()
+        _active_session.reset(self.token)
+        with self.lock:
+            self.closed = True
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        snapshot = None
+        peak = None
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if self.started_tracemalloc:
+                tracemalloc.stop()
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc_val}"
+        try:
+            self.profiler._write(self, wall, cpu, snapshot, peak)
+        finally:
+            self.profiler._release()
+        return False
+
+    def tag(self, **tags):
+        """补充标签（如执行后才知道的意图）"""
+        self.tags.update(tags)
+
+    def pause(self):
+        """暂停采集（流式输出时把控制权交还调用方期间不计入）"""
+        self.profile.disable()
+
+    def resume(self):
+        self.profile.enable()
+
+    def _worker_submitted(self):
+        with self.lock:
+            self.pending_workers += 1
+
+    def _worker_finished(self, profile: Optional[cProfile.Profile]):
+        """合并工作线程中采集的数据（会话已结束时丢弃）"""
+        with self.lock:
+            self.pending_workers -= 1
+            if profile is not None and not self.closed:
+                self.worker_profiles.append(profile)
+
+
+def profile_worker(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    包装提交到线程池的任务：提交时有剖析会话则在工作线程里采集并合并到该会话
+
+    未在剖析时原样返回fn，不增加开销。
+
+    Args:
+        fn: 在工作线程中执行的调用
+
+    Returns:
+        可直接提交给executor的调用
+    """
+    session = _active_session.get()
+    if session is None:
+        return fn
+    session._worker_submitted()
+
+    def run(*args, **kwargs):
+        profile: Optional[cProfile.Profile] = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Python 3.12+的cProfile基于sys.monitoring，会话的采集已覆盖所有线程
+            profile = None
+        token = _active_session.set(session)  # 工作线程里再提交的任务也归属同一会话
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+            _active_session.reset(token)
+            session._worker_finished(profile)
+
+    return run
+
+
+class RequestProfiler:
+    """按请求采样的剖析器（同一时刻只剖析一个请求，cProfile和tracemalloc都是进程级的）"""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        sample_rate: float = 0.0,
+        output_dir: str = "data/profiles",
+        max_files: int = 200,
+        top_functions: int = 30,
+        top_allocations: int = 20,
+        trace_memory: bool = True,
+        traceback_depth: int = 1
+    ):
+        """
+        Args:
+            enabled: 是否按sample_rate采样（per-request强制剖析不受此限制）
+            sample_rate: 采样比例（0-1）
+            output_dir: 输出目录
+            max_files: 最多保留的请求数
+            top_functions: 元数据中记录的热点函数数
+            top_allocations: 元数据中记录的内存分配行数
+            trace_memory: 是否同时采集tracemalloc
+            traceback_depth: tracemalloc记录的栈深度
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.max_files = max_files
+        self.top_functions = top_functions
+        self.top_allocations = top_allocations
+        self.trace_memory = trace_memory
+        self.traceback_depth = traceback_depth
+        self.busy = threading.Lock()
+        self.sequence = count(1)
+        self.skipped_busy = 0
+
+    def should_profile(self, force: Optional[bool] = None) -> bool:
+        if force is not None:
+            return force
+        return self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def session(self, force: Optional[bool] = None, **tags):
+        """
+        为一次请求创建剖析会话
+
+        Args:
+            force: True强制剖析，False强制不剖析，None按配置采样
+            **tags: 请求标签（user_id、query等）
+
+        Returns:
+            上下文管理器；未被采样或已有请求在剖析时为空会话
+        """
+        if not self.should_profile(force):
+            return NULL_SESSION
+        if not self.busy.acquire(blocking=False):
+            self.skipped_busy += 1
+            return NULL_SESSION
+        return ProfileSession(self, tags)
+
+    def _release(self):
+        self.busy.release()
+
+    def _write(self, session: ProfileSession, wall: float, cpu: float, snapshot, peak: Optional[int]):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        base = os.path.join(
+            self.output_dir,
+            f"{stamp}_u{session.tags.get('user_id', 'na')}_{next(self.sequence)}"
+        )
+        stream = io.StringIO()
+        stats = pstats.Stats(session.profile, stream=stream)
+        with session.lock:
+            worker_profiles = list(session.worker_profiles)
+            unfinished = session.pending_workers
+        if worker_profiles:
+            stats.add(*worker_profiles)
+        stats.dump_stats(f"{base}.prof")
+        functions = []
+        for (filename, line, name), (calls, _, total, cumulative, _) in sorted(
+            stats.stats.items(), key=lambda item: item[1][3], reverse=True
+        )[:self.top_functions]:
+            functions.append({
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "total_seconds": round(total, 6),
+                "cumulative_seconds": round(cumulative, 6),
+            })
+
+        allocations = []
+        if snapshot is not None:
+            snapshot = snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            for stat in snapshot.statistics("lineno")[:self.top_allocations]:
+                frame = stat.traceback[0]
+                allocations.append({
+                    "location": f"{frame.filename}:{frame.lineno}",
+                    "size_kb": round(stat.size / 1024, 1),
+                    "count": stat.count,
+                })
+
+        meta = {
+            "tags": session.tags,
+            "started_at": stamp,
+            "wall_seconds": round(wall, 6),
+            "cpu_seconds": round(cpu, 6),
+            "peak_memory_kb": round(peak / 1024, 1) if peak is not None else None,
+            "error": session.error,
+            "worker_profiles": len(worker_profiles),
+            "unfinished_worker_tasks": unfinished,
+            "profile_file": os.path.basename(f"{base}.prof"),
+            "top_functions": functions,
+            "top_allocations": allocations,
+        }
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+        self._rotate()
+
+    def _rotate(self):
+        metas = sorted(glob.glob(os.path.join(self.output_dir, "*.json")))
+        for path in metas[:max(0, len(metas) - self.max_files)]:
+            for victim in (path, path[:-len(".json")] + ".prof"):
+                try:
+                    os.remove(victim)
+                except FileNotFoundError:
+                    pass
+
+
+def load_profiles(output_dir: str) -> List[Dict[str, Any]]:
+    """读取输出目录下所有请求的元数据"""
+    profiles = []
+    for path in glob.glob(os.path.join(output_dir, "*.json")):
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+        meta["path"] = path
+        profiles.append(meta)
+    return profiles
+
+
+def worst_requests(output_dir: str, top: int = 10, key: str = "wall_seconds") -> List[Dict[str, Any]]:
+    """按耗时（或cpu_seconds / peak_memory_kb）排序的最差N个请求"""
+    profiles = [p for p in load_profiles(output_dir) if p.get(key) is not None]
+    return sorted(profiles, key=lambda p: p[key], reverse=True)[:top]
+
+
+def combine_stats(profiles: List[Dict[str, Any]], output_dir: str, limit: int = 25) -> str:
+    """合并多个请求的cProfile数据，输出累计耗时最高的函数"""
+    paths = [os.path.join(output_dir, p["profile_file"]) for p in profiles]
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        return "没有可合并的剖析数据"
+    stream = io.StringIO()
+    stats = pstats.Stats(*paths, stream=stream)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
+
+
+# 全局剖析器
+request_profiler = RequestProfiler(**config.PROFILING_CONFIG)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="汇总最慢请求的剖析数据")
+    parser.add_argument("--dir", default=config.PROFILING_CONFIG["output_dir"])
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--by", default="wall_seconds", choices=["wall_seconds", "cpu_seconds", "peak_memory_kb"])
+    parser.add_argument("--combine", action="store_true", help="合并这些请求的cProfile数据并输出热点函数")
+    args = parser.parse_args(argv)
+
+    worst = worst_requests(args.dir, args.top, args.by)
+    if not worst:
+        print(f"{args.dir} 下没有剖析数据")
+        return
+    for meta in worst:
+        tags = meta["tags"]
+        print(
+            f"{meta['wall_seconds']:>8.3f}s  cpu {meta['cpu_seconds']:>7.3f}s  "
+            f"峰值 {meta['peak_memory_kb'] or 0:>9.1f}KB  "
+            f"用户 {tags.get('user_id')}  意图 {tags.get('intent', '')}  {meta['profile_file']}"
+        )
+        for function in meta["top_functions"][:3]:
+            print(f"          {function['cumulative_seconds']:>8.3f}s  {function['function']}")
+        for allocation in meta["top_allocations"][:3]:
+            print(f"          {allocation['size_kb']:>8.1f}KB  {allocation['location']}")
+    if args.combine:
+        print()
+        print(combine_stats(worst, args.dir))
+
+
+if __name__ == "__main__":
+    main()
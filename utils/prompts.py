@@ -14,6 +14,16 @@ SYSTEM_PROMPT = """你是一个专业的健身记录分析助手。你的任务
 请根据用户的查询，使用可用的工具获取数据，然后进行分析和回复。"""
 
 
+# 工具调用模式的提示词（模型绑定全部工具，自行决定调用哪些）
+TOOL_AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT + """
+
+当前用户ID：{user_id}，今天是{today}。
+多个查询互不依赖时，请在同一轮中同时发起这些工具调用；拿到结果后再决定是否继续调用或直接回复。"""),
+    ("human", "{query}")
+])
+
+
 # 查询路由提示词
 QUERY_ROUTER_PROMPT = ChatPromptTemplate.from_messages([
     ("system", """你是一个查询意图识别助手。根据用户的查询，判断用户的意图类型。
@@ -24,6 +34,7 @@ QUERY_ROUTER_PROMPT = ChatPromptTemplate.from_messages([
 - "specific_record": 查询特定记录
 - "trend_analysis": 趋势分析
 - "comparison": 对比分析
+- "notes_search": 按备注内容检索记录（如“跑5公里的那次”“游了20圈”）
 - "general_query": 一般性查询
 
 请只返回意图类型，不要返回其他内容。"""),
@@ -42,9 +53,10 @@ ANALYSIS_PROMPT = ChatPromptTemplate.from_messages([
 4. 心率数据（如果有）
 5. 运动类型分布
 6. 趋势变化
+7. 写入时检测到的异常记录（如果有），说明可能的原因
 
 请用专业但易懂的语言进行分析。"""),
-    ("human", "请分析以下运动数据：\n{data}")
+    ("human", "请分析以下运动数据：\n{data}\n\n用户的日常水平（用于与平时对比）：\n{profile}")
 ])
 
 
@@ -62,12 +74,28 @@ RESPONSE_PROMPT = ChatPromptTemplate.from_messages([
 ])
 
 
+# 周报生成提示词
+WEEKLY_REPORT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """你是一个友好的健身助手。根据用户本周和上周的运动统计，写一段简短的周报。
+
+周报要求：
+1. 概括本周运动量，并与上周对比
+2. 指出亮点或需要注意的地方
+3. 给出一条下周建议
+4. 使用中文，不超过150字"""),
+    ("human", "{stats}")
+])
+
+
 # Agent状态说明
 AGENT_STATE_DESCRIPTION = """
 Agent状态包含以下字段：
 - messages: 对话消息历史
 - query: 用户原始查询
+- user_id: 用户ID
 - intent: 识别的查询意图
+- date_range: 查询中解析出的时间范围（未提及时间为None）
+- prefetched_data: 路由阶段推测预取命中的数据（未命中为None）
 - data: 查询到的数据
 - analysis: 分析结果
 - response: 最终回复
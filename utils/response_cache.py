@@ -0,0 +1,209 @@
+"""响应缓存 - 按用户缓存工具结果和分析结果，新记录写入时按用户失效
+
+每个用户有一个版本号，写入新记录时版本号递增，旧版本的缓存条目随即失效。
+计算前先取版本号、写入时校验，避免计算期间到达的新记录被旧结果覆盖。
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+# 不使用查询时间范围的意图（今天的汇总只看当天），缓存键中不包含范围，与预热写入的条目一致
+WINDOWLESS_INTENTS = frozenset({"today_performance"})
+
+
+def data_cache_key(
+    intent: str,
+    date_range: Optional[Any] = None,
+    query: str = "",
+    day: Optional[date] = None
+) -> tuple:
+    """
+    工具结果的缓存键（查询节点、推测式预取和预热共用）
+
+    Args:
+        intent: 查询意图
+        date_range: 查询中解析出的时间范围（DateRange），不使用范围的意图忽略
+        query: 用户查询原文，只有备注检索的结果依赖它
+        day: 缓存所属的日期，默认今天
+
+    Returns:
+        缓存键
+    """
+    if intent in WINDOWLESS_INTENTS:
+        date_range = None
+    if intent != "notes_search":
+        query = ""
+    day = day or date.today()
+    return ("data", intent, day.isoformat(), date_range.key() if date_range else None, query)
+
+
+class CacheEntry:
+    """缓存条目"""
+
+    __slots__ = ("value", "version", "expires_at", "prewarmed")
+
+    def __init__(self, value: Any, version: int, expires_at: float, prewarmed: bool):
+        self.value = value
+        self.version = version
+        self.expires_at = expires_at
+        self.prewarmed = prewarmed
+
+
+class ResponseCache:
+    """带TTL和LRU淘汰的按用户响应缓存"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400):
+        """
+        Args:
+            max_entries: 最大条目数，超出时淘汰最久未使用的条目
+            ttl_seconds: 条目有效期（秒）
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[Tuple[int, Hashable], CacheEntry]" = OrderedDict()
+        self.versions: Dict[int, int] = {}
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "hits": 0, "misses": 0, "prewarmed_hits": 0, "puts": 0, "prewarmed_puts": 0,
+            "stale_puts": 0, "invalidations": 0, "evictions": 0, "expired": 0,
+        }
+
+    def version(self, user_id: int) -> int:
+        """用户当前的数据版本"""
+        with self.lock:
+            return self.versions.get(user_id, 0)
+
+    def _lookup(self, cache_key: Tuple[int, Hashable]) -> Optional[CacheEntry]:
+        entry = self.entries.get(cache_key)
+        if entry is None:
+            return None
+        if entry.version != self.versions.get(cache_key[0], 0):
+            del self.entries[cache_key]
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self.entries[cache_key]
+            self.counters["expired"] += 1
+            return None
+        self.entries.move_to_end(cache_key)
+        return entry
+
+    def get(self, user_id: int, key: Hashable, record: bool = True) -> Optional[Any]:
+        """
+        读取缓存
+
+        Args:
+            user_id: 用户ID
+            key: 缓存键
+            record: 是否计入命中率统计（预热检查时传False）
+
+        Returns:
+            缓存的值，未命中返回None
+        """
+        with self.lock:
+            entry = self._lookup((user_id, key))
+            if record:
+                if entry is None:
+                    self.counters["misses"] += 1
+                else:
+                    self.counters["hits"] += 1
+                    if entry.prewarmed:
+                        self.counters["prewarmed_hits"] += 1
+            return entry.value if entry is not None else None
+
+    def put(
+        self,
+        user_id: int,
+        key: Hashable,
+        value: Any,
+        version: Optional[int] = None,
+        prewarmed: bool = False
+    ) -> bool:
+        """
+        写入缓存
+
+        Args:
+            user_id: 用户ID
+            key: 缓存键
+            value: 缓存的值
+            version: 计算开始时的用户版本；与当前版本不一致说明计算期间数据已变化，放弃写入
+            prewarmed: 是否由预热任务写入
+
+        Returns:
+            是否写入成功
+        """
+        with self.lock:
+            current = self.versions.get(user_id, 0)
+            if version is not None and version != current:
+                self.counters["stale_puts"] += 1
+                return False
+            cache_key = (user_id, key)
+            self.entries[cache_key] = CacheEntry(value, current, time.monotonic() + self.ttl_seconds, prewarmed)
+            self.entries.move_to_end(cache_key)
+            self.counters["puts"] += 1
+            if prewarmed:
+                self.counters["prewarmed_puts"] += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            return True
+
+    def get_or_compute(
+        self,
+        user_id: int,
+        key: Hashable,
+        compute: Callable[[], Any],
+        prewarmed: bool = False
+    ) -> Any:
+        """
+        命中时直接返回，否则计算并写入（计算抛出的异常不缓存）
+
+        Args:
+            user_id: 用户ID
+            key: 缓存键
+            compute: 未命中时调用的计算函数
+            prewarmed: 是否为预热调用（预热调用不计入命中率）
+        """
+        value = self.get(user_id, key, record=not prewarmed)
+        if value is not None:
+            return value
+        version = self.version(user_id)
+        value = compute()
+        self.put(user_id, key, value, version=version, prewarmed=prewarmed)
+        return value
+
+    def contains(self, user_id: int, key: Hashable) -> bool:
+        """是否存在有效条目（不计入统计）"""
+        with self.lock:
+            return self._lookup((user_id, key)) is not None
+
+    def invalidate_user(self, user_id: int):
+        """使用户的全部缓存失效（新记录写入时调用）"""
+        with self.lock:
+            self.versions[user_id] = self.versions.get(user_id, 0) + 1
+            self.counters["invalidations"] += 1
+            for cache_key in [k for k in self.entries if k[0] == user_id]:
+                del self.entries[cache_key]
+
+    def on_workout_written(self, record: Dict[str, Any]):
+        """新记录写入事件的监听函数"""
+        self.invalidate_user(record["user_id"])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """缓存指标"""
+        with self.lock:
+            counters = dict(self.counters)
+            size = len(self.entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": size,
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "prewarmed_hit_rate": counters["prewarmed_hits"] / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,294 @@
+"""跨进程共享响应缓存 - 预分叉的多个工作进程共用一段multiprocessing.shared_memory
+
+与ResponseCache接口一致（get/put/get_or_compute/invalidate_user/snapshot），但条目存放在共享内存中：
+    [用户版本表 | 各分段计数器 | 条目槽位]
+- 槽位定长（头部 + 序列化后的值），按键摘要分到各分段，分段内线性探测probe个槽位；
+  探测窗口内没有空位时覆盖最久未访问的条目（命中时更新访问时间，窗口内的LRU），超过槽位大小的值不缓存。
+- 每个分段一把进程间锁，不同分段的读写互不阻塞。
+- 用户版本表按user_id哈希到固定数量的版本槽，失效时只递增版本号（不扫描条目）；
+  哈希冲突只会让其他用户的缓存多失效一次，不会读到旧数据。
+锁和共享内存在父进程创建，fork后由工作进程继承。
+
+只有缓存条目放在共享内存中：多粒度汇总等进程内数据结构在fork前构建，按写时复制共享，
+按用户的汇总结果经本缓存共享（汇总桶本身没有移入共享内存）。
+"""
+import hashlib
+import multiprocessing
+import os
+import pickle
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+# 槽位头部：键摘要、写入时的用户版本、过期时间、最近访问时间、值长度、是否预热写入
+_HEADER = struct.Struct("<16sQddIB3x")
+_ACCESSED = struct.Struct("<d")
+_ACCESSED_OFFSET = struct.calcsize("<16sQd")
+_VERSION = struct.Struct("<Q")
+_COUNTER = struct.Struct("<q")
+_EMPTY_DIGEST = bytes(16)
+
+# 每个分段的计数器（在分段锁内更新，读取时求和）
+COUNTERS = (
+    "hits", "misses", "prewarmed_hits", "puts", "prewarmed_puts",
+    "stale_puts", "evictions", "expired", "too_large", "invalidations",
+)
+_COUNTER_INDEX = {name: i for i, name in enumerate(COUNTERS)}
+
+
+class SharedResponseCache:
+    """基于共享内存的按用户响应缓存"""
+
+    def __init__(
+        self,
+        slots: int = 2048,
+        slot_bytes: int = 32768,
+        stripes: int = 64,
+        probe: int = 8,
+        version_slots: int = 65536,
+        ttl_seconds: float = 86400,
+        name: Optional[str] = None
+    ):
+        """
+        Args:
+            slots: 条目槽位数（向上取整为stripes的整数倍）
+            slot_bytes: 每个槽位的字节数（含头部），决定可缓存的最大值
+            stripes: 分段数（每段一把锁）
+            probe: 线性探测的槽位数
+            version_slots: 用户版本表大小
+            ttl_seconds: 条目有效期（秒）
+            name: 共享内存名称，默认自动生成
+        """
+        self.stripes = stripes
+        self.per_stripe = max(probe, -(-slots // stripes))
+        self.slots = self.per_stripe * stripes
+        self.slot_bytes = slot_bytes
+        self.probe = probe
+        self.version_slots = version_slots
+        self.ttl_seconds = ttl_seconds
+        self.max_value_bytes = slot_bytes - _HEADER.size
+
+        self.versions_offset = 0
+        self.counters_offset = version_slots * _VERSION.size
+        self.slots_offset = self.counters_offset + stripes * len(COUNTERS) * _COUNTER.size
+        size = self.slots_offset + self.slots * slot_bytes
+        self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.buffer = self.memory.buf
+        self.buffer[:self.slots_offset] = bytes(self.slots_offset)
+
+        # fork后工作进程继承同一组锁
+        context = multiprocessing.get_context("fork")
+        self.locks = [context.Lock() for _ in range(stripes)]
+        self.version_lock = context.Lock()
+        self.owner_pid = os.getpid()
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    @property
+    def size(self) -> int:
+        return self.memory.size
+
+    # ---- 用户版本 ----
+
+    def _version_offset(self, user_id: int) -> int:
+        return self.versions_offset + (hash(user_id) % self.version_slots) * _VERSION.size
+
+    def version(self, user_id: int) -> int:
+        """用户当前的数据版本"""
+        with self.version_lock:
+            return _VERSION.unpack_from(self.buffer, self._version_offset(user_id))[0]
+
+    def invalidate_user(self, user_id: int):
+        """使用户的全部缓存失效（递增版本号，旧条目在读取或覆盖时清除）"""
+        offset = self._version_offset(user_id)
+        with self.version_lock:
+            _VERSION.pack_into(self.buffer, offset, _VERSION.unpack_from(self.buffer, offset)[0] + 1)
+        with self.locks[0]:
+            self._incr(0, "invalidations")
+
+    def on_workout_written(self, record: Dict[str, Any]):
+        """新记录写入事件的监听函数"""
+        self.invalidate_user(record["user_id"])
+
+    # ---- 条目 ----
+
+    @staticmethod
+    def _digest(user_id: int, key: Hashable) -> bytes:
+        return hashlib.blake2b(repr((user_id, key)).encode("utf-8"), digest_size=16).digest()
+
+    def _locate(self, digest: bytes):
+        """返回(分段, 探测起点在内的槽位偏移列表)"""
+        value = int.from_bytes(digest[:8], "little")
+        stripe = value % self.stripes
+        start = (value // self.stripes) % self.per_stripe
+        base = self.slots_offset + stripe * self.per_stripe * self.slot_bytes
+        offsets = [
+            base + ((start + i) % self.per_stripe) * self.slot_bytes
+            for i in range(min(self.probe, self.per_stripe))
+        ]
+        return stripe, offsets
+
+    def _incr(self, stripe: int, name: str, value: int = 1):
+        """递增计数器（调用方持有该分段的锁）"""
+        offset = self.counters_offset + (stripe * len(COUNTERS) + _COUNTER_INDEX[name]) * _COUNTER.size
+        _COUNTER.pack_into(self.buffer, offset, _COUNTER.unpack_from(self.buffer, offset)[0] + value)
+
+    def _clear_slot(self, offset: int):
+        self.buffer[offset:offset + _HEADER.size] = bytes(_HEADER.size)
+
+    def get(self, user_id: int, key: Hashable, record: bool = True) -> Optional[Any]:
+        """
+        读取缓存
+
+        Args:
+            user_id: 用户ID
+            key: 缓存键
+            record: 是否计入命中率统计（预热检查时传False）
+
+        Returns:
+            缓存的值，未命中返回None
+        """
+        digest = self._digest(user_id, key)
+        version = self.version(user_id)
+        stripe, offsets = self._locate(digest)
+        value = None
+        with self.locks[stripe]:
+            for offset in offsets:
+                slot_digest, slot_version, expires_at, _, length, prewarmed = _HEADER.unpack_from(self.buffer, offset)
+                if slot_digest != digest:
+                    continue
+                if slot_version != version:
+                    self._clear_slot(offset)
+                elif expires_at <= time.time():
+                    self._clear_slot(offset)
+                    self._incr(stripe, "expired")
+                else:
+                    start = offset + _HEADER.size
+                    value = pickle.loads(self.buffer[start:start + length])
+                    _ACCESSED.pack_into(self.buffer, offset + _ACCESSED_OFFSET, time.time())
+                    if record:
+                        self._incr(stripe, "hits")
+                        if prewarmed:
+                            self._incr(stripe, "prewarmed_hits")
+                break
+            if value is None and record:
+                self._incr(stripe, "misses")
+        return value
+
+    def put(
+        self,
+        user_id: int,
+        key: Hashable,
+        value: Any,
+        version: Optional[int] = None,
+        prewarmed: bool = False
+    ) -> bool:
+        """
+        写入缓存
+
+        Args:
+            user_id: 用户ID
+            key: 缓存键
+            value: 缓存的值（可pickle）
+            version: 计算开始时的用户版本；与当前版本不一致时放弃写入
+            prewarmed: 是否由预热任务写入
+
+        Returns:
+            是否写入成功
+        """
+        digest = self._digest(user_id, key)
+        current = self.version(user_id)
+        stripe, offsets = self._locate(digest)
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.locks[stripe]:
+            if version is not None and version != current:
+                self._incr(stripe, "stale_puts")
+                return False
+            if len(payload) > self.max_value_bytes:
+                self._incr(stripe, "too_large")
+                return False
+
+            now = time.time()
+            target, oldest = None, None
+            for offset in offsets:
+                slot_digest, _, expires_at, accessed_at, _, _ = _HEADER.unpack_from(self.buffer, offset)
+                if slot_digest == digest or slot_digest == _EMPTY_DIGEST or expires_at <= now:
+                    target = offset
+                    break
+                if oldest is None or accessed_at < oldest[1]:
+                    oldest = (offset, accessed_at)
+            if target is None:
+                target = oldest[0]
+                self._incr(stripe, "evictions")
+
+            _HEADER.pack_into(
+                self.buffer, target, digest, current, now + self.ttl_seconds, now, len(payload), prewarmed
+            )
+            start = target + _HEADER.size
+            self.buffer[start:start + len(payload)] = payload
+            self._incr(stripe, "puts")
+            if prewarmed:
+                self._incr(stripe, "prewarmed_puts")
+            return True
+
+    def get_or_compute(
+        self,
+        user_id: int,
+        key: Hashable,
+        compute: Callable[[], Any],
+        prewarmed: bool = False
+    ) -> Any:
+        """命中时直接返回，否则计算并写入（计算抛出的异常不缓存）"""
+        value = self.get(user_id, key, record=not prewarmed)
+        if value is not None:
+            return value
+        version = self.version(user_id)
+        value = compute()
+        self.put(user_id, key, value, version=version, prewarmed=prewarmed)
+        return value
+
+    def contains(self, user_id: int, key: Hashable) -> bool:
+        """是否存在有效条目（不计入统计）"""
+        return self.get(user_id, key, record=False) is not None
+
+    def clear(self):
+        for stripe, lock in enumerate(self.locks):
+            with lock:
+                base = self.slots_offset + stripe * self.per_stripe * self.slot_bytes
+                for slot in range(self.per_stripe):
+                    self._clear_slot(base + slot * self.slot_bytes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """缓存指标（所有进程合计）"""
+        counters = dict.fromkeys(COUNTERS, 0)
+        entries = 0
+        now = time.time()
+        for stripe, lock in enumerate(self.locks):
+            with lock:
+                for name in COUNTERS:
+                    offset = self.counters_offset + (stripe * len(COUNTERS) + _COUNTER_INDEX[name]) * _COUNTER.size
+                    counters[name] += _COUNTER.unpack_from(self.buffer, offset)[0]
+                base = self.slots_offset + stripe * self.per_stripe * self.slot_bytes
+                for slot in range(self.per_stripe):
+                    digest, _, expires_at, _, _, _ = _HEADER.unpack_from(self.buffer, base + slot * self.slot_bytes)
+                    if digest != _EMPTY_DIGEST and expires_at > now:
+                        entries += 1
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": entries,
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "prewarmed_hit_rate": counters["prewarmed_hits"] / lookups if lookups else 0.0,
+            "shared_bytes": self.size,
+        }
+
+    def close(self):
+        """解除本进程的映射；创建者进程同时删除共享内存"""
+        self.buffer = None
+        self.memory.close()
+        if os.getpid() == self.owner_pid:
+            self.memory.unlink()